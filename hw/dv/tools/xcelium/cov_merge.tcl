@@ -8,8 +8,17 @@
 # using the env var 'cov_db_dirs' (which is a space separated list of directories).
 # Append each of these directories with /* wildcard at the end to allow the tool to
 # find all available test databases.
-set cov_db_dirs_env [string trim $::env(cov_db_dirs) " \"'"]
-foreach i $cov_db_dirs_env { append cov_db_dirs "[string trim $i]/* "; }
+#
+# If the env var 'cov_merge_tests_file' is set (for a batch of a hierarchical
+# merge), merge just the test databases listed in that file instead.
+if {[info exists ::env(cov_merge_tests_file)] && $::env(cov_merge_tests_file) ne ""} {
+  set filepointer [open [string trim $::env(cov_merge_tests_file) " \"'"] r]
+  set cov_db_dirs [string trim [read $filepointer]]
+  close $filepointer
+} else {
+  set cov_db_dirs_env [string trim $::env(cov_db_dirs) " \"'"]
+  foreach i $cov_db_dirs_env { append cov_db_dirs "[string trim $i]/* "; }
+}
 puts "Input coverage directories:\n$cov_db_dirs"
 
 # Set the output directory for the merged database using the env var 'cov_merge_db_dir'.
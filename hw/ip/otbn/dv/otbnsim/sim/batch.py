@@ -0,0 +1,142 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+'''Run one OTBN program many times, with different DMEM inputs
+
+This is intended for known-answer test flows, which run the same ELF over and
+over with different inputs. The ELF is read and decoded once (see
+ElfProgram) and each run gets a fresh StandaloneSim. Runs can be spread over a
+pool of worker processes. Each worker is sent the decoded program once, when it
+starts, rather than once per run.
+
+'''
+
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional
+
+from .load_elf import ElfProgram
+from .standalonesim import StandaloneSim
+from .stats import ExecutionStats
+
+# The sideload keys used by standalone.py
+_KEY0 = int('deadbeef' * 12, 16)
+_KEY1 = int('baadf00d' * 12, 16)
+
+
+class BatchResult:
+    '''The result of a single run in a batch
+
+    dmem is the contents of DMEM at the end of the run (in the format written
+    by standalone.py --dump-dmem) and regs is a register dump (in the format
+    written by standalone.py --dump-regs). If stats were requested, stats is
+    the ExecutionStats object for the run.
+
+    '''
+    def __init__(self,
+                 cycles: int,
+                 stop_pc: int,
+                 err_bits: int,
+                 dmem: bytes,
+                 regs: str,
+                 stats: Optional[ExecutionStats],
+                 run_time: float) -> None:
+        self.cycles = cycles
+        self.stop_pc = stop_pc
+        self.err_bits = err_bits
+        self.dmem = dmem
+        self.regs = regs
+        self.stats = stats
+        self.run_time = run_time
+
+
+def run_one(elf_program: ElfProgram,
+            dmem_image: bytes,
+            collect_stats: bool,
+            use_decode_cache: bool = False) -> BatchResult:
+    '''Run elf_program once with the given DMEM image
+
+    The image is loaded at address zero, after the initial DMEM contents from
+    the ELF file. Each 32-bit word should be represented by 4 bytes in
+    little-endian format (as with OTBNSim.load_data with has_validity=False).
+
+    '''
+    start_time = time.monotonic()
+
+    sim = StandaloneSim(use_decode_cache=use_decode_cache)
+    elf_program.load_into(sim)
+    sim.load_data(dmem_image, has_validity=False)
+    sim.state.wsrs.set_sideload_keys(_KEY0, _KEY1)
+    sim.state.ext_regs.commit()
+    sim.start(collect_stats)
+
+    regs = io.StringIO()
+    cycles = sim.run(verbose=False, dump_file=regs)
+
+    return BatchResult(cycles,
+                       sim.state.pc,
+                       sim.state.ext_regs.read('ERR_BITS', False),
+                       sim.dump_data(),
+                       regs.getvalue(),
+                       sim.stats,
+                       time.monotonic() - start_time)
+
+
+# The program that a worker process runs. This is set once per worker by
+# _init_worker.
+_WORKER_PROGRAM: Optional[ElfProgram] = None
+
+
+def _init_worker(elf_program: ElfProgram) -> None:
+    global _WORKER_PROGRAM
+    _WORKER_PROGRAM = elf_program
+
+
+def _worker_run(dmem_image: bytes,
+                collect_stats: bool,
+                use_decode_cache: bool) -> BatchResult:
+    assert _WORKER_PROGRAM is not None
+    result = run_one(_WORKER_PROGRAM, dmem_image,
+                     collect_stats, use_decode_cache)
+
+    # Each ExecutionStats object points at the program. Don't send a copy of
+    # that back with every result: run_batch puts it back again.
+    if result.stats is not None:
+        result.stats.program = []
+
+    return result
+
+
+def run_batch(elf_program: ElfProgram,
+              dmem_images: Iterable[bytes],
+              collect_stats: bool = False,
+              jobs: Optional[int] = None,
+              use_decode_cache: bool = False) -> List[BatchResult]:
+    '''Run elf_program once for each image in dmem_images
+
+    Returns a list of results, in the same order as dmem_images. If jobs is 1,
+    everything runs in this process. Otherwise, runs are spread over a pool of
+    jobs worker processes (defaulting to the number of CPUs).
+
+    '''
+    images = list(dmem_images)
+
+    if jobs == 1 or len(images) <= 1:
+        return [run_one(elf_program, image, collect_stats, use_decode_cache)
+                for image in images]
+
+    with ProcessPoolExecutor(max_workers=jobs,
+                             initializer=_init_worker,
+                             initargs=(elf_program,)) as pool:
+        futures = [pool.submit(_worker_run, image,
+                               collect_stats, use_decode_cache)
+                   for image in images]
+        results = [future.result() for future in futures]
+
+    for result in results:
+        if result.stats is not None:
+            result.stats.program = elf_program.program
+
+    return results
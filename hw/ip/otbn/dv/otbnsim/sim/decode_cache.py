@@ -0,0 +1,89 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+'''A cache of predecoded instructions for OTBNSim.run_cached'''
+
+import inspect
+from typing import Dict, List, Set
+
+from .isa import OTBNInsn
+
+
+def is_single_cycle(insn: OTBNInsn) -> bool:
+    '''Can insn be run by OTBNSim.run_cached?
+
+    This is true if the instruction's execute method isn't a generator
+    function. Instructions that might take more than one cycle (like LW or a
+    CSRRS that reads RND) are all written as generators. run_cached doesn't
+    handle them: instead, it stops and hands over to OTBNSim.step().
+
+    '''
+    return (insn.has_bits and
+            not inspect.isgeneratorfunction(type(insn).execute))
+
+
+class InsnRun:
+    '''A run of consecutive single-cycle instructions
+
+    The instructions are all single-cycle instructions (see is_single_cycle).
+    The run stops after the first instruction that isn't straight-line (a
+    branch, jump, loop or ECALL) or that is the last instruction of some loop
+    body. It also stops just before any multi-cycle instruction, or at the end
+    of IMEM.
+
+    '''
+    def __init__(self, entries: List[OTBNInsn]) -> None:
+        self.entries = entries
+
+
+class DecodeCache:
+    '''A lazily populated cache of the instruction runs in a program
+
+    This only saves OTBNSim.step() from working out, on each cycle, whether
+    the next instruction can be run without any special handling. Each
+    instruction still takes its own cycle, with the same state updates as in
+    step().
+
+    The cache is keyed by the PC of the first instruction in a run. It must
+    be discarded if the program changes (see OTBNSim.load_program) or if IMEM
+    is invalidated.
+
+    '''
+    def __init__(self, program: List[OTBNInsn]) -> None:
+        self.program = program
+        self.runs: Dict[int, InsnRun] = {}
+
+        # The address of the last instruction in each possible loop body. We
+        # can find these statically because both LOOP and LOOPI encode the
+        # body size as an immediate. Loop warping might change how many times
+        # we go round, but not where the loop ends.
+        self.loop_ends: Set[int] = set()
+        for idx, insn in enumerate(program):
+            if insn.insn.mnemonic in ['loop', 'loopi']:
+                self.loop_ends.add(4 * idx + 4 * insn.op_vals['bodysize'])
+
+    def get(self, pc: int) -> InsnRun:
+        '''Get the run of instructions that starts at pc'''
+        run = self.runs.get(pc)
+        if run is None:
+            run = self._make_run(pc)
+            self.runs[pc] = run
+        return run
+
+    def _make_run(self, pc: int) -> InsnRun:
+        entries: List[OTBNInsn] = []
+        idx = pc >> 2
+        while idx < len(self.program):
+            insn = self.program[idx]
+            if not is_single_cycle(insn):
+                break
+
+            entries.append(insn)
+
+            if not insn.insn.straight_line or 4 * idx in self.loop_ends:
+                break
+
+            idx += 1
+
+        return InsnRun(entries)
@@ -2,14 +2,17 @@
 # Licensed under the Apache License, Version 2.0, see LICENSE for details.
 # SPDX-License-Identifier: Apache-2.0
 
-import struct
-from typing import Dict, List, Sequence, Optional
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
 from shared.mem_layout import get_memory_layout
 
 from .trace import Trace
 
 
+# The types of data that we can load into DMEM without copying it first.
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
 class TraceDmemStore(Trace):
     def __init__(self, addr: int, value: int, is_wide: bool):
         self.addr = addr
@@ -25,10 +28,11 @@ class TraceDmemStore(Trace):
 class Dmem:
     '''An object representing OTBN's DMEM.
 
-    Memory is stored as an array of 32-byte words (the native width for the
-    OTBN wide side). These words are stored as 256-bit unsigned integers. This
-    is the same width as the wide-side registers (to avoid unnecessary
-    packing/unpacking work), but the unsigned values simplify tracing.
+    Memory is stored as a contiguous little-endian byte buffer, together with
+    a validity flag for each 32-bit word. A 256-bit access (for BN.LID or
+    BN.SID) is a single slice of the buffer, which we convert with
+    int.from_bytes/int.to_bytes. Loading and dumping the memory contents can
+    also work on the buffer directly (see load_le_words and dump_view).
 
     '''
 
@@ -47,12 +51,14 @@ class Dmem:
             raise RuntimeError('DMEM size ({}) is not divisible by 32.'
                                .format(dmem_size))
 
-        # We represent the contents of DMEM as a list of 32-bit words (unlike
-        # the RTL, which uses a 256-bit array). An entry in self.data is None
-        # if the word has invalid integrity bits and we'll get an error if we
-        # try to read it. Otherwise, we store the integer value.
-        num_words = dmem_size // 4
-        self.data: List[Optional[int]] = [None] * num_words
+        # We represent the contents of DMEM as a byte buffer, together with a
+        # validity byte for each 32-bit word (unlike the RTL, which uses a
+        # 256-bit array). If a word's validity byte is zero, the word has
+        # invalid integrity bits and we'll get an error if we try to read it.
+        # The bytes for an invalid word are always zero.
+        self.num_words = dmem_size // 4
+        self.data = bytearray(dmem_size)
+        self.valid = bytearray(self.num_words)
 
         # Because it's an actual memory, stores to DMEM take two cycles in the
         # RTL. We wouldn't need to model this except that a DMEM invalidation
@@ -62,11 +68,18 @@ class Dmem:
         # generate a trace entry which will appear in changes() at the end of
         # this cycle. However, the first commit() will then move it to the
         # self.pending list. Entries here will only make it to self.data on the
-        # next commit().
+        # next commit(). The list is keyed by 32-bit word index.
         self.trace: List[TraceDmemStore] = []
         self.pending: Dict[int, int] = {}
 
-    def _load_5byte_le_words(self, data: bytes, word_offset: int) -> None:
+    def _check_load_size(self, num_words: int, word_offset: int) -> None:
+        if word_offset + num_words > self.num_words:
+            raise ValueError('Trying to load {} bytes of data at byte offset '
+                             '{}, but DMEM is only {} bytes long.'
+                             .format(4 * num_words, 4 * word_offset,
+                                     len(self.data)))
+
+    def _load_5byte_le_words(self, data: BytesLike, word_offset: int) -> None:
         '''Replace the memory start at word_offset with data
 
         The bytes loaded should represent each 32-bit word with 5 bytes,
@@ -79,50 +92,58 @@ class Dmem:
                              'which is not a multiple of 5.'
                              .format(len(data)))
 
-        len_data_32 = len(data) // 5
-        len_mem_32 = (256 // 32) * len(self.data)
-
-        if len_data_32 > len_mem_32:
-            raise ValueError('Trying to load {} bytes of data, but DMEM '
-                             'is only {} bytes long.'
-                             .format(4 * len_data_32, 32 * len(self.data)))
-
-        # Zero-pad up to the next 32-bit word, represented by 5 bytes. Because
-        # things are little-endian, this is like zero-extending the last word.
-        if len(data) % 5:
-            data = data + b'0' * (5 - (len(data) % 5))
-
-        for idx32, (vld, u32) in enumerate(struct.iter_unpack('<BI', data)):
-            if vld not in [0, 1]:
-                raise ValueError('The validity byte for 32-bit word {} '
-                                 'in the input data is {}, not 0 or 1.'
-                                 .format(idx32, vld))
-            self.data[idx32 + word_offset] = u32 if vld else None
-
-    def _load_4byte_le_words(self, data: bytes, word_offset: int) -> None:
+        num_words = len(data) // 5
+        self._check_load_size(num_words, word_offset)
+
+        src = memoryview(data).cast('B')
+        vld = bytes(src[0::5])
+        if vld.strip(b'\x00\x01'):
+            for idx32, vld_byte in enumerate(vld):
+                if vld_byte not in [0, 1]:
+                    raise ValueError('The validity byte for 32-bit word {} '
+                                     'in the input data is {}, not 0 or 1.'
+                                     .format(idx32, vld_byte))
+
+        # Gather the 4 data bytes of each 5-byte group into place with strided
+        # slice assignments, then zero the bytes of any invalid words.
+        lo = 4 * word_offset
+        hi = lo + 4 * num_words
+        for i in range(4):
+            self.data[lo + i:hi:4] = src[1 + i::5]
+        self.valid[word_offset:word_offset + num_words] = vld
+
+        idx32 = vld.find(0)
+        while idx32 >= 0:
+            addr = 4 * (word_offset + idx32)
+            self.data[addr:addr + 4] = bytes(4)
+            idx32 = vld.find(0, idx32 + 1)
+
+    def _load_4byte_le_words(self, data: BytesLike, word_offset: int) -> None:
         '''Replace the memory start at word_offset with data
 
         The bytes loaded should represent each 32-bit word with 4 bytes in
-        little-endian format.
+        little-endian format. If the length of data is not a multiple of 4, the
+        last word is zero-extended.
 
         '''
-        if len(data) > 32 * len(self.data):
-            raise ValueError('Trying to load {} bytes of data, but DMEM '
-                             'is only {} bytes long.'
-                             .format(len(data), 32 * len(self.data)))
-        # Zero-pad bytes up to the next multiple of 32 bits (because things
-        # are little-endian, is like zero-extending the last word).
-        if len(data) % 4:
-            data = data + b'0' * (32 - (len(data) % 32))
-
-        for idx32, u32 in enumerate(struct.iter_unpack('<I', data)):
-            self.data[idx32 + word_offset] = u32[0]
-
-    def load_le_words(self, data: bytes, has_validity: bool, word_offset: int) -> None:
+        num_words = (len(data) + 3) // 4
+        self._check_load_size(num_words, word_offset)
+
+        lo = 4 * word_offset
+        self.data[lo:lo + len(data)] = data
+        self.data[lo + len(data):lo + 4 * num_words] = \
+            bytes(4 * num_words - len(data))
+        self.valid[word_offset:word_offset + num_words] = b'\x01' * num_words
+
+    def load_le_words(self,
+                      data: BytesLike,
+                      has_validity: bool,
+                      word_offset: int) -> None:
         '''Replace the memory start at word_offset with data
 
         Uses the 5-byte format if has_validity is true and the 4-byte format
-        otherwise.
+        otherwise. The data can be any bytes-like object (such as a
+        memoryview), and is copied straight into the memory buffer.
 
         '''
         if has_validity:
@@ -130,25 +151,63 @@ class Dmem:
         else:
             self._load_4byte_le_words(data, word_offset)
 
-    def dump_le_words(self) -> bytes:
+    def _with_pending(self) -> Tuple[bytearray, bytearray]:
+        '''Return copies of data and valid with pending stores applied'''
+        data = self.data[:]
+        valid = self.valid[:]
+        for idx, u32 in self.pending.items():
+            data[4 * idx:4 * idx + 4] = u32.to_bytes(4, 'little')
+            valid[idx] = 1
+        return (data, valid)
+
+    def dump_le_words(self,
+                      word_offset: int = 0,
+                      word_count: Optional[int] = None) -> bytes:
         '''Return the contents of memory as bytes.
 
-        The bytes are formatted as little-endian 32-bit words. These
-        words are themselves packed little-endian into 256-bit words.
+        Each 32-bit word is represented by 5 bytes: a validity byte (0 or 1)
+        followed by the word itself in little-endian format. Invalid words are
+        dumped as zero.
+
+        If word_count is not None, only dump that many words, starting at
+        word_offset. Otherwise, dump everything from word_offset to the end.
 
         '''
-        ret = b''
-        for idx, u32 in enumerate(self.data):
-            # If there's a pending store, apply it. This matches the RTL, where
-            # we only observe the memory after that store has landed.
-            u32 = self.pending.get(idx, u32)
+        if word_count is None:
+            word_count = self.num_words - word_offset
+        assert 0 <= word_offset
+        assert 0 <= word_count
+        assert word_offset + word_count <= self.num_words
+
+        # If there's a pending store, apply it. This matches the RTL, where we
+        # only observe the memory after that store has landed.
+        data, valid = ((self.data, self.valid) if not self.pending
+                       else self._with_pending())
 
-            if u32 is None:
-                ret += struct.pack('<BI', 0, 0)
-            else:
-                ret += struct.pack('<BI', 1, u32)
+        lo = 4 * word_offset
+        hi = 4 * (word_offset + word_count)
+        ret = bytearray(5 * word_count)
+        ret[0::5] = valid[word_offset:word_offset + word_count]
+        for i in range(4):
+            ret[1 + i::5] = data[lo + i:hi:4]
 
-        return ret
+        return bytes(ret)
+
+    def dump_view(self) -> Tuple[memoryview, memoryview]:
+        '''Return read-only views of the contents of memory.
+
+        Returns a pair (data, valid). data is the memory as little-endian
+        32-bit words (with invalid words reading as zero) and valid has a byte
+        for each word, which is 1 if the word is valid and 0 otherwise.
+
+        If there are no pending stores, these are views of the memory itself
+        and no data is copied. They are only valid until the next change to
+        DMEM.
+
+        '''
+        data, valid = ((self.data, self.valid) if not self.pending
+                       else self._with_pending())
+        return (memoryview(data).toreadonly(), memoryview(valid).toreadonly())
 
     def is_valid_256b_addr(self, addr: int) -> bool:
         '''Return true if this is a valid address for a BN.LID/BN.SID'''
@@ -157,7 +216,7 @@ class Dmem:
             return False
 
         word_addr = addr // 4
-        if word_addr >= len(self.data):
+        if word_addr >= self.num_words:
             return False
 
         return True
@@ -166,14 +225,23 @@ class Dmem:
         '''Read a u256 little-endian value from an aligned address'''
         assert addr >= 0
         assert self.is_valid_256b_addr(addr)
-        ret_data = 0
-        for i in range(256 // 32):
-            rd_data = self.load_u32(addr + 4 * i)
-            if rd_data is None:
-                return None
-            ret_data = ret_data | (rd_data << (i * 32))
 
-        return ret_data
+        idx = addr // 4
+        if self.pending and any(idx + i in self.pending
+                                for i in range(256 // 32)):
+            # Handle "read under write" hazards a word at a time
+            ret_data = 0
+            for i in range(256 // 32):
+                rd_data = self.load_u32(addr + 4 * i)
+                if rd_data is None:
+                    return None
+                ret_data = ret_data | (rd_data << (i * 32))
+            return ret_data
+
+        if self.valid.find(0, idx, idx + 256 // 32) >= 0:
+            return None
+
+        return int.from_bytes(self.data[addr:addr + 32], 'little')
 
     def store_u256(self, addr: int, value: int) -> None:
         '''Write a u256 little-endian value to an aligned address'''
@@ -189,7 +257,7 @@ class Dmem:
         if addr & 3:
             return False
 
-        if (addr + 3) // 4 >= len(self.data):
+        if (addr + 3) // 4 >= self.num_words:
             return False
 
         return True
@@ -211,7 +279,10 @@ class Dmem:
         if pending_val is not None:
             return pending_val
 
-        return self.data[addr // 4]
+        if not self.valid[idx]:
+            return None
+
+        return int.from_bytes(self.data[addr:addr + 4], 'little')
 
     def store_u32(self, addr: int, value: int) -> None:
         '''Store a 32-bit unsigned value to memory.
@@ -244,7 +315,8 @@ class Dmem:
     def commit(self) -> None:
         # Move items from self.pending to self.data
         for idx, value in self.pending.items():
-            self.data[idx] = value
+            self.data[4 * idx:4 * idx + 4] = value.to_bytes(4, 'little')
+            self.valid[idx] = 1
         self.pending = {}
 
         # Apply trace entries to self.pending
@@ -256,4 +328,5 @@ class Dmem:
         self.trace = []
 
     def empty_dmem(self) -> None:
-        self.data = [None] * len(self.data)
+        self.data = bytearray(len(self.data))
+        self.valid = bytearray(self.num_words)
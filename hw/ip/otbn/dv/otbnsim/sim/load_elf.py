@@ -6,11 +6,12 @@
 
 import re
 import struct
-from typing import Optional, Dict
+from typing import Dict, List, Optional
 
 from shared.elf import read_elf
 
 from .decode import decode_words
+from .isa import OTBNInsn
 from .sim import LoopWarps, OTBNSim
 
 
@@ -69,12 +70,34 @@ def _get_loop_warps(symbols: Dict[str, int]) -> LoopWarps:
     return ret
 
 
-def load_elf(sim: OTBNSim, path: str) -> Optional[int]:
-    '''Load ELF file at path and inject its contents into sim
+class ElfProgram:
+    '''The decoded contents of an OTBN ELF file
 
-    Returns the expected end address, if set, otherwise None.
+    This can be loaded into any number of simulator objects with load_into(),
+    which avoids re-reading and re-decoding the ELF for each run.
 
     '''
+    def __init__(self,
+                 program: List[OTBNInsn],
+                 loop_warps: LoopWarps,
+                 dmem_bytes: bytes,
+                 symbols: Dict[str, int]) -> None:
+        self.program = program
+        self.loop_warps = loop_warps
+        self.dmem_bytes = dmem_bytes
+        self.symbols = symbols
+        self.exp_end = _get_exp_end_addr(symbols)
+
+    def load_into(self, sim: OTBNSim) -> None:
+        '''Inject the program and initial DMEM contents into sim'''
+        sim.load_program(self.program)
+        sim.loop_warps = self.loop_warps
+        sim.load_data(self.dmem_bytes, has_validity=False)
+        sim.symbols = self.symbols
+
+
+def read_elf_program(path: str) -> ElfProgram:
+    '''Read and decode the ELF file at path'''
     (imem_bytes, dmem_bytes, symbols) = read_elf(path)
 
     # Collect imem bytes into 32-bit words and set the validity bit for each
@@ -82,13 +105,18 @@ def load_elf(sim: OTBNSim, path: str) -> Optional[int]:
     imem_words = [(True, w32s[0])
                   for w32s in struct.iter_unpack('<I', imem_bytes)]
 
-    imem_insns = decode_words(0, imem_words)
-    loop_warps = _get_loop_warps(symbols)
-    exp_end = _get_exp_end_addr(symbols)
+    return ElfProgram(decode_words(0, imem_words),
+                      _get_loop_warps(symbols),
+                      dmem_bytes,
+                      symbols)
 
-    sim.load_program(imem_insns)
-    sim.loop_warps = loop_warps
-    sim.load_data(dmem_bytes, has_validity=False)
-    sim.symbols = symbols
 
-    return exp_end
+def load_elf(sim: OTBNSim, path: str) -> Optional[int]:
+    '''Load ELF file at path and inject its contents into sim
+
+    Returns the expected end address, if set, otherwise None.
+
+    '''
+    elf_program = read_elf_program(path)
+    elf_program.load_into(sim)
+    return elf_program.exp_end
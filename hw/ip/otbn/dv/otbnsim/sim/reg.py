@@ -8,8 +8,13 @@ from .trace import Trace
 
 
 class TraceRegister(Trace):
-    def __init__(self, name: str, width: int, new_value: Optional[int]):
+    def __init__(self,
+                 name: str,
+                 idx: int,
+                 width: int,
+                 new_value: Optional[int]):
         self.name = name
+        self.idx = idx
         self.width = width
         self.new_value = new_value
 
@@ -116,6 +121,7 @@ class RegFile:
             assert 0 <= idx < len(self._registers)
             next_val = self.get_reg(idx).read_next()
             ret.append(TraceRegister('{}{:02}'.format(self._name_pfx, idx),
+                                     idx,
                                      self._width,
                                      next_val))
         return ret
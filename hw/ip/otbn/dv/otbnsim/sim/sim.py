@@ -4,6 +4,7 @@
 
 from typing import Dict, Iterator, List, Optional, Tuple
 
+from .decode_cache import DecodeCache
 from .constants import ErrBits, LcTx, Status, read_lc_tx_t
 from .decode import EmptyInsn
 from .isa import OTBNInsn
@@ -23,7 +24,7 @@ StepRes = Tuple[Optional[OTBNInsn], List[Trace]]
 
 
 class OTBNSim:
-    def __init__(self) -> None:
+    def __init__(self, use_decode_cache: bool = False) -> None:
         self.state = OTBNState()
         self.program: List[OTBNInsn] = []
         self.loop_warps: LoopWarps = {}
@@ -32,9 +33,35 @@ class OTBNSim:
         self._execute_generator: Optional[Iterator[None]] = None
         self._next_insn: Optional[OTBNInsn] = None
 
+        # If use_decode_cache is true, run_cached() can execute straight-line
+        # code from a cache of predecoded instructions, rather than going
+        # through step() for each cycle. The cache itself is built lazily (and
+        # thrown away when the program changes).
+        self.use_decode_cache = use_decode_cache
+        self._decode_cache: Optional[DecodeCache] = None
+
+        # If this is false, the steppers don't build a list of architectural
+        # changes for each cycle (unless tracing is enabled). See step().
+        self._collect_changes = True
+
+        # Pairs: (stepper, handles_injected_err). If handles_injected_err is
+        # False then the generic code in step() will deal with any pending
+        # errors in self.state.injected_err_bits. If True, then we expect the
+        # stepper function to handle them.
+        self._steppers = {
+            FsmState.MEM_SEC_WIPE: (self._step_ext_wipe, False),
+            FsmState.IDLE: (self._step_idle, False),
+            FsmState.PRE_EXEC: (self._step_pre_exec, False),
+            FsmState.EXEC: (self._step_exec, True),
+            FsmState.PRE_WIPE: (self._step_pre_wipe, False),
+            FsmState.WIPING: (self._step_wiping, False),
+            FsmState.LOCKED: (self._step_idle, False)
+        }
+
     def load_program(self, program: List[OTBNInsn]) -> None:
         self.program = program.copy()
         self.state.clear_imem_invalidation()
+        self._decode_cache = None
 
     def add_loop_warp(self, addr: int, from_cnt: int, to_cnt: int) -> None:
         '''Add a new loop warp to the simulation'''
@@ -94,12 +121,23 @@ class OTBNSim:
 
         return self.program[word_pc]
 
+    def _changes(self, verbose: bool) -> List[Trace]:
+        '''Get the pending architectural changes for this cycle
+
+        If we aren't tracing and the caller of step() didn't ask for changes,
+        this returns an empty list without building any Trace objects.
+
+        '''
+        if verbose or self._collect_changes:
+            return self.state.changes()
+        return []
+
     def _on_stall(self,
                   verbose: bool,
                   fetch_next: bool) -> List[Trace]:
         '''This is run on a stall cycle'''
         self.state.stop_if_pending_halt()
-        changes = self.state.changes()
+        changes = self._changes(verbose)
         self.state.commit(sim_stalled=True)
         if fetch_next:
             self._next_insn = self._fetch(self.state.pc)
@@ -121,7 +159,7 @@ class OTBNSim:
             self.stats.record_insn(insn, self.state)
 
         halting = self.state.stop_if_pending_halt()
-        changes = self.state.changes()
+        changes = self._changes(verbose)
 
         # Program counter before commit
         pc_before = self.state.pc
@@ -132,12 +170,30 @@ class OTBNSim:
         no_fetch = halting or insn.has_fetch_stall
         self._next_insn = None if no_fetch else self._fetch(self.state.pc)
 
-        disasm = insn.disassemble(pc_before)
         if verbose:
-            self._print_trace(pc_before, disasm, changes)
+            self._print_trace(pc_before, insn.disassemble(pc_before), changes)
 
         return changes
 
+    def _start_insn(self, insn: OTBNInsn) -> None:
+        '''This is run on the first cycle of an instruction'''
+        # Run any setup for the state object and then start running the
+        # instruction itself.
+        self.state.pre_insn(insn.affects_control)
+
+        # Either execute the instruction directly (if it is a single-cycle
+        # instruction without a `yield` in execute()), or return a generator
+        # for multi-cycle instructions. Note that this doesn't consume the
+        # first yielded value.
+        self._execute_generator = insn.execute(self.state)
+
+    def _check_rnd_errors(self) -> None:
+        '''Stop at the end of the cycle if an RND check has failed'''
+        if self.state.wsrs.RND.rep_err_escalate:
+            self.state.stop_at_end_of_cycle(ErrBits.RND_REP_CHK_FAIL)
+        if self.state.wsrs.RND.fips_err_escalate:
+            self.state.stop_at_end_of_cycle(ErrBits.RND_FIPS_CHK_FAIL)
+
     def _delayed_insn_cnt_zero(self, delay_if_locking: int) -> None:
         '''Zero INSN_CNT if we are in a wiping state and are going to lock
         after wipe.
@@ -175,34 +231,93 @@ class OTBNSim:
             # (maybe we'll update insn_cnt next cycle).
             self.state.time_to_insn_cnt_zero = count - 1
 
-    def step(self, verbose: bool) -> StepRes:
+    def step(self, verbose: bool, collect_changes: bool = True) -> StepRes:
         '''Run a single cycle.
 
         Returns the instruction, together with a list of the architectural
         changes that have happened. If the model isn't currently executing,
         returns no instruction and no changes.
 
+        If collect_changes is false and verbose is false, the list of changes
+        will always be empty. This avoids building Trace objects when the
+        caller doesn't need them (see StandaloneSim.run), but doesn't change
+        the architectural behaviour of the model.
+
         '''
+        self._collect_changes = collect_changes
         fsm_state = self.state.get_fsm_state()
-        # Pairs: (stepper, handles_injected_err). If handles_injected_err is
-        # False then the generic code here will deal with any pending errors in
-        # self.state.injected_err_bits. If True, then we expect the stepper
-        # function to handle them.
-        steppers = {
-            FsmState.MEM_SEC_WIPE: (self._step_ext_wipe, False),
-            FsmState.IDLE: (self._step_idle, False),
-            FsmState.PRE_EXEC: (self._step_pre_exec, False),
-            FsmState.EXEC: (self._step_exec, True),
-            FsmState.PRE_WIPE: (self._step_pre_wipe, False),
-            FsmState.WIPING: (self._step_wiping, False),
-            FsmState.LOCKED: (self._step_idle, False)
-        }
-
-        stepper, handles_injected_err = steppers[fsm_state]
+        stepper, handles_injected_err = self._steppers[fsm_state]
         self.state.step(not handles_injected_err)
 
         return stepper(verbose)
 
+    def run_cached(self) -> int:
+        '''Run straight-line code from the decode cache, if possible.
+
+        This is an optional fast path for run-to-completion simulation (see
+        StandaloneSim.run). It has the same architectural effect as calling
+        step(verbose=False, collect_changes=False) once per cycle, but takes
+        the instructions from a DecodeCache and skips the FSM dispatch and the
+        checks that can't fire in straight-line code that only contains
+        single-cycle instructions. Each cycle still goes through the same
+        _start_insn and _on_retire as in _step_exec, so this only saves a
+        modest amount of time.
+
+        Returns the number of cycles run. This is zero if we can't take the
+        fast path on this cycle (for example, because we are stalled, or
+        there is a pending error or RND request). In that case, the caller
+        should use step().
+
+        '''
+        if not self.use_decode_cache:
+            return 0
+
+        state = self.state
+        insn = self._next_insn
+        if (insn is None or
+                self._execute_generator is not None or
+                state.get_fsm_state() != FsmState.EXEC or
+                state.rma_req == LcTx.ON or
+                state.injected_err_bits or
+                state.pending_halt or
+                state.ext_regs.read('RND_REQ', True)):
+            return 0
+
+        if not state.imem_is_stable():
+            # IMEM has been (or is about to be) invalidated. The cached
+            # instructions no longer match what we'd fetch, so throw them away
+            # and let step() handle things.
+            self._decode_cache = None
+            return 0
+
+        if self._decode_cache is None:
+            self._decode_cache = DecodeCache(self.program)
+
+        entries = self._decode_cache.get(state.pc).entries
+        if not entries or entries[0] is not insn:
+            return 0
+
+        self._collect_changes = False
+        urnd = state.wsrs.URND
+        cycles = 0
+        for insn in entries:
+            # This matches step() and _step_exec() for a single-cycle
+            # instruction in the EXEC state.
+            state.step(False)
+            urnd.step()
+            self._start_insn(insn)
+            assert self._execute_generator is None
+            self._check_rnd_errors()
+            self._on_retire(False, insn)
+            cycles += 1
+
+            # Stop if we are halting or have a fetch stall. Otherwise, the
+            # next instruction in the run is the one that _on_retire fetched.
+            if self._next_insn is None:
+                break
+
+        return cycles
+
     def _step_idle(self, verbose: bool) -> StepRes:
         '''Step the simulation when OTBN is IDLE or LOCKED'''
         self.state.stop_if_pending_halt()
@@ -261,14 +376,14 @@ class OTBNSim:
                     if is_locked:
                         self.state.lock_after_wipe = True
 
-        changes = self.state.changes()
+        changes = self._changes(verbose)
         self.state.commit(sim_stalled=True)
         return (None, changes)
 
     def _step_ext_wipe(self, verbose: bool) -> StepRes:
         '''Step the simulation DMEM/IMEM wipe operation'''
         self.state.stop_if_pending_halt()
-        changes = self.state.changes()
+        changes = self._changes(verbose)
         self.state.commit(sim_stalled=True)
         return (None, changes)
 
@@ -331,16 +446,7 @@ class OTBNSim:
             self._execute_generator = None
 
         if self._execute_generator is None:
-            # This is the first cycle for an instruction. Run any setup for
-            # the state object and then start running the instruction
-            # itself.
-            self.state.pre_insn(insn.affects_control)
-
-            # Either execute the instruction directly (if it is a
-            # single-cycle instruction without a `yield` in execute()), or
-            # return a generator for multi-cycle instructions. Note that
-            # this doesn't consume the first yielded value.
-            self._execute_generator = insn.execute(self.state)
+            self._start_insn(insn)
 
         if self._execute_generator is not None:
             # This is a cycle for a multi-cycle instruction (which possibly
@@ -350,10 +456,7 @@ class OTBNSim:
             except StopIteration:
                 self._execute_generator = None
 
-        if (self.state.wsrs.RND.rep_err_escalate):
-            self.state.stop_at_end_of_cycle(ErrBits.RND_REP_CHK_FAIL)
-        if (self.state.wsrs.RND.fips_err_escalate):
-            self.state.stop_at_end_of_cycle(ErrBits.RND_FIPS_CHK_FAIL)
+        self._check_rnd_errors()
 
         # Handle any pending injected error. Note that this has to run after
         # we've executed any instruction, to ensure we get a trace entry for
@@ -27,6 +27,10 @@ class StandaloneSim(OTBNSim):
 
         Return the number of cycles taken.
 
+        Nothing here consumes the per-cycle list of architectural changes, so
+        we ask step() not to build it. Unless verbose is true, this also means
+        that we don't disassemble instructions as they retire.
+
         '''
         insn_count = 0
 
@@ -38,17 +42,18 @@ class StandaloneSim(OTBNSim):
             if self.state.ext_regs.read('RND_REQ', True):
                 self.state.wsrs.RND.set_unsigned(next(_TEST_RND_DATA), False,
                                                  False)
-            # If there's a URND request, respond immediately.
+            # If URND is not running, provide it with some arbitrary seed.
             if not self.state.wsrs.URND.running:
                 self.state.wsrs.URND.set_seed(_TEST_URND_DATA)
 
-            # Similarly, if URND is not running, provide it with some arbitrary
-            # seed.
-            if not self.state.wsrs.URND.running:
-                self.state.wsrs.URND.set_seed(_TEST_URND_DATA)
-
-            self.step(verbose)
-            insn_count += 1
+            # If enabled, try to run straight-line code from the decode cache.
+            # Otherwise (or if this isn't possible), step a single cycle.
+            cached_cycles = 0 if verbose else self.run_cached()
+            if cached_cycles:
+                insn_count += cached_cycles
+            else:
+                self.step(verbose, collect_changes=False)
+                insn_count += 1
 
             # Dump registers on the first wipe cycle. This makes sure that we
             # dump them before zeroing.
@@ -543,6 +543,11 @@ class OTBNState:
     def invalidate_imem(self) -> None:
         self._time_to_imem_invalidation = 2
 
+    def imem_is_stable(self) -> bool:
+        '''True if IMEM is valid with no pending invalidation'''
+        return (self._time_to_imem_invalidation is None and
+                not self.invalidated_imem)
+
     def clear_imem_invalidation(self) -> None:
         '''Clear any effective or pending IMEM invalidation'''
         self._time_to_imem_invalidation = None
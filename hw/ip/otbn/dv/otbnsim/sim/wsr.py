@@ -405,6 +405,13 @@ class WSRFile:
         '''
         return self._by_idx[idx].write_unsigned(value)
 
+    def idx_of_name(self, name: str) -> int:
+        '''Return the index of the WSR with the given name'''
+        for idx, wsr in self._by_idx.items():
+            if wsr.name == name:
+                return idx
+        raise ValueError('Unknown WSR name: {!r}.'.format(name))
+
     def commit(self) -> None:
         self.MOD.commit()
         self.RND.commit()
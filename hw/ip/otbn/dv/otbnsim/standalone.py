@@ -17,6 +17,14 @@ def main() -> int:
     parser = argparse.ArgumentParser()
     parser.add_argument('elf')
     parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument(
+        '--decode-cache',
+        action='store_true',
+        help=("run straight-line code from a cache of predecoded "
+              "instructions. This gives the same results and cycle counts, "
+              "but is a little faster for long runs. It has no effect with "
+              "--verbose.")
+    )
     parser.add_argument(
         '--testcase',
         type=argparse.FileType('r'),
@@ -54,7 +62,7 @@ def main() -> int:
     if coverage_dat:
         collect_stats = True
 
-    sim = StandaloneSim()
+    sim = StandaloneSim(use_decode_cache=args.decode_cache)
     exp_end_addr = load_elf(sim, args.elf)
 
     testcase = None
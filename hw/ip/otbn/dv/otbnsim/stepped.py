@@ -70,15 +70,86 @@ prefixed with "0x" if they are hexadecimal.
     send_err_escalation     React to an injected error.
 
     set_software_errs_fatal Set software_errs_fatal bit.
+
+If run with --binary (or --socket <path>), the simulator speaks a framed
+binary protocol instead, which avoids text parsing and temporary files. Each
+request frame is a header of a 32-bit little-endian payload length followed by
+a one byte opcode, then the payload. Each response frame is a header of a
+32-bit little-endian payload length and a one byte status (0 for success, 1 for
+an error, in which case the payload is a UTF-8 error message), then the
+payload. The opcodes are:
+
+    0 (TEXT)                The payload is a UTF-8 command line, as above. The
+                            response payload is the UTF-8 text that the command
+                            would have printed (without the trailing '.').
+
+    1 (STEP)                The payload is a 32-bit count, N. Run N cycles,
+                            exactly as if "step" had been sent N times. The
+                            response payload has an entry for each cycle (see
+                            below).
+
+    2 (READ_DMEM)           The payload is a 32-bit word offset and a 32-bit
+                            word count. The response payload is the contents of
+                            those words of DMEM in the format used by dump_d.
+
+    3 (WRITE_DMEM)          The payload is a 32-bit word offset, followed by
+                            data in the format used by load_d, which is written
+                            to DMEM starting at that word.
+
+All multi-byte integers are little-endian.
+
+Each cycle entry in the response to STEP starts with a header of:
+
+    - the kind of cycle (8 bits): 0 if there is nothing to trace, 1 if an
+      instruction was executed, 2 for a stall, 3 for a round of secure wipe and
+      4 for the last round of secure wipe,
+    - the PC at the start of the cycle (32 bits),
+    - whether the instruction is valid (8 bits: 0 if this wasn't an executed
+      instruction or the instruction fetch failed),
+    - the instruction word (32 bits) and
+    - the number of change records that follow (16 bits).
+
+Each change record starts with an 8-bit type and has the following fields.
+Wide values are 256 bits. If a valid field is zero, the new value is unknown
+and the value that follows is zero.
+
+    0 (GPR)                 8-bit index, 8-bit valid, 32-bit value
+    1 (WDR)                 8-bit index, 8-bit valid, wide value
+    2 (WSR)                 8-bit WSR index (as used by BN.WSRR), 8-bit valid,
+                            wide value
+    3 (FLAGS)               8-bit flag group, 8-bit flags (bit 0 is C, bit 1
+                            is M, bit 2 is L and bit 3 is Z)
+    4 (EXT_REG)             8-bit register id, 32-bit value. The id is the
+                            position of the register in otbn.hjson, followed by
+                            the simulation-only STOP_PC, RND_REQ and WIPE_START
+                            registers.
+    5 (DMEM_WORD)           32-bit byte address, 32-bit value
+    6 (DMEM_WIDE)           32-bit byte address, wide value
+
+These are the changes that "step" would have printed, together with the DMEM
+stores (which "step" doesn't print).
 '''
 
+import argparse
 import binascii
+import io
+import os
+import socket
+import struct
 import sys
-from typing import List, Optional
+from contextlib import redirect_stdout
+from typing import BinaryIO, Dict, List, Optional, Tuple
 
 from sim.decode import decode_file
+from sim.dmem import TraceDmemStore
+from sim.ext_regs import TraceExtRegChange
+from sim.flags import TraceFlags
+from sim.isa import OTBNInsn
 from sim.load_elf import load_elf
+from sim.reg import TraceRegister
 from sim.sim import OTBNSim
+from sim.trace import Trace
+from sim.wsr import TraceWSR, WSRFile
 
 
 def read_word(arg_name: str, word_data: str, bits: int) -> int:
@@ -132,10 +203,33 @@ def on_start_operation(sim: OTBNSim, args: List[str]) -> Optional[OTBNSim]:
     return None
 
 
-def on_step(sim: OTBNSim, args: List[str]) -> Optional[OTBNSim]:
-    '''Step one instruction'''
-    check_arg_count('step', 0, args)
+# The kinds of cycle that step_cycle reports. CYCLE_NONE means that there is
+# nothing to trace.
+CYCLE_NONE = 0
+CYCLE_EXEC = 1
+CYCLE_STALL = 2
+CYCLE_WIPE = 3
+CYCLE_WIPE_LAST = 4
+
+# The RTL trace header for each kind of cycle other than CYCLE_NONE and
+# CYCLE_EXEC. The trailing spaces for wipe cycles are a bit naff but match the
+# behaviour in the RTL tracer, where it's rather difficult to change.
+_CYCLE_HEADERS = {
+    CYCLE_STALL: 'STALL',
+    CYCLE_WIPE: 'U ',
+    CYCLE_WIPE_LAST: 'V '
+}
+
+
+def step_cycle(sim: OTBNSim) -> Tuple[int, int, Optional[OTBNInsn],
+                                      List[Trace]]:
+    '''Step one cycle, returning (kind, pc, insn, changes)
 
+    kind is one of the CYCLE_* values above. pc is the PC at the start of the
+    cycle and insn is the instruction that was executed (if kind is
+    CYCLE_EXEC). changes is the list of architectural changes in the cycle.
+
+    '''
     pc = sim.state.pc
     assert 0 == pc & 3
 
@@ -144,26 +238,18 @@ def on_step(sim: OTBNSim, args: List[str]) -> Optional[OTBNSim]:
     insn, changes = sim.step(verbose=False)
 
     if insn is not None:
-        hdr = insn.rtl_trace(pc)  # type: Optional[str]
+        kind = CYCLE_EXEC
     elif was_wiping:
-        # The trailing space is a bit naff but matches the behaviour in the RTL
-        # tracer, where it's rather difficult to change.
         done_last_round = (sim.state.wipe_rounds_done == 2)
-        hdr = 'V ' if done_last_round else 'U '
+        kind = CYCLE_WIPE_LAST if done_last_round else CYCLE_WIPE
     elif sim.state.executing():
-        hdr = 'STALL'
+        kind = CYCLE_STALL
     else:
-        hdr = None
+        kind = CYCLE_NONE
 
     # When locking immediately, drop headers that get cancelled by RTL.
-    if sim.state.lock_immediately and hdr in ['V ', 'STALL']:
-        hdr = None
-
-    rtl_changes = []
-    for c in changes:
-        rt = c.rtl_trace()
-        if rt is not None:
-            rtl_changes.append(rt)
+    if sim.state.lock_immediately and kind in [CYCLE_WIPE_LAST, CYCLE_STALL]:
+        kind = CYCLE_NONE
 
     # This is a bit of a hack. Very occasionally, we'll see traced changes when
     # there's not actually an instruction in flight. For example, this happens
@@ -171,13 +257,39 @@ def on_step(sim: OTBNSim, args: List[str]) -> Optional[OTBNSim]:
     # case, we might see a change where we drop the REQ signal after the secure
     # wipe has finished. Rather than define a special "do-nothing" trace entry
     # format for this situation, we cheat and use STALL.
-    if hdr is None and rtl_changes:
-        hdr = 'STALL'
+    if kind == CYCLE_NONE and any(c.rtl_trace() is not None for c in changes):
+        kind = CYCLE_STALL
 
-    if hdr is not None:
-        print(hdr)
-        for rt in rtl_changes:
-            print(rt)
+    return (kind, pc, insn, changes)
+
+
+def step_trace(sim: OTBNSim) -> List[str]:
+    '''Step one instruction, returning the items of trace output'''
+    kind, pc, insn, changes = step_cycle(sim)
+    if kind == CYCLE_NONE:
+        return []
+
+    if kind == CYCLE_EXEC:
+        assert insn is not None
+        hdr = insn.rtl_trace(pc)
+    else:
+        hdr = _CYCLE_HEADERS[kind]
+
+    rtl_changes = []
+    for c in changes:
+        rt = c.rtl_trace()
+        if rt is not None:
+            rtl_changes.append(rt)
+
+    return [hdr] + rtl_changes
+
+
+def on_step(sim: OTBNSim, args: List[str]) -> Optional[OTBNSim]:
+    '''Step one instruction'''
+    check_arg_count('step', 0, args)
+
+    for item in step_trace(sim):
+        print(item)
 
     return None
 
@@ -452,8 +564,244 @@ def on_input(sim: OTBNSim, line: str) -> Optional[OTBNSim]:
     return ret
 
 
+# Opcodes and frame headers for the binary protocol (described in the
+# docstring at the top of this file).
+BIN_TEXT = 0
+BIN_STEP = 1
+BIN_READ_DMEM = 2
+BIN_WRITE_DMEM = 3
+
+_BIN_HEADER = struct.Struct('<IB')
+_U32 = struct.Struct('<I')
+_U32_PAIR = struct.Struct('<II')
+
+# Change record types in the response to a STEP request
+CHG_GPR = 0
+CHG_WDR = 1
+CHG_WSR = 2
+CHG_FLAGS = 3
+CHG_EXT_REG = 4
+CHG_DMEM_WORD = 5
+CHG_DMEM_WIDE = 6
+
+_BIN_CYCLE = struct.Struct('<BIBIH')
+_BIN_GPR = struct.Struct('<BBBI')
+_BIN_WIDE_REG = struct.Struct('<BBB')
+_BIN_FLAGS = struct.Struct('<BBB')
+_BIN_EXT_REG = struct.Struct('<BBI')
+_BIN_DMEM_WORD = struct.Struct('<BII')
+_BIN_DMEM_WIDE = struct.Struct('<BI')
+
+
+def _read_exact(stream: BinaryIO, length: int) -> Optional[bytes]:
+    '''Read exactly length bytes, or return None at EOF'''
+    chunks = []
+    while length:
+        chunk = stream.read(length)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        length -= len(chunk)
+    return b''.join(chunks)
+
+
+def read_frame(stream: BinaryIO) -> Optional[Tuple[int, bytes]]:
+    '''Read a request frame, returning (opcode, payload) or None at EOF'''
+    header = _read_exact(stream, _BIN_HEADER.size)
+    if header is None:
+        return None
+    length, opcode = _BIN_HEADER.unpack(header)
+    payload = _read_exact(stream, length)
+    if payload is None:
+        raise RuntimeError('Unexpected EOF in the middle of a frame.')
+    return (opcode, payload)
+
+
+def write_frame(stream: BinaryIO, status: int, payload: bytes) -> None:
+    '''Write a response frame'''
+    stream.write(_BIN_HEADER.pack(len(payload), status))
+    stream.write(payload)
+    stream.flush()
+
+
+def _bin_text(sim: OTBNSim, payload: bytes) -> Tuple[Optional[OTBNSim], bytes]:
+    words = payload.decode('utf-8').split()
+    if not words:
+        return (None, b'')
+
+    handler = _HANDLERS.get(words[0])
+    if handler is None:
+        raise RuntimeError('Unknown command: {!r}'.format(words[0]))
+
+    # The text handlers print their output. Capture it, so that we can send
+    # it back in the response frame.
+    text = io.StringIO()
+    with redirect_stdout(text):
+        ret = handler(sim, words[1:])
+    return (ret, text.getvalue().encode('utf-8'))
+
+
+def _wide_value(value: Optional[int]) -> bytes:
+    return (value or 0).to_bytes(32, 'little')
+
+
+def _bin_change(change: Trace,
+                wsrs: WSRFile,
+                ext_reg_ids: Dict[str, int]) -> Optional[bytes]:
+    '''Encode a change as a change record (or None if it has no record)'''
+    if isinstance(change, TraceRegister):
+        valid = change.new_value is not None
+        if change.width == 32:
+            return _BIN_GPR.pack(CHG_GPR, change.idx, valid,
+                                 change.new_value or 0)
+        return (_BIN_WIDE_REG.pack(CHG_WDR, change.idx, valid) +
+                _wide_value(change.new_value))
+
+    if isinstance(change, TraceWSR):
+        return (_BIN_WIDE_REG.pack(CHG_WSR, wsrs.idx_of_name(change.wsr_name),
+                                   change.new_value is not None) +
+                _wide_value(change.new_value))
+
+    if isinstance(change, TraceFlags):
+        flags = change.value
+        return _BIN_FLAGS.pack(CHG_FLAGS, change.group,
+                               (int(flags.C) | int(flags.M) << 1 |
+                                int(flags.L) << 2 | int(flags.Z) << 3))
+
+    if isinstance(change, TraceExtRegChange):
+        return _BIN_EXT_REG.pack(CHG_EXT_REG, ext_reg_ids[change.name],
+                                 change.erc.new_value)
+
+    if isinstance(change, TraceDmemStore):
+        if change.is_wide:
+            return (_BIN_DMEM_WIDE.pack(CHG_DMEM_WIDE, change.addr) +
+                    _wide_value(change.value))
+        return _BIN_DMEM_WORD.pack(CHG_DMEM_WORD, change.addr, change.value)
+
+    return None
+
+
+def _bin_step(sim: OTBNSim, payload: bytes) -> bytes:
+    (count,) = _U32.unpack(payload)
+
+    ext_reg_ids = {name: idx
+                   for idx, name in enumerate(sim.state.ext_regs.regs)}
+
+    out = []
+    for _ in range(count):
+        kind, pc, insn, changes = step_cycle(sim)
+        records = []
+        for change in changes:
+            record = _bin_change(change, sim.state.wsrs, ext_reg_ids)
+            if record is not None:
+                records.append(record)
+
+        if insn is not None and insn.has_bits:
+            insn_valid, raw = True, insn.raw
+        else:
+            insn_valid, raw = False, 0
+        out.append(_BIN_CYCLE.pack(kind, pc, insn_valid, raw, len(records)))
+        out += records
+    return b''.join(out)
+
+
+def _bin_read_dmem(sim: OTBNSim, payload: bytes) -> bytes:
+    word_offset, word_count = _U32_PAIR.unpack(payload)
+    if word_offset + word_count > sim.state.dmem.num_words:
+        raise ValueError('Cannot read {} words of DMEM from word {}: DMEM '
+                         'only has {} words.'
+                         .format(word_count, word_offset,
+                                 sim.state.dmem.num_words))
+    return sim.state.dmem.dump_le_words(word_offset, word_count)
+
+
+def _bin_write_dmem(sim: OTBNSim, payload: bytes) -> bytes:
+    if len(payload) < _U32.size:
+        raise ValueError('WRITE_DMEM payload has no word offset.')
+    (word_offset,) = _U32.unpack_from(payload)
+    sim.state.dmem.load_le_words(memoryview(payload)[_U32.size:],
+                                 has_validity=True,
+                                 word_offset=word_offset)
+    return b''
+
+
+def on_bin_frame(sim: OTBNSim,
+                 opcode: int,
+                 payload: bytes) -> Tuple[Optional[OTBNSim], bytes]:
+    '''Process a binary request frame
+
+    Returns a pair (new_sim, response). new_sim is not None if the command
+    replaced the simulator (like on_input).
+
+    '''
+    if opcode == BIN_TEXT:
+        return _bin_text(sim, payload)
+    if opcode == BIN_STEP:
+        return (None, _bin_step(sim, payload))
+    if opcode == BIN_READ_DMEM:
+        return (None, _bin_read_dmem(sim, payload))
+    if opcode == BIN_WRITE_DMEM:
+        return (None, _bin_write_dmem(sim, payload))
+
+    raise RuntimeError('Unknown binary opcode: {}'.format(opcode))
+
+
+def serve_binary(sim: OTBNSim, rd: BinaryIO, wr: BinaryIO) -> int:
+    '''Run the binary protocol on the given streams until EOF
+
+    If a request fails, the error is sent back in the response frame and we
+    carry on with the next one. Anything else that the simulator prints goes
+    to stderr, so it can't get mixed up with the response frames if wr is
+    stdout.
+
+    '''
+    with redirect_stdout(sys.stderr):
+        while True:
+            frame = read_frame(rd)
+            if frame is None:
+                return 0
+
+            opcode, payload = frame
+            try:
+                ret, response = on_bin_frame(sim, opcode, payload)
+            except Exception as err:
+                msg = str(err) or type(err).__name__
+                write_frame(wr, 1, msg.encode('utf-8'))
+                continue
+
+            if ret is not None:
+                sim = ret
+            write_frame(wr, 0, response)
+
+
 def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--binary', action='store_true',
+                        help=('Speak the binary protocol on stdin/stdout, '
+                              'rather than the text REPL.'))
+    parser.add_argument('--socket', metavar='PATH',
+                        help=('Listen on a Unix socket at PATH and speak the '
+                              'binary protocol to the first client that '
+                              'connects.'))
+    args = parser.parse_args()
+
     sim = OTBNSim()
+
+    if args.socket is not None:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+            server.bind(args.socket)
+            try:
+                server.listen(1)
+                conn, _ = server.accept()
+                with conn:
+                    with conn.makefile('rb') as rd, conn.makefile('wb') as wr:
+                        return serve_binary(sim, rd, wr)
+            finally:
+                os.unlink(args.socket)
+
+    if args.binary:
+        return serve_binary(sim, sys.stdin.buffer, sys.stdout.buffer)
+
     try:
         for line in sys.stdin:
             ret = on_input(sim, line)
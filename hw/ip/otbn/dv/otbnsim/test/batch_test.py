@@ -0,0 +1,51 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+'''Test running a program many times with the batch API.'''
+
+import struct
+
+from sim.batch import run_batch
+from sim.decode import decode_words
+from sim.load_elf import ElfProgram
+from testutil import encode_insns
+
+# Load two words from DMEM, add them and store the result at address 8.
+_PROGRAM = [
+    ('lw', {'grd': 2, 'grs1': 0, 'offset': 0}),
+    ('lw', {'grd': 3, 'grs1': 0, 'offset': 4}),
+    ('add', {'grd': 4, 'grs1': 2, 'grs2': 3}),
+    ('sw', {'grs1': 0, 'grs2': 4, 'offset': 8}),
+    ('ecall', {}),
+]
+
+
+def _make_elf_program() -> ElfProgram:
+    words = encode_insns(_PROGRAM)
+    return ElfProgram(decode_words(0, [(True, w) for w in words]),
+                      {}, bytes(12), {})
+
+
+def test_batch_results() -> None:
+    '''Check each run sees its own inputs, in and out of process.'''
+    elf_program = _make_elf_program()
+    images = [struct.pack('<II', a, 3 * a + 1) for a in range(6)]
+
+    serial = run_batch(elf_program, images, collect_stats=True, jobs=1)
+    parallel = run_batch(elf_program, images, collect_stats=True, jobs=2)
+
+    assert len(serial) == len(parallel) == len(images)
+    for a, (res_s, res_p) in enumerate(zip(serial, parallel)):
+        assert res_s.err_bits == res_p.err_bits == 0
+        assert res_s.cycles == res_p.cycles
+        assert res_s.regs == res_p.regs
+        assert res_s.dmem == res_p.dmem
+
+        # The dump has a validity byte followed by 4 bytes for each word
+        _, result = struct.unpack_from('<BI', res_s.dmem, 2 * 5)
+        assert result == 4 * a + 1
+
+        assert res_s.stats is not None and res_p.stats is not None
+        assert res_s.stats.insn_histo == res_p.stats.insn_histo
+        assert res_p.stats.program is elf_program.program
@@ -0,0 +1,29 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+'''Test the decode table used by InsnsFile.mnem_for_word.'''
+
+import random
+
+from sim.isa import INSNS_FILE
+
+
+def test_decode_table_matches_scan() -> None:
+    '''Check the decode table agrees with a linear scan over the masks.'''
+    rng = random.Random(0)
+    masks = list(INSNS_FILE._masks.items())
+
+    # Every instruction should decode as itself when we only set the bits
+    # that its encoding requires.
+    for mnem, (m0, m1) in masks:
+        assert INSNS_FILE.mnem_for_word(m1) == mnem
+
+    for _ in range(10000):
+        word = rng.getrandbits(32)
+        if rng.random() < 0.5:
+            m0, m1 = rng.choice(masks)[1]
+            word = (word & ~m0) | m1
+
+        assert (INSNS_FILE.mnem_for_word(word) ==
+                INSNS_FILE.mnem_for_word_by_scan(word))
@@ -0,0 +1,77 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+'''Test the byte-buffer representation of DMEM.'''
+
+import random
+import struct
+
+from sim.dmem import Dmem
+
+
+def test_load_dump_round_trip() -> None:
+    '''Check loading and dumping in the 5-byte format, with invalid words.'''
+    dmem = Dmem()
+    rng = random.Random(0)
+
+    words = [(rng.random() < 0.8, rng.getrandbits(32))
+             for _ in range(dmem.num_words)]
+    data = b''.join(struct.pack('<BI', int(vld), u32 if vld else 0)
+                    for vld, u32 in words)
+    dmem.load_le_words(memoryview(data), has_validity=True, word_offset=0)
+    assert dmem.dump_le_words() == data
+
+    for idx, (vld, u32) in enumerate(words):
+        assert dmem.load_u32(4 * idx) == (u32 if vld else None)
+
+    for addr in range(0, 4 * dmem.num_words, 32):
+        expected = 0
+        for i in range(8):
+            vld, u32 = words[addr // 4 + i]
+            if not vld:
+                expected = None
+                break
+            expected |= u32 << (32 * i)
+        assert dmem.load_u256(addr) == expected
+
+    view, valid = dmem.dump_view()
+    assert bytes(valid) == bytes(int(vld) for vld, _ in words)
+    assert (bytes(view) ==
+            b''.join(struct.pack('<I', u32 if vld else 0)
+                     for vld, u32 in words))
+
+
+def test_pending_stores() -> None:
+    '''Check that pending stores are visible to loads and dumps.'''
+    dmem = Dmem()
+    dmem.load_le_words(bytes(range(64)), has_validity=False, word_offset=0)
+    assert dmem.load_u256(32) == int.from_bytes(bytes(range(32, 64)),
+                                                'little')
+
+    value = (1 << 256) - 12345
+    dmem.store_u256(32, value)
+    dmem.store_u32(4, 0xdeadbeef)
+    dmem.commit()
+
+    # The stores are now pending. An invalidation shouldn't trash them.
+    dmem.empty_dmem()
+    assert dmem.load_u256(32) == value
+    assert dmem.load_u32(4) == 0xdeadbeef
+    assert dmem.load_u32(0) is None
+    view, valid = dmem.dump_view()
+    assert bytes(view[32:64]) == value.to_bytes(32, 'little')
+    assert valid[0] == 0 and valid[1] == 1
+
+    dmem.commit()
+    assert dmem.load_u256(32) == value
+    assert dmem.load_u256(0) is None
+
+    dump = dmem.dump_le_words()
+    assert struct.unpack_from('<BI', dump, 5) == (1, 0xdeadbeef)
+    assert struct.unpack_from('<BI', dump, 0) == (0, 0)
+
+    # Dumping part of the memory gives the matching slice of the whole dump.
+    assert dmem.dump_le_words(1, 9) == dump[5:50]
+    assert dmem.dump_le_words(8) == dump[40:]
+    assert dmem.dump_le_words(3, 0) == b''
@@ -0,0 +1,143 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+'''Test the caches used by the OTBN information-flow analysis.'''
+
+import random
+from typing import Dict, List, Optional, Tuple
+
+import py
+import pytest
+
+from testutil import encode_insns
+from shared.cache import Cache
+from shared.constants import ConstantContext
+from shared.control_flow import subroutine_control_graph
+from shared.decode import OTBNProgram
+from shared.information_flow_analysis import (IFlowCache, IFlowCacheEntry,
+                                              IFlowDiskCache,
+                                              SubroutineIFlow,
+                                              get_subroutine_iflow)
+
+_GPRS = ['x2', 'x3', 'x4', 'x5']
+
+
+def _result(constants: ConstantContext) -> Tuple[ConstantContext, int]:
+    '''A stand-in for _get_iflow, which depends on some of the constants.
+
+    The constants must include all of _GPRS. Returns the constants that were
+    used and the "result". Like the real thing, which constants are used
+    depends on the values of other ones.
+
+    '''
+    used = {'x0': 0}
+    value = 0
+    for name in _GPRS:
+        const = constants.get(name)
+        assert const is not None
+        used[name] = const
+        value = 10 * value + const
+        if const % 3 == 0:
+            break
+    return ConstantContext(used), value
+
+
+def test_indexed_cache_matches_cache() -> None:
+    '''Check IFlowCache lookups give the same results as a plain Cache.'''
+    rng = random.Random(1234)
+
+    # The values don't have to be real IFlowResults: the caches only store
+    # and return them.
+    cache = Cache[int, ConstantContext, object]()
+    indexed = IFlowCache()
+    for _ in range(1000):
+        pc = 4 * rng.randrange(4)
+        values = {name: rng.randrange(4)
+                  for name in _GPRS if rng.random() < 0.9}
+        values['x0'] = 0
+        constants = ConstantContext(values)
+
+        expected = cache.lookup(pc, constants)
+        assert indexed.lookup(pc, constants) == expected
+
+        # Add a result for a miss if we know all the constants (otherwise we
+        # can't compute it).
+        if expected is None and len(values) == len(_GPRS) + 1:
+            used, value = _result(constants)
+            entry = IFlowCacheEntry(used, (pc, value))
+            cache.add(pc, entry)
+            indexed.add(pc, entry)
+
+    assert indexed.entries.keys() == cache.entries.keys()
+    for pc, entries in cache.entries.items():
+        assert ([(e.key.values, e.value) for e in indexed.entries[pc]] ==
+                [(e.key.values, e.value) for e in entries])
+
+
+def _subroutine(base: int) -> List[Tuple[str, Dict[str, int]]]:
+    '''A subroutine with a branch, starting at base.'''
+    return [
+        ('add', {'grd': 3, 'grs1': 4, 'grs2': 5}),
+        ('beq', {'grs1': 6, 'grs2': 0, 'offset': base + 12}),
+        ('addi', {'grd': 7, 'grs1': 3, 'imm': 1}),
+        ('jalr', {'grd': 0, 'grs1': 1, 'offset': 0}),
+    ]
+
+
+def _program(base: int) -> OTBNProgram:
+    '''A program with the subroutine at base, after some padding.'''
+    nop = ('addi', {'grd': 0, 'grs1': 0, 'imm': 0})
+    words = encode_insns([nop] * (base // 4) + _subroutine(base))
+    return OTBNProgram({'sub': base},
+                       {4 * idx: word for idx, word in enumerate(words)},
+                       {})
+
+
+def _iflow(program: OTBNProgram,
+           disk_cache: Optional[IFlowDiskCache]) -> SubroutineIFlow:
+    return get_subroutine_iflow(program,
+                                subroutine_control_graph(program, 'sub'),
+                                'sub', {}, disk_cache)
+
+
+def _flatten(iflow: SubroutineIFlow) -> object:
+    ret_iflow, end_iflow, control_deps = iflow
+    return (ret_iflow.exists, ret_iflow.flow,
+            end_iflow.exists, end_iflow.flow, control_deps)
+
+
+def test_disk_cache_relocated(tmpdir: py.path.local) -> None:
+    '''A stored result is still right for a subroutine at another PC.'''
+    disk_cache = IFlowDiskCache(str(tmpdir))
+
+    at_zero = _iflow(_program(0), disk_cache)
+    assert (disk_cache.hits, disk_cache.misses) == (0, 1)
+
+    # The control dependency is on the branch, whose PC is in the result.
+    assert at_zero[2] == {'x6': {4}}
+
+    program = _program(16)
+    relocated = _iflow(program, disk_cache)
+    assert (disk_cache.hits, disk_cache.misses) == (1, 1)
+    assert _flatten(relocated) == _flatten(_iflow(program, None))
+    assert relocated[2] == {'x6': {20}}
+
+
+def test_disk_cache_unwritable(tmpdir: py.path.local,
+                               capsys: pytest.CaptureFixture[str]) -> None:
+    '''A cache that can't be written gives a warning, not an error.'''
+    # The cache directory can't be created, because its parent is a file.
+    parent = tmpdir.join('not_a_dir')
+    parent.write('')
+    disk_cache = IFlowDiskCache(str(parent.join('cache')))
+
+    program = _program(0)
+    for _ in range(2):
+        assert (_flatten(_iflow(program, disk_cache)) ==
+                _flatten(_iflow(program, None)))
+    assert (disk_cache.hits, disk_cache.misses) == (0, 2)
+
+    # We only warn once.
+    _, err = capsys.readouterr()
+    assert err.count('Warning: Cannot write') == 1
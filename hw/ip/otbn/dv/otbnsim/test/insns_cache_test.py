@@ -0,0 +1,115 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+'''Test the serialized cache of the OTBN instruction database.'''
+
+import os
+import pickle
+from typing import List
+
+import py
+import pytest
+
+# Importing sim puts the OTBN util directory on sys.path.
+import sim  # noqa: F401
+from shared import insn_yaml
+from shared.insn_yaml import InsnsFile
+
+
+@pytest.fixture
+def yaml_loads(monkeypatch: pytest.MonkeyPatch) -> List[InsnsFile]:
+    '''Count the times load_insns_yaml parses the YAML
+
+    Also clears load_insns_yaml's in-memory copy of the database, so that
+    each call in a test goes back to the cache or the YAML.
+
+    '''
+    loads = []
+    real_load = insn_yaml._load_default_from_yaml
+
+    def load() -> InsnsFile:
+        insns_file = real_load()
+        loads.append(insns_file)
+        return insns_file
+
+    monkeypatch.setattr(insn_yaml, '_load_default_from_yaml', load)
+    monkeypatch.setattr(insn_yaml, '_DEFAULT_INSNS_FILE', None)
+    return loads
+
+
+def _reload() -> InsnsFile:
+    insn_yaml._DEFAULT_INSNS_FILE = None
+    return insn_yaml.load_insns_yaml()
+
+
+def test_cache_hit(tmpdir: py.path.local,
+                   monkeypatch: pytest.MonkeyPatch,
+                   yaml_loads: List[InsnsFile]) -> None:
+    '''An up-to-date cache is used instead of the YAML'''
+    path = str(tmpdir.join('insns.pickle'))
+    insn_yaml.write_insns_cache(path)
+    monkeypatch.setenv(insn_yaml.INSNS_CACHE_ENV_VAR, path)
+    del yaml_loads[:]
+
+    insns_file = _reload()
+    assert yaml_loads == []
+    assert 'addi' in insns_file.mnemonic_to_insn
+
+
+def test_stale_stamp(tmpdir: py.path.local,
+                     monkeypatch: pytest.MonkeyPatch,
+                     yaml_loads: List[InsnsFile]) -> None:
+    '''A cache with the wrong stamp is ignored and left alone'''
+    path = str(tmpdir.join('insns.pickle'))
+    insn_yaml.write_insns_cache(path)
+    monkeypatch.setenv(insn_yaml.INSNS_CACHE_ENV_VAR, path)
+    del yaml_loads[:]
+
+    # Pretend that the YAML or the code that reads it has changed since the
+    # cache was written.
+    monkeypatch.setattr(insn_yaml, 'insns_cache_stamp', lambda: 'stale')
+    with open(path, 'rb') as handle:
+        cached_bytes = handle.read()
+
+    insns_file = _reload()
+    assert yaml_loads == [insns_file]
+
+    # OTBN_INSNS_CACHE is set, so the cache belongs to someone else and
+    # shouldn't have been rewritten.
+    with open(path, 'rb') as handle:
+        assert handle.read() == cached_bytes
+
+
+def test_first_load_writes_cache(tmpdir: py.path.local,
+                                 monkeypatch: pytest.MonkeyPatch,
+                                 yaml_loads: List[InsnsFile]) -> None:
+    '''Without OTBN_INSNS_CACHE, the first load writes the default cache'''
+    path = str(tmpdir.join('build', 'otbn', 'insns.pickle'))
+    monkeypatch.delenv(insn_yaml.INSNS_CACHE_ENV_VAR, raising=False)
+    monkeypatch.setattr(insn_yaml, 'default_insns_cache_path', lambda: path)
+
+    _reload()
+    assert len(yaml_loads) == 1
+    with open(path, 'rb') as handle:
+        assert pickle.load(handle) == insn_yaml.insns_cache_stamp()
+    assert os.listdir(os.path.dirname(path)) == ['insns.pickle']
+
+    # The second load should use the cache that the first one wrote.
+    _reload()
+    assert len(yaml_loads) == 1
+
+
+def test_unwritable_cache(tmpdir: py.path.local,
+                          monkeypatch: pytest.MonkeyPatch,
+                          yaml_loads: List[InsnsFile]) -> None:
+    '''Failing to write the default cache doesn't stop us loading the YAML'''
+    # The cache "directory" is a file, so we can't create the cache.
+    blocker = tmpdir.join('build')
+    blocker.write('')
+    path = str(blocker.join('insns.pickle'))
+    monkeypatch.delenv(insn_yaml.INSNS_CACHE_ENV_VAR, raising=False)
+    monkeypatch.setattr(insn_yaml, 'default_insns_cache_path', lambda: path)
+
+    insns_file = _reload()
+    assert yaml_loads == [insns_file]
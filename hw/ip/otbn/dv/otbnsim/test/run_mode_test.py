@@ -0,0 +1,116 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+'''Check that skipping trace collection doesn't change simulation results.'''
+
+from typing import Dict, List, Tuple
+
+from sim.standalonesim import StandaloneSim, _TEST_URND_DATA
+from testutil import prepare_sim_for_insns
+
+# A small program with a loop, some bignum arithmetic and a DMEM store. The
+# result is x3 = 4 * 5 = 20 and w1 = 4 * 7 = 28, with w1 stored at address 0.
+_PROGRAM: List[Tuple[str, Dict[str, int]]] = [
+    ('addi', {'grd': 2, 'grs1': 0, 'imm': 5}),
+    ('addi', {'grd': 5, 'grs1': 0, 'imm': 1}),
+    ('loopi', {'iterations': 4, 'bodysize': 2}),
+    ('add', {'grd': 3, 'grs1': 3, 'grs2': 2}),
+    ('bn.addi', {'wrd': 1, 'wrs': 1, 'imm': 7}),
+    ('bn.sid', {'grs1': 0, 'grs2': 5, 'offset': 0}),
+    ('ecall', {}),
+]
+
+
+def _check_results(sim: StandaloneSim) -> None:
+    assert sim.state.ext_regs.read('ERR_BITS', False) == 0
+    assert sim.state.gprs.get_reg(3).read_unsigned() == 20
+    assert sim.state.wdrs.get_reg(1).read_unsigned() == 28
+    assert sim.state.dmem.load_u256(0) == 28
+
+
+def test_run_matches_traced_step() -> None:
+    '''Step two copies of the model, one of them collecting changes.'''
+    traced = prepare_sim_for_insns(_PROGRAM, False)
+    untraced = prepare_sim_for_insns(_PROGRAM, False)
+
+    cycles = 0
+    for sim in [traced, untraced]:
+        sim.state.complete_init_sec_wipe()
+
+    while traced.state.executing():
+        for sim in [traced, untraced]:
+            if not sim.state.wsrs.URND.running:
+                sim.state.wsrs.URND.set_seed(_TEST_URND_DATA)
+
+        t_insn, t_changes = traced.step(verbose=False)
+        u_insn, u_changes = untraced.step(verbose=False,
+                                          collect_changes=False)
+        cycles += 1
+
+        assert t_insn is u_insn or (t_insn is not None and
+                                    u_insn is not None and
+                                    t_insn.raw == u_insn.raw)
+        assert u_changes == []
+        assert traced.state.pc == untraced.state.pc
+        assert (traced.state.gprs.peek_unsigned_values() ==
+                untraced.state.gprs.peek_unsigned_values())
+        assert (traced.state.wdrs.peek_unsigned_values() ==
+                untraced.state.wdrs.peek_unsigned_values())
+
+    assert not untraced.state.executing()
+    _check_results(traced)
+    _check_results(untraced)
+
+    # StandaloneSim.run doesn't collect changes. Check that it takes the same
+    # number of cycles as the traced model.
+    sim = prepare_sim_for_insns(_PROGRAM, False)
+    assert sim.run(verbose=False, dump_file=None) == cycles
+    _check_results(sim)
+
+
+# A program that mixes straight-line code with a loop, a branch and some
+# multi-cycle instructions (BN.SID and LW), so that the decode cache has to
+# hand over to step() from time to time.
+_BRANCHY_PROGRAM: List[Tuple[str, Dict[str, int]]] = [
+    ('addi', {'grd': 2, 'grs1': 0, 'imm': 5}),
+    ('addi', {'grd': 5, 'grs1': 0, 'imm': 1}),
+    ('loopi', {'iterations': 4, 'bodysize': 2}),
+    ('add', {'grd': 3, 'grs1': 3, 'grs2': 2}),
+    ('bn.addi', {'wrd': 1, 'wrs': 1, 'imm': 7}),
+    ('bn.sid', {'grs1': 0, 'grs2': 5, 'offset': 0}),
+    ('lw', {'grd': 6, 'grs1': 0, 'offset': 0}),
+    ('addi', {'grd': 7, 'grs1': 7, 'imm': 1}),
+    ('bne', {'grs1': 7, 'grs2': 2, 'offset': 28}),
+    ('bn.add', {'wrd': 2, 'wrs1': 1, 'wrs2': 1}),
+    ('ecall', {}),
+]
+
+
+def test_decode_cache_matches_step() -> None:
+    '''Check that running with the decode cache gives the same results.'''
+    results = []
+    for use_decode_cache in [False, True]:
+        sim = prepare_sim_for_insns(_BRANCHY_PROGRAM, True)
+        sim.use_decode_cache = use_decode_cache
+        cycles = sim.run(verbose=False, dump_file=None)
+
+        assert sim.state.ext_regs.read('ERR_BITS', False) == 0
+        assert sim.stats is not None
+        results.append((cycles,
+                        sim.state.ext_regs.read('INSN_CNT', False),
+                        sim.state.gprs.peek_unsigned_values(),
+                        sim.state.wdrs.peek_unsigned_values(),
+                        sim.dump_data(),
+                        sim.stats.stall_count,
+                        sim.stats.insn_histo,
+                        sim.stats.coverage,
+                        sim.stats.loops,
+                        sim.stats.basic_block_histo))
+
+    assert results[0] == results[1]
+
+    gprs = results[1][2]
+    wdrs = results[1][3]
+    assert gprs[3] == 20 and gprs[6] == 28 and gprs[7] == 5
+    assert wdrs[2] == 56
@@ -0,0 +1,250 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+'''Test the binary protocol for the stepped simulator.'''
+
+import io
+import socket
+import struct
+import sys
+import threading
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import pytest
+
+import stepped
+from sim.decode import decode_words
+from sim.sim import OTBNSim
+from sim.standalonesim import _TEST_URND_DATA
+from sim.trace import Trace
+from testutil import encode_insns
+
+_PROGRAM = [
+    ('addi', {'grd': 2, 'grs1': 0, 'imm': 5}),
+    ('addi', {'grd': 5, 'grs1': 0, 'imm': 1}),
+    ('loopi', {'iterations': 3, 'bodysize': 2}),
+    ('add', {'grd': 3, 'grs1': 3, 'grs2': 2}),
+    ('bn.addi', {'wrd': 1, 'wrs': 1, 'imm': 7}),
+    ('sw', {'grs2': 2, 'grs1': 0, 'offset': 4}),
+    ('bn.sid', {'grs1': 0, 'grs2': 5, 'offset': 32}),
+    ('lw', {'grd': 4, 'grs1': 0, 'offset': 4}),
+    ('ecall', {}),
+]
+
+_WSR_NAMES = ['MOD', 'RND', 'URND', 'ACC',
+              'KeyS0L', 'KeyS0H', 'KeyS1L', 'KeyS1H']
+
+
+def _make_sim() -> OTBNSim:
+    sim = OTBNSim()
+    words = encode_insns(_PROGRAM)
+    sim.load_program(decode_words(0, [(True, w) for w in words]))
+    sim.load_data(bytes(32), has_validity=False)
+    sim.state.complete_init_sec_wipe()
+    return sim
+
+
+def _decode_steps(sim: OTBNSim,
+                  payload: bytes,
+                  count: int) -> Tuple[List[str], List[Tuple[int, int]]]:
+    '''Decode the response to a STEP command
+
+    Returns the lines of trace that "step" would have printed for those cycles
+    (except for the "#" lines, which give instruction mnemonics) and the DMEM
+    stores, as pairs (addr, value).
+
+    '''
+    wsr_names = {sim.state.wsrs.idx_of_name(name): name
+                 for name in _WSR_NAMES}
+    ext_reg_names = list(sim.state.ext_regs.regs)
+    headers = {stepped.CYCLE_STALL: 'STALL',
+               stepped.CYCLE_WIPE: 'U ',
+               stepped.CYCLE_WIPE_LAST: 'V '}
+
+    def wide(pos: int, valid: int) -> Optional[int]:
+        value = int.from_bytes(payload[pos:pos + 32], 'little')
+        return value if valid else None
+
+    lines = []
+    stores = []
+    pos = 0
+    for _ in range(count):
+        kind, pc, insn_valid, raw, num_records = \
+            struct.unpack_from('<BIBIH', payload, pos)
+        pos += 12
+        if kind == stepped.CYCLE_NONE:
+            assert num_records == 0
+        elif kind == stepped.CYCLE_EXEC:
+            insn = f'{raw:#010x}' if insn_valid else '??'
+            lines.append(f'E PC: {pc:#010x}, insn: {insn}')
+        else:
+            lines.append(headers[kind])
+
+        for _ in range(num_records):
+            rec_type = payload[pos]
+            if rec_type == stepped.CHG_GPR:
+                _, idx, valid, value = struct.unpack_from('<BBBI', payload,
+                                                          pos)
+                pos += 7
+                value_str = Trace.hex_value(value if valid else None, 32)
+                lines.append(f'> x{idx:02}: {value_str}')
+            elif rec_type in [stepped.CHG_WDR, stepped.CHG_WSR]:
+                _, idx, valid = struct.unpack_from('<BBB', payload, pos)
+                value_str = Trace.hex_value(wide(pos + 3, valid), 256)
+                pos += 35
+                name = (f'w{idx:02}' if rec_type == stepped.CHG_WDR
+                        else wsr_names[idx])
+                lines.append(f'> {name}: {value_str}')
+            elif rec_type == stepped.CHG_FLAGS:
+                _, group, flags = struct.unpack_from('<BBB', payload, pos)
+                pos += 3
+                bits = [(flags >> bit) & 1 for bit in range(4)]
+                lines.append('> FLAGS{}: {{C: {}, M: {}, L: {}, Z: {}}}'
+                             .format(group, *bits))
+            elif rec_type == stepped.CHG_EXT_REG:
+                _, reg_id, value = struct.unpack_from('<BBI', payload, pos)
+                pos += 6
+                lines.append(f'! otbn.{ext_reg_names[reg_id]}: {value:#010x}')
+            elif rec_type == stepped.CHG_DMEM_WORD:
+                _, addr, value = struct.unpack_from('<BII', payload, pos)
+                pos += 9
+                stores.append((addr, value))
+            else:
+                assert rec_type == stepped.CHG_DMEM_WIDE
+                _, addr = struct.unpack_from('<BI', payload, pos)
+                stores.append((addr, wide(pos + 5, 1) or 0))
+                pos += 37
+
+    assert pos == len(payload)
+    return (lines, stores)
+
+
+def _read_responses(stream: io.BytesIO) -> List[Tuple[int, bytes]]:
+    stream.seek(0)
+    frames: List[Tuple[int, bytes]] = []
+    while True:
+        frame = stepped.read_frame(stream)
+        if frame is None:
+            return frames
+        frames.append(frame)
+
+
+def test_bulk_step_matches_text() -> None:
+    '''Check a bulk STEP gives the same trace as repeated "step" commands.'''
+    num_cycles = 30
+
+    text_sim = _make_sim()
+    text = io.StringIO()
+    with redirect_stdout(text):
+        stepped.on_input(text_sim, 'start_operation Execute')
+    text_sim.state.wsrs.URND.set_seed(_TEST_URND_DATA)
+    text = io.StringIO()
+    with redirect_stdout(text):
+        for _ in range(num_cycles):
+            stepped.on_input(text_sim, 'step')
+    text_lines = [line for line in text.getvalue().splitlines()
+                  if line != '.' and not line.startswith('# ')]
+
+    bin_sim = _make_sim()
+    _, resp = stepped.on_bin_frame(bin_sim, stepped.BIN_TEXT,
+                                   b'start_operation Execute')
+    assert resp == b'START\n'
+    bin_sim.state.wsrs.URND.set_seed(_TEST_URND_DATA)
+    _, resp = stepped.on_bin_frame(bin_sim, stepped.BIN_STEP,
+                                   struct.pack('<I', num_cycles))
+
+    lines, stores = _decode_steps(bin_sim, resp, num_cycles)
+    assert lines == text_lines
+    assert stores == [(4, 5), (32, 21)]
+    assert (bin_sim.state.gprs.peek_unsigned_values() ==
+            text_sim.state.gprs.peek_unsigned_values())
+
+
+def test_dmem_frames() -> None:
+    '''Write and read DMEM through the framed protocol.'''
+    data = b''.join(struct.pack('<BI', i % 2, 0x1000 + i if i % 2 else 0)
+                    for i in range(6))
+
+    requests = io.BytesIO()
+    for opcode, payload in [
+            (stepped.BIN_WRITE_DMEM, struct.pack('<I', 8) + data),
+            (stepped.BIN_READ_DMEM, struct.pack('<II', 8, 6)),
+            (stepped.BIN_READ_DMEM, struct.pack('<II', 1 << 20, 1)),
+            (stepped.BIN_TEXT, b'print_call_stack')]:
+        requests.write(struct.pack('<IB', len(payload), opcode) + payload)
+    requests.seek(0)
+
+    responses = io.BytesIO()
+    assert stepped.serve_binary(_make_sim(), requests, responses) == 0
+    frames = _read_responses(responses)
+
+    assert [status for status, _ in frames] == [0, 0, 1, 0]
+    assert frames[1][1] == data
+    assert frames[3][1] == b'PRINT_CALL_STACK\n'
+
+
+def test_errors(monkeypatch: pytest.MonkeyPatch,
+                capsys: pytest.CaptureFixture[str]) -> None:
+    '''Failed requests get error frames and stray output goes to stderr.'''
+    requests = io.BytesIO()
+    for payload in [b'load_d /does/not/exist', b'print_call_stack']:
+        requests.write(struct.pack('<IB', len(payload), stepped.BIN_TEXT) +
+                       payload)
+    requests.seek(0)
+
+    # Print something each time a request is handled (outside the text
+    # handlers, whose output is sent back in the response).
+    real_on_bin_frame = stepped.on_bin_frame
+
+    def on_bin_frame(sim: OTBNSim,
+                     opcode: int,
+                     payload: bytes) -> Tuple[Optional[OTBNSim], bytes]:
+        print('handling', payload.decode('utf-8'))
+        return real_on_bin_frame(sim, opcode, payload)
+
+    monkeypatch.setattr(stepped, 'on_bin_frame', on_bin_frame)
+
+    responses = io.BytesIO()
+    assert stepped.serve_binary(_make_sim(), requests, responses) == 0
+    frames = _read_responses(responses)
+
+    # The first request raises a FileNotFoundError, but we carry on.
+    assert [status for status, _ in frames] == [1, 0]
+    assert b'/does/not/exist' in frames[0][1]
+    assert frames[1][1] == b'PRINT_CALL_STACK\n'
+
+    out, err = capsys.readouterr()
+    assert out == ''
+    assert err == ('handling load_d /does/not/exist\n'
+                   'handling print_call_stack\n')
+
+
+def test_socket(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    '''Serve a client on a Unix socket, which is removed afterwards.'''
+    path = tmp_path / 'otbnsim.sock'
+    monkeypatch.setattr(sys, 'argv', ['stepped.py', '--socket', str(path)])
+    server = threading.Thread(target=stepped.main)
+    server.start()
+
+    deadline = time.monotonic() + 10
+    while not path.exists():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(str(path))
+        payload = b'print_call_stack'
+        client.sendall(struct.pack('<IB', len(payload), stepped.BIN_TEXT) +
+                       payload)
+        client.shutdown(socket.SHUT_WR)
+        with client.makefile('rb') as rd:
+            assert (stepped.read_frame(rd) ==
+                    (0, b'PRINT_CALL_STACK\n'))
+
+    server.join(10)
+    assert not server.is_alive()
+    assert not path.exists()
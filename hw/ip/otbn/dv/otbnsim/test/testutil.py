@@ -5,8 +5,11 @@
 import os
 import subprocess
 import tempfile
+from typing import Dict, List, Tuple
 
 import py
+from sim.decode import decode_words
+from sim.isa import INSNS_FILE
 from sim.load_elf import load_elf
 from sim.standalonesim import StandaloneSim
 
@@ -60,3 +63,42 @@ def prepare_sim_for_asm_str(assembly: str, tmpdir: py.path.local,
         fp.write(assembly)
         fp.flush()
         return prepare_sim_for_asm_file(fp.name, tmpdir, collect_stats)
+
+
+def encode_insns(insns: List[Tuple[str, Dict[str, int]]]) -> List[int]:
+    '''Encode a list of instructions as 32-bit words.
+
+    Each instruction is a pair (mnemonic, op_vals) where op_vals maps operand
+    names to operand values. Operands that aren't given are encoded as zero.
+    This lets us build small programs without the RISC-V toolchain.
+
+    '''
+    words = []
+    for idx, (mnemonic, op_vals) in enumerate(insns):
+        insn = INSNS_FILE.mnemonic_to_insn[mnemonic]
+        assert insn.encoding is not None
+        enc_vals = {}
+        for op_name, op_val in op_vals.items():
+            op_type = insn.name_to_operand[op_name].op_type
+            enc_val = op_type.op_val_to_enc_val(op_val, 4 * idx)
+            assert enc_val is not None
+            enc_vals[op_name] = enc_val
+        words.append(insn.encoding.assemble(enc_vals))
+    return words
+
+
+def prepare_sim_for_insns(insns: List[Tuple[str, Dict[str, int]]],
+                          collect_stats: bool) -> StandaloneSim:
+    '''Set up the simulation of a list of instructions.
+
+    The instructions are encoded with encode_insns. The returned simulation is
+    ready to be run through the run() method.
+
+    '''
+    sim = StandaloneSim()
+    sim.load_program(decode_words(0, [(True, w)
+                                      for w in encode_insns(insns)]))
+
+    sim.state.ext_regs.commit()
+    sim.start(collect_stats)
+    return sim
@@ -10,7 +10,8 @@ from shared.constants import parse_required_constants
 from shared.control_flow import program_control_graph, subroutine_control_graph
 from shared.decode import decode_elf
 from shared.information_flow import InformationFlowGraph
-from shared.information_flow_analysis import (get_program_iflow,
+from shared.information_flow_analysis import (IFlowDiskCache,
+                                              get_program_iflow,
                                               get_subroutine_iflow,
                                               stringify_control_deps)
 
@@ -52,6 +53,13 @@ def main() -> int:
         help=(
             'Initially secret information-flow nodes. If provided, the final '
             'secrets will be printed.'))
+    parser.add_argument(
+        '--cache-dir',
+        required=False,
+        help=('A directory in which to cache information-flow results. The '
+              'cache can be shared between runs on different programs: a '
+              'subroutine that appears in more than one program is only '
+              'analyzed once.'))
     args = parser.parse_args()
     program = decode_elf(args.elf)
 
@@ -84,15 +92,20 @@ def main() -> int:
                              'subroutine.')
         constants = parse_required_constants(args.constants)
 
+    disk_cache = None
+    if args.cache_dir is not None:
+        disk_cache = IFlowDiskCache(args.cache_dir)
+
     # Compute information-flow graph(s).
     if args.subroutine is None:
         what = 'program'
-        end_iflow, control_deps = get_program_iflow(program, graph)
+        end_iflow, control_deps = get_program_iflow(program, graph,
+                                                    disk_cache)
         ret_iflow = InformationFlowGraph.nonexistent()
     else:
         what = 'subroutine'
         ret_iflow, end_iflow, control_deps = get_subroutine_iflow(
-            program, graph, args.subroutine, constants)
+            program, graph, args.subroutine, constants, disk_cache)
 
     # If no secrets were given or the --verbose flag is set, then print the
     # full information-flow graphs.
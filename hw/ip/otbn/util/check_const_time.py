@@ -6,13 +6,10 @@
 import argparse
 import sys
 
-from shared.check import CheckResult
+from shared.const_time import check_const_time
 from shared.constants import parse_required_constants
-from shared.control_flow import program_control_graph, subroutine_control_graph
 from shared.decode import decode_elf
-from shared.information_flow_analysis import (get_program_iflow,
-                                              get_subroutine_iflow,
-                                              stringify_control_deps)
+from shared.information_flow_analysis import IFlowDiskCache
 
 
 def main() -> int:
@@ -51,6 +48,13 @@ def main() -> int:
               'assume everything is secret; check that the subroutine or '
               'program has only one possible control-flow path regardless '
               'of input.'))
+    parser.add_argument(
+        '--cache-dir',
+        required=False,
+        help=('A directory in which to cache information-flow results. The '
+              'cache can be shared between runs on different programs: a '
+              'subroutine that appears in more than one program is only '
+              'analyzed once.'))
     args = parser.parse_args()
 
     # Parse initial constants.
@@ -63,53 +67,27 @@ def main() -> int:
                              'subroutine.')
         constants = parse_required_constants(args.constants)
 
-    # Compute control graph and get all nodes that influence control flow.
-    program = decode_elf(args.elf)
+    disk_cache = None
+    if args.cache_dir is not None:
+        disk_cache = IFlowDiskCache(args.cache_dir)
+
     if args.subroutine is None:
-        graph = program_control_graph(program)
         to_analyze = 'entire program'
-        _, control_deps = get_program_iflow(program, graph)
     else:
-        graph = subroutine_control_graph(program, args.subroutine)
         to_analyze = 'subroutine {}'.format(args.subroutine)
-        _, _, control_deps = get_subroutine_iflow(program, graph,
-                                                  args.subroutine, constants)
-
-    control_deps_ignore = {}
-    if args.ignore is not None:
-        for subroutine in args.ignore:
-            graph = subroutine_control_graph(program, subroutine)
-            _, _, control_deps_ignore_temp = get_subroutine_iflow(program, graph,
-                                                                  subroutine, {})
-            control_deps_ignore.update(control_deps_ignore_temp)
 
-    if args.secrets is None:
-        if args.verbose:
+    if args.verbose:
+        if args.secrets is None:
             print(
                 'No specific secrets provided; checking that {} has only one '
                 'control-flow path'.format(to_analyze))
-        secret_control_deps = control_deps
-    else:
-        if args.verbose:
+        else:
             print('Analyzing {} with initial secrets {} and initial constants {}'.format(
                 to_analyze, args.secrets, constants))
-        # If secrets were provided, only show the ways in which those specific
-        # nodes could influence control flow.
-        secret_control_deps = {
-            node: pcs
-            for node, pcs in control_deps.items() if node in args.secrets
-        }
-
-    secret_control_deps_filt = {k: v for k, v in secret_control_deps.items()
-                                if v not in control_deps_ignore.values()}
 
-    out = CheckResult()
-
-    if len(secret_control_deps_filt) != 0:
-        msg = 'The following secrets may influence control flow:\n  '
-        msg += '\n  '.join(stringify_control_deps(program,
-                                                  secret_control_deps_filt))
-        out.err(msg)
+    program = decode_elf(args.elf)
+    out = check_const_time(program, args.subroutine, constants, args.secrets,
+                           args.ignore, disk_cache)
 
     if args.verbose or out.has_errors() or out.has_warnings():
         print(out.report())
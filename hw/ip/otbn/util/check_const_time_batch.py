@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+'''Run many constant-time checks in one go
+
+This does the same check as check_const_time.py, but for a list of jobs read
+from a JSON file. The file should contain a list of objects, each of which
+describes one job. The fields of a job are:
+
+  elf:         The .elf file to check (required).
+  subroutine:  The subroutine to check. If missing, check the whole program.
+  secrets:     A list of initial secret information-flow nodes. If missing,
+               everything is treated as secret.
+  constants:   A list of required constants, in the form "reg:value".
+  ignore:      A list of subroutines whose violations should be ignored.
+  name:        A name for the job in the report. Defaults to "elf:subroutine".
+
+Relative paths to ELF files are interpreted relative to the directory
+containing the jobs file.
+
+The instruction set description is loaded once and jobs are spread over a
+pool of worker processes. Each worker decodes a given ELF file at most once,
+however many jobs refer to it. The results are written as a single JSON
+report, with the time taken by each job.
+
+'''
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from shared.const_time import check_const_time
+from shared.constants import parse_required_constants
+from shared.decode import OTBNProgram, decode_elf
+from shared.information_flow_analysis import IFlowDiskCache
+from shared.insn_yaml import load_insns_yaml
+
+_JOB_FIELDS = {'elf', 'subroutine', 'secrets', 'constants', 'ignore', 'name'}
+
+
+class Job:
+    '''A single constant-time check'''
+    def __init__(self,
+                 name: str,
+                 elf: str,
+                 subroutine: Optional[str],
+                 secrets: Optional[List[str]],
+                 constants: List[str],
+                 ignore: Optional[List[str]]) -> None:
+        self.name = name
+        self.elf = elf
+        self.subroutine = subroutine
+        self.secrets = secrets
+        self.constants = constants
+        self.ignore = ignore
+
+    @staticmethod
+    def from_json(idx: int, obj: object, base_dir: str) -> 'Job':
+        where = 'job {}'.format(idx)
+        if not isinstance(obj, dict):
+            raise ValueError('{} is not an object.'.format(where))
+
+        unknown = set(obj.keys()) - _JOB_FIELDS
+        if unknown:
+            raise ValueError('{} has unknown fields: {}.'
+                             .format(where, ', '.join(sorted(unknown))))
+
+        elf = obj.get('elf')
+        if not isinstance(elf, str):
+            raise ValueError('{} has no elf field (or it is not a string).'
+                             .format(where))
+
+        subroutine = obj.get('subroutine')
+        if subroutine is not None and not isinstance(subroutine, str):
+            raise ValueError('{} has a subroutine field that is not a string.'
+                             .format(where))
+
+        lists = {}
+        for field in ['secrets', 'constants', 'ignore']:
+            value = obj.get(field)
+            if value is not None:
+                if not (isinstance(value, list) and
+                        all(isinstance(x, str) for x in value)):
+                    raise ValueError('{} has a {} field that is not a list '
+                                     'of strings.'.format(where, field))
+            lists[field] = value
+
+        if lists['constants'] and subroutine is None:
+            raise ValueError('{} requires initial constants for a whole '
+                             'program; a subroutine is needed.'.format(where))
+
+        name = obj.get('name')
+        if name is None:
+            name = elf if subroutine is None else '{}:{}'.format(elf,
+                                                                 subroutine)
+        elif not isinstance(name, str):
+            raise ValueError('{} has a name field that is not a string.'
+                             .format(where))
+
+        return Job(name,
+                   os.path.join(base_dir, elf),
+                   subroutine,
+                   lists['secrets'],
+                   lists['constants'] or [],
+                   lists['ignore'])
+
+
+def read_jobs(path: str) -> List[Job]:
+    '''Read a list of jobs from the JSON file at path'''
+    with open(path) as handle:
+        data = json.load(handle)
+    if not isinstance(data, list):
+        raise ValueError('Top-level JSON value in {} is not a list.'
+                         .format(path))
+    base_dir = os.path.dirname(os.path.abspath(path))
+    return [Job.from_json(idx, obj, base_dir) for idx, obj in enumerate(data)]
+
+
+# Decoded programs for the current process, keyed by path. Many jobs check
+# different subroutines of the same ELF file, so this saves decoding it again.
+_PROGRAMS: Dict[str, OTBNProgram] = {}
+
+# The on-disk information-flow cache for the current process (if any). This
+# is set by _init_worker.
+_DISK_CACHE: Optional[IFlowDiskCache] = None
+
+
+def _init_worker(cache_dir: Optional[str]) -> None:
+    global _DISK_CACHE
+    # Make sure the ISA description is loaded before the first job starts.
+    # With a fork-based pool, this just picks up the parent's copy.
+    load_insns_yaml()
+    if cache_dir is not None:
+        _DISK_CACHE = IFlowDiskCache(cache_dir)
+
+
+def _get_program(path: str) -> OTBNProgram:
+    program = _PROGRAMS.get(path)
+    if program is None:
+        program = decode_elf(path)
+        _PROGRAMS[path] = program
+    return program
+
+
+def run_job(job: Job) -> Dict[str, Any]:
+    '''Run a job, returning its entry in the report'''
+    start_time = time.monotonic()
+    entry: Dict[str, Any] = {
+        'name': job.name,
+        'elf': job.elf,
+        'subroutine': job.subroutine,
+    }
+    try:
+        program = _get_program(job.elf)
+        constants = parse_required_constants(job.constants)
+        result = check_const_time(program, job.subroutine, constants,
+                                  job.secrets, job.ignore, _DISK_CACHE)
+    except (OSError, ValueError, RuntimeError) as err:
+        entry['status'] = 'error'
+        entry['errors'] = [str(err)]
+        entry['warnings'] = []
+    else:
+        failed = result.has_errors() or result.has_warnings()
+        entry['status'] = 'fail' if failed else 'pass'
+        entry['errors'] = result.errors
+        entry['warnings'] = result.warnings
+
+    entry['time'] = time.monotonic() - start_time
+    return entry
+
+
+def run_jobs(jobs: List[Job],
+             num_procs: Optional[int],
+             cache_dir: Optional[str]) -> List[Dict[str, Any]]:
+    '''Run all the jobs, returning their report entries in order'''
+    if num_procs == 1 or len(jobs) <= 1:
+        _init_worker(cache_dir)
+        return [run_job(job) for job in jobs]
+
+    # Sort the jobs by ELF file before handing them out. Jobs are taken from
+    # the queue in order, so this makes it likely that jobs for the same file
+    # end up on a worker that has already decoded it.
+    order = sorted(range(len(jobs)), key=lambda idx: jobs[idx].elf)
+    entries: List[Optional[Dict[str, Any]]] = [None] * len(jobs)
+    with ProcessPoolExecutor(max_workers=num_procs,
+                             initializer=_init_worker,
+                             initargs=(cache_dir,)) as pool:
+        futures = {idx: pool.submit(run_job, jobs[idx]) for idx in order}
+        for idx, future in futures.items():
+            entries[idx] = future.result()
+
+    out = []
+    for entry in entries:
+        assert entry is not None
+        out.append(entry)
+    return out
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description='Run a batch of constant-time checks on OTBN programs.')
+    parser.add_argument('jobs', help='A JSON file listing the jobs to run.')
+    parser.add_argument('--report', '-o', required=False,
+                        help=('Where to write the JSON report. If not given, '
+                              'it is written to stdout.'))
+    parser.add_argument('--jobs', '-j', type=int, dest='num_procs',
+                        required=False,
+                        help=('The number of worker processes. Defaults to '
+                              'the number of CPUs.'))
+    parser.add_argument(
+        '--cache-dir',
+        required=False,
+        help=('A directory in which to cache information-flow results (see '
+              'check_const_time.py).'))
+    args = parser.parse_args()
+
+    if args.num_procs is not None and args.num_procs < 1:
+        print('--jobs must be positive.', file=sys.stderr)
+        return 1
+
+    try:
+        jobs = read_jobs(args.jobs)
+    except (OSError, ValueError) as err:
+        print('Failed to read jobs: {}'.format(err), file=sys.stderr)
+        return 1
+
+    start_time = time.monotonic()
+    entries = run_jobs(jobs, args.num_procs, args.cache_dir)
+
+    report = {
+        'jobs': entries,
+        'passed': sum(1 for e in entries if e['status'] == 'pass'),
+        'failed': sum(1 for e in entries if e['status'] == 'fail'),
+        'errored': sum(1 for e in entries if e['status'] == 'error'),
+        'time': time.monotonic() - start_time,
+    }
+
+    if args.report is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.report, 'w') as handle:
+            json.dump(report, handle, indent=2)
+            handle.write('\n')
+
+    return 0 if report['passed'] == len(entries) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+'''Benchmark OTBN instruction decoding on a full IMEM image
+
+This compares InsnsFile.mnem_for_word (which uses a precomputed decode table)
+with InsnsFile.mnem_for_word_by_scan (which checks every instruction's masks
+in turn). The image is filled with a random mixture of valid instruction
+encodings and random words.
+
+'''
+
+import argparse
+import random
+import sys
+import time
+from typing import Callable, List, Optional
+
+from shared.insn_yaml import load_insns_yaml
+
+
+def _make_image(num_words: int, valid_frac: float, seed: int) -> List[int]:
+    '''Generate num_words instruction words'''
+    insns_file = load_insns_yaml()
+    masks = list(insns_file._masks.values())
+    rng = random.Random(seed)
+
+    words = []
+    for _ in range(num_words):
+        word = rng.getrandbits(32)
+        if rng.random() < valid_frac:
+            # Force the bits that this instruction fixes to the right values
+            m0, m1 = rng.choice(masks)
+            word = (word & ~m0) | m1
+        words.append(word)
+    return words
+
+
+def _time_decode(fun: Callable[[int], Optional[str]],
+                 words: List[int],
+                 reps: int) -> float:
+    '''Return the best time (in seconds) to decode words over reps runs'''
+    best = None
+    for _ in range(reps):
+        start = time.perf_counter()
+        for word in words:
+            fun(word)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    assert best is not None
+    return best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--imem-bytes', type=int, default=16 * 1024,
+                        help='Size of the IMEM image to decode (in bytes)')
+    parser.add_argument('--valid-frac', type=float, default=0.9,
+                        help=('Fraction of words in the image that are '
+                              'valid instruction encodings'))
+    parser.add_argument('--reps', type=int, default=5,
+                        help='Number of times to decode the image')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.imem_bytes <= 0 or args.imem_bytes % 4:
+        print('--imem-bytes must be a positive multiple of 4.',
+              file=sys.stderr)
+        return 1
+
+    insns_file = load_insns_yaml()
+    words = _make_image(args.imem_bytes // 4, args.valid_frac, args.seed)
+
+    # Check the two paths agree before timing them.
+    for word in words:
+        fast = insns_file.mnem_for_word(word)
+        slow = insns_file.mnem_for_word_by_scan(word)
+        if fast != slow:
+            print(f'Mismatch decoding {word:#010x}: decode table gives '
+                  f'{fast!r} but mask scan gives {slow!r}.',
+                  file=sys.stderr)
+            return 1
+
+    t_scan = _time_decode(insns_file.mnem_for_word_by_scan, words, args.reps)
+    t_table = _time_decode(insns_file.mnem_for_word, words, args.reps)
+
+    print(f'Decoded {len(words)} words (best of {args.reps} runs)')
+    print(f'  Mask scan:    {1000 * t_scan:8.2f} ms')
+    print(f'  Decode table: {1000 * t_table:8.2f} ms')
+    print(f'  Speedup:      {t_scan / t_table:8.2f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+'''Write a serialized copy of the OTBN instruction database
+
+Loading insns.yml (and the files it includes) is a noticeable part of the
+startup time of every OTBN tool. This script parses the YAML once and writes
+the result in a form that load_insns_yaml can read much more quickly. The
+output is stamped with a hash of the YAML files and of the code that reads
+them: if either changes, load_insns_yaml ignores the stale copy and parses the
+YAML again.
+
+By default, the output goes where load_insns_yaml looks for it: the path in
+the OTBN_INSNS_CACHE environment variable if set, otherwise
+build/otbn/insns.pickle at the top of the repository (which git ignores).
+
+'''
+
+import argparse
+import sys
+
+from shared.insn_yaml import default_insns_cache_path, write_insns_cache
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', '-o',
+                        help=('Where to write the serialized database '
+                              '(default: {})'
+                              .format(default_insns_cache_path())))
+    args = parser.parse_args()
+
+    path = args.output or default_insns_cache_path()
+    try:
+        write_insns_cache(path)
+    except (OSError, RuntimeError) as err:
+        print(err, file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -16,12 +16,12 @@ Partial support:
 
 '''
 
-import os
 import re
+import shlex
 import subprocess
 import sys
-import tempfile
-from typing import Dict, List, Optional, Set, TextIO, Tuple
+import time
+from typing import Dict, List, Optional, TextIO, Tuple, cast
 
 from shared.bit_ranges import BitRanges
 from shared.encoding import Encoding
@@ -91,7 +91,7 @@ class RVFmt:
 
         assert msb == -1
 
-        fields_used = set()  # type: Set[str]
+        fields_used = set()  # type: set[str]
         b2o_dict = {}
 
         for operand in syntax:
@@ -387,7 +387,8 @@ def find_insn_schemes(mnem_to_insn: Dict[str, Insn]) -> Dict[str, RVEncoding]:
 
 
 def parse_positionals(
-        argv: List[str]) -> Tuple[List[str], List[str], Set[str]]:
+        argv: List[str]) -> Tuple[List[str], List[str],
+                                  Dict[str, Optional[str]]]:
     '''A partial argument parser that extracts positional arguments'''
 
     # The only arguments we actually need to parse from as are the input files:
@@ -402,20 +403,33 @@ def parse_positionals(
     # argument).
     space_args = ['--debug-prefix-map', '--defsym', '-I', '-o']
 
-    # OTBN-specific flags
-    otbn_flags = ['--otbn-translate']
+    # OTBN-specific flags. These aren't passed through to as. The ones in
+    # otbn_space_args take an argument.
+    otbn_flags = ['--otbn-translate', '--otbn-timing']
+    otbn_space_args = ['--otbn-batch']
 
-    flags = set()
+    flags = {}  # type: Dict[str, Optional[str]]
 
     expecting_arg = False
+    expecting_otbn_arg = None  # type: Optional[str]
     for arg in argv[1:]:
         if expecting_arg:
             others.append(arg)
             expecting_arg = False
             continue
 
+        if expecting_otbn_arg is not None:
+            flags[expecting_otbn_arg] = arg
+            expecting_otbn_arg = None
+            continue
+
         if arg in otbn_flags:
-            flags.add(arg)
+            flags[arg] = None
+            continue
+
+        if arg in otbn_space_args:
+            expecting_otbn_arg = arg
+            continue
 
         if arg in space_args:
             others.append(arg)
@@ -428,6 +442,11 @@ def parse_positionals(
 
         positionals.append(arg)
 
+    if expecting_otbn_arg is not None:
+        sys.stderr.write('Missing argument for {}.\n'
+                         .format(expecting_otbn_arg))
+        sys.exit(1)
+
     if '-h' in others or '--help' in others:
         print('otbn_as.py:\n\n'
               'A wrapper around riscv32-unknown-elf-as for OTBN.\n'
@@ -435,7 +454,16 @@ def parse_positionals(
               'for more information.\n'
               '\n'
               '  --otbn-translate: Translate the input and dump to '
-              'stdout rather than calling as.\n')
+              'stdout rather than calling as.\n'
+              '  --otbn-timing: Report the time spent in each phase of '
+              'assembly to stderr.\n'
+              '  --otbn-batch FILE: Assemble several translation units, '
+              'reading the arguments\n'
+              '      for each (in shell syntax) from a line of FILE ("--" '
+              'for stdin). Other\n'
+              '      arguments are passed to every job. The exit code of '
+              'each job is printed\n'
+              '      to stdout when it finishes.\n')
         sys.exit(0)
 
     return (positionals, others, flags)
@@ -1139,123 +1167,312 @@ def transform_input(out_handle: TextIO, in_path: str, in_handle: TextIO,
     transformer.at_eof()
 
 
-def transform_inputs(out_dir: str, inputs: List[str], insns_file: InsnsFile,
-                     mnem_to_rve: Dict[str, RVEncoding],
-                     glued_insns_dec_len: List[Insn],
-                     just_translate: bool) -> List[str]:
-    '''Transform inputs to make them suitable for riscv as'''
-    out_paths = []
-    for idx, in_path in enumerate(inputs):
-        out_path = os.path.join(out_dir, str(idx))
-        out_paths.append(out_path)
+def transform_inputs(out_handle: TextIO, inputs: List[str],
+                     ctx: 'AsContext') -> None:
+    '''Transform inputs to make them suitable for riscv as
+
+    The transformed code for all the inputs is written to out_handle, one after
+    the other. This is equivalent to passing the transformed files to as
+    separately, since as treats its inputs as a single logical file anyway.
 
+    '''
+    for idx, in_path in enumerate(inputs):
         in_handle = sys.stdin
         pretty_in_path = 'stdin'
-        out_handle = sys.stdout
         try:
             if in_path != '--':
                 in_handle = open(in_path, 'r')
                 pretty_in_path = in_path
 
-            if not just_translate:
-                out_handle = open(out_path, 'w')
-
-            transform_input(out_handle, pretty_in_path, in_handle, idx, insns_file,
-                            glued_insns_dec_len, mnem_to_rve)
+            transform_input(out_handle, pretty_in_path, in_handle, idx,
+                            ctx.insns_file, ctx.glued_insns_dec_len,
+                            ctx.mnem_to_rve)
 
         finally:
             if in_handle is not sys.stdin and in_handle is not None:
                 in_handle.close()
-            if out_handle is not sys.stdout:
-                out_handle.close()
 
-    return out_paths
+
+_AS_DEFAULT_ARGS = [
+    # Don't ask the linker to do relaxation because, in some cases, this
+    # might generate a GP-relative load. OTBN doesn't treat x3 (gp)
+    # specially, so this won't work.
+    '-mno-relax',
+    # OTBN isn't a standard RISC-V architecture, disable .riscv.attributes.
+    '-mno-arch-attr',
+    # OTBN is based on RV32I without any hard float support.
+    '-mabi=ilp32',
+    # Produce debug info for source line mapping.
+    '-g',
+]
 
 
-def run_binutils_as(other_args: List[str], inputs: List[str]) -> int:
-    '''Run binutils' as on transformed inputs
+class PhaseTimer:
+    '''Accumulates the time spent in each phase of assembly
 
-    Performs no output redirection and returns the process's exit code.
+    The phases are "load-isa" (loading insns.yml), "schemes" (matching OTBN
+    encodings to .insn schemes), "transform" (rewriting the inputs) and "as"
+    (waiting for binutils as to finish). Because the transformed code is piped
+    into as while it runs, the "transform" phase also includes any time spent
+    waiting for as to read its input.
 
     '''
-    as_name = find_tool('as')
+    def __init__(self) -> None:
+        self.times = {}  # type: Dict[str, float]
+        self._phase = None  # type: Optional[str]
+        self._start = 0.0
 
-    default_args = [
-        # Don't ask the linker to do relaxation because, in some cases, this
-        # might generate a GP-relative load. OTBN doesn't treat x3 (gp)
-        # specially, so this won't work.
-        '-mno-relax',
-        # OTBN isn't a standard RISC-V architecture, disable .riscv.attributes.
-        '-mno-arch-attr',
-        # OTBN is based on RV32I without any hard float support.
-        '-mabi=ilp32',
-        # Produce debug info for source line mapping.
-        '-g',
-    ]
+    def start(self, phase: str) -> None:
+        self.stop()
+        self._phase = phase
+        self._start = time.perf_counter()
+
+    def stop(self) -> None:
+        if self._phase is not None:
+            elapsed = time.perf_counter() - self._start
+            self.times[self._phase] = self.times.get(self._phase, 0) + elapsed
+            self._phase = None
+
+    def add(self, other: 'PhaseTimer') -> None:
+        for phase, elapsed in other.times.items():
+            self.times[phase] = self.times.get(phase, 0) + elapsed
+
+    def report(self, what: str) -> str:
+        parts = ['{} {:.1f}'.format(phase, 1000 * elapsed)
+                 for phase, elapsed in self.times.items()]
+        return 'otbn_as.py: {} time (ms): {}'.format(what, ', '.join(parts))
+
+
+class AsContext:
+    '''The tables used to transform OTBN assembly
+
+    These only depend on insns.yml so we compute them once per process (see
+    get_context) and share them between all the files that we assemble.
+
+    '''
+    def __init__(self, insns_file: InsnsFile, timer: PhaseTimer) -> None:
+        self.insns_file = insns_file
+
+        # A list of instructions that have "glued operations" (which means
+        # their syntax doesn't require a space between the mnemonic and the
+        # first operation). Ordered from longest to shortest mnemonic, so that
+        # you can find a maximal prefix by linearly searching through the list
+        # and calling startswith.
+        self.glued_insns_dec_len = []  # type: List[Insn]
+        for insn in insns_file.insns:
+            if insn.glued_ops:
+                self.glued_insns_dec_len.append(insn)
+        self.glued_insns_dec_len.sort(key=lambda insn: len(insn.mnemonic),
+                                      reverse=True)
+
+        # Check that any instruction that claims to have a Python pseudo-op
+        # assembler really does.
+        for insn in insns_file.insns:
+            if insn.python_pseudo_op:
+                if insn.mnemonic not in _PSEUDO_OP_ASSEMBLERS:
+                    raise RuntimeError(
+                        "Instruction {!r} has python-pseudo-op true, "
+                        "but otbn_as.py doesn't have a custom assembler "
+                        "for it.".format(insn.mnemonic))
+
+        # Try to match up OTBN instruction encodings with .insn schemes (as
+        # stored in RISCV_FORMATS).
+        timer.start('schemes')
+        self.mnem_to_rve = find_insn_schemes(insns_file.mnemonic_to_insn)
+        timer.stop()
+
+
+_CONTEXT = None  # type: Optional[AsContext]
+
+
+def get_context(timer: PhaseTimer) -> AsContext:
+    '''Get the (cached) AsContext for this process
+
+    Raises a RuntimeError if insns.yml can't be loaded or is inconsistent with
+    this script.
+
+    '''
+    global _CONTEXT
+    if _CONTEXT is None:
+        timer.start('load-isa')
+        insns_file = load_insns_yaml()
+        timer.stop()
+        _CONTEXT = AsContext(insns_file, timer)
+    return _CONTEXT
+
+
+def run_binutils_as(other_args: List[str], inputs: List[str],
+                    ctx: AsContext, timer: PhaseTimer,
+                    as_stdout: Optional[TextIO] = None) -> int:
+    '''Transform inputs and pipe the result to binutils' as
+
+    Returns the process's exit code. If as_stdout is not None, the standard
+    output of as is sent there. Raises a RuntimeError if an input can't be
+    transformed.
+
+    '''
+    as_name = find_tool('as')
 
-    cmd = [as_name] + default_args + other_args + inputs
+    # A '--' argument tells as to read from stdin
+    cmd = [as_name] + _AS_DEFAULT_ARGS + other_args + ['--']
     try:
-        return subprocess.run(cmd).returncode
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=as_stdout,
+                                universal_newlines=True)
     except FileNotFoundError:
         sys.stderr.write('Unknown command: {!r}.\n'.format(as_name))
         return 127
 
+    assert proc.stdin is not None
+    as_stdin = cast(TextIO, proc.stdin)
+    try:
+        timer.start('transform')
+        try:
+            transform_inputs(as_stdin, inputs, ctx)
+            as_stdin.close()
+        except BrokenPipeError:
+            # as has exited early. It will have said why, so just collect its
+            # exit code.
+            pass
+        except BaseException:
+            proc.kill()
+            raise
+        timer.start('as')
+        return proc.wait()
+    finally:
+        timer.stop()
+        if proc.returncode is None:
+            proc.wait()
+
+
+def assemble(argv: List[str], ctx: AsContext, timer: PhaseTimer,
+             as_stdout: Optional[TextIO] = None) -> int:
+    '''Assemble one translation unit, described by as arguments argv
+
+    argv doesn't include the program name. Returns an exit code.
+
+    '''
+    files, other_args, flags = parse_positionals([''] + argv)
+    if flags:
+        sys.stderr.write('Unexpected OTBN-specific flags in batch job: {}.\n'
+                         .format(', '.join(sorted(flags))))
+        return 1
+
+    # A job with no input files (or with '--', which denotes standard input)
+    # would read its assembly from standard input. That might be where the
+    # jobs themselves are coming from, so we don't allow it.
+    if not files or '--' in files:
+        sys.stderr.write('Batch jobs cannot read from standard input: each '
+                         'job must name its input files.\n')
+        return 1
+
+    try:
+        return run_binutils_as(other_args, files, ctx, timer, as_stdout)
+    except (OSError, RuntimeError) as err:
+        sys.stderr.write('{}\n'.format(err))
+        return 1
+
+
+def run_batch(jobs_path: str, common_args: List[str], ctx: AsContext,
+              report_timing: bool) -> int:
+    '''Run a batch of assembly jobs
+
+    Each non-empty line of the jobs file (other than comments starting with
+    '#') gives the arguments for one run of as, with shell quoting. The
+    arguments in common_args are prepended to each job's arguments. If
+    jobs_path is '--', jobs are read from stdin. Jobs can't read their input
+    from stdin, so each job must name its input files. After each job
+    finishes, its exit code is written to stdout on a line by itself (the
+    output of as itself goes to stderr), so that another process can drive
+    this one through a pair of pipes.
+
+    Returns zero if all the jobs succeeded and 1 otherwise.
+
+    '''
+    total = PhaseTimer()
+    all_ok = True
+    num_jobs = 0
+    in_handle = sys.stdin if jobs_path == '--' else open(jobs_path)
+    try:
+        for line in in_handle:
+            try:
+                job_args = shlex.split(line, comments=True)
+            except ValueError as err:
+                sys.stderr.write('Cannot parse batch job {!r}: {}\n'
+                                 .format(line.rstrip('\n'), err))
+                all_ok = False
+                print(1, flush=True)
+                continue
+            if not job_args:
+                continue
+
+            num_jobs += 1
+            timer = PhaseTimer()
+            ret = assemble(common_args + job_args, ctx, timer, sys.stderr)
+            all_ok = all_ok and ret == 0
+
+            print(ret, flush=True)
+            if report_timing:
+                sys.stderr.write(timer.report('job {}'.format(num_jobs)) +
+                                 '\n')
+            total.add(timer)
+    finally:
+        if in_handle is not sys.stdin:
+            in_handle.close()
+
+    if report_timing:
+        sys.stderr.write(total.report('batch total') + '\n')
+
+    return 0 if all_ok else 1
+
 
 def main(argv: List[str]) -> int:
     files, other_args, flags = parse_positionals(argv)
     files = files or ['--']
     just_translate = '--otbn-translate' in flags
+    batch_path = flags.get('--otbn-batch')
+    report_timing = '--otbn-timing' in flags
 
     # files is now a nonempty list of input files. Rather unusually, '--'
     # (rather than '-') denotes standard input.
 
+    timer = PhaseTimer()
     try:
-        insns_file = load_insns_yaml()
+        ctx = get_context(timer)
     except RuntimeError as err:
         sys.stderr.write('{}\n'.format(err))
         return 1
 
-    # A list of instructions that have "glued operations" (which means their
-    # syntax doesn't require a space between the mnemonic and the first
-    # operation). Ordered from longest to shortest mnemonic, so that you can
-    # find a maximal prefix by linearly searching through the list and calling
-    # startswith.
-    glued_insns_dec_len = []
-    for insn in insns_file.insns:
-        if insn.glued_ops:
-            glued_insns_dec_len.append(insn)
-    glued_insns_dec_len.sort(key=lambda insn: len(insn.mnemonic), reverse=True)
-
-    # Check that any instruction that claims to have a Python pseudo-op
-    # assembler really does.
-    for insn in insns_file.insns:
-        if insn.python_pseudo_op:
-            if insn.mnemonic not in _PSEUDO_OP_ASSEMBLERS:
-                sys.stderr.write(
-                    "Instruction {!r} has python-pseudo-op true, "
-                    "but otbn_as.py doesn't have a custom assembler "
-                    "for it.\n".format(insn.mnemonic))
-                return 1
-
-    # Try to match up OTBN instruction encodings with .insn schemes (as stored
-    # in RISCV_FORMATS).
-    mnem_to_rve = find_insn_schemes(insns_file.mnemonic_to_insn)
-
-    with tempfile.TemporaryDirectory(suffix='.otbn-as') as tmpdir:
+    if batch_path is not None:
+        if just_translate:
+            sys.stderr.write('--otbn-translate and --otbn-batch cannot be '
+                             'used together.\n')
+            return 1
+        if report_timing:
+            sys.stderr.write(timer.report('setup') + '\n')
         try:
-            transformed = transform_inputs(tmpdir, files, insns_file,
-                                           mnem_to_rve, glued_insns_dec_len,
-                                           just_translate)
+            return run_batch(batch_path, other_args, ctx, report_timing)
+        except OSError as err:
+            sys.stderr.write('{}\n'.format(err))
+            return 1
+
+    if just_translate:
+        try:
+            transform_inputs(sys.stdout, files, ctx)
         except RuntimeError as err:
             sys.stderr.write('{}\n'.format(err))
             return 1
+        return 0
 
-        if just_translate:
-            # transform_inputs already printed out the translated code. We're
-            # done.
-            return 0
+    try:
+        ret = run_binutils_as(other_args, files, ctx, timer)
+    except (OSError, RuntimeError) as err:
+        sys.stderr.write('{}\n'.format(err))
+        return 1
 
-        return run_binutils_as(transformed, other_args)
+    if report_timing:
+        sys.stderr.write(timer.report('total') + '\n')
+
+    return ret
 
 
 if __name__ == '__main__':
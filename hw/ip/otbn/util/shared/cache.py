@@ -2,7 +2,7 @@
 # Licensed under the Apache License, Version 2.0, see LICENSE for details.
 # SPDX-License-Identifier: Apache-2.0
 
-from typing import Dict, Generic, List, Optional, TypeVar
+from typing import Dict, Generic, Hashable, List, Optional, TypeVar
 
 K = TypeVar('K')  # Key type.
 V = TypeVar('V')  # Value type.
@@ -61,3 +61,53 @@ class Cache(Generic[X, K, V]):
             if entry.is_match(key):
                 return entry.value
         return None
+
+
+class IndexedCache(Cache[X, K, V]):
+    '''A cache that finds matching entries without scanning them all.
+
+    This works for caches where an entry's key is a restriction of the lookup
+    key: the entry matches if the lookup key agrees with it on every field that
+    the entry's key contains. Within each index, entries are grouped by the set
+    of fields in their key (their "shape") and then stored in a dictionary
+    keyed by the values of those fields. A lookup projects the lookup key onto
+    each shape in turn, so it takes time proportional to the number of distinct
+    shapes rather than the number of entries.
+
+    Subclasses must implement key_shape and project; is_match on the entries is
+    not used.
+    '''
+    def __init__(self) -> None:
+        super().__init__()
+        self.index: Dict[X, Dict[Hashable, Dict[Hashable, V]]] = {}
+
+    def key_shape(self, key: K) -> Hashable:
+        '''Returns a hashable description of the fields that key contains.'''
+        raise NotImplementedError()
+
+    def project(self, key: K, shape: Hashable) -> Optional[Hashable]:
+        '''Returns the values of key for the fields in shape.
+
+        If key doesn't contain all of the fields in shape, returns None.
+        '''
+        raise NotImplementedError()
+
+    def add(self, index: X, entry: CacheEntry[K, V]) -> None:
+        shape = self.key_shape(entry.key)
+        values = self.project(entry.key, shape)
+        assert values is not None
+        by_values = self.index.setdefault(index, {}).setdefault(shape, {})
+        # Only add if there's no matching entry already
+        if values not in by_values and self.lookup(index, entry.key) is None:
+            by_values[values] = entry.value
+            self.entries.setdefault(index, []).append(entry)
+
+    def lookup(self, index: X, key: K) -> Optional[V]:
+        for shape, by_values in self.index.get(index, {}).items():
+            values = self.project(key, shape)
+            if values is None:
+                continue
+            value = by_values.get(values)
+            if value is not None:
+                return value
+        return None
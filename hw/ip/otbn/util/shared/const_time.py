@@ -0,0 +1,79 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+'''The constant-time check done by check_const_time.py'''
+
+from typing import Dict, List, Optional, Set
+
+from .check import CheckResult
+from .control_flow import program_control_graph, subroutine_control_graph
+from .decode import OTBNProgram
+from .information_flow_analysis import (IFlowDiskCache, get_program_iflow,
+                                        get_subroutine_iflow,
+                                        stringify_control_deps)
+
+
+def check_const_time(program: OTBNProgram,
+                     subroutine: Optional[str],
+                     constants: Dict[str, int],
+                     secrets: Optional[List[str]],
+                     ignore: Optional[List[str]],
+                     disk_cache: Optional[IFlowDiskCache] = None
+                     ) -> CheckResult:
+    '''Check whether secret data affects control flow.
+
+    If subroutine is None, check the whole program. Otherwise, check just that
+    subroutine, with the registers in constants known to have the given values
+    at the start. If secrets is None, every information-flow node is treated as
+    secret (so the check passes only if there is a single control-flow path).
+    Any control-flow dependencies that also appear in the subroutines named in
+    ignore are not reported.
+
+    Returns a CheckResult with an error if some secret may influence control
+    flow.
+    '''
+    if subroutine is None:
+        if constants:
+            raise ValueError('Cannot require initial constants for a whole '
+                             'program; use --subroutine to analyze a specific '
+                             'subroutine.')
+        graph = program_control_graph(program)
+        _, control_deps = get_program_iflow(program, graph, disk_cache)
+    else:
+        graph = subroutine_control_graph(program, subroutine)
+        _, _, control_deps = get_subroutine_iflow(program, graph, subroutine,
+                                                  constants, disk_cache)
+
+    control_deps_ignore: Dict[str, Set[int]] = {}
+    if ignore is not None:
+        for ignored in ignore:
+            graph = subroutine_control_graph(program, ignored)
+            _, _, control_deps_ignore_temp = get_subroutine_iflow(program,
+                                                                  graph,
+                                                                  ignored, {},
+                                                                  disk_cache)
+            control_deps_ignore.update(control_deps_ignore_temp)
+
+    if secrets is None:
+        secret_control_deps = control_deps
+    else:
+        # If secrets were provided, only show the ways in which those specific
+        # nodes could influence control flow.
+        secret_control_deps = {
+            node: pcs
+            for node, pcs in control_deps.items() if node in secrets
+        }
+
+    secret_control_deps_filt = {k: v for k, v in secret_control_deps.items()
+                                if v not in control_deps_ignore.values()}
+
+    out = CheckResult()
+
+    if len(secret_control_deps_filt) != 0:
+        msg = 'The following secrets may influence control flow:\n  '
+        msg += '\n  '.join(stringify_control_deps(program,
+                                                  secret_control_deps_filt))
+        out.err(msg)
+
+    return out
@@ -23,6 +23,7 @@ class OTBNProgram:
                  data: Dict[int, int]):
         self.symbols = symbols  # label -> PC
         self.data = data  # addr -> data (32b word)
+        self.opcodes = insns  # PC -> raw instruction word
 
         self.insns = {}
         for pc, opcode in insns.items():
@@ -3,16 +3,21 @@
 # Licensed under the Apache License, Version 2.0, see LICENSE for details.
 # SPDX-License-Identifier: Apache-2.0
 
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
 from copy import deepcopy
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
 
-from .cache import Cache, CacheEntry
+from .cache import CacheEntry, IndexedCache
 from .constants import ConstantContext, get_op_val_str
 from .control_flow import (ControlLoc, ControlGraph, Cycle, Ecall,
-                           ImemEnd, LoopStart, Ret)
+                           ImemEnd, LoopEnd, LoopStart, Ret)
 from .decode import OTBNProgram
 from .information_flow import InformationFlowGraph
-from .insn_yaml import Insn
+from .insn_yaml import Insn, insns_cache_stamp
 
 # Calls to _get_iflow return results in the form of a tuple with entries:
 #   used constants: a set containing the names of input constants the
@@ -53,14 +58,29 @@ class IFlowCacheEntry(CacheEntry[ConstantContext, IFlowResult]):
         return constants.includes(self.key)
 
 
-class IFlowCache(Cache[int, ConstantContext, IFlowResult]):
+class IFlowCache(IndexedCache[int, ConstantContext, IFlowResult]):
     '''Represents the cache for _get_iflow.
 
     The index of the cache is the start PC for the call to _get_iflow. If this
     index and the values of the constants used in the call match a new call,
     the cached result is returned.
+
+    Entries for a PC are grouped by the names of the constants in their key, so
+    a lookup does one dictionary access per distinct set of names.
     '''
-    pass
+    def key_shape(self, key: ConstantContext) -> Hashable:
+        return tuple(sorted(key.values.keys()))
+
+    def project(self, key: ConstantContext,
+                shape: Hashable) -> Optional[Hashable]:
+        assert isinstance(shape, tuple)
+        values = []
+        for name in shape:
+            value = key.get(name)
+            if value is None:
+                return None
+            values.append(value)
+        return tuple(values)
 
 
 # The information flow of a subroutine is represented as a tuple whose entries
@@ -529,10 +549,151 @@ def _get_iflow(program: OTBNProgram, graph: ControlGraph, start_pc: int,
     return out
 
 
+# A digest of everything that the stored results depend on, apart from the
+# program itself. This is the instruction YAML files (insns.yml defines the
+# information flow for each instruction) and the source of the modules in
+# this directory (which implement the analysis and define the classes that
+# get pickled). That is exactly what insns_cache_stamp hashes, together with
+# the Python version (which also matters for pickles). Computed on first use
+# by _analysis_digest.
+_ANALYSIS_DIGEST: Optional[bytes] = None
+
+
+def _analysis_digest() -> bytes:
+    global _ANALYSIS_DIGEST
+    if _ANALYSIS_DIGEST is None:
+        _ANALYSIS_DIGEST = insns_cache_stamp().encode()
+    return _ANALYSIS_DIGEST
+
+
+def _edge_fingerprint(edge: ControlLoc, base_pc: int) -> str:
+    '''Returns a string describing edge, with PCs relative to base_pc.'''
+    name = type(edge).__name__
+    if isinstance(edge, LoopStart):
+        return '{}:{}:{}'.format(name, edge.loop_start_pc - base_pc,
+                                 edge.loop_end_pc - base_pc)
+    if isinstance(edge, LoopEnd):
+        return '{}:{}:{}'.format(name,
+                                 edge.loop_start.loop_start_pc - base_pc,
+                                 edge.loop_start.loop_end_pc - base_pc)
+    if isinstance(edge, (Ecall, ImemEnd, Ret)):
+        return name
+    return '{}:{}'.format(name, edge.pc - base_pc)
+
+
+def _rebase_control_deps(control_deps: Dict[str, Set[int]],
+                         offset: int) -> Dict[str, Set[int]]:
+    '''Returns a copy of control_deps with offset added to every PC.'''
+    return {node: {pc + offset for pc in pcs}
+            for node, pcs in control_deps.items()}
+
+
+class IFlowDiskCache:
+    '''A persistent cache of subroutine and program information flow.
+
+    Entries are stored as pickle files in cache_dir, so they can be shared
+    between runs (and between programs). The key for an entry is a hash of:
+
+    - the raw instruction words in every section of the control-flow graph,
+      together with the edges between sections,
+    - the start constants, and
+    - the instruction YAML files and the source of the modules in shared/
+      (so any change to the analysis code gives new keys).
+
+    All PCs in the key are relative to the start PC, as are the PCs in the
+    stored control-flow dependencies. Branches, jumps and loops are encoded
+    relative to the PC, so a library routine that is linked at a different
+    address in another program gets the same key. Instructions that build an
+    absolute address (like LUI) have that address in their encoding, so a
+    routine that depends on where things are linked gets a different key.
+
+    Entries that are missing or can't be read count as misses. If an entry
+    can't be written (for example, because cache_dir isn't writable), we
+    print a warning and carry on without it.
+    '''
+    def __init__(self, cache_dir: str) -> None:
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self.store_failed = False
+
+    def key(self, kind: str, program: OTBNProgram, graph: ControlGraph,
+            start_pc: int, start_constants: Dict[str, int]) -> str:
+        '''Compute the key for analyzing graph from start_pc.
+
+        The kind argument distinguishes between different types of stored
+        result (so a subroutine and a whole program starting at the same PC
+        don't collide).
+        '''
+        hasher = hashlib.sha256()
+        hasher.update(_analysis_digest())
+        hasher.update('{};'.format(kind).encode())
+        for name, value in sorted(start_constants.items()):
+            hasher.update('{}={};'.format(name, value).encode())
+        for sec_pc, (section, edges) in sorted(graph.graph.items()):
+            words = ','.join('{:08x}'.format(program.opcodes[pc])
+                             for pc in section)
+            edge_strs = ','.join(_edge_fingerprint(edge, start_pc)
+                                 for edge in edges)
+            hasher.update('[{}:{}:{}:{}]'.format(sec_pc - start_pc,
+                                                 section.end - start_pc,
+                                                 words, edge_strs).encode())
+        return hasher.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + '.pickle')
+
+    def load(self, key: str) -> Optional[Any]:
+        '''Load the entry with the given key, or return None on a miss.'''
+        try:
+            with open(self._path(key), 'rb') as handle:
+                value = pickle.load(handle)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError,
+                ImportError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def store(self, key: str, value: Any) -> None:
+        '''Store an entry.
+
+        The entry is written to a temporary file and then moved into place, so
+        that concurrent runs sharing a cache directory never see a partially
+        written entry.
+        '''
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        except OSError as err:
+            self._on_store_error(err)
+            return
+
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                pickle.dump(value, handle)
+            os.replace(tmp_path, self._path(key))
+        except BaseException as err:
+            os.unlink(tmp_path)
+            if not isinstance(err, OSError):
+                raise
+            self._on_store_error(err)
+
+    def _on_store_error(self, err: OSError) -> None:
+        '''Warn (just once) that we couldn't write an entry.'''
+        if not self.store_failed:
+            sys.stderr.write('Warning: Cannot write to the information-flow '
+                             'cache in {!r} ({}). Carrying on without '
+                             'it.\n'.format(self.cache_dir, err))
+        self.store_failed = True
+
+
 def get_subroutine_iflow(program: OTBNProgram,
                          graph: ControlGraph,
                          subroutine_name: str,
-                         start_constants: Dict[str, int]) -> SubroutineIFlow:
+                         start_constants: Dict[str, int],
+                         disk_cache: Optional[IFlowDiskCache] = None
+                         ) -> SubroutineIFlow:
     '''Gets the information-flow graphs for the subroutine.
 
     Returns three items:
@@ -543,6 +704,8 @@ def get_subroutine_iflow(program: OTBNProgram,
        paths)
     3. The information-flow nodes whose values at the start of the subroutine
        influence its control flow.
+
+    If disk_cache is given, it is used to look up (and then store) the result.
     '''
     if 'x0' in start_constants and start_constants['x0'] != 0:
         raise ValueError('The x0 register is always 0; cannot require '
@@ -550,6 +713,17 @@ def get_subroutine_iflow(program: OTBNProgram,
     start_constants['x0'] = 0
     constants = ConstantContext(start_constants)
     start_pc = program.get_pc_at_symbol(subroutine_name)
+
+    disk_key = None
+    if disk_cache is not None:
+        disk_key = disk_cache.key('subroutine', program, graph, start_pc,
+                                  start_constants)
+        cached = disk_cache.load(disk_key)
+        if cached is not None:
+            ret_iflow, end_iflow, rel_control_deps = cached
+            return (ret_iflow, end_iflow,
+                    _rebase_control_deps(rel_control_deps, start_pc))
+
     _, ret_iflow, end_iflow, _, cycles, control_deps = _get_iflow(
         program, graph, start_pc, constants, None, IFlowCache())
     if cycles:
@@ -561,11 +735,20 @@ def get_subroutine_iflow(program: OTBNProgram,
     if not (ret_iflow.exists or end_iflow.exists):
         raise ValueError('Could not find any complete control-flow paths when '
                          'analyzing subroutine.')
+
+    if disk_cache is not None:
+        assert disk_key is not None
+        disk_cache.store(disk_key,
+                         (ret_iflow, end_iflow,
+                          _rebase_control_deps(control_deps, -start_pc)))
+
     return ret_iflow, end_iflow, control_deps
 
 
 def get_program_iflow(program: OTBNProgram,
-                      graph: ControlGraph) -> ProgramIFlow:
+                      graph: ControlGraph,
+                      disk_cache: Optional[IFlowDiskCache] = None
+                      ) -> ProgramIFlow:
     '''Gets the information-flow graph for the whole program.
 
     Returns two items:
@@ -573,10 +756,21 @@ def get_program_iflow(program: OTBNProgram,
        program (e.g. ECALL or the end of IMEM)
     2. The information-flow nodes whose values at the start of the subroutine
        influence its control flow.
+
+    If disk_cache is given, it is used to look up (and then store) the result.
     '''
+    start_pc = program.min_pc()
+
+    disk_key = None
+    if disk_cache is not None:
+        disk_key = disk_cache.key('program', program, graph, start_pc, {})
+        cached = disk_cache.load(disk_key)
+        if cached is not None:
+            end_iflow, rel_control_deps = cached
+            return end_iflow, _rebase_control_deps(rel_control_deps, start_pc)
+
     _, ret_iflow, end_iflow, _, cycles, control_deps = _get_iflow(
-        program, graph, program.min_pc(), ConstantContext.empty(), None,
-        IFlowCache())
+        program, graph, start_pc, ConstantContext.empty(), None, IFlowCache())
     if cycles:
         raise RuntimeError('Unresolved cycles; start PCs: {}'.format(', '.join(
             ['{:#x}'.format(k) for k in cycles.keys()])))
@@ -585,6 +779,13 @@ def get_program_iflow(program: OTBNProgram,
         raise ValueError('Unexpected information flow for paths ending in RET '
                          'when analyzing whole program.')
     assert end_iflow.exists
+
+    if disk_cache is not None:
+        assert disk_key is not None
+        disk_cache.store(disk_key,
+                         (end_iflow,
+                          _rebase_control_deps(control_deps, -start_pc)))
+
     return end_iflow, control_deps
 
 
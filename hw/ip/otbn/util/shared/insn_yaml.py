@@ -4,9 +4,14 @@
 
 '''Support code for reading the instruction database in insns.yml'''
 
+import glob
+import hashlib
 import itertools
 import os
+import pickle
 import re
+import sys
+import tempfile
 from typing import Dict, List, Optional, Tuple, cast
 
 from serialize.parse_helpers import (check_keys, check_str, check_bool,
@@ -279,6 +284,59 @@ class InsnGroups:
                                        self.groups, lambda ig: ig.key)
 
 
+class DecodeTable:
+    '''A precomputed index from instruction words to mnemonics
+
+    This is built once from the (m0, m1) mask pairs generated by
+    InsnsFile._get_masks. Instructions are split into buckets, keyed by the
+    bits of the word selected by KEY_MASK (the major opcode and funct3
+    fields). An instruction whose encoding doesn't fix every key bit appears
+    in each bucket that it might match. Looking up a word then only needs to
+    check the handful of candidates in its bucket, rather than every
+    instruction in the ISA.
+
+    '''
+    # Bits 6:0 are the major opcode and bits 14:12 are funct3. Every OTBN
+    # instruction fixes the major opcode and most also fix funct3, which
+    # leaves at most a few instructions per bucket.
+    KEY_MASK = 0x707f
+
+    def __init__(self, masks: Dict[str, Tuple[int, int]]) -> None:
+        self.buckets: Dict[int, List[Tuple[str, int, int]]] = {}
+        for mnem, (m0, m1) in masks.items():
+            # The key bits that this instruction's encoding doesn't fix. We
+            # iterate over every subset of these bits to find all the buckets
+            # that a word for this instruction might land in.
+            fixed = (m0 | m1) & self.KEY_MASK
+            free = self.KEY_MASK & ~fixed
+            base = m1 & self.KEY_MASK
+            sub = free
+            while True:
+                self.buckets.setdefault(base | sub, []).append((mnem, m0, m1))
+                if sub == 0:
+                    break
+                sub = (sub - 1) & free
+
+    def lookup(self, word: int) -> Optional[str]:
+        '''Find the instruction that could be encoded as word
+
+        If there is no such instruction, return None.
+
+        '''
+        ret = None
+        for mnem, m0, m1 in self.buckets.get(word & self.KEY_MASK, ()):
+            # If any bit is set that should be zero or if any bit is clear that
+            # should be one, ignore this instruction.
+            if word & m0 or (~ word) & m1:
+                continue
+
+            # Belt-and-braces ambiguity check
+            assert ret is None
+            ret = mnem
+
+        return ret
+
+
 class InsnsFile:
     def __init__(self,
                  path: str,
@@ -322,6 +380,7 @@ class InsnsFile:
                              ', '.join(ambiguities))
 
         self._masks = masks_exc
+        self._decode_table = DecodeTable(masks_exc)
 
     def grouped_insns(self) -> List[Tuple[InsnGroup, List[Insn]]]:
         '''Return the instructions in groups'''
@@ -373,6 +432,15 @@ class InsnsFile:
 
         If there is no such instruction, return None.
 
+        '''
+        return self._decode_table.lookup(word)
+
+    def mnem_for_word_by_scan(self, word: int) -> Optional[str]:
+        '''Like mnem_for_word, but by checking every instruction's masks
+
+        This is much slower than mnem_for_word, but doesn't depend on the
+        decode table. It is used as a reference (in tests and benchmarks).
+
         '''
         ret = None
         for mnem, (m0, m1) in self._masks.items():
@@ -419,10 +487,134 @@ def make_isr_dict(path: str) -> IsrMap:
 
 _DEFAULT_INSNS_FILE: Optional[InsnsFile] = None
 
+# The environment variable that can be used to point at a serialized copy of
+# the default instruction database (see write_insns_cache). If it isn't set,
+# we look for INSNS_CACHE_NAME in the OTBN directory of the (untracked) build
+# directory at the top of the repository.
+INSNS_CACHE_ENV_VAR = 'OTBN_INSNS_CACHE'
+INSNS_CACHE_NAME = 'insns.pickle'
+
+# Bump this if the format of the cache file changes.
+_INSNS_CACHE_VERSION = 1
+
+
+def _data_dir() -> str:
+    dirname = os.path.dirname(__file__)
+    return os.path.normpath(os.path.join(dirname, '..', '..', 'data'))
+
+
+def default_insns_cache_path() -> str:
+    '''Return the path where load_insns_yaml looks for a serialized cache'''
+    env_path = os.environ.get(INSNS_CACHE_ENV_VAR)
+    if env_path:
+        return env_path
+    repo_top = os.path.join(_data_dir(), '..', '..', '..', '..')
+    return os.path.normpath(os.path.join(repo_top, 'build', 'otbn',
+                                         INSNS_CACHE_NAME))
+
+
+def insns_cache_stamp() -> str:
+    '''Compute the version stamp for a serialized instruction database
+
+    This is a hash of the YAML files in the data directory, the source code
+    of the modules that define the classes that get serialized, the Python
+    version and the cache format version. A cache is only used if its stamp
+    matches.
+
+    '''
+    hasher = hashlib.sha256()
+    hasher.update('v{};{};py{}.{};'
+                  .format(_INSNS_CACHE_VERSION, __name__,
+                          sys.version_info[0], sys.version_info[1])
+                  .encode())
+
+    shared_dir = os.path.dirname(__file__)
+    paths = (sorted(glob.glob(os.path.join(_data_dir(), '*.yml'))) +
+             sorted(glob.glob(os.path.join(shared_dir, '*.py'))))
+    for path in paths:
+        hasher.update(os.path.basename(path).encode() + b'\0')
+        with open(path, 'rb') as handle:
+            hasher.update(handle.read())
+        hasher.update(b'\0')
+
+    return hasher.hexdigest()
+
+
+def _load_default_from_yaml() -> InsnsFile:
+    data_path = _data_dir()
+
+    csrs = make_isr_dict(os.path.join(data_path, 'csr.yml'))
+    wsrs = make_isr_dict(os.path.join(data_path, 'wsr.yml'))
+
+    return load_file(os.path.join(data_path, 'insns.yml'),
+                     IsrMaps(csrs, wsrs))
+
+
+def _load_insns_cache(path: str) -> Optional[InsnsFile]:
+    '''Try to load a serialized instruction database from path
+
+    Returns None if there is no such file, if it can't be read or if its
+    stamp doesn't match insns_cache_stamp().
+
+    '''
+    try:
+        with open(path, 'rb') as handle:
+            # The stamp is pickled on its own before the InsnsFile, so we can
+            # check it without unpickling everything else.
+            stamp = pickle.load(handle)
+            if stamp != insns_cache_stamp():
+                return None
+            insns_file = pickle.load(handle)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError,
+            ImportError):
+        return None
+
+    if not isinstance(insns_file, InsnsFile):
+        return None
+    return insns_file
+
+
+def _write_insns_cache(path: str, insns_file: InsnsFile) -> None:
+    '''Serialize insns_file to path
+
+    The data is written to a temporary file in the same directory, which then
+    replaces path. This means that concurrent readers and writers never see a
+    partially written cache.
+
+    '''
+    dirname = os.path.dirname(path)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=dirname or '.',
+                                    prefix=INSNS_CACHE_NAME + '.')
+    try:
+        with os.fdopen(fd, 'wb') as handle:
+            pickle.dump(insns_cache_stamp(), handle)
+            pickle.dump(insns_file, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_insns_cache(path: str) -> None:
+    '''Load the default instruction database from YAML and serialize it
+
+    The result is written to path, in the format read by load_insns_yaml.
+    Raises a RuntimeError on syntax or schema error in the YAML.
+
+    '''
+    _write_insns_cache(path, _load_default_from_yaml())
+
 
 def load_insns_yaml() -> InsnsFile:
     '''Load the insns.yml file from its default location.
 
+    If there is an up-to-date serialized copy (see write_insns_cache) at
+    default_insns_cache_path(), it is used instead of parsing the YAML.
+    Otherwise, we parse the YAML and, unless OTBN_INSNS_CACHE is set, try to
+    write a serialized copy for the next caller.
+
     Caches its result. Raises a RuntimeError on syntax or schema error.
 
     '''
@@ -430,13 +622,20 @@ def load_insns_yaml() -> InsnsFile:
     if _DEFAULT_INSNS_FILE is not None:
         return _DEFAULT_INSNS_FILE
 
-    dirname = os.path.dirname(__file__)
-    data_path = os.path.normpath(os.path.join(dirname, '..', '..', 'data'))
-
-    csrs = make_isr_dict(os.path.join(data_path, 'csr.yml'))
-    wsrs = make_isr_dict(os.path.join(data_path, 'wsr.yml'))
+    cache_path = default_insns_cache_path()
+    insns_file = _load_insns_cache(cache_path)
+    if insns_file is None:
+        insns_file = _load_default_from_yaml()
 
-    _DEFAULT_INSNS_FILE = load_file(os.path.join(data_path, 'insns.yml'),
-                                    IsrMaps(csrs, wsrs))
+        # If OTBN_INSNS_CACHE is set, the cache belongs to whatever set it
+        # (the Bazel rules point it at a file generated by the build), so we
+        # leave it alone. Otherwise, write a cache at the default location. If
+        # that fails (maybe the tree is read-only), we carry on without it.
+        if not os.environ.get(INSNS_CACHE_ENV_VAR):
+            try:
+                _write_insns_cache(cache_path, insns_file)
+            except OSError:
+                pass
 
+    _DEFAULT_INSNS_FILE = insns_file
     return _DEFAULT_INSNS_FILE
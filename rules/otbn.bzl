@@ -23,10 +23,11 @@ def _otbn_assemble_sources(ctx, additional_srcs = []):
     ctx.actions.run(
         outputs = [obj],
         inputs = depset(
-            direct = files + [ctx.executable._otbn_as],
+            direct = files + [ctx.executable._otbn_as, ctx.file._otbn_insns_cache],
             transitive = [cc_toolchain.all_files],
         ),
         env = {
+            "OTBN_INSNS_CACHE": ctx.file._otbn_insns_cache.path,
             "RV32_TOOL_AS": ctx.executable._riscv32_as.path,
         },
         arguments = ["-o", obj.path] + paths + ctx.attr.args,
@@ -325,6 +326,11 @@ otbn_library = rv_rule(
             executable = True,
             cfg = "exec",
         ),
+        "_otbn_insns_cache": attr.label(
+            default = "//hw/ip/otbn/util:insns_cache",
+            allow_single_file = True,
+            cfg = "exec",
+        ),
     },
     fragments = ["cpp"],
     toolchains = ["@rules_cc//cc:toolchain_type"],
@@ -366,6 +372,11 @@ otbn_binary = rv_rule(
             executable = True,
             cfg = "exec",
         ),
+        "_otbn_insns_cache": attr.label(
+            default = "//hw/ip/otbn/util:insns_cache",
+            allow_single_file = True,
+            cfg = "exec",
+        ),
         "_otbn_data": attr.label(
             default = "//hw/ip/otbn/data:all_files",
             allow_files = True,
@@ -420,6 +431,11 @@ otbn_sim_test = rv_rule(
             executable = True,
             cfg = "exec",
         ),
+        "_otbn_insns_cache": attr.label(
+            default = "//hw/ip/otbn/util:insns_cache",
+            allow_single_file = True,
+            cfg = "exec",
+        ),
         "_otbn_data": attr.label(
             default = "//hw/ip/otbn/data:all_files",
             allow_files = True,
@@ -486,6 +502,11 @@ otbn_autogen_sim_test = rv_rule(
             executable = True,
             cfg = "exec",
         ),
+        "_otbn_insns_cache": attr.label(
+            default = "//hw/ip/otbn/util:insns_cache",
+            allow_single_file = True,
+            cfg = "exec",
+        ),
         "_otbn_data": attr.label(
             default = "//hw/ip/otbn/data:all_files",
             allow_files = True,
@@ -0,0 +1,64 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+'''Directories for the persistent caches of the generators
+
+A generator that can cache something between runs (such as compiled
+templates or validated IP blocks) keeps it in the directory returned by
+cache_dir(). Caching is opt-in: the directory is given by an environment
+variable, and if that is unset or empty, or the directory can't be written
+(as in some build sandboxes), there is no cache directory and the generator
+works without one.
+'''
+
+import logging as log
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+_cache_dirs: Dict[str, Optional[Path]] = {}
+
+
+def cache_dir(env_var: str) -> Optional[Path]:
+    '''Return the cache directory named by env_var, or None if there is none'''
+    if env_var not in _cache_dirs:
+        _cache_dirs[env_var] = _find_cache_dir(env_var)
+    return _cache_dirs[env_var]
+
+
+def _find_cache_dir(env_var: str) -> Optional[Path]:
+    env_dir = os.environ.get(env_var)
+    if not env_dir:
+        return None
+    path = Path(env_dir)
+
+    try:
+        path.mkdir(parents=True, exist_ok=True)
+    except OSError as err:
+        log.debug(f'Not using cache directory {path}: {err}')
+        return None
+    if not os.access(path, os.W_OK):
+        log.debug(f'Not using cache directory {path}: '
+                  'the directory is not writable')
+        return None
+    return path
+
+
+def write_atomically(path: Path, data: bytes) -> None:
+    '''Write data to a file in a cache directory
+
+    The file is written under a temporary name and then renamed, so that
+    other processes using the cache never see a partially written file.
+    Errors are ignored, since a cache entry that can't be written just
+    means a cache miss in a later run.
+    '''
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    try:
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+    except OSError as err:
+        log.debug(f'Could not write cache entry {path}: {err}')
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
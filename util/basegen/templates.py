@@ -0,0 +1,138 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+'''Loading of Mako templates, with a cache of compiled templates
+
+Before rendering a template, Mako compiles it to a Python module, which takes
+a while for the larger templates (more than rendering them, for small IPs).
+The generators (reggen, tlgen, ipgen and topgen) load their templates with
+template_from_file() and template_lookup() instead of constructing Mako
+Template and TemplateLookup objects directly, so that:
+
+  - A template that is loaded several times by a process is only compiled
+    once.
+
+  - If OT_MAKO_CACHE_DIR names a directory, the compiled modules are kept
+    there and shared between processes (and runs). A compiled module is
+    named after a digest of the template's contents, its path, the Mako
+    version and the options it was compiled with, so a module is never used
+    for a template that has changed since it was compiled.
+
+If OT_MAKO_CACHE_DIR is unset or empty, or the directory can't be written
+(as in some build sandboxes), templates are compiled in memory by each
+process, as Mako does by default. The cache directory can be deleted at any
+time.
+'''
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+import mako  # type: ignore
+from mako.lookup import TemplateLookup  # type: ignore
+from mako.template import Template  # type: ignore
+
+from basegen.cache import cache_dir
+
+CACHE_DIR_ENV = 'OT_MAKO_CACHE_DIR'
+
+_templates: Dict[Tuple[str, str, Tuple[Tuple[str, str], ...], int],
+                 Template] = {}
+_lookups: Dict[Tuple[Tuple[str, ...], Tuple[Tuple[str, str], ...]],
+               TemplateLookup] = {}
+
+
+def _options_key(options: Dict[str, object]) -> Tuple[Tuple[str, str], ...]:
+    '''Return a key for the compile options of a template'''
+    return tuple(sorted((name, repr(value))
+                        for name, value in options.items()
+                        if name != 'lookup'))
+
+
+def _module_filename(filename: str, uri: Optional[str],
+                     content: bytes,
+                     options: Dict[str, object]) -> Optional[str]:
+    '''Return the path of the compiled module for a template
+
+    Returns None if compiled templates are not cached, or if the template
+    can't be cached because it has options (such as a preprocessor function)
+    that can't be part of its key.
+    '''
+    directory = cache_dir(CACHE_DIR_ENV)
+    if directory is None:
+        return None
+    if any(callable(value) for name, value in options.items()
+           if name != 'lookup'):
+        return None
+
+    hasher = hashlib.sha256()
+    for part in (mako.__version__, filename, str(uri),
+                 repr(_options_key(options))):
+        hasher.update(part.encode('utf-8'))
+        hasher.update(b'\0')
+    hasher.update(content)
+    return str(directory / (hasher.hexdigest() + '.py'))
+
+
+def template_from_file(filename: Union[str, Path],
+                       **kwargs: object) -> Template:
+    '''Return a Template for the file at filename
+
+    kwargs are passed to the Template constructor. The template is compiled
+    at most once per process, and is taken from the cache directory if it
+    has been compiled before.
+    '''
+    # The template is given the path as passed in, since its uri (used to
+    # find templates that it includes) defaults to that.
+    filename = str(filename)
+    abs_filename = os.path.abspath(filename)
+    with open(filename, 'rb') as handle:
+        content = handle.read()
+
+    options_key = _options_key(kwargs)
+    key = (filename, hashlib.sha256(content).hexdigest(), options_key,
+           id(kwargs.get('lookup')))
+    template = _templates.get(key)
+    if template is None:
+        uri = kwargs.get('uri', filename)
+        assert uri is None or isinstance(uri, str)
+        module_filename = _module_filename(abs_filename, uri, content, kwargs)
+        template = Template(filename=filename,
+                            module_filename=module_filename,
+                            **kwargs)
+        _templates[key] = template
+    return template
+
+
+class _CachedModuleNames:
+    '''The modulename_callable of a TemplateLookup, see template_lookup()'''
+
+    def __init__(self, options: Dict[str, object]) -> None:
+        self.options = options
+
+    def __call__(self, filename: str, uri: str) -> Optional[str]:
+        with open(filename, 'rb') as handle:
+            content = handle.read()
+        return _module_filename(os.path.abspath(filename), uri, content,
+                                self.options)
+
+
+def template_lookup(directories: Sequence[Union[str, Path]],
+                    **kwargs: object) -> TemplateLookup:
+    '''Return a TemplateLookup for templates in directories
+
+    kwargs are passed to the TemplateLookup constructor. Lookups are shared
+    by all callers that ask for the same directories and options, and the
+    templates they find are taken from the cache directory if they have been
+    compiled before.
+    '''
+    dirs = tuple(str(d) for d in directories)
+    key = (dirs, _options_key(kwargs))
+    lookup = _lookups.get(key)
+    if lookup is None:
+        lookup = TemplateLookup(directories=list(dirs),
+                                modulename_callable=_CachedModuleNames(kwargs),
+                                **kwargs)
+        _lookups[key] = lookup
+    return lookup
@@ -0,0 +1,290 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+"""A content-addressed cache of simulation build directories."""
+
+import hashlib
+import json
+import logging as log
+import os
+import shlex
+import shutil
+import subprocess
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from utils import VERBOSE, rm_path
+
+
+class BuildCache:
+    """Build directories of passing CompileSim jobs, kept for reuse.
+
+    Each entry in the cache is a copy of a build directory, together with a
+    manifest of the source files that went into it. Entries are stored as
+
+        <root>/<key>/<entry id>/{manifest.json,build/}
+
+    The key is a hash of the build's fingerprint (its resolved command and
+    exports) and its output directory. The output directory is part of the
+    key because simulators record absolute paths in the things they build, so
+    a build directory can only be restored to where it was built.
+
+    The fusesoc-generated filelist is only written by the build itself, so it
+    can't be part of the key. Instead, the manifest records a hash of each
+    source file it lists, of the other files in its include directories and
+    of the fusesoc core files next to (or above) the sources. An entry is
+    only used if all of these still match. The entry id is a hash of the
+    manifest, so the same sources are never stored twice.
+
+    Entries are copied with "cp --reflink=auto", which is nearly free on
+    filesystems that support copy-on-write and a plain copy otherwise. They
+    are never hard-linked: incremental builds (and some simulators' runs)
+    write into the build directory in place, which would corrupt the entry.
+    """
+
+    # The name of the manifest file in each entry.
+    MANIFEST = "manifest.json"
+
+    # The name of a file in a build directory saying which entry it matches.
+    STAMP = ".dvsim_build_cache"
+
+    # Keep at most this many entries for each key, dropping the least
+    # recently used.
+    max_entries_per_key = 2
+
+    def __init__(self, root: str) -> None:
+        self.root = Path(root)
+
+        # The sha256 of each file hashed so far, with the (mtime, size) it
+        # had at the time. Most sources are shared between build modes, so
+        # this saves hashing them more than once.
+        self._file_hashes: Dict[str, Tuple[Tuple[int, int], str]] = {}
+
+    def key(self, item) -> str:
+        """The key for a CompileSim item."""
+        digest = hashlib.sha256()
+        digest.update(item.fingerprint.encode())
+        digest.update(b"\0" + str(item.odir).encode())
+        return digest.hexdigest()
+
+    def _hash_file(self, path: str) -> Optional[str]:
+        """Return the sha256 of the file at path (None if it is missing)."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        sig = (stat.st_mtime_ns, stat.st_size)
+        known = self._file_hashes.get(path)
+        if known is not None and known[0] == sig:
+            return known[1]
+
+        digest = hashlib.sha256()
+        try:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+        except OSError:
+            return None
+        self._file_hashes[path] = (sig, digest.hexdigest())
+        return digest.hexdigest()
+
+    @staticmethod
+    def _read_filelist(path: Path, seen: set) -> Tuple[List[str], List[str]]:
+        """Return the (files, include dirs) listed in a filelist.
+
+        Relative paths are taken relative to the directory containing the
+        filelist (where the build tool is run). Nested filelists ("-f") are
+        followed. Other options are ignored.
+        """
+        files, incdirs = [], []
+        if path in seen:
+            return files, incdirs
+        seen.add(path)
+
+        base = path.parent
+        with open(path, encoding="UTF-8", errors="surrogateescape") as f:
+            tokens = shlex.split(f.read(), comments=True)
+
+        idx = 0
+        while idx < len(tokens):
+            tok = tokens[idx]
+            idx += 1
+            if tok.startswith("+incdir+"):
+                incdirs += [str(base / d) for d in tok.split("+")[2:] if d]
+            elif tok in ["-f", "-F"] and idx < len(tokens):
+                sub_files, sub_incdirs = BuildCache._read_filelist(
+                    base / tokens[idx], seen)
+                files += sub_files
+                incdirs += sub_incdirs
+                idx += 1
+            elif not tok.startswith(("-", "+")):
+                files.append(str(base / tok))
+        return files, incdirs
+
+    def _get_sources(self, item) -> Optional[Dict[str, str]]:
+        """Hash the source files of a build that has just finished.
+
+        Returns a dict mapping each source file to its sha256, or None if the
+        build's filelist can't be found or read. Files in the build directory
+        are skipped: they are generated by the build and restored with it.
+        """
+        flist = getattr(item, "sv_flist", "")
+        if not flist or not os.path.isfile(flist):
+            return None
+        try:
+            files, incdirs = self._read_filelist(Path(flist), set())
+        except (OSError, ValueError) as e:
+            log.warning("Cannot read filelist %s for the build cache: %s",
+                        flist, e)
+            return None
+
+        odir = os.path.realpath(item.odir)
+        proj_root = os.path.realpath(item.proj_root)
+
+        def outside_odir(path):
+            return os.path.commonpath([odir, path]) != odir
+
+        paths = set()
+        for path in files:
+            path = os.path.realpath(path)
+            if outside_odir(path) and os.path.isfile(path):
+                paths.add(path)
+        for incdir in incdirs:
+            incdir = os.path.realpath(incdir)
+            if not outside_odir(incdir) or not os.path.isdir(incdir):
+                continue
+            for entry in os.scandir(incdir):
+                if entry.is_file():
+                    paths.add(entry.path)
+
+        # The core files that fusesoc read aren't listed anywhere, so take
+        # those in the directories of the sources and their parents (up to
+        # the project root).
+        core_dirs = set()
+        for path in list(paths):
+            parent = os.path.dirname(path)
+            while (parent not in core_dirs and parent != proj_root and
+                   os.path.commonpath([proj_root, parent]) == proj_root):
+                core_dirs.add(parent)
+                parent = os.path.dirname(parent)
+        for core_dir in core_dirs:
+            for entry in os.scandir(core_dir):
+                if entry.name.endswith(".core") and entry.is_file():
+                    paths.add(entry.path)
+
+        sources = {}
+        for path in sorted(paths):
+            file_hash = self._hash_file(path)
+            if file_hash is not None:
+                sources[path] = file_hash
+        return sources
+
+    def lookup(self, item) -> Optional[Path]:
+        """Find an entry matching item, returning its path (or None)."""
+        key_dir = self.root / self.key(item)
+        if not key_dir.is_dir():
+            return None
+
+        entries = sorted((e for e in key_dir.iterdir() if e.is_dir()),
+                         key=lambda e: e.stat().st_mtime, reverse=True)
+        for entry in entries:
+            try:
+                with open(entry / self.MANIFEST, encoding="UTF-8") as f:
+                    sources = json.load(f)["sources"]
+            except (OSError, ValueError, KeyError):
+                continue
+            if all(self._hash_file(path) == file_hash
+                   for path, file_hash in sources.items()):
+                # Mark the entry as recently used.
+                os.utime(entry)
+                return entry
+        return None
+
+    def _stamp(self, build_dir: Path) -> Optional[str]:
+        try:
+            return (build_dir / self.STAMP).read_text().strip()
+        except OSError:
+            return None
+
+    def restore_cmd(self, entry: Path, item) -> str:
+        """Prepare to restore item's build directory from entry.
+
+        This is called just before the build is launched. Returns the command
+        that the job should run instead of the build. If the build directory
+        already holds the entry, there is nothing to copy. Otherwise, it is
+        removed here and refilled by the job.
+        """
+        if self._stamp(Path(item.odir)) == entry.name:
+            return (f"echo \"[dvsim]: {item.odir} already matches build cache "
+                    f"entry {entry}\"")
+
+        rm_path(item.odir)
+        return (f"cp -a --reflink=auto {shlex.quote(str(entry / 'build'))}/. "
+                f"{shlex.quote(str(item.odir))}")
+
+    def forget(self, item) -> None:
+        """Note that item's build directory is about to be rebuilt."""
+        rm_path(Path(item.odir) / self.STAMP)
+
+    def store(self, item) -> None:
+        """Add the build directory of item, which has just passed."""
+        sources = self._get_sources(item)
+        if sources is None:
+            log.log(VERBOSE, "Not caching the build of %s: cannot find its "
+                    "filelist", item.full_name)
+            return
+
+        manifest = {
+            "name": item.full_name,
+            "fingerprint": item.fingerprint,
+            "odir": str(item.odir),
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "sources": sources,
+        }
+        entry_id = hashlib.sha256(
+            json.dumps(sources, sort_keys=True).encode()).hexdigest()
+        key_dir = self.root / self.key(item)
+        entry = key_dir / entry_id
+        odir = Path(item.odir)
+
+        if not entry.is_dir():
+            key_dir.mkdir(parents=True, exist_ok=True)
+            tmp = key_dir / f".tmp.{os.getpid()}.{entry_id}"
+            rm_path(tmp)
+            tmp.mkdir()
+            subprocess.run(["cp", "-a", "--reflink=auto", str(odir),
+                            str(tmp / "build")],
+                           check=True, stdout=subprocess.DEVNULL,
+                           stderr=subprocess.PIPE)
+
+            # Leave out the files that the launcher writes for each job, so
+            # that restoring the entry doesn't overwrite them.
+            for name in [Path(item.get_log_path()).name, "env_vars"]:
+                rm_path(tmp / "build" / name)
+            (tmp / "build" / self.STAMP).write_text(entry_id + "\n")
+            with open(tmp / self.MANIFEST, "w", encoding="UTF-8") as f:
+                json.dump(manifest, f, indent=2, sort_keys=True)
+
+            try:
+                tmp.rename(entry)
+            except OSError:
+                # Another regression stored the same entry first.
+                shutil.rmtree(tmp, ignore_errors=True)
+            else:
+                log.log(VERBOSE, "Stored the build of %s in build cache "
+                        "entry %s", item.full_name, entry)
+        else:
+            os.utime(entry)
+
+        (odir / self.STAMP).write_text(entry_id + "\n")
+        self._prune(key_dir)
+
+    def _prune(self, key_dir: Path) -> None:
+        """Drop all but the max_entries_per_key most recently used entries."""
+        entries = sorted(
+            (e for e in key_dir.iterdir()
+             if e.is_dir() and not e.name.startswith(".")),
+            key=lambda e: e.stat().st_mtime, reverse=True)
+        for entry in entries[self.max_entries_per_key:]:
+            shutil.rmtree(entry, ignore_errors=True)
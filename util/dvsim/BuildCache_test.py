@@ -0,0 +1,77 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+'''pytest-based testing for BuildCache.py'''
+
+import subprocess
+from types import SimpleNamespace
+
+from .BuildCache import BuildCache
+
+
+def _make_build(tmp_path):
+    '''Make a project with one core and the result of building it.'''
+    proj_root = tmp_path / 'proj'
+    (proj_root / 'ip' / 'rtl').mkdir(parents=True)
+    (proj_root / 'ip' / 'ip.core').write_text('core v1\n')
+    (proj_root / 'ip' / 'rtl' / 'ip.sv').write_text('module ip; endmodule\n')
+    (proj_root / 'ip' / 'rtl' / 'ip.svh').write_text('`define X 1\n')
+
+    odir = tmp_path / 'scratch' / 'default'
+    flist_dir = odir / 'fusesoc-work'
+    flist_dir.mkdir(parents=True)
+    (flist_dir / 'gen.sv').write_text('module gen; endmodule\n')
+    (flist_dir / 'ip.scr').write_text(
+        f'+define+FOO\n+incdir+{proj_root}/ip/rtl\n'
+        f'{proj_root}/ip/rtl/ip.sv\ngen.sv\n')
+    (odir / 'simv').write_text('built\n')
+    (odir / 'build.log').write_text('build log\n')
+
+    return SimpleNamespace(fingerprint='f' * 64,
+                           odir=str(odir),
+                           full_name='ip:default',
+                           proj_root=str(proj_root),
+                           sv_flist=str(flist_dir / 'ip.scr'),
+                           get_log_path=lambda: f'{odir}/build.log')
+
+
+def test_build_cache(tmp_path):
+    '''Check that a stored build is restored until its sources change.'''
+    item = _make_build(tmp_path)
+    cache = BuildCache(str(tmp_path / 'cache'))
+    assert cache.lookup(item) is None
+
+    cache.store(item)
+    entry = cache.lookup(item)
+    assert entry is not None
+    sources = (entry / BuildCache.MANIFEST).read_text()
+    for name in ['ip.core', 'ip.sv', 'ip.svh']:
+        assert name in sources
+    assert 'gen.sv' not in sources
+    assert not (entry / 'build' / 'build.log').exists()
+
+    # The build directory already holds the entry, so nothing is copied.
+    assert cache.restore_cmd(entry, item).startswith('echo ')
+
+    # Otherwise, the directory is cleared and the job copies the entry.
+    (tmp_path / 'scratch' / 'default' / BuildCache.STAMP).unlink()
+    cmd = cache.restore_cmd(entry, item)
+    assert not (tmp_path / 'scratch' / 'default').exists()
+    (tmp_path / 'scratch' / 'default').mkdir()
+    subprocess.run(cmd, shell=True, check=True)
+    assert (tmp_path / 'scratch' / 'default' / 'simv').read_text() == 'built\n'
+
+    # A change to a source, an included file or a core file means the entry
+    # no longer matches.
+    for path in ['ip/rtl/ip.sv', 'ip/rtl/ip.svh', 'ip/ip.core']:
+        src = tmp_path / 'proj' / path
+        old = src.read_text()
+        src.write_text(old + '// changed\n')
+        assert BuildCache(str(tmp_path / 'cache')).lookup(item) is None
+        src.write_text(old)
+        assert BuildCache(str(tmp_path / 'cache')).lookup(item) == entry
+
+    # A different command (or output directory) uses a different key.
+    item.fingerprint = 'e' * 64
+    assert cache.lookup(item) is None
@@ -130,6 +130,22 @@ def set_target_attribute(path, target, key, dict_val):
         target[key] += dict_val
         return
 
+    if isinstance(old_val, dict):
+        if not isinstance(dict_val, dict):
+            raise RuntimeError('{!r}: Conflicting types for key {!r}: was '
+                               '{!r}, a dict, but loaded value is {!r}, '
+                               'of type {}.'
+                               .format(path, key, old_val, dict_val,
+                                       type(dict_val).__name__))
+
+        # Dicts are merged entry by entry (on a copy, in case old_val is
+        # shared with something else).
+        merged = dict(old_val)
+        for sub_key, sub_val in dict_val.items():
+            set_target_attribute(path, merged, sub_key, sub_val)
+        target[key] = merged
+        return
+
     # The other types we support are "scalar" types.
     scalar_types = [(str, [""]), (int, [0, -1]), (bool, [False])]
     defaults = None
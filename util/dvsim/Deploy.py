@@ -2,20 +2,45 @@
 # Licensed under the Apache License, Version 2.0, see LICENSE for details.
 # SPDX-License-Identifier: Apache-2.0
 
+import hashlib
 import logging as log
+import os
 import pprint
 import random
+import re
 import shlex
+import subprocess
+import sys
 from pathlib import Path
-from typing import List
+from typing import Dict, List
 
 from JobTime import JobTime
 from LauncherFactory import get_launcher
 from sim_utils import (get_cov_summary_table, get_job_runtime,
                        get_simulated_time)
 from tabulate import tabulate
-from utils import (VERBOSE, clean_odirs, find_and_substitute_wildcards,
-                   rm_path, subst_wildcards)
+from utils import (VERBOSE, WildcardTable, clean_odirs,
+                   find_and_substitute_wildcards, rm_path, subst_wildcards)
+
+
+class _SubstCache:
+    """Substitution results shared by all the Deploy objects of a sim_cfg.
+
+    This is stored on the sim_cfg object (see Deploy._get_subst_cache), so it
+    goes away with it.
+    """
+
+    def __init__(self):
+        # WildcardTable objects for the second substitution pass of
+        # Deploy._subst_vars, keyed by ignored_subst_vars. Each wildcard in
+        # the sim_cfg is only expanded once, rather than once per attribute
+        # per job.
+        self.tables = {}
+
+        # The outputs of commands run with eval_cmd when substituting
+        # variables, keyed by command. Reseeded copies of a test usually run
+        # exactly the same commands, so each one is only run once.
+        self.eval_cmd_outputs = {}
 
 
 class Deploy():
@@ -58,6 +83,24 @@ class Deploy():
         # this current job to run
         self.needs_all_dependencies_passing = True
 
+        # Set up the job's attributes, exports, resources and command.
+        self._resolve()
+
+        # The job's fingerprint, computed when first needed.
+        self._fingerprint = None
+
+        # Launcher instance created later using create_launcher() method.
+        self.launcher = None
+
+        # Job's wall clock time (a.k.a CPU time, or runtime).
+        self.job_runtime = JobTime()
+
+    def _resolve(self):
+        """Set the job's attributes, exports, resources and command.
+
+        These are all derived from the HJson cfg and the instance attributes
+        that the constructor sets before calling this method.
+        """
         # Declare attributes that need to be extracted from the HJSon cfg.
         self._define_attrs()
 
@@ -73,15 +116,12 @@ class Deploy():
         # List of vars required to be exported to sub-shell, as a dict.
         self.exports = self._process_exports()
 
+        # The resources the job holds while it runs, as a dict.
+        self.resources = self._process_resources()
+
         # Construct the job's command.
         self.cmd = self._construct_cmd()
 
-        # Launcher instance created later using create_launcher() method.
-        self.launcher = None
-
-        # Job's wall clock time (a.k.a CPU time, or runtime).
-        self.job_runtime = JobTime()
-
     def _define_attrs(self):
         """Defines the attributes this instance needs to have.
 
@@ -169,6 +209,13 @@ class Deploy():
         self.pass_patterns = []
         self.fail_patterns = []
 
+        # The resources (such as tool licenses or GB of memory) that the job
+        # needs while it runs. These default to the '<target>_resources' dict
+        # in the HJson (for example, 'run_resources'). Build modes and tests
+        # can add to (or override) these with their own 'resources'.
+        self.resources = dict(
+            getattr(self.sim_cfg, self.target + "_resources", None) or {})
+
     def _check_attrs(self):
         """Checks if all required class attributes are set.
 
@@ -184,20 +231,40 @@ class Deploy():
                 raise AttributeError("Attribute {!r} not found for "
                                      "{!r}.".format(attr, self.name))
 
+    def _get_subst_cache(self):
+        """Get the _SubstCache for self.sim_cfg, creating it if needed."""
+        cache = getattr(self.sim_cfg, "_deploy_subst_cache", None)
+        if cache is None:
+            cache = _SubstCache()
+            self.sim_cfg._deploy_subst_cache = cache
+        return cache
+
+    def _get_sim_cfg_subst_table(self, ignored_subst_vars):
+        """Get the WildcardTable for substituting from self.sim_cfg."""
+        cache = self._get_subst_cache()
+        key = tuple(ignored_subst_vars)
+        table = cache.tables.get(key)
+        if table is None or table.mdict is not self.sim_cfg.__dict__:
+            table = WildcardTable(self.sim_cfg.__dict__, ignored_subst_vars,
+                                  False, cache.eval_cmd_outputs)
+            cache.tables[key] = table
+        return table
+
     def _subst_vars(self, ignored_subst_vars=[]):
         """Recursively search and replace substitution variables.
 
         First pass: search within self dict. We ignore errors since some
         substitutions may be available in the second pass. Second pass: search
-        the entire sim_cfg object."""
+        the entire sim_cfg object. The expansions of sim_cfg variables are
+        remembered across Deploy objects (see _get_sim_cfg_subst_table)."""
 
-        self.__dict__ = find_and_substitute_wildcards(self.__dict__,
-                                                      self.__dict__,
-                                                      ignored_subst_vars, True)
-        self.__dict__ = find_and_substitute_wildcards(self.__dict__,
-                                                      self.sim_cfg.__dict__,
-                                                      ignored_subst_vars,
-                                                      False)
+        self.__dict__ = find_and_substitute_wildcards(
+            self.__dict__, self.__dict__, ignored_subst_vars, True,
+            WildcardTable(self.__dict__, ignored_subst_vars, True,
+                          self._get_subst_cache().eval_cmd_outputs))
+        self.__dict__ = find_and_substitute_wildcards(
+            self.__dict__, self.sim_cfg.__dict__, ignored_subst_vars, False,
+            self._get_sim_cfg_subst_table(ignored_subst_vars))
 
     def _process_exports(self):
         """Convert 'exports' as a list of dicts in the HJson to a dict.
@@ -212,6 +279,26 @@ class Deploy():
 
         return {k: str(v) for item in self.exports for k, v in item.items()}
 
+    def _process_resources(self):
+        """Check the 'resources' dict and convert its amounts to numbers.
+
+        The amounts may come from substitution variables, so they can be
+        strings until this point.
+        """
+        resources = {}
+        for name, amount in self.resources.items():
+            try:
+                value = float(amount)
+                if isinstance(amount, bool) or value < 0:
+                    raise ValueError
+            except (TypeError, ValueError):
+                log.error("Resource %r needed by %r has the amount %r, which "
+                          "is not a non-negative number.", name, self.name,
+                          amount)
+                sys.exit(1)
+            resources[name] = int(value) if value.is_integer() else value
+        return resources
+
     def _construct_cmd(self):
         """Construct the command that will eventually be launched."""
 
@@ -232,40 +319,75 @@ class Deploy():
             cmd += " {}={}".format(attr, value)
         return cmd
 
+    # Stands in for the job's output directory when computing its
+    # fingerprint.
+    _FINGERPRINT_ODIR = "\0odir\0"
+
+    @property
+    def fingerprint(self) -> str:
+        """A hash that identifies what the job does.
+
+        This is computed from the final resolved 'cmd' & the exports, with the
+        job's output directory (which is unique to each job) replaced by a
+        fixed placeholder. Two jobs with the same fingerprint would behave
+        exactly the same way when deployed, so there is no point in running
+        both. The fingerprint of a job is also stable across invocations of
+        dvsim (for a given scratch area), so it can be used to track a job
+        between regressions.
+
+        The output directory is normalised out, rather than the job's 'name'
+        (which the directory is named after), because the name may also
+        appear as part of something that matters. For example, a test called
+        'foo' might run 'foo_vseq' or use a SW image called 'foo'.
+        """
+        if self._fingerprint is None:
+            # Don't replace the directory if it's just a prefix of some other
+            # name (like "default" in "default_cov").
+            odir_re = re.compile(r"{}(?![\w.-])".format(
+                re.escape(str(self.odir))))
+
+            def normalise(val):
+                if type(val) is str:
+                    return odir_re.sub(self._FINGERPRINT_ODIR, val)
+                return repr(val)
+
+            digest = hashlib.sha256()
+            digest.update(normalise(self.cmd).encode())
+            for key, val in sorted(self.exports.items()):
+                digest.update(b"\0" + key.encode() + b"=" +
+                              normalise(val).encode())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
     def is_equivalent_job(self, item):
         """Checks if job that would be dispatched with 'item' is equivalent to
         'self'.
 
         Determines if 'item' and 'self' would behave exactly the same way when
         deployed. If so, then there is no point in keeping both. The caller can
-        choose to discard 'item' and pick 'self' instead. To do so, we check
-        the final resolved 'cmd' & the exports. The 'name' field will be unique
-        to 'item' and 'self', so we take that out of the comparison.
+        choose to discard 'item' and pick 'self' instead. This compares the
+        fingerprints of the jobs. To deduplicate many jobs at once, use
+        dedup_jobs() instead, which avoids comparing every pair of jobs.
         """
         if not isinstance(item, Deploy):
             return False
 
-        # Check if the cmd field is identical.
-        item_cmd = item.cmd.replace(item.name, self.name)
-        if self.cmd != item_cmd:
-            return False
-
-        # Check if exports have identical set of keys.
-        if self.exports.keys() != item.exports.keys():
+        if self.fingerprint != item.fingerprint:
             return False
 
-        # Check if exports have identical values.
-        for key, val in self.exports.items():
-            item_val = item.exports[key]
-            if type(item_val) is str:
-                item_val = item_val.replace(item.name, self.name)
-            if val != item_val:
-                return False
-
         log.log(VERBOSE, "Deploy job \"%s\" is equivalent to \"%s\"",
                 item.name, self.name)
         return True
 
+    def copy_results_from(self, item):
+        """Take the results of an equivalent job, as if this job had run.
+
+        This is used for a job that wasn't run because 'item' has the same
+        fingerprint (see dedup_jobs).
+        """
+        self.launcher = item.launcher
+        self.job_runtime = item.job_runtime
+
     def pre_launch(self):
         """Callback to perform additional pre-launch activities.
 
@@ -329,9 +451,17 @@ class CompileSim(Deploy):
     cmds_list_vars = ["pre_build_cmds", "post_build_cmds"]
     weight = 5
 
+    # If not None, the BuildCache from which builds are restored (if they
+    # match an earlier build) and in which passing builds are stored.
+    build_cache = None
+
     def __init__(self, build_mode, sim_cfg):
         self.build_mode_obj = build_mode
         self.seed = sim_cfg.build_seed
+
+        # The build cache entry that the build directory was restored from,
+        # if any.
+        self.cache_entry = None
         super().__init__(sim_cfg)
 
     def _define_attrs(self):
@@ -374,6 +504,10 @@ class CompileSim(Deploy):
             self.output_dirs += [self.cov_db_dir]
         self.pass_patterns = self.build_pass_patterns
         self.fail_patterns = self.build_fail_patterns
+        self.resources.update(self.build_mode_obj.resources or {})
+
+        # The filelist generated by the build (used by the build cache).
+        self.sv_flist = getattr(self.sim_cfg, "sv_flist", "")
 
         if self.sim_cfg.args.build_timeout_mins is not None:
             self.build_timeout_mins = self.sim_cfg.args.build_timeout_mins
@@ -382,11 +516,39 @@ class CompileSim(Deploy):
             log.debug("Timeout for job \"%s\" is %d minutes.", self.name,
                       self.build_timeout_mins)
 
+    def _uses_build_cache(self):
+        # The coverage database is written by the build but lives outside
+        # the build directory, so coverage builds are not cached.
+        return (self.build_cache is not None and not self.dry_run and
+                not self.sim_cfg.cov)
+
     def pre_launch(self):
         # Delete old coverage database directories before building again. We
         # need to do this because the build directory is not 'renewed'.
         rm_path(self.cov_db_dir)
 
+        # If the build cache has a matching build, restore that instead of
+        # building. The job then runs the command that does the restore.
+        if self._uses_build_cache():
+            self.cache_entry = self.build_cache.lookup(self)
+            if self.cache_entry is None:
+                self.build_cache.forget(self)
+            else:
+                log.log(VERBOSE, "Restoring build %s from build cache entry %s",
+                        self.full_name, self.cache_entry)
+                self.cmd = self.build_cache.restore_cmd(self.cache_entry, self)
+                self.pass_patterns = []
+                self.fail_patterns = []
+
+    def post_finish(self, status):
+        if (status == "P" and self._uses_build_cache() and
+                self.cache_entry is None):
+            try:
+                self.build_cache.store(self)
+            except (OSError, subprocess.CalledProcessError) as e:
+                log.warning("Cannot store the build of %s in the build "
+                            "cache: %s", self.full_name, e)
+
     def get_timeout_mins(self):
         """Returns the timeout in minutes.
 
@@ -394,6 +556,17 @@ class CompileSim(Deploy):
         """
         return self.build_timeout_mins if self.build_timeout_mins is not None else 60
 
+    def extract_info_from_log(self, log_text: List):
+        """Extracts the job's runtime from the log.
+
+        A build restored from the build cache didn't run the tool, so its
+        runtime is the time dvsim measured.
+        """
+        if self.cache_entry is not None:
+            self.job_runtime.set(self.launcher.job_runtime_secs, "s")
+            return
+        super().extract_info_from_log(log_text)
+
 
 class CompileOneShot(Deploy):
     """Abstraction for building the design (used by non-DV flows)."""
@@ -443,6 +616,7 @@ class CompileOneShot(Deploy):
         self.job_name += f"_{self.build_mode}"
         self.fail_patterns = self.build_fail_patterns
         self.pass_patterns = self.build_pass_patterns
+        self.resources.update(self.build_mode_obj.resources or {})
 
         if self.sim_cfg.args.build_timeout_mins is not None:
             self.build_timeout_mins = self.sim_cfg.args.build_timeout_mins
@@ -527,6 +701,7 @@ class RunTest(Deploy):
         self.job_name += f"_{self.build_mode}"
         if self.sim_cfg.cov:
             self.output_dirs += [self.cov_db_dir]
+        self.resources.update(self.test_obj.resources or {})
 
         # In GUI mode, the log file is not updated; hence, nothing to check.
         if not self.gui:
@@ -589,6 +764,10 @@ class RunTest(Deploy):
         except RuntimeError as e:
             log.debug(f"{self.full_name}: {e}")
 
+    def copy_results_from(self, item):
+        super().copy_results_from(item)
+        self.simulated_time = item.simulated_time
+
 
 class CovUnr(Deploy):
     """Abstraction for coverage UNR flow."""
@@ -632,43 +811,89 @@ class CovUnr(Deploy):
 
 
 class CovMerge(Deploy):
-    """Abstraction for merging coverage databases."""
+    """Abstraction for merging coverage databases.
+
+    Normally, a single CovMerge job merges the coverage databases of all the
+    builds once all the tests have finished. For a hierarchical merge, the
+    CovMerge jobs form a tree instead (see SimCfg._create_cov_merge_jobs).
+    Each leaf (a job with a node_name but no children) merges the coverage of
+    a batch of tests (run_items) as soon as those tests have finished. Each
+    inner node merges the databases written by its children. The root (a job
+    with children but no node_name) merges the databases of its children into
+    the final merged database.
+    """
 
     target = "cov_merge"
     weight = 10
 
-    def __init__(self, run_items, sim_cfg):
-        # Construct the cov_db_dirs right away from the run_items. This is a
-        # special variable used in the HJson. The coverage associated with
-        # the primary build mode needs to be first in the list.
+    def __init__(self, run_items, sim_cfg, children=None, node_name=None):
+        self.children = children or []
+        self.node_name = node_name
+        self.run_items = run_items
+
+        # Construct the cov_db_dirs right away from the run_items (or the
+        # children). This is a special variable used in the HJson. The
+        # coverage associated with the primary build mode needs to be first
+        # in the list.
+        self.has_primary_build = False
         self.cov_db_dirs = []
-        for run in run_items:
-            if run.cov_db_dir not in self.cov_db_dirs:
-                if sim_cfg.primary_build_mode == run.build_mode:
-                    self.cov_db_dirs.insert(0, run.cov_db_dir)
-                else:
-                    self.cov_db_dirs.append(run.cov_db_dir)
+        if self.children:
+            self.children = sorted(self.children,
+                                   key=lambda child: not child.has_primary_build)
+            self.has_primary_build = self.children[0].has_primary_build
+            self.cov_db_dirs = [child.cov_merge_db_dir
+                                for child in self.children]
+        else:
+            for run in run_items:
+                if run.cov_db_dir not in self.cov_db_dirs:
+                    if sim_cfg.primary_build_mode == run.build_mode:
+                        self.cov_db_dirs.insert(0, run.cov_db_dir)
+                        self.has_primary_build = True
+                    else:
+                        self.cov_db_dirs.append(run.cov_db_dir)
 
         # Early lookup the cov_merge_db_dir, which is a mandatory misc
         # attribute anyway. We need it to compute additional cov db dirs.
         self.cov_merge_db_dir = subst_wildcards("{cov_merge_db_dir}",
                                                 sim_cfg.__dict__)
 
-        # Prune previous merged cov directories, keeping past 7 dbs.
-        prev_cov_db_dirs = clean_odirs(odir=self.cov_merge_db_dir, max_odirs=7)
-
-        # If the --cov-merge-previous command line switch is passed, then
-        # merge coverage with the previous runs.
-        if sim_cfg.cov_merge_previous:
-            self.cov_db_dirs += [str(item) for item in prev_cov_db_dirs]
+        # For a leaf, a file listing the tests whose coverage is merged (see
+        # pre_launch). This is a special variable used in the HJson.
+        self.cov_merge_tests_file = ""
+
+        if node_name is None:
+            # Prune previous merged cov directories, keeping past 7 dbs.
+            prev_cov_db_dirs = clean_odirs(odir=self.cov_merge_db_dir,
+                                           max_odirs=7)
+
+            # If the --cov-merge-previous command line switch is passed, then
+            # merge coverage with the previous runs.
+            if sim_cfg.cov_merge_previous:
+                self.cov_db_dirs += [str(item) for item in prev_cov_db_dirs]
+        else:
+            # Nodes other than the root write their database (named like the
+            # final one) in a directory of their own.
+            node_dir = (Path(subst_wildcards("{cov_merge_dir}",
+                                             sim_cfg.__dict__)) /
+                        "tree" / node_name)
+            self.cov_merge_db_dir = str(node_dir /
+                                        Path(self.cov_merge_db_dir).name)
+            if not self.children:
+                self.cov_merge_tests_file = str(node_dir / "tests.txt")
+        self._cov_merge_db_dir = self.cov_merge_db_dir
 
         super().__init__(sim_cfg)
-        self.dependencies += run_items
+        self.dependencies += self.children or run_items
         # Run coverage merge even if one test passes.
         self.needs_all_dependencies_passing = False
 
+    def _resolve(self):
+        super()._resolve()
+
         # Append cov_db_dirs to the list of exports.
         self.exports["cov_db_dirs"] = shlex.quote(" ".join(self.cov_db_dirs))
+        if self.cov_merge_tests_file:
+            self.exports["cov_merge_tests_file"] = self.cov_merge_tests_file
 
     def _define_attrs(self):
         super()._define_attrs()
@@ -685,13 +910,81 @@ class CovMerge(Deploy):
     def _set_attrs(self):
         super()._set_attrs()
         self.qual_name = self.target
+        if self.node_name is not None:
+            self.qual_name += "." + self.node_name
+
+            # The tool cfg refers to the final database as {cov_merge_db_dir},
+            # which was expanded when the cfg was loaded. Point this job's
+            # options and exports at its own database instead.
+            final_db_dir = self.cov_merge_db_dir
+            self.cov_merge_db_dir = self._cov_merge_db_dir
+
+            def retarget(value):
+                return value.replace(final_db_dir, self.cov_merge_db_dir)
+
+            self.cov_merge_opts = [retarget(opt) for opt in self.cov_merge_opts]
+            self.exports = [{k: retarget(v) if type(v) is str else v
+                             for k, v in item.items()}
+                            for item in self.exports]
         self.full_name = self.sim_cfg.name + ":" + self.qual_name
 
+        # A leaf only merges the tests listed in cov_merge_tests_file, which
+        # the tool's cov_merge_tests_opts tell it about.
+        if self.cov_merge_tests_file:
+            self.cov_merge_opts = (self.cov_merge_opts +
+                                   self.sim_cfg.cov_merge_tests_opts)
+
         # For merging coverage db, the precise output dir is set in the HJson.
         self.odir = self.cov_merge_db_dir
         self.input_dirs += self.cov_db_dirs
         self.output_dirs = [self.odir]
 
+    def pre_launch(self):
+        """Work out which coverage databases there are to merge.
+
+        A job with children only merges the databases that its children
+        actually wrote: a child doesn't write one if all of its tests failed
+        (or all of its own children wrote nothing).
+
+        A leaf writes the list of tests to merge. Each line is
+        "<cov_db_dir>/<test name>". Tests that failed have had their coverage
+        data deleted, so they are left out.
+        """
+        if self.dry_run:
+            return
+
+        if self.children:
+            self._skip_missing_children()
+
+        if not self.cov_merge_tests_file:
+            return
+
+        tests = [
+            "{}/{}".format(run.cov_db_dir, Path(run.cov_db_test_dir).name)
+            for run in self.run_items if os.path.isdir(run.cov_db_test_dir)
+        ]
+        tests_file = Path(self.cov_merge_tests_file)
+        tests_file.parent.mkdir(parents=True, exist_ok=True)
+        tests_file.write_text("".join(test + "\n" for test in tests))
+
+    def _skip_missing_children(self):
+        """Leave out the databases of children that didn't write one.
+
+        The cov_db_dirs are substituted into the job's options and exports,
+        so these are resolved again with the databases that remain.
+        """
+        missing = {child.cov_merge_db_dir for child in self.children
+                   if not os.path.isdir(child.cov_merge_db_dir)}
+        if not missing:
+            return
+
+        for db_dir in sorted(missing):
+            log.log(VERBOSE, "%s: Skipping %s, which was not written",
+                    self.full_name, db_dir)
+        self.cov_db_dirs = [db_dir for db_dir in self.cov_db_dirs
+                            if db_dir not in missing]
+        self._resolve()
+
 
 class CovReport(Deploy):
     """Abstraction for coverage report generation. """
@@ -777,3 +1070,33 @@ class CovAnalyze(Deploy):
         self.qual_name = self.target
         self.full_name = self.sim_cfg.name + ":" + self.qual_name
         self.input_dirs += [self.cov_merge_db_dir]
+
+
+def dedup_jobs(items: List[Deploy]) -> Dict[Deploy, Deploy]:
+    """Find the jobs in 'items' that are equivalent to an earlier one.
+
+    Returns a dict that maps each item to the first item in the list with the
+    same fingerprint (which is the item itself if there is no earlier one).
+    This takes a single pass over the items, rather than comparing them in
+    pairs.
+
+    A job that another job in 'items' depends on is never replaced, even if
+    an earlier job is equivalent to it. The fingerprint ignores the job's
+    output directory, but its dependents have that directory in their
+    commands (a test runs the build in its build_dir, for example), so they
+    would be broken if the job never ran. Such jobs must be deduplicated
+    before their dependents are created, as SimCfg does for builds.
+    """
+    depended_on = {dep for item in items for dep in item.dependencies}
+    first_by_fingerprint = {}
+    canonical = {}
+    for item in items:
+        if item in depended_on:
+            canonical[item] = item
+            continue
+        first = first_by_fingerprint.setdefault(item.fingerprint, item)
+        if first is not item:
+            log.log(VERBOSE, "Deploy job \"%s\" is equivalent to \"%s\"",
+                    item.full_name, first.full_name)
+        canonical[item] = first
+    return canonical
@@ -0,0 +1,141 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+'''pytest-based testing for jobs in Deploy.py'''
+
+from types import SimpleNamespace
+
+from .Deploy import CovMerge, Deploy, dedup_jobs
+
+
+def _job(name, odir, cmd, exports=None, dependencies=()):
+    '''Make a job with just what fingerprint and dedup_jobs look at.'''
+    job = Deploy.__new__(Deploy)
+    job.name = name
+    job.full_name = name
+    job.odir = odir
+    job.cmd = cmd
+    job.exports = exports or {}
+    job.dependencies = list(dependencies)
+    job._fingerprint = None
+    return job
+
+
+def test_fingerprint_normalises_odir():
+    a = _job('a:default', '/scratch/a/default',
+             'make build_dir=/scratch/a/default', {'ODIR': '/scratch/a/default'})
+    b = _job('b:default', '/scratch/b/default',
+             'make build_dir=/scratch/b/default', {'ODIR': '/scratch/b/default'})
+    assert a.fingerprint == b.fingerprint
+    assert a.is_equivalent_job(b)
+
+    # The output directory is only replaced as a whole path, not as the
+    # prefix of some other name.
+    c = _job('c:default', '/scratch/c/default',
+             'make build_dir=/scratch/c/default_cov')
+    d = _job('d:default', '/scratch/d/default',
+             'make build_dir=/scratch/d/default')
+    assert c.fingerprint != d.fingerprint
+
+    # Job names that appear elsewhere in the command still matter.
+    e = _job('e:foo', '/scratch/foo', 'make test=foo_vseq odir=/scratch/foo')
+    f = _job('f:bar', '/scratch/bar', 'make test=bar_vseq odir=/scratch/bar')
+    assert e.fingerprint != f.fingerprint
+
+    # So do exports.
+    g = _job('g', '/scratch/g', 'make', {'SEED': 1})
+    h = _job('h', '/scratch/h', 'make', {'SEED': 2})
+    assert g.fingerprint != h.fingerprint
+
+
+def test_dedup_jobs():
+    a = _job('a:build', '/scratch/a/build', 'make build')
+    b = _job('b:build', '/scratch/b/build', 'make build')
+    c = _job('c:other', '/scratch/c/other', 'make other')
+    canonical = dedup_jobs([a, b, c])
+    assert canonical == {a: a, b: a, c: c}
+
+
+def test_dedup_jobs_keeps_dependencies():
+    '''A job that something depends on is never dropped.'''
+    build_a = _job('a:build', '/scratch/a/build', 'make build')
+    build_b = _job('b:build', '/scratch/b/build', 'make build')
+    run_a = _job('a:test', '/scratch/a/test',
+                 'make run build_dir=/scratch/a/build',
+                 dependencies=[build_a])
+    run_b = _job('b:test', '/scratch/b/test',
+                 'make run build_dir=/scratch/b/build',
+                 dependencies=[build_b])
+    canonical = dedup_jobs([build_a, run_a, build_b, run_b])
+
+    # The builds have the same fingerprint, but each is needed by its test,
+    # which runs what is in that build's directory.
+    assert build_a.fingerprint == build_b.fingerprint
+    assert canonical[build_b] is build_b
+    assert canonical[run_b] is run_b
+    assert run_b.dependencies == [build_b]
+
+    # Jobs that nothing depends on are still deduplicated.
+    run_c = _job('c:test', '/scratch/c/test',
+                 'make run build_dir=/scratch/a/build',
+                 dependencies=[build_a])
+    canonical = dedup_jobs([build_a, run_a, run_c])
+    assert canonical[run_c] is run_a
+
+
+def _cov_cfg(scratch):
+    '''Make a cfg with just what CovMerge jobs look at.'''
+    return SimpleNamespace(
+        name='ip', flow_makefile='sim.mk', dry_run=False, exports=[],
+        build_mode='default', gui=False, scratch_path=str(scratch),
+        primary_build_mode='default', cov_merge_previous=False,
+        cov_merge_cmd='merge',
+        cov_merge_opts=[
+            "{eval_cmd} echo {cov_db_dirs} | sed -E 's/(\\S+)/-dir \\1/g'",
+            '-out {cov_merge_db_dir}'
+        ],
+        cov_merge_tests_opts=['-tests {cov_merge_tests_file}'],
+        cov_merge_dir=str(scratch / 'merge'),
+        cov_merge_db_dir=str(scratch / 'merge' / 'merged.vdb'))
+
+
+def test_cov_merge_skips_missing_children(tmp_path):
+    '''A merge leaves out children that didn't write a database.'''
+    cfg = _cov_cfg(tmp_path)
+    leaves = []
+    for idx in range(3):
+        run = SimpleNamespace(build_mode='default',
+                              cov_db_dir=str(tmp_path / 'cov{}'.format(idx)))
+        leaves.append(CovMerge([run], cfg, node_name=str(idx)))
+    root = CovMerge([], cfg, children=leaves)
+    for leaf in leaves:
+        assert '-dir ' + leaf.cov_merge_db_dir in root.cmd
+
+    # Only the first and last leaves had tests that passed.
+    (tmp_path / 'merge' / 'tree' / '0' / 'merged.vdb').mkdir(parents=True)
+    (tmp_path / 'merge' / 'tree' / '2' / 'merged.vdb').mkdir(parents=True)
+    root.pre_launch()
+
+    kept = [leaves[0].cov_merge_db_dir, leaves[2].cov_merge_db_dir]
+    assert root.cov_db_dirs == kept
+    assert root.input_dirs == kept
+    assert root.exports['cov_db_dirs'] == "'{}'".format(' '.join(kept))
+    assert ('-dir {} -dir {} -out {}'.format(*kept, root.cov_merge_db_dir)
+            in root.cmd)
+    assert leaves[1].cov_merge_db_dir not in root.cmd
+
+
+def test_subst_cache_per_cfg(tmp_path):
+    '''Substitution results are kept on the cfg they came from.'''
+    cfg_a = _cov_cfg(tmp_path / 'a')
+    cfg_b = _cov_cfg(tmp_path / 'b')
+    run = SimpleNamespace(build_mode='default', cov_db_dir='/cov')
+    CovMerge([run], cfg_a, node_name='0')
+    CovMerge([run], cfg_a, node_name='1')
+    assert len(cfg_a._deploy_subst_cache.eval_cmd_outputs) == 1
+    assert not hasattr(cfg_b, '_deploy_subst_cache')
+
+    merge_b = CovMerge([run], cfg_b, node_name='0')
+    assert cfg_b._deploy_subst_cache is not cfg_a._deploy_subst_cache
+    assert str(tmp_path / 'b' / 'merge') in merge_b.cmd
@@ -14,7 +14,10 @@ from shutil import which
 import hjson
 from results_server import NoGCPError, ResultsServer
 from CfgJson import set_target_attribute
+from Deploy import dedup_jobs
 from LauncherFactory import get_launcher_cls
+from ResultsSink import ResultsSink
+from RuntimeDb import RuntimeDb
 from Scheduler import Scheduler
 from utils import (VERBOSE, clean_odirs, find_and_substitute_wildcards,
                    md_results_to_html, mk_path, rm_path, subst_wildcards)
@@ -106,6 +109,10 @@ class FlowCfg():
         self.results_server_url = ""
         self.results_html_name = ""
 
+        # The SimResults for the jobs of this cfg, collected by a ResultsSink
+        # as they finished (None if they weren't collected).
+        self.sim_results = None
+
         # Full results in md text
         self.results_md = ""
         # Selectively sanitized md results to be published
@@ -394,7 +401,43 @@ class FlowCfg():
             log.error("Nothing to run!")
             sys.exit(1)
 
-        return Scheduler(deploy, get_launcher_cls(), self.interactive).run()
+        # Jobs from different cfgs might be equivalent. Only run the first of
+        # each group of equivalent jobs, and give its results to the others.
+        # Jobs that others depend on are never dropped (see dedup_jobs), so
+        # dependencies don't need updating.
+        canonical = dedup_jobs(deploy)
+        unique = [item for item in deploy if canonical[item] is item]
+
+        # Use the runtimes of jobs in earlier regressions to dispatch the
+        # longest jobs first and to predict how long is left.
+        runtime_db = None
+        if not self.args.no_runtime_db:
+            runtime_db = RuntimeDb.open(
+                os.path.join(self.scratch_root, RuntimeDb.FILENAME))
+
+        # Collect the results of the jobs as they finish.
+        results_sink = ResultsSink(self.cfgs, canonical)
+
+        try:
+            results = Scheduler(unique, get_launcher_cls(), self.interactive,
+                                runtime_db, results_sink).run()
+        finally:
+            if runtime_db is not None:
+                runtime_db.close()
+            results_sink.close()
+
+        for item, first in canonical.items():
+            if item is not first:
+                item.copy_results_from(first)
+                results[item] = results[first]
+
+        # Give each cfg the results collected for its jobs, in the order of
+        # the jobs (rather than the order in which they finished).
+        for cfg in self.cfgs:
+            if results_sink.num_finished.get(cfg) == len(cfg.deploy):
+                cfg.sim_results = results_sink.results[cfg]
+                cfg.sim_results.sort(cfg.deploy)
+        return results
 
     def _gen_results(self, results):
         '''
@@ -6,11 +6,12 @@ import collections
 import datetime
 import logging as log
 import os
-import re
 import sys
+import time
 from pathlib import Path
 from typing import Union
 
+from LogScanner import LogScanner
 from utils import VERBOSE, clean_odirs, mk_symlink, rm_path
 
 
@@ -53,12 +54,35 @@ class Launcher:
     # Max jobs running at one time
     max_parallel = sys.maxsize
 
+    # The capacity of each pool of resources (such as tool licenses or GB of
+    # memory) shared by the jobs this launcher runs, by name. A job is only
+    # dispatched when there is enough free in each pool for the resources it
+    # needs (see Deploy.resources).
+    resource_pools = {}
+
     # Max jobs polled at one time
     max_poll = 10000
 
     # Poll job's completion status every this many seconds
     poll_freq = 1
 
+    # If not None, a signal that dvsim receives whenever a job launched by
+    # this launcher might have finished. The scheduler wakes up and polls as
+    # soon as it sees this signal, so that freed slots are refilled at once
+    # rather than on the next poll. Launchers that can't provide such a
+    # notification (such as those that submit jobs to a remote grid) leave
+    # this as None and are just polled every poll_freq seconds.
+    completion_signal = None
+
+    # If True, launchers that scan the logs of running jobs (see
+    # _scan_running_log) kill a job as soon as one of its fail patterns
+    # appears, rather than letting it run to the end.
+    kill_on_fail = False
+
+    # Scan the log of a running job for fail patterns at most this often (in
+    # seconds).
+    log_scan_interval = 5
+
     # Points to the python virtual env area.
     pyvenv = None
 
@@ -169,6 +193,11 @@ class Launcher:
         # The actual job runtime computed by dvsim, in seconds.
         self.job_runtime_secs = 0
 
+        # The scanner for the job's log. This is created when we first look
+        # at the log (possibly while the job is still running).
+        self._log_scanner = None
+        self._next_log_scan = 0.0
+
     def _make_odir(self) -> None:
         """Create the output directory."""
         # If renew_odir flag is True - then move it.
@@ -236,6 +265,53 @@ class Launcher:
         """Terminate the job."""
         raise NotImplementedError
 
+    def _get_log_scanner(self) -> LogScanner:
+        """Return the LogScanner for this job's log, creating it if needed."""
+        if self._log_scanner is None:
+            self._log_scanner = LogScanner(
+                self.deploy.get_log_path(),
+                self.deploy.fail_patterns,
+                self.deploy.pass_patterns,
+            )
+        return self._log_scanner
+
+    def _fail_error_message(self, scanner: LogScanner) -> ErrorMessage:
+        """The ErrorMessage for a job whose log matched a fail pattern."""
+        assert scanner.failed()
+        return ErrorMessage(
+            line_number=scanner.fail_line_number,
+            message=scanner.fail_message(),
+            context=scanner.fail_context,
+        )
+
+    def _scan_running_log(self) -> Union[ErrorMessage, None]:
+        """Scan the log of a running job for fail patterns.
+
+        Scans at most once every log_scan_interval seconds (and never in a
+        dry run). Returns an ErrorMessage if a fail pattern has been seen and
+        None otherwise. This is used by launchers to kill a job early if
+        kill_on_fail is set.
+        """
+        if self.deploy.dry_run or not self.deploy.fail_patterns:
+            return None
+
+        now = time.monotonic()
+        if now < self._next_log_scan:
+            return None
+        self._next_log_scan = now + self.log_scan_interval
+
+        scanner = self._get_log_scanner()
+        try:
+            scanner.scan()
+        except OSError:
+            # The log might not exist yet. We'll find out for certain when
+            # the job finishes.
+            return None
+
+        if scanner.failed():
+            return self._fail_error_message(scanner)
+        return None
+
     def _check_status(self):
         """Determine the outcome of the job (P/F if it ran to completion).
 
@@ -243,31 +319,18 @@ class Launcher:
         "P" if the it passed, "F" otherwise. This is invoked by poll() just
         after the job finishes. err_msg is an instance of the named tuple
         ErrorMessage.
-        """
-
-        def _find_patterns(patterns, line):
-            """Helper function that returns the pattern if any of the given
-            patterns is found, else None.
-            """
-            assert patterns
-            for pattern in patterns:
-                match = re.search(rf"{pattern}", line)
-                if match:
-                    return pattern
-            return None
 
+        The log is scanned with a LogScanner. If the job's log was being
+        scanned while it ran (see _scan_running_log), this picks up where
+        that left off. The whole log is then read again for
+        extract_info_from_log().
+        """
         if self.deploy.dry_run:
             return "P", None
 
-        # Only one fail pattern needs to be seen.
-        chk_failed = bool(self.deploy.fail_patterns)
-
-        # All pass patterns need to be seen, so we replicate the list and remove
-        # patterns as we encounter them.
-        pass_patterns = self.deploy.pass_patterns.copy()
-        chk_passed = bool(pass_patterns) and (self.exit_code == 0)
-
+        scanner = self._get_log_scanner()
         try:
+            scanner.scan(final=True)
             with open(
                 self.deploy.get_log_path(),
                 encoding="UTF-8",
@@ -281,28 +344,14 @@ class Launcher:
                 context=[],
             )
 
-        # Since the log file is already opened and read to assess the job's
+        # Since the log file has already been read to assess the job's
         # status, use this opportunity to also extract other pieces of
         # information.
         self.deploy.extract_info_from_log(lines)
 
-        if chk_failed or chk_passed:
-            for cnt, line in enumerate(lines):
-                if chk_failed and _find_patterns(self.deploy.fail_patterns, line):
-                    # If failed, then nothing else to do. Just return.
-                    # Provide some extra lines for context.
-                    end = cnt + 5
-                    return "F", ErrorMessage(
-                        line_number=cnt + 1,
-                        message=line.strip(),
-                        context=lines[cnt:end],
-                    )
-
-                if chk_passed:
-                    pattern = _find_patterns(pass_patterns, line)
-                    if pattern:
-                        pass_patterns.remove(pattern)
-                        chk_passed = bool(pass_patterns)
+        # Only one fail pattern needs to be seen.
+        if self.deploy.fail_patterns and scanner.failed():
+            return "F", self._fail_error_message(scanner)
 
         # If no fail patterns were seen, but the job returned with non-zero
         # exit code for whatever reason, then show the last 10 lines of the log
@@ -313,10 +362,12 @@ class Launcher:
                 message="Job returned non-zero exit code",
                 context=lines[-10:],
             )
-        if chk_passed:
+
+        # All pass patterns need to be seen.
+        if scanner.pass_patterns:
             return "F", ErrorMessage(
                 line_number=None,
-                message=f"Some pass patterns missing: {pass_patterns}",
+                message=f"Some pass patterns missing: {scanner.pass_patterns}",
                 context=lines[-10:],
             )
         return "P", None
@@ -330,6 +381,8 @@ class Launcher:
         err_msg is an instance of the named tuple ErrorMessage.
         """
         assert status in ["P", "F", "K"]
+        if self._log_scanner is not None:
+            self._log_scanner.close()
         self._link_odir(status)
         log.debug("Item %s has completed execution: %s", self, status)
 
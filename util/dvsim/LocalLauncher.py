@@ -6,6 +6,7 @@
 import datetime
 import os
 import shlex
+import signal
 import subprocess
 from pathlib import Path
 from typing import Union
@@ -13,9 +14,31 @@ from typing import Union
 from Launcher import ErrorMessage, Launcher, LauncherBusy, LauncherError
 
 
+def _host_resource_pools():
+    """Pools for the CPUs and memory (in GB) of the local machine."""
+    pools = {}
+    cpus = os.cpu_count()
+    if cpus:
+        pools["cpus"] = cpus
+    try:
+        mem_bytes = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, OSError, ValueError):
+        mem_bytes = 0
+    if mem_bytes >= 1 << 30:
+        pools["mem_gb"] = mem_bytes // (1 << 30)
+    return pools
+
+
 class LocalLauncher(Launcher):
     """Implementation of Launcher to launch jobs in the user's local workstation."""
 
+    # Jobs are child processes, so we get a SIGCHLD when one exits (where the
+    # platform has such a thing).
+    completion_signal = getattr(signal, "SIGCHLD", None)
+
+    # Jobs share the CPUs and memory of this machine.
+    resource_pools = _host_resource_pools()
+
     def __init__(self, deploy) -> None:
         """Initialize common class members."""
         super().__init__(deploy)
@@ -129,6 +152,13 @@ class LocalLauncher(Launcher):
                 )
                 return "K"
 
+            if self.kill_on_fail:
+                err_msg = self._scan_running_log()
+                if err_msg is not None:
+                    self._kill()
+                    self._post_finish("F", err_msg)
+                    return "F"
+
             return "D"
 
         self.exit_code = self._process.returncode
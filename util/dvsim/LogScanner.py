@@ -0,0 +1,146 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+"""Incremental scanning of job logs for pass and fail patterns."""
+
+import re
+from typing import List, Optional, TextIO
+
+
+class LogScanner:
+    """Scan a job's log for pass and fail patterns as it is written.
+
+    Each call to scan() reads whatever has been appended to the log since the
+    last call, so a running job's log can be scanned a bit at a time and the
+    whole log is never held in memory. Every line is first checked against a
+    single precompiled alternation of all the patterns. Only lines that match
+    that are checked against the individual patterns, to find out which ones
+    matched.
+
+    The results are the same as checking each line in turn: the first line
+    matching any fail pattern is the failure (with the following few lines as
+    context), and each pass pattern is ticked off by the first line that
+    matches it.
+    """
+
+    # The number of lines of context (including the failing line itself)
+    # reported with a fail pattern match.
+    fail_context_len = 5
+
+    def __init__(self, log_path: str, fail_patterns: List[str],
+                 pass_patterns: List[str]) -> None:
+        self.log_path = log_path
+        self._fail_res = [re.compile(p) for p in fail_patterns]
+
+        # The pass patterns that haven't been seen yet, in order.
+        self.pass_patterns = list(pass_patterns)
+        self._pass_res = {p: re.compile(p) for p in pass_patterns}
+
+        # A regex that matches any line matching at least one pattern. If the
+        # patterns can't be joined, this is None and every line is checked
+        # against each pattern. That is the case if one of them starts with a
+        # global flag like "(?i)", or if one of them has groups: these would
+        # be renumbered in the joined regex, so a backreference like "\1"
+        # could refer to a group of some other pattern.
+        self._any_re = None
+        all_patterns = fail_patterns + pass_patterns
+        if all_patterns and not any(
+                regex.groups for regex in self._fail_res + list(self._pass_res.values())):
+            try:
+                self._any_re = re.compile("|".join(f"(?:{p})" for p in all_patterns))
+            except re.error:
+                pass
+
+        # The number of complete lines seen so far.
+        self.line_count = 0
+
+        # If a fail pattern has been seen, the number of the first line that
+        # matched one (counting from 1), together with that line and the
+        # lines after it (up to fail_context_len of them).
+        self.fail_line_number = None
+        self.fail_context = []
+
+        self._handle = None
+        self._partial = ""
+
+        # True once the final scan has been done (see scan).
+        self._done = False
+
+    def failed(self) -> bool:
+        """Return true if a fail pattern has been seen."""
+        return self.fail_line_number is not None
+
+    def _open(self) -> TextIO:
+        if self._handle is None:
+            self._handle = open(
+                self.log_path,
+                encoding="UTF-8",
+                errors="surrogateescape",
+            )
+        return self._handle
+
+    def scan(self, final: bool = False) -> None:
+        """Scan anything added to the log since the last call.
+
+        A partial line at the end of the log is only scanned if final is true
+        (otherwise, we wait for the rest of it). When final is true, the log
+        is also closed and any later calls do nothing.
+
+        Raises OSError if the log can't be opened or read.
+        """
+        if self._done:
+            return
+
+        handle = self._open()
+        try:
+            while True:
+                chunk = handle.read(1 << 20)
+                if not chunk:
+                    break
+                lines = (self._partial + chunk).split("\n")
+                self._partial = lines.pop()
+                for line in lines:
+                    self._take_line(line + "\n")
+
+            if final and self._partial:
+                self._take_line(self._partial)
+                self._partial = ""
+        finally:
+            if final:
+                self._done = True
+                self.close()
+
+    def close(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def _take_line(self, line: str) -> None:
+        self.line_count += 1
+
+        if self.failed():
+            # Collect context for the failure. There's no need to look at
+            # patterns any more.
+            if len(self.fail_context) < self.fail_context_len:
+                self.fail_context.append(line)
+            return
+
+        if self._any_re is not None and not self._any_re.search(line):
+            return
+
+        for fail_re in self._fail_res:
+            if fail_re.search(line):
+                self.fail_line_number = self.line_count
+                self.fail_context = [line]
+                return
+
+        for pattern in self.pass_patterns:
+            if self._pass_res[pattern].search(line):
+                self.pass_patterns.remove(pattern)
+                break
+
+    def fail_message(self) -> Optional[str]:
+        """The (stripped) line that matched a fail pattern, if any."""
+        if not self.failed():
+            return None
+        return self.fail_context[0].strip()
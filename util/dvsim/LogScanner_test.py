@@ -0,0 +1,63 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+'''pytest-based testing for LogScanner.py'''
+
+from .LogScanner import LogScanner
+
+
+def test_log_scanner(tmp_path):
+    '''Check that scanning a log in pieces gives the expected results.'''
+    log_path = tmp_path / 'run.log'
+    log_path.write_text('start\nTEST PASSED\n')
+
+    scanner = LogScanner(str(log_path), [r'^UVM_ERROR'], [r'PASSED', r'^done'])
+    scanner.scan()
+    assert not scanner.failed()
+    assert scanner.pass_patterns == [r'^done']
+
+    # A partial line is only seen when it is completed (or at the end).
+    with open(log_path, 'a') as handle:
+        handle.write('UVM_ERR')
+    scanner.scan()
+    assert not scanner.failed()
+    assert scanner.line_count == 2
+
+    with open(log_path, 'a') as handle:
+        handle.write('OR @ 10: bad\n')
+        handle.write(''.join(f'line {i}\n' for i in range(10)))
+        handle.write('done')
+    scanner.scan(final=True)
+
+    assert scanner.failed()
+    assert scanner.fail_line_number == 3
+    assert scanner.fail_message() == 'UVM_ERROR @ 10: bad'
+    assert scanner.fail_context == ['UVM_ERROR @ 10: bad\n', 'line 0\n',
+                                    'line 1\n', 'line 2\n', 'line 3\n']
+    assert scanner.line_count == 14
+
+
+def test_log_scanner_flags(tmp_path):
+    '''Patterns that can't be combined are still checked one at a time.'''
+    log_path = tmp_path / 'run.log'
+    log_path.write_text('Error: oops\n')
+
+    scanner = LogScanner(str(log_path), [r'(?i)^error'], [])
+    scanner.scan(final=True)
+    assert scanner.failed()
+    assert scanner.fail_line_number == 1
+
+
+def test_log_scanner_groups(tmp_path):
+    '''Backreferences still refer to the groups of their own pattern.'''
+    log_path = tmp_path / 'run.log'
+    log_path.write_text('got 1 expected 2\ngot 3 expected 3\n')
+
+    # Joined with the fail pattern, "\1" in the pass pattern would refer to
+    # the fail pattern's group.
+    scanner = LogScanner(str(log_path), [r'^(UVM_ERROR|UVM_FATAL)'],
+                         [r'got (\d+) expected \1'])
+    scanner.scan(final=True)
+    assert not scanner.failed()
+    assert scanner.pass_patterns == []
@@ -0,0 +1,85 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+"""Pools of resources (licenses, memory, CPUs) shared by running jobs."""
+
+import logging as log
+from typing import Dict, Iterable, Set, Tuple
+
+# The amount of each resource needed by a job or held in a pool, by name.
+Resources = Dict[str, float]
+
+
+def parse_pool(spec: str) -> Tuple[str, float]:
+    """Parse a pool given as "NAME=AMOUNT".
+
+    Raises ValueError if spec isn't of that form or the amount isn't a
+    positive number.
+    """
+    name, sep, amount = spec.partition("=")
+    name = name.strip()
+    if not sep or not name:
+        raise ValueError(f"{spec!r} is not of the form NAME=AMOUNT")
+    value = float(amount)
+    if not value > 0:
+        raise ValueError(f"the amount of {name!r} must be positive")
+    return name, int(value) if value.is_integer() else value
+
+
+class ResourcePools:
+    """Track how much of each resource pool is held by running jobs.
+
+    Each pool has a name and a capacity. A job declares how much of each
+    resource it needs (see Deploy.resources) and can only start when that
+    much is free in every pool it uses. Resources that a job needs but that
+    have no pool are not limited. A job that needs more than the whole of a
+    pool is allowed to run on its own in that pool, rather than never
+    running at all.
+    """
+
+    def __init__(self, capacities: Resources) -> None:
+        self.capacities = dict(capacities)
+        self.used = {name: 0 for name in self.capacities}
+
+        # The names of resources that jobs have asked for that have no pool
+        # (so that we only say so once for each).
+        self._unpooled: Set[str] = set()
+
+    def __bool__(self) -> bool:
+        return bool(self.capacities)
+
+    def _pooled(self, needs: Resources) -> Iterable[Tuple[str, float]]:
+        """The (name, amount) pairs of needs that are limited by a pool."""
+        for name, amount in needs.items():
+            if name in self.capacities:
+                if amount:
+                    yield name, amount
+            elif name not in self._unpooled:
+                self._unpooled.add(name)
+                log.warning("Jobs need resource %r, but there is no pool for "
+                            "it, so it won't limit how many jobs run.", name)
+
+    def blockers(self, needs: Resources) -> Set[str]:
+        """The names of the pools that don't have enough free for needs."""
+        return {name for name, amount in self._pooled(needs)
+                if self.used[name] and
+                self.used[name] + amount > self.capacities[name]}
+
+    def uses(self, needs: Resources) -> Set[str]:
+        """The names of the pools that needs takes something from."""
+        return {name for name, _ in self._pooled(needs)}
+
+    def acquire(self, needs: Resources) -> None:
+        """Take needs from the pools (which must have no blockers)."""
+        for name, amount in self._pooled(needs):
+            self.used[name] += amount
+
+    def release(self, needs: Resources) -> None:
+        """Give back needs, which were taken with acquire()."""
+        for name, amount in self._pooled(needs):
+            self.used[name] -= amount
+
+    def status(self) -> str:
+        """A message showing how much of each pool is in use."""
+        return ", ".join(f"{name}: {self.used[name]:g}/{capacity:g}"
+                         for name, capacity in sorted(self.capacities.items()))
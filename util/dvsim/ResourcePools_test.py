@@ -0,0 +1,43 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+'''pytest-based testing for ResourcePools.py'''
+
+import pytest
+
+from .ResourcePools import ResourcePools, parse_pool
+
+
+def test_parse_pool():
+    assert parse_pool('license_xcelium=4') == ('license_xcelium', 4)
+    assert parse_pool('mem_gb = 1.5') == ('mem_gb', 1.5)
+    for bad in ['mem_gb', '=4', 'mem_gb=0', 'mem_gb=lots']:
+        with pytest.raises(ValueError):
+            parse_pool(bad)
+
+
+def test_resource_pools():
+    pools = ResourcePools({'lic': 2, 'mem_gb': 32})
+    small = {'lic': 1, 'mem_gb': 8}
+    big = {'mem_gb': 64}
+
+    # A job that needs more than the whole pool can run on its own.
+    assert not pools.blockers(big)
+    pools.acquire(big)
+    assert pools.blockers(small) == {'mem_gb'}
+    pools.release(big)
+
+    pools.acquire(small)
+    pools.acquire(small)
+    assert pools.status() == 'lic: 2/2, mem_gb: 16/32'
+    assert pools.blockers(small) == {'lic'}
+    assert pools.blockers({'mem_gb': 16}) == set()
+    assert pools.blockers(big) == {'mem_gb'}
+
+    # Resources without a pool are not limited.
+    assert pools.uses({'cpus': 100, 'lic': 0}) == set()
+    assert pools.uses(small) == {'lic', 'mem_gb'}
+
+    pools.release(small)
+    assert not pools.blockers(small)
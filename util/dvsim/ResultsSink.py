@@ -0,0 +1,148 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+"""Results of jobs, collected as the jobs finish."""
+
+import json
+import logging as log
+import os
+import time
+
+from SimResults import SimResults
+from utils import VERBOSE, mk_path, rm_path
+
+
+class ResultsSink:
+    """Collect the result of each job as soon as it finishes.
+
+    Each finished job is appended to a JSON lines file in the scratch path of
+    its cfg (see FILENAME), so the results of a regression are on disk while
+    it runs. Each job is also added to a SimResults for its cfg, which keeps
+    the table of test results and the failure buckets up to date. The final
+    reports are generated from these, so collating the results (bucketing
+    failures, in particular) is done as the jobs finish rather than all at
+    the end.
+
+    Every report_interval seconds, each cfg that can do so (by having a
+    gen_partial_results method) writes a partial report of the results so far
+    to PARTIAL_REPORT in its scratch path. This is removed by close().
+    """
+
+    # The name of the file in each cfg's scratch path holding the results.
+    FILENAME = "results.jsonl"
+
+    # The name of the file in each cfg's scratch path holding the partial
+    # report.
+    PARTIAL_REPORT = "report.partial.md"
+
+    # How often to write partial reports, in seconds.
+    report_interval = 60
+
+    def __init__(self, cfgs, canonical) -> None:
+        """Start collecting results for the jobs of cfgs.
+
+        canonical maps each job to the one that is actually run in its place
+        (see dedup_jobs). A job that isn't run is given the results of its
+        canonical job as soon as that finishes.
+        """
+        self._duplicates = {}
+        for item, first in canonical.items():
+            if item is not first:
+                self._duplicates.setdefault(first, []).append(item)
+
+        self.results = {cfg: SimResults() for cfg in cfgs}
+        self.num_finished = {cfg: 0 for cfg in cfgs}
+
+        self._files = {}
+        for cfg in cfgs:
+            path = os.path.join(cfg.scratch_path, self.FILENAME)
+            try:
+                mk_path(cfg.scratch_path)
+                self._files[cfg] = open(path, "w", encoding="UTF-8")
+            except OSError as err:
+                log.warning("Cannot write results to %s: %s", path, err)
+
+        self._changed = set()
+        self._last_report = time.monotonic()
+
+    def add(self, item, status) -> None:
+        """Record the status of item, which has just finished."""
+        for job in [item] + self._duplicates.get(item, []):
+            if job is not item:
+                job.copy_results_from(item)
+            self._record(job, status)
+
+        if time.monotonic() - self._last_report >= self.report_interval:
+            self._write_partial_reports()
+
+    def _record(self, item, status) -> None:
+        cfg = item.sim_cfg
+        if cfg not in self.results:
+            self.results[cfg] = SimResults()
+            self.num_finished[cfg] = 0
+        bucket = self.results[cfg].add_item(item, status)
+        self.num_finished[cfg] += 1
+        self._changed.add(cfg)
+
+        handle = self._files.get(cfg)
+        if handle is None:
+            return
+        try:
+            handle.write(json.dumps(self._to_dict(item, status, bucket)) +
+                         "\n")
+            handle.flush()
+        except OSError as err:
+            log.warning("Cannot write results to %s: %s. Not writing any "
+                        "more.", handle.name, err)
+            handle.close()
+            del self._files[cfg]
+
+    @staticmethod
+    def _to_dict(item, status, bucket) -> dict:
+        """The record in the JSON lines file for an item."""
+        record = {
+            "name": item.full_name,
+            "target": item.target,
+            "status": status,
+            "fingerprint": item.fingerprint,
+            "job_runtime_s": item.job_runtime.with_unit("s").get()[0],
+        }
+        if item.target == "run":
+            record["test"] = item.name
+            record["seed"] = str(item.seed)
+            record["simulated_time_us"] = (
+                item.simulated_time.with_unit("us").get()[0])
+        if bucket is not None:
+            fail_msg = item.launcher.fail_msg
+            record["failure"] = {
+                "bucket": bucket,
+                "log_file_path": item.get_log_path(),
+                "log_file_line_num": fail_msg.line_number,
+                "text": "".join(fail_msg.context),
+            }
+        return record
+
+    def _write_partial_reports(self) -> None:
+        for cfg in self._changed:
+            if not hasattr(cfg, "gen_partial_results"):
+                continue
+            path = os.path.join(cfg.scratch_path, self.PARTIAL_REPORT)
+            try:
+                with open(path, "w", encoding="UTF-8") as f:
+                    f.write(cfg.gen_partial_results(self.results[cfg],
+                                                    self.num_finished[cfg]))
+            except OSError as err:
+                log.warning("Cannot write partial report %s: %s", path, err)
+            else:
+                log.log(VERBOSE, "[partial report]: [%s] [%s]", cfg.name, path)
+
+        self._changed.clear()
+        self._last_report = time.monotonic()
+
+    def close(self) -> None:
+        """Close the results files and remove any partial reports."""
+        for handle in self._files.values():
+            handle.close()
+        self._files = {}
+        for cfg in self.results:
+            rm_path(os.path.join(cfg.scratch_path, self.PARTIAL_REPORT))
@@ -0,0 +1,78 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+'''pytest-based testing for ResultsSink.py'''
+
+import json
+from types import SimpleNamespace
+
+from .JobTime import JobTime
+from .ResultsSink import ResultsSink
+from .SimResults import SimResults
+
+
+class _Obj(SimpleNamespace):
+    # Jobs and cfgs are compared by identity.
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+
+
+def _run(cfg, name, seed, message=None):
+    fail_msg = SimpleNamespace(message=message, line_number=3,
+                               context=['Error: ' + str(message) + '\n'])
+    item = _Obj(name=name,
+                full_name=f'{cfg.name}:{name}.{seed}',
+                target='run',
+                seed=seed,
+                sim_cfg=cfg,
+                fingerprint=f'{name}{seed}',
+                job_runtime=JobTime(seed, 's'),
+                simulated_time=JobTime(seed, 'us'),
+                launcher=SimpleNamespace(fail_msg=fail_msg),
+                get_log_path=lambda: f'{name}.{seed}.log')
+
+    def copy_results_from(other):
+        item.job_runtime = other.job_runtime
+        item.simulated_time = other.simulated_time
+        item.launcher.fail_msg = other.launcher.fail_msg
+
+    item.copy_results_from = copy_results_from
+    return item
+
+
+def test_results_sink(tmp_path):
+    cfg = _Obj(name='uart', scratch_path=str(tmp_path))
+    items = [_run(cfg, 'smoke', 1),
+             _run(cfg, 'smoke', 2, 'bad value 0x12'),
+             _run(cfg, 'intr', 3),
+             _run(cfg, 'smoke', 1)]
+    statuses = {items[0]: 'P', items[1]: 'F', items[2]: 'P', items[3]: 'P'}
+
+    # The last item is a duplicate of the first, so it is never run.
+    canonical = {item: item for item in items}
+    canonical[items[3]] = items[0]
+    sink = ResultsSink([cfg], canonical)
+    for item in [items[2], items[1], items[0]]:
+        sink.add(item, statuses[item])
+    sink.close()
+
+    assert sink.num_finished[cfg] == 4
+    records = [json.loads(line)
+               for line in (tmp_path / ResultsSink.FILENAME).open()]
+    assert [r['name'] for r in records] == [
+        'uart:intr.3', 'uart:smoke.2', 'uart:smoke.1', 'uart:smoke.1']
+    assert records[0]['job_runtime_s'] == 3
+    assert 'failure' not in records[0]
+    assert records[1]['failure'] == {'bucket': 'bad value *',
+                                     'log_file_path': 'smoke.2.log',
+                                     'log_file_line_num': 3,
+                                     'text': 'Error: bad value 0x12\n'}
+
+    # Once sorted, the collected results match those made in one go.
+    results = sink.results[cfg]
+    results.sort(items)
+    expected = SimResults(items, statuses)
+    assert ([(r.name, r.passing, r.total) for r in results.table] ==
+            [(r.name, r.passing, r.total) for r in expected.table])
+    assert results.buckets == expected.buckets
@@ -0,0 +1,141 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+"""A database of how long jobs took in earlier regressions."""
+
+import logging as log
+import sqlite3
+import time
+from typing import Dict, Optional, Tuple
+
+# A key for a job in the database: (cfg name, target, job name). For tests,
+# the job name is the name of the test, so all seeds share an entry.
+JobKey = Tuple[str, str, str]
+
+
+class RuntimeDb:
+    """Runtime statistics for jobs, stored in an SQLite database.
+
+    The database is normally kept in the scratch root, so it is shared between
+    the regressions that use it (including ones that run at the same time).
+    For each job, it stores how many runs have been recorded and the mean,
+    maximum and last runtime, in seconds. The mean is a running mean over at
+    most the last mean_window runs, so that it follows changes in a test.
+
+    All the statistics are read when the database is opened. Runtimes recorded
+    with record() are written straight away, but are only committed every
+    commit_interval seconds (and on close).
+    """
+
+    # The name of the database file in the scratch root.
+    FILENAME = "dvsim_runtimes.db"
+
+    # The maximum number of runs averaged over by the mean runtime.
+    mean_window = 20
+
+    # How often to commit new runtimes to the database, in seconds.
+    commit_interval = 30
+
+    def __init__(self, path: str) -> None:
+        """Open (and create, if necessary) the database at path.
+
+        Raises sqlite3.Error if this fails.
+        """
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=60)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS runtimes ("
+            "cfg TEXT NOT NULL, "
+            "target TEXT NOT NULL, "
+            "name TEXT NOT NULL, "
+            "runs INTEGER NOT NULL, "
+            "mean_secs REAL NOT NULL, "
+            "max_secs REAL NOT NULL, "
+            "last_secs REAL NOT NULL, "
+            "PRIMARY KEY (cfg, target, name))")
+        self._conn.commit()
+
+        # The number of runs and mean runtime of each job in the database.
+        self._stats: Dict[JobKey, Tuple[int, float]] = {}
+        for cfg, target, name, runs, mean_secs in self._conn.execute(
+                "SELECT cfg, target, name, runs, mean_secs FROM runtimes"):
+            self._stats[(cfg, target, name)] = (runs, mean_secs)
+
+        self._last_commit = time.monotonic()
+
+    @staticmethod
+    def open(path: str) -> Optional["RuntimeDb"]:
+        """Open the database at path, returning None if that fails.
+
+        A missing runtime database shouldn't stop a regression, so a failure
+        is just logged as a warning.
+        """
+        try:
+            return RuntimeDb(path)
+        except sqlite3.Error as err:
+            log.warning("Cannot open runtime database %s: %s", path, err)
+            return None
+
+    @staticmethod
+    def job_key(item) -> JobKey:
+        """The key for a Deploy item in the database."""
+        return (item.sim_cfg.name, item.target, item.name)
+
+    def estimate(self, item) -> Optional[float]:
+        """Predict the runtime of item in seconds (None if it is unknown)."""
+        stats = self._stats.get(self.job_key(item))
+        return None if stats is None else stats[1]
+
+    def record(self, item) -> None:
+        """Record the runtime of item, which has just passed.
+
+        The runtime is read from the item's job_runtime. Nothing is recorded
+        for dry runs or for builds that were restored from the build cache.
+        """
+        if (self._conn is None or getattr(item, "dry_run", False) or
+                getattr(item, "cache_entry", None) is not None):
+            return
+
+        secs = item.job_runtime.with_unit("s").get()[0]
+        key = self.job_key(item)
+        try:
+            self._conn.execute(
+                "INSERT INTO runtimes VALUES (?, ?, ?, 1, ?, ?, ?) "
+                "ON CONFLICT (cfg, target, name) DO UPDATE SET "
+                "runs = runs + 1, "
+                "mean_secs = mean_secs + "
+                "(excluded.last_secs - mean_secs) / MIN(runs + 1, ?), "
+                "max_secs = MAX(max_secs, excluded.max_secs), "
+                "last_secs = excluded.last_secs",
+                key + (secs, secs, secs, self.mean_window))
+            self._maybe_commit()
+        except sqlite3.Error as err:
+            log.warning("Cannot update runtime database %s: %s. Not "
+                        "recording any more runtimes.", self.path, err)
+            self.close()
+            return
+
+        # Update our copy of the statistics in the same way (ignoring
+        # anything recorded by other regressions since we opened the
+        # database).
+        runs, mean_secs = self._stats.get(key, (0, 0.0))
+        mean_secs += (secs - mean_secs) / min(runs + 1, self.mean_window)
+        self._stats[key] = (runs + 1, mean_secs)
+
+    def _maybe_commit(self) -> None:
+        now = time.monotonic()
+        if now - self._last_commit >= self.commit_interval:
+            self._conn.commit()
+            self._last_commit = now
+
+    def close(self) -> None:
+        """Commit any new runtimes and close the database."""
+        if self._conn is None:
+            return
+        try:
+            self._conn.commit()
+        except sqlite3.Error as err:
+            log.warning("Cannot update runtime database %s: %s",
+                        self.path, err)
+        self._conn.close()
+        self._conn = None
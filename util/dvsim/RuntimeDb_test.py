@@ -0,0 +1,45 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+'''pytest-based testing for RuntimeDb.py'''
+
+from types import SimpleNamespace
+
+from .JobTime import JobTime
+from .RuntimeDb import RuntimeDb
+
+
+def _job(name, secs, dry_run=False):
+    return SimpleNamespace(name=name,
+                           target='run',
+                           sim_cfg=SimpleNamespace(name='uart'),
+                           job_runtime=JobTime(secs, 's'),
+                           dry_run=dry_run)
+
+
+def test_runtime_db(tmp_path):
+    '''Check that runtimes are averaged and persist across regressions.'''
+    path = str(tmp_path / RuntimeDb.FILENAME)
+
+    db = RuntimeDb(path)
+    assert db.estimate(_job('uart_smoke', 0)) is None
+    db.record(_job('uart_smoke', 10))
+    db.record(_job('uart_smoke', 20))
+    db.record(_job('uart_smoke', 1000, dry_run=True))
+    assert db.estimate(_job('uart_smoke', 0)) == 15
+    db.close()
+
+    db = RuntimeDb(path)
+    assert db.estimate(_job('uart_smoke', 0)) == 15
+    assert db.estimate(_job('uart_intr', 0)) is None
+
+    # The mean only covers (roughly) the last mean_window runs.
+    for _ in range(10 * RuntimeDb.mean_window):
+        db.record(_job('uart_smoke', 100))
+    assert abs(db.estimate(_job('uart_smoke', 0)) - 100) < 1
+    db.close()
+
+    db = RuntimeDb(path)
+    assert abs(db.estimate(_job('uart_smoke', 0)) - 100) < 1
+    db.close()
@@ -3,10 +3,14 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import logging as log
+import os
+import select
 import threading
-from signal import SIGINT, SIGTERM, signal
+import time
+from signal import SIGINT, SIGTERM, set_wakeup_fd, signal
 
 from Launcher import LauncherBusy, LauncherError
+from ResourcePools import ResourcePools
 from StatusPrinter import get_status_printer
 from Timer import Timer
 from utils import VERBOSE
@@ -46,11 +50,34 @@ def get_next_item(arr, index):
     return item, index
 
 
+def format_hms(secs):
+    """Format a time in seconds as hh:mm:ss."""
+    secs = int(secs + 0.5)
+    return f"{secs // 3600:02}:{secs // 60 % 60:02}:{secs % 60:02}"
+
+
 class Scheduler:
-    """An object that runs one or more Deploy items."""
+    """An object that runs one or more Deploy items.
+
+    If runtime_db is not None, it is a RuntimeDb with the runtimes of earlier
+    jobs. Each target's queued jobs are then dispatched longest first (using
+    the predicted runtimes) and the status shows a predicted time until each
+    target is done. The runtimes of jobs that pass are recorded in the
+    database.
+
+    If the launcher has resource pools (see Launcher.resource_pools), a job is
+    only dispatched when each pool has enough free for the resources that the
+    job needs, and the status shows how much of each pool is in use.
+
+    If results_sink is not None, it is a ResultsSink, which is given the
+    status of each item as soon as the item finishes (or is cancelled).
+    """
 
-    def __init__(self, items, launcher_cls, interactive):
+    def __init__(self, items, launcher_cls, interactive, runtime_db=None,
+                 results_sink=None):
         self.items = items
+        self.runtime_db = runtime_db
+        self.results_sink = results_sink
 
         # 'scheduled[target][cfg]' is a list of Deploy objects for the chosen
         # target and cfg. As items in _scheduled are ready to be run (once
@@ -63,15 +90,19 @@ class Scheduler:
 
         # Print status periodically using an external status printer.
         self.status_printer = get_status_printer(interactive)
-        self.status_printer.print_header(
-            msg="Q: queued, D: dispatched, P: passed, F: failed, K: killed, T: total",
-        )
+        legend = "Q: queued, D: dispatched, P: passed, F: failed, K: killed, T: total"
+        if runtime_db is not None:
+            legend += ", ETA: predicted time left"
+        self.status_printer.print_header(msg=legend)
 
         # Sets of items, split up by their current state. The sets are
         # disjoint and their union equals the keys of self.item_to_status.
         # _queued is a list so that we dispatch things in order (relevant
         # for things like tests where we have ordered things cleverly to
-        # try to see failures early). They are maintained for each target.
+        # try to see failures early). If we have a runtime database, each
+        # target's _queued list is instead kept sorted with the longest jobs
+        # first, which cuts the tail of long jobs that start late. They are
+        # maintained for each target.
 
         # The list of available targets and the list of running items in each
         # target are polled in a circular fashion, looping back to the start.
@@ -106,6 +137,21 @@ class Scheduler:
             msg = self.msg_fmt.format(0, 0, 0, 0, 0, self._total[target])
             self.status_printer.init_target(target=target, msg=msg)
 
+        # Predicted runtimes, from the runtime database. _estimates maps each
+        # item with a known runtime to that runtime in seconds. _pending maps
+        # each item that hasn't yet been dispatched (or cancelled) to its
+        # predicted runtime, using the mean of the known runtimes in its
+        # target if it has none of its own. _pending_secs[target] is the sum
+        # of those predictions in the target (None if we can't predict
+        # anything in the target). _dispatch_time maps each running item to
+        # the time it was dispatched.
+        self._estimates = {}
+        self._pending = {}
+        self._pending_secs = {}
+        self._dispatch_time = {}
+        if runtime_db is not None:
+            self._init_estimates()
+
         # A map from the Deploy objects tracked by this class to their
         # current status. This status is 'Q', 'D', 'P', 'F' or 'K',
         # corresponding to membership in the dicts above. This is not
@@ -120,6 +166,18 @@ class Scheduler:
         # variant-specific settings such as max parallel jobs & poll rate.
         self.launcher_cls = launcher_cls
 
+        # The launcher's resource pools (leaving out any that no item needs)
+        # and the resources taken from them by each running item.
+        needed = {name for item in items for name in item.resources}
+        self._pools = ResourcePools({
+            name: capacity
+            for name, capacity in launcher_cls.resource_pools.items()
+            if name in needed
+        })
+        self._held = {}
+        if self._pools:
+            self.status_printer.init_pools(msg=self._pools.status())
+
     def run(self):
         """Run all scheduled jobs and return the results.
 
@@ -132,6 +190,16 @@ class Scheduler:
         stop_now = threading.Event()
         old_handler = None
 
+        # A pipe that wakes the polling loop early. Python writes a byte to
+        # wake_w whenever a signal arrives that has a Python handler (see
+        # set_wakeup_fd). That covers the SIGINT / SIGTERM handler below and
+        # the launcher's completion signal, if any. We can't use an Event
+        # for this: setting it from a signal handler can deadlock if the
+        # signal arrives while the main loop is waiting on it.
+        wake_r, wake_w = os.pipe()
+        os.set_blocking(wake_r, False)
+        os.set_blocking(wake_w, False)
+
         def on_signal(signal_received, frame):
             log.info(
                 "Received signal %s. Exiting gracefully.",
@@ -155,6 +223,21 @@ class Scheduler:
         # Install the SIGTERM handler before scheduling jobs.
         signal(SIGTERM, on_signal)
 
+        # If the launcher can tell us when a job finishes, listen for that so
+        # that we can reap the job and refill its slot straight away. The
+        # handler itself has nothing to do: the byte written to wake_w is
+        # what wakes us up.
+        completion_signal = self.launcher_cls.completion_signal
+        old_completion_handler = None
+        if completion_signal is not None:
+
+            def on_completion(signal_received, frame):
+                pass
+
+            old_completion_handler = signal(completion_signal, on_completion)
+
+        old_wakeup_fd = set_wakeup_fd(wake_w)
+
         # Enqueue all items of the first target.
         self._enqueue_successors(None)
 
@@ -171,14 +254,29 @@ class Scheduler:
                     if self._check_if_done(hms):
                         break
 
+                if stop_now.is_set():
+                    continue
+
                 # This is essentially sleep(1) to wait a second between each
-                # polling loop. But we do it with a bounded wait on stop_now so
+                # polling loop. But we do it with a bounded wait on wake_r so
                 # that we jump back to the polling loop immediately on a
-                # signal.
-                stop_now.wait(timeout=self.launcher_cls.poll_freq)
+                # signal or when a job finishes. We drain the pipe before
+                # polling, so a job that finishes after that will write
+                # another byte and we can't miss it.
+                select.select([wake_r], [], [], self.launcher_cls.poll_freq)
+                try:
+                    while os.read(wake_r, 4096):
+                        pass
+                except BlockingIOError:
+                    pass
 
         finally:
+            set_wakeup_fd(old_wakeup_fd)
+            os.close(wake_r)
+            os.close(wake_w)
             signal(SIGINT, old_handler)
+            if completion_signal is not None:
+                signal(completion_signal, old_completion_handler)
 
         # Cleanup the status printer.
         self.status_printer.exit()
@@ -186,6 +284,67 @@ class Scheduler:
         # We got to the end without anything exploding. Return the results.
         return self.item_to_status
 
+    def _init_estimates(self):
+        """Look up the predicted runtime of each item."""
+        for target in self._scheduled:
+            items = [item for cfg_list in self._scheduled[target].values()
+                     for item in cfg_list]
+            known = []
+            for item in items:
+                secs = self.runtime_db.estimate(item)
+                if secs is not None:
+                    self._estimates[item] = secs
+                    known.append(secs)
+
+            if not known:
+                self._pending_secs[target] = None
+                continue
+
+            default = sum(known) / len(known)
+            for item in items:
+                self._pending[item] = self._estimates.get(item, default)
+            self._pending_secs[target] = sum(self._pending[item]
+                                             for item in items)
+
+    def _lpt_key(self, item):
+        """The sort key for longest-processing-time-first dispatch.
+
+        Items with no predicted runtime go first, because they might be long.
+        """
+        return -self._estimates.get(item, float("inf"))
+
+    def _unpend(self, item):
+        """Remove item from the work that hasn't been started."""
+        secs = self._pending.pop(item, None)
+        if secs is not None:
+            self._pending_secs[item.target] -= secs
+
+    def _predict_secs_left(self, target):
+        """Predict how long it will take to finish target, in seconds.
+
+        Returns None if there's no prediction. Otherwise, the prediction is
+        the larger of the longest remaining job and the total remaining work
+        spread evenly over the available slots.
+        """
+        if self._pending_secs.get(target) is None:
+            return None
+
+        now = time.monotonic()
+        work = max(self._pending_secs[target], 0)
+        # The queue is sorted longest first, so the first queued item is
+        # (roughly) the longest one that hasn't started.
+        queued = self._queued[target]
+        longest = self._pending.get(queued[0], 0) if queued else 0
+        for item in self._running[target]:
+            secs = self._estimates.get(item)
+            if secs is None:
+                continue
+            left = max(secs - (now - self._dispatch_time[item]), 0)
+            work += left
+            longest = max(longest, left)
+
+        return max(work / self.launcher_cls.max_parallel, longest)
+
     def add_to_scheduled(self, items):
         """Add items to the list of _scheduled.
 
@@ -245,12 +404,21 @@ class Scheduler:
         target. If 'item' is specified, then we find its successors and move
         them to _queued.
         """
+        targets = set()
         for next_item in self._get_successors(item):
             assert next_item not in self.item_to_status
             assert next_item not in self._queued[next_item.target]
             self.item_to_status[next_item] = "Q"
             self._queued[next_item.target].append(next_item)
             self._remove_from_scheduled(next_item)
+            targets.add(next_item.target)
+
+        # Keep each queue sorted with the longest jobs first. The sort is
+        # stable, so jobs with the same predicted runtime (or none at all)
+        # stay in their original order.
+        if self.runtime_db is not None:
+            for target in targets:
+                self._queued[target].sort(key=self._lpt_key)
 
     def _cancel_successors(self, item):
         """Cancel an item's successors recursively by moving them from
@@ -265,40 +433,41 @@ class Scheduler:
     def _get_successors(self, item=None):
         """Find immediate successors of an item.
 
-        'item' is a job that has completed. We choose the target that follows
-        the 'item''s current target and find the list of successors whose
-        dependency list contains 'item'. If 'item' is None, we pick successors
-        from all cfgs, else we pick successors only from the cfg to which the
-        item belongs.
+        'item' is a job that has completed. We look for successors in the
+        'item''s own target (for jobs that depend on others in the same
+        target, like the nodes of a coverage merge tree) and in the target
+        that follows it, and find those whose dependency list contains
+        'item'. If 'item' is None, we pick successors from all cfgs, else we
+        pick successors only from the cfg to which the item belongs.
 
         Returns the list of item's successors, or an empty list if there are
         none.
         """
         if item is None:
-            target = self._get_next_target(None)
-            cfgs = set(self._scheduled[target])
+            targets = [self._get_next_target(None)]
+            cfgs = set(self._scheduled[targets[0]])
         else:
-            target = self._get_next_target(item.target)
+            targets = [item.target, self._get_next_target(item.target)]
             cfgs = {item.sim_cfg}
 
-        if target is None:
-            return []
-
         # Find item's successors that can be enqueued. We assume here that
-        # only the immediately succeeding target can be enqueued at this
-        # time.
+        # only the item's target and the immediately succeeding target can be
+        # enqueued at this time.
         successors = []
-        for cfg in cfgs:
-            for next_item in self._scheduled[target][cfg]:
-                if item is not None:
-                    # Something is terribly wrong if item exists but the
-                    # next_item's dependency list is empty.
-                    assert next_item.dependencies
-                    if item not in next_item.dependencies:
-                        continue
-
-                if self._ok_to_enqueue(next_item):
-                    successors.append(next_item)
+        for target in targets:
+            if target is None:
+                continue
+            for cfg in cfgs:
+                for next_item in self._scheduled[target].get(cfg, []):
+                    if item is not None:
+                        # Something is terribly wrong if item exists but the
+                        # next_item's dependency list is empty.
+                        assert next_item.dependencies
+                        if item not in next_item.dependencies:
+                            continue
+
+                    if self._ok_to_enqueue(next_item):
+                        successors.append(next_item)
 
         return successors
 
@@ -382,6 +551,8 @@ class Scheduler:
 
                 if status == "P":
                     self._passed[target].add(item)
+                    if self.runtime_db is not None:
+                        self.runtime_db.record(item)
                 elif status == "F":
                     self._failed[target].add(item)
                     level = log.ERROR
@@ -391,8 +562,11 @@ class Scheduler:
                     level = log.ERROR
 
                 self._running[target].pop(self.last_item_polled_idx[target])
+                self._dispatch_time.pop(item, None)
+                self._release(item)
                 self.last_item_polled_idx[target] -= 1
                 self.item_to_status[item] = status
+                self._record_result(item)
                 log.log(
                     level,
                     "[%s]: [%s]: [status] [%s: %s]",
@@ -426,6 +600,12 @@ class Scheduler:
         slots_filled = 0
         total_weight = sum(self._queued[t][0].weight for t in self._queued if self._queued[t])
 
+        # The pools that a queued item is waiting for. Once an item is
+        # waiting for a pool, items behind it in the queues can't take from
+        # that pool either. Otherwise, a stream of small jobs could stop a
+        # big job from ever starting.
+        blocked = set()
+
         for target in self._scheduled:
             if not self._queued[target]:
                 continue
@@ -456,6 +636,7 @@ class Scheduler:
             slots_filled += target_slots
 
             to_dispatch = []
+            waiting = []
             while self._queued[target] and target_slots > 0:
                 next_item = self._queued[target].pop(0)
                 if not self._ok_to_run(next_item):
@@ -463,9 +644,22 @@ class Scheduler:
                     self._enqueue_successors(next_item)
                     continue
 
+                if self._pools:
+                    blockers = self._pools.blockers(next_item.resources)
+                    if blockers or self._pools.uses(next_item.resources) & blocked:
+                        blocked |= blockers
+                        waiting.append(next_item)
+                        continue
+                    self._pools.acquire(next_item.resources)
+                    self._held[next_item] = next_item.resources
+
                 to_dispatch.append(next_item)
                 target_slots -= 1
 
+            # Put the items that are waiting for resources back at the front
+            # of the queue, in their original order.
+            self._queued[target][:0] = waiting
+
             if not to_dispatch:
                 continue
 
@@ -488,6 +682,7 @@ class Scheduler:
                 except LauncherBusy as err:
                     log.error("Launcher busy: %s", err)
 
+                    self._release(item)
                     self._queued[target].append(item)
 
                     log.log(
@@ -501,6 +696,19 @@ class Scheduler:
 
                 self._running[target].append(item)
                 self.item_to_status[item] = "D"
+                self._unpend(item)
+                self._dispatch_time[item] = time.monotonic()
+
+    def _record_result(self, item):
+        """Pass the final status of item to the results sink (if any)."""
+        if self.results_sink is not None:
+            self.results_sink.add(item, self.item_to_status[item])
+
+    def _release(self, item):
+        """Return the resources held by item (if any) to their pools."""
+        needs = self._held.pop(item, None)
+        if needs is not None:
+            self._pools.release(needs)
 
     def _kill(self):
         """Kill any running items and cancel any that are waiting"""
@@ -549,6 +757,10 @@ class Scheduler:
                 len(self._killed[target]),
                 self._total[target],
             )
+            if self.runtime_db is not None:
+                secs_left = self._predict_secs_left(target)
+                eta = "--:--:--" if secs_left is None else format_hms(secs_left)
+                msg += f", ETA: {eta}"
             self.status_printer.update_target(
                 target=target,
                 msg=msg,
@@ -556,6 +768,9 @@ class Scheduler:
                 perc=perc,
                 running=running,
             )
+
+        if self._pools:
+            self.status_printer.update_pools(hms=hms, msg=self._pools.status())
         return done
 
     def _cancel_item(self, item, cancel_successors=True):
@@ -566,6 +781,8 @@ class Scheduler:
         """
         self.item_to_status[item] = "K"
         self._killed[item.target].add(item)
+        self._record_result(item)
+        self._unpend(item)
         if item in self._queued[item.target]:
             self._queued[item.target].remove(item)
         else:
@@ -577,7 +794,10 @@ class Scheduler:
     def _kill_item(self, item):
         """Kill a running item and cancel all of its successors."""
         item.launcher.kill()
+        self._release(item)
         self.item_to_status[item] = "K"
         self._killed[item.target].add(item)
+        self._record_result(item)
         self._running[item.target].remove(item)
+        self._dispatch_time.pop(item, None)
         self._cancel_successors(item)
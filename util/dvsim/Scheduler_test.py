@@ -0,0 +1,88 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+'''pytest-based testing for Scheduler.py'''
+
+import signal
+
+from .Launcher import Launcher
+from .Scheduler import Scheduler
+
+
+class _Launcher(Launcher):
+    '''A launcher whose jobs pass as soon as they are launched.'''
+
+    variant = 'test'
+    poll_freq = 0.01
+    completion_signal = None
+
+    # The full names of the jobs, in the order they were launched.
+    launched = []
+
+    def __init__(self, deploy):
+        self.deploy = deploy
+
+    def launch(self):
+        self.launched.append(self.deploy.full_name)
+
+    def poll(self):
+        return 'P'
+
+    def kill(self):
+        pass
+
+
+class _Deploy:
+    '''A dummy Deploy item.'''
+
+    needs_all_dependencies_passing = True
+    weight = 1
+    resources = {}
+
+    def __init__(self, name, target, dependencies=()):
+        self.full_name = name
+        self.target = target
+        self.dependencies = list(dependencies)
+        self.sim_cfg = None
+        self.launcher = None
+
+    def create_launcher(self):
+        self.launcher = _Launcher(self)
+
+
+def _on_alarm(signum, frame):
+    raise TimeoutError('The scheduler hung')
+
+
+def test_same_target_dependencies():
+    '''Jobs that depend on jobs in the same target are run.
+
+    This is the shape of a coverage merge tree: each node merges the
+    coverage of the nodes below it, all in the cov_merge target.
+    '''
+    build = _Deploy('build', 'build')
+    runs = [_Deploy(f'run{idx}', 'run', [build]) for idx in range(5)]
+    leaves = [_Deploy(f'leaf{idx}', 'cov_merge', runs[2 * idx:2 * idx + 2])
+              for idx in range(3)]
+    inner = [_Deploy('inner0', 'cov_merge', leaves[:2]),
+             _Deploy('inner1', 'cov_merge', leaves[2:])]
+    root = _Deploy('root', 'cov_merge', inner)
+    report = _Deploy('report', 'cov_report', [root])
+    items = [build] + runs + leaves + inner + [root, report]
+
+    _Launcher.launched = []
+    old_handler = signal.signal(signal.SIGALRM, _on_alarm)
+    signal.alarm(10)
+    try:
+        results = Scheduler(items, _Launcher, interactive=True).run()
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, old_handler)
+
+    assert results == {item: 'P' for item in items}
+    order = _Launcher.launched
+    assert sorted(order) == sorted(item.full_name for item in items)
+    for item in items:
+        for dep in item.dependencies:
+            assert order.index(dep.full_name) < order.index(item.full_name)
@@ -14,10 +14,12 @@ import os
 import re
 import sys
 from collections import OrderedDict
+from copy import deepcopy
 from pathlib import Path
 from typing import Optional
 
-from Deploy import CompileSim, CovAnalyze, CovMerge, CovReport, CovUnr, RunTest
+from Deploy import (CompileSim, CovAnalyze, CovMerge, CovReport, CovUnr,
+                    RunTest, dedup_jobs)
 from FlowCfg import FlowCfg
 from modes import BuildMode, Mode, RunMode, find_mode
 from Regression import Regression
@@ -33,6 +35,70 @@ _MAX_UNIQUE_TESTS = 5
 _MAX_TEST_RESEEDS = 2
 
 
+def _indent_by(level):
+    return " " * (4 * level)
+
+
+def _create_failure_message(test, line, context):
+    message = [f"{_indent_by(2)}* {test.qual_name}\\"]
+    if line:
+        message.append(
+            f"{_indent_by(2)}  Line {line}, in log " +
+            test.get_log_path())
+    else:
+        message.append(f"{_indent_by(2)} Log {test.get_log_path()}")
+    if context:
+        message.append("")
+        lines = [f"{_indent_by(4)}{c.rstrip()}" for c in context]
+        message.extend(lines)
+    message.append("")
+    return message
+
+
+def _create_bucket_report(buckets):
+    """Creates a report based on the given buckets.
+
+    The buckets are sorted by descending number of failures. Within
+    buckets this also group tests by unqualified name, and just a few
+    failures are shown per unqualified name.
+
+    Args:
+      buckets: A dictionary by bucket containing triples
+        (test, line, context).
+
+    Returns:
+      A list of text lines for the report.
+    """
+    by_tests = sorted(buckets.items(),
+                      key=lambda i: len(i[1]),
+                      reverse=True)
+    fail_msgs = ["\n## Failure Buckets", ""]
+    for bucket, tests in by_tests:
+        fail_msgs.append(f"* `{bucket}` has {len(tests)} failures:")
+        unique_tests = collections.defaultdict(list)
+        for (test, line, context) in tests:
+            unique_tests[test.name].append((test, line, context))
+        for name, test_reseeds in list(unique_tests.items())[
+                :_MAX_UNIQUE_TESTS]:
+            fail_msgs.append(f"{_indent_by(1)}* Test {name} has "
+                             f"{len(test_reseeds)} failures.")
+            for test, line, context in test_reseeds[:_MAX_TEST_RESEEDS]:
+                fail_msgs.extend(
+                    _create_failure_message(test, line, context))
+            if len(test_reseeds) > _MAX_TEST_RESEEDS:
+                fail_msgs.append(
+                    f"{_indent_by(2)}* ... and "
+                    f"{len(test_reseeds) - _MAX_TEST_RESEEDS} "
+                    "more failures.")
+        if len(unique_tests) > _MAX_UNIQUE_TESTS:
+            fail_msgs.append(
+                f"{_indent_by(1)}* ... and "
+                f"{len(unique_tests) - _MAX_UNIQUE_TESTS} more tests.")
+
+    fail_msgs.append("")
+    return fail_msgs
+
+
 class SimCfg(FlowCfg):
     """Simulation configuration object
 
@@ -45,7 +111,7 @@ class SimCfg(FlowCfg):
     # TODO: Find a way to set these in sim cfg instead
     ignored_wildcards = [
         "build_mode", "index", "test", "seed", "svseed", "uvm_test", "uvm_test_seq",
-        "cov_db_dirs", "sw_images", "sw_build_device", "sw_build_cmd",
+        "cov_db_dirs", "cov_merge_tests_file", "sw_images", "sw_build_device", "sw_build_cmd",
         "sw_build_opts"
     ]
 
@@ -71,6 +137,7 @@ class SimCfg(FlowCfg):
         self.max_waves = args.max_waves
         self.cov = args.cov
         self.cov_merge_previous = args.cov_merge_previous
+        self.cov_merge_batch = args.cov_merge_batch
         self.profile = args.profile or '(cfg uses profile without --profile)'
         self.xprop_off = args.xprop_off
         self.no_rerun = args.no_rerun
@@ -437,34 +504,28 @@ class SimCfg(FlowCfg):
         # Create the build and run list first
         self._create_build_and_run_list()
 
+        # It is possible for tests to supply different build modes, but
+        # those builds may differ only under specific circumstances,
+        # such as coverage being enabled. If coverage is not enabled,
+        # then they may be completely identical. In that case, we can
+        # save compute resources by removing the extra duplicated
+        # builds. We discard each build that is equivalent to an earlier
+        # one (see Deploy.dedup_jobs).
+        new_builds = [CompileSim(build_mode_obj, self)
+                      for build_mode_obj in self.build_list]
+        canonical = dedup_jobs(new_builds)
+
         self.builds = []
         build_map = {}
-        for build_mode_obj in self.build_list:
-            new_build = CompileSim(build_mode_obj, self)
-
-            # It is possible for tests to supply different build modes, but
-            # those builds may differ only under specific circumstances,
-            # such as coverage being enabled. If coverage is not enabled,
-            # then they may be completely identical. In that case, we can
-            # save compute resources by removing the extra duplicated
-            # builds. We discard the new_build if it is equivalent to an
-            # existing one.
-            is_unique = True
-            for build in self.builds:
-                if new_build.is_equivalent_job(build):
-                    # Discard `new_build` since build implements the same
-                    # thing. If `new_build` is the same as
-                    # `primary_build_mode`, update `primary_build_mode` to
-                    # match `build`.
-                    if new_build.name == self.primary_build_mode:
-                        self.primary_build_mode = build.name
-                    new_build = build
-                    is_unique = False
-                    break
-
-            if is_unique:
-                self.builds.append(new_build)
-            build_map[build_mode_obj] = new_build
+        for build_mode_obj, new_build in zip(self.build_list, new_builds):
+            build = canonical[new_build]
+            if build is new_build:
+                self.builds.append(build)
+            elif new_build.name == self.primary_build_mode:
+                # If `new_build` is the same as `primary_build_mode`, update
+                # `primary_build_mode` to match `build`.
+                self.primary_build_mode = build.name
+            build_map[build_mode_obj] = build
 
         # If there is only one build, set primary_build_mode to it.
         if len(self.builds) == 1:
@@ -511,13 +572,58 @@ class SimCfg(FlowCfg):
             # Create cov_merge and cov_report objects, so long as we've got at
             # least one run to do.
             if self.cov and self.runs:
-                self.cov_merge_deploy = CovMerge(self.runs, self)
+                cov_merge_jobs = self._create_cov_merge_jobs()
+                self.cov_merge_deploy = cov_merge_jobs[-1]
                 self.cov_report_deploy = CovReport(self.cov_merge_deploy, self)
-                self.deploy += [self.cov_merge_deploy, self.cov_report_deploy]
+                self.deploy += cov_merge_jobs + [self.cov_report_deploy]
 
         # Create initial set of directories before kicking off the regression.
         self._create_dirs()
 
+    def _create_cov_merge_jobs(self):
+        '''Create the jobs that merge coverage, with the final merge last.
+
+        Normally, this is a single job that runs after all the tests. With
+        --cov-merge-batch N, coverage is merged in a tree instead. The leaves
+        each merge the coverage of a batch of (up to) N tests, as soon as
+        those tests have finished. Each node above them merges up to N of the
+        nodes below, and the root writes the final merged database.
+        '''
+        batch_size = self.cov_merge_batch
+        if batch_size and not hasattr(self, "cov_merge_tests_opts"):
+            log.warning("%s: The %s tool cfg doesn't set cov_merge_tests_opts, "
+                        "so coverage can't be merged in batches. Merging it "
+                        "all at once instead.", self.name, self.tool)
+            batch_size = 0
+        if not batch_size or len(self.runs) <= batch_size:
+            return [CovMerge(self.runs, self)]
+
+        # Remove the databases of an earlier tree, so that they can't be
+        # mistaken for the output of the jobs below.
+        rm_path(Path(self.cov_merge_dir) / "tree")
+
+        # Each batch is a contiguous slice of the runs, so that it tends to
+        # be ready to merge as soon as the tests dispatched around the same
+        # time have finished.
+        level = [
+            CovMerge(self.runs[idx:idx + batch_size], self,
+                     node_name=f"0.{idx // batch_size}")
+            for idx in range(0, len(self.runs), batch_size)
+        ]
+        jobs = list(level)
+        depth = 1
+        while len(level) > batch_size:
+            level = [
+                CovMerge([], self, children=level[idx:idx + batch_size],
+                         node_name=f"{depth}.{idx // batch_size}")
+                for idx in range(0, len(level), batch_size)
+            ]
+            jobs += level
+            depth += 1
+
+        jobs.append(CovMerge(self.runs, self, children=level))
+        return jobs
+
     def _cov_analyze(self):
         '''Use the last regression coverage data to open up the GUI tool to
         analyze the coverage.
@@ -554,6 +660,37 @@ class SimCfg(FlowCfg):
         for item in self.cfgs:
             item._cov_unr()
 
+    def _get_sim_results(self, run_results):
+        """Return the SimResults for the jobs of this cfg.
+
+        These are normally collected as the jobs finish (see ResultsSink). If
+        they weren't, they are collected from run_results now.
+        """
+        if self.sim_results is None:
+            self.sim_results = SimResults(self.deploy, run_results)
+        return self.sim_results
+
+    def gen_partial_results(self, sim_results, num_finished):
+        """Return a markdown report of the results of the jobs so far.
+
+        This is called by a ResultsSink during the regression. sim_results
+        holds the results of the num_finished jobs that have finished.
+        """
+        lines = [f"## {self.results_title} (partial)",
+                 f"### {self.timestamp_long}",
+                 f"### {num_finished} of {len(self.deploy)} jobs finished",
+                 ""]
+        if sim_results.table:
+            # Mapping results to the testplan changes it, so map them to a
+            # copy (leaving the testplan itself for the final report).
+            testplan = deepcopy(self.testplan)
+            testplan.map_test_results(test_results=sim_results.table)
+            lines.append(testplan.get_test_results_table(
+                map_full_testplan=self.map_full_testplan))
+        if sim_results.buckets:
+            lines += _create_bucket_report(sim_results.buckets)
+        return "\n".join(lines)
+
     def _gen_json_results(self, run_results):
         """Returns the run results as json-formatted dictionary.
         """
@@ -628,11 +765,12 @@ class SimCfg(FlowCfg):
             'testplan_stage_summary': [],
             'coverage': dict(),
             'failure_buckets': [],
+            'jobs': [],
         }
 
         # If the testplan does not yet have test results mapped to testpoints,
         # map them now.
-        sim_results = SimResults(self.deploy, run_results)
+        sim_results = self._get_sim_results(run_results)
         if not self.testplan.test_results_mapped:
             self.testplan.map_test_results(test_results=sim_results.table)
 
@@ -708,6 +846,7 @@ class SimCfg(FlowCfg):
                     for test, line, context in test_runs:
                         frs.append({
                             'seed': str(test.seed),
+                            'fingerprint': test.fingerprint,
                             'failure_message': {
                                 'log_file_path': test.get_log_path(),
                                 'log_file_line_num': line,
@@ -724,6 +863,17 @@ class SimCfg(FlowCfg):
                     'failing_tests': fts,
                 })
 
+        # List every job with its fingerprint, which identifies what the job
+        # does (see Deploy.fingerprint). This can be used to track a job
+        # across regressions.
+        for item in self.deploy:
+            results['results']['jobs'].append({
+                'name': item.full_name,
+                'target': item.target,
+                'fingerprint': item.fingerprint,
+                'status': run_results.get(item),
+            })
+
         # Store the `results` dictionary in this object.
         self.results_dict = results
 
@@ -740,69 +890,7 @@ class SimCfg(FlowCfg):
         result is in markdown format.
         '''
 
-        def indent_by(level):
-            return " " * (4 * level)
-
-        def create_failure_message(test, line, context):
-            message = [f"{indent_by(2)}* {test.qual_name}\\"]
-            if line:
-                message.append(
-                    f"{indent_by(2)}  Line {line}, in log " +
-                    test.get_log_path())
-            else:
-                message.append(f"{indent_by(2)} Log {test.get_log_path()}")
-            if context:
-                message.append("")
-                lines = [f"{indent_by(4)}{c.rstrip()}" for c in context]
-                message.extend(lines)
-            message.append("")
-            return message
-
-        def create_bucket_report(buckets):
-            """Creates a report based on the given buckets.
-
-            The buckets are sorted by descending number of failures. Within
-            buckets this also group tests by unqualified name, and just a few
-            failures are shown per unqualified name.
-
-            Args:
-              buckets: A dictionary by bucket containing triples
-                (test, line, context).
-
-            Returns:
-              A list of text lines for the report.
-            """
-            by_tests = sorted(buckets.items(),
-                              key=lambda i: len(i[1]),
-                              reverse=True)
-            fail_msgs = ["\n## Failure Buckets", ""]
-            for bucket, tests in by_tests:
-                fail_msgs.append(f"* `{bucket}` has {len(tests)} failures:")
-                unique_tests = collections.defaultdict(list)
-                for (test, line, context) in tests:
-                    unique_tests[test.name].append((test, line, context))
-                for name, test_reseeds in list(unique_tests.items())[
-                        :_MAX_UNIQUE_TESTS]:
-                    fail_msgs.append(f"{indent_by(1)}* Test {name} has "
-                                     f"{len(test_reseeds)} failures.")
-                    for test, line, context in test_reseeds[:_MAX_TEST_RESEEDS]:
-                        fail_msgs.extend(
-                            create_failure_message(test, line, context))
-                    if len(test_reseeds) > _MAX_TEST_RESEEDS:
-                        fail_msgs.append(
-                            f"{indent_by(2)}* ... and "
-                            f"{len(test_reseeds) - _MAX_TEST_RESEEDS} "
-                            "more failures.")
-                if len(unique_tests) > _MAX_UNIQUE_TESTS:
-                    fail_msgs.append(
-                        f"{indent_by(1)}* ... and "
-                        f"{len(unique_tests) - _MAX_UNIQUE_TESTS} more tests.")
-
-            fail_msgs.append("")
-            return fail_msgs
-
-        deployed_items = self.deploy
-        results = SimResults(deployed_items, run_results)
+        results = self._get_sim_results(run_results)
 
         # Generate results table for runs.
         results_str = "## " + self.results_title + "\n"
@@ -890,7 +978,7 @@ class SimCfg(FlowCfg):
 
         if results.buckets:
             self.errors_seen = True
-            results_str += "\n".join(create_bucket_report(results.buckets))
+            results_str += "\n".join(_create_bucket_report(results.buckets))
 
         self.results_md = results_str
         return results_str
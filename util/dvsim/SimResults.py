@@ -73,18 +73,25 @@ class SimResults:
 
     self.buckets contains a dictionary accessed by the failure signature,
     holding all failing tests with the same signature.
+
+    Items can also be added one at a time with add_item() as they finish, so
+    that the table and buckets are kept up to date during a regression.
     '''
 
-    def __init__(self, items, results):
+    def __init__(self, items=(), results=None):
         self.table = []
         self.buckets = collections.defaultdict(list)
         self._name_to_row = {}
         for item in items:
-            self._add_item(item, results)
+            self.add_item(item, results[item])
+
+    def add_item(self, item, status):
+        '''Add a single item, which finished with the given status
 
-    def _add_item(self, item, results):
-        '''Recursively add a single item to the table of results'''
-        status = results[item]
+        Returns the failure bucket that the item was added to, or None if it
+        passed.
+        '''
+        bucket = None
         if status in ["F", "K"]:
             bucket = self._bucketize(item.launcher.fail_msg.message)
             self.buckets[bucket].append(
@@ -94,6 +101,7 @@ class SimResults:
         # Runs get added to the table directly
         if item.target == "run":
             self._add_run(item, status)
+        return bucket
 
     def _add_run(self, item, status):
         '''Add an entry to table for item'''
@@ -115,6 +123,30 @@ class SimResults:
             row.passing += 1
         row.total += 1
 
+    def sort(self, items):
+        '''Put the table and buckets in the order of items
+
+        Items added with add_item() are added in the order in which they
+        finished. This sorts them as if they had been passed to the
+        constructor in the order given by items.
+        '''
+        index = {item: idx for idx, item in enumerate(items)}
+        first_item = {}
+        for item in items:
+            if item.target == "run":
+                first_item.setdefault(item.name, index[item])
+        self.table.sort(key=lambda row: first_item.get(row.name, len(index)))
+
+        # Buckets are listed by size, so the order only matters between
+        # buckets of the same size.
+        for bucket, tests in self.buckets.items():
+            tests.sort(key=lambda test: index.get(test[0], len(index)))
+        first_test = {bucket: index.get(tests[0][0], len(index))
+                      for bucket, tests in self.buckets.items()}
+        self.buckets = collections.defaultdict(
+            list, sorted(self.buckets.items(),
+                         key=lambda bucket: first_test[bucket[0]]))
+
     def _bucketize(self, fail_msg):
         bucket = fail_msg
         # Remove stuff.
@@ -32,6 +32,12 @@ class StatusPrinter:
     def update_target(self, target, hms, msg, perc, running):
         pass
 
+    def init_pools(self, msg):
+        pass
+
+    def update_pools(self, hms, msg):
+        pass
+
     def exit(self):
         pass
 
@@ -67,6 +73,10 @@ class TtyStatusPrinter(StatusPrinter):
         super().__init__()
         self.target_done = {}
 
+        # The last message printed by update_pools (which only prints
+        # anything when the message changes).
+        self.pools_msg = None
+
     def print_header(self, msg):
         '''Initilize / print the header bar.
 
@@ -99,6 +109,14 @@ class TtyStatusPrinter(StatusPrinter):
         if perc == 100:
             self.target_done[target] = True
 
+    def update_pools(self, hms, msg):
+        '''Print how much of each resource pool is in use, if it changed.'''
+
+        if msg == self.pools_msg:
+            return
+        self.pools_msg = msg
+        log.info(self.header_fmt.format(hms=hms, target="pools", msg=msg))
+
     def exit(self):
         '''Do cleanup activities before exitting.'''
 
@@ -128,6 +146,7 @@ class EnlightenStatusPrinter(TtyStatusPrinter):
         self.manager = enlighten.get_manager()
         self.status_header = None
         self.status_target = {}
+        self.status_pools = None
 
     def print_header(self, msg):
         self.status_header = self.manager.status_bar(
@@ -159,10 +178,22 @@ class EnlightenStatusPrinter(TtyStatusPrinter):
         if perc == 100:
             self.target_done[target] = True
 
+    def init_pools(self, msg):
+        self.status_pools = self.manager.status_bar(
+            status_format=self.header_fmt,
+            hms="",
+            target="pools",
+            msg=msg)
+
+    def update_pools(self, hms, msg):
+        self.status_pools.update(hms=hms, msg=msg)
+
     def exit(self):
         self.status_header.close()
         for target in self.status_target:
             self.status_target[target].close()
+        if self.status_pools is not None:
+            self.status_pools.close()
 
 
 def get_status_printer(interactive):
@@ -4,7 +4,9 @@
 r"""Testpoint and Testplan classes for maintaining the testplan
 """
 
+import hashlib
 import os
+import pickle
 import re
 import sys
 from typing import TextIO
@@ -15,6 +17,8 @@ import hjson
 import mistletoe
 from tabulate import tabulate
 
+from utils import get_parsed_hjson, put_parsed_hjson
+
 
 class Result:
     '''The results for a single test'''
@@ -243,9 +247,28 @@ class Testplan:
 
     @staticmethod
     def _parse_hjson(filename):
-        """Parses an input file with HJson and returns a dict."""
+        """Parses an input file with HJson and returns a dict.
+
+        The result is cached in the same way as for utils.parse_hjson.
+        Testplans are parsed without use_decimal, so their keys get a prefix
+        to keep them apart from the cfg files that parse_hjson reads.
+        """
         try:
-            return hjson.load(open(filename, 'r'))
+            with open(filename, 'r') as f:
+                text = f.read()
+            key = "testplan-" + hashlib.sha256(
+                f"{hjson.__version__}\0{text}".encode()).hexdigest()
+
+            pickled = get_parsed_hjson(key)
+            if pickled is not None:
+                try:
+                    return pickle.loads(pickled)
+                except Exception:
+                    pass
+
+            data = hjson.loads(text)
+            put_parsed_hjson(key, pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+            return data
         except IOError as e:
             print(f"IO Error when opening file {filename}\n{e}")
         except hjson.scanner.HjsonDecodeError as e:
@@ -37,8 +37,11 @@ import SgeLauncher
 import SlurmLauncher
 import LsfLauncher
 import NcLauncher
+import utils
+from BuildCache import BuildCache
 from CfgFactory import make_cfg
-from Deploy import RunTest
+from Deploy import CompileSim, RunTest
+from ResourcePools import parse_pool
 from Timer import Timer
 from utils import (TS_FORMAT, TS_FORMAT_LONG, VERBOSE, rm_path,
                    run_cmd_with_timeout)
@@ -125,6 +128,38 @@ def resolve_max_parallel(arg):
     return 16
 
 
+def read_resource_pool(arg):
+    '''Take value for --resource-pool as a (name, amount) pair'''
+    try:
+        return parse_pool(arg)
+    except ValueError as err:
+        raise argparse.ArgumentTypeError(
+            'Bad argument for --resource-pool ({!r}): {}.'.format(arg, err))
+
+
+def resolve_resource_pools(arg):
+    '''Combine the pools in $DVSIM_RESOURCE_POOLS with those in arg
+
+    The environment variable is a comma-separated list of NAME=AMOUNT pairs.
+    Pools given on the command line take precedence.
+    '''
+    pools = {}
+    from_env = os.environ.get('DVSIM_RESOURCE_POOLS', '')
+    for spec in from_env.split(','):
+        if not spec.strip():
+            continue
+        try:
+            name, amount = parse_pool(spec)
+        except ValueError as err:
+            log.warning('Ignoring {!r} in the DVSIM_RESOURCE_POOLS environment '
+                        'variable: {}.'.format(spec, err))
+            continue
+        pools[name] = amount
+
+    pools.update(arg or [])
+    return pools
+
+
 def resolve_branch(branch):
     '''Choose a branch name for output files
 
@@ -359,6 +394,38 @@ def parse_args():
                             'is used. Only applicable when launching jobs '
                             'locally.'))
 
+    disg.add_argument("--resource-pool",
+                      type=read_resource_pool,
+                      action='append',
+                      metavar="NAME=AMOUNT",
+                      help=('Add a pool of AMOUNT of the resource NAME (such '
+                            'as a tool license or GB of memory), shared by '
+                            'the running jobs. A job that needs some of a '
+                            'pool (given by the "resources" of its build '
+                            'mode or test, or the <target>_resources in the '
+                            'HJson) is only dispatched when that much is '
+                            'free. Can be given more than once. Pools are '
+                            'also read from the DVSIM_RESOURCE_POOLS '
+                            'environment variable, as a comma-separated list '
+                            'of NAME=AMOUNT. When launching jobs locally, '
+                            'there are also "cpus" and "mem_gb" pools for '
+                            'the CPUs and memory of the machine.'))
+
+    disg.add_argument("--no-runtime-db",
+                      action='store_true',
+                      help=('Don\'t use or update the database of job '
+                            'runtimes in the scratch root. By default, dvsim '
+                            'records how long each passing job took and uses '
+                            'that to start the longest jobs first and to '
+                            'predict how long is left.'))
+
+    disg.add_argument("--kill-on-fail",
+                      action='store_true',
+                      help=('Watch the logs of running jobs and kill a job as '
+                            'soon as one of its fail patterns appears, rather '
+                            'than waiting for it to finish. Only applicable '
+                            'when launching jobs locally.'))
+
     pathg = parser.add_argument_group('File management')
 
     pathg.add_argument("--scratch-root",
@@ -438,6 +505,19 @@ def parse_args():
                               'GUI mode is enabled, this timeout mechanism will '
                               'be disabled.'))
 
+    buildg.add_argument("--build-cache",
+                        action='store_true',
+                        help=('Keep a copy of the directory of each passing '
+                              'build in the build cache. A later build with '
+                              'the same command, exports and sources restores '
+                              'the copy instead of building again. Coverage '
+                              'builds are not cached.'))
+
+    buildg.add_argument("--build-cache-dir",
+                        metavar="PATH",
+                        help=('The directory of the build cache (by default, '
+                              'dvsim_build_cache in the scratch root).'))
+
     disg.add_argument("--gui",
                       action='store_true',
                       help=('Run the flow in GUI mode instead of the batch '
@@ -608,6 +688,17 @@ def parse_args():
                             'coverage database directory with the new '
                             'coverage database.'))
 
+    covg.add_argument("--cov-merge-batch",
+                      type=int,
+                      default=0,
+                      metavar="N",
+                      help=('Only applicable with --cov. Merge coverage in '
+                            'a tree, rather than all at once after the last '
+                            'test. Batches of N tests are merged as soon as '
+                            'they finish and the results are merged N at a '
+                            'time. This needs cov_merge_tests_opts to be set '
+                            'in the tool cfg.'))
+
     covg.add_argument("--cov-unr",
                       action='store_true',
                       help=('Run coverage UNR analysis and generate report. '
@@ -653,6 +744,14 @@ def parse_args():
                      help=("Print dvsim tool messages but don't actually "
                            "run any command"))
 
+    dvg.add_argument("--no-hjson-cache",
+                     action='store_true',
+                     help=('Don\'t keep parsed hjson files in the scratch '
+                           'root. By default, dvsim keeps parsed cfg and '
+                           'testplan files there (keyed by their contents), '
+                           'so that later runs don\'t need to parse them '
+                           'again.'))
+
     args = parser.parse_args()
 
     if args.version:
@@ -679,6 +778,9 @@ def parse_args():
     args.max_parallel = resolve_max_parallel(args.max_parallel)
     assert args.max_parallel > 0
 
+    # Add any resource pools from the environment.
+    args.resource_pool = resolve_resource_pools(args.resource_pool)
+
     return args
 
 
@@ -714,6 +816,13 @@ def main():
     # core files.
     (Path(args.scratch_root) / 'FUSESOC_IGNORE').touch()
 
+    # Keep parsed hjson files in the scratch root, so that later runs can
+    # skip parsing the files that haven't changed.
+    if not args.no_hjson_cache:
+        utils.hjson_cache_dir = os.path.join(args.scratch_root,
+                                             'dvsim_hjson_cache')
+        utils.prune_hjson_cache()
+
     args.cfg = os.path.abspath(args.cfg)
     if args.remote:
         cfg_path = args.cfg.replace(proj_root_src + "/", "")
@@ -732,6 +841,12 @@ def main():
         args.reseed = 1
     RunTest.fixed_seed = args.fixed_seed
 
+    # Register the build cache, if enabled, with the CompileSim class.
+    if args.build_cache:
+        CompileSim.build_cache = BuildCache(
+            args.build_cache_dir or
+            os.path.join(args.scratch_root, "dvsim_build_cache"))
+
     # Register the common deploy settings.
     Timer.print_interval = args.print_interval
     LocalLauncher.LocalLauncher.max_parallel = args.max_parallel
@@ -740,8 +855,14 @@ def main():
     LsfLauncher.LsfLauncher.max_parallel = args.max_parallel
     NcLauncher.NcLauncher.max_parallel = args.max_parallel
     Launcher.Launcher.max_odirs = args.max_odirs
+    Launcher.Launcher.kill_on_fail = args.kill_on_fail
     LauncherFactory.set_launcher_type(args.local)
 
+    # Add the resource pools to those the chosen launcher already has.
+    launcher_cls = LauncherFactory.get_launcher_cls()
+    launcher_cls.resource_pools = {**launcher_cls.resource_pools,
+                                   **args.resource_pool}
+
     # Build infrastructure from hjson file and create the list of items to
     # be deployed.
     global cfg
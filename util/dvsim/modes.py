@@ -87,6 +87,20 @@ class Mode:
                 self_attr_val.extend(mode_attr_val)
                 continue
 
+            # If the current value is a dict, merge in the incoming entries.
+            # An entry that both dicts have must have the same value.
+            if isinstance(self_attr_val, dict):
+                merged = dict(self_attr_val)
+                for key, val in mode_attr_val.items():
+                    if merged.setdefault(key, val) != val:
+                        log.error(f"Cannot merge mode {mode.name} into "
+                                  f"{self.name} because they have conflicting "
+                                  f"values for {attr}[{key!r}]: {val} and "
+                                  f"{merged[key]}.")
+                        sys.exit(1)
+                setattr(self, attr, merged)
+                continue
+
             # The types that we support other than lists are "scalar" types,
             # which each have a default value. The idea is that a default value
             # gets overridden by anything else.
@@ -242,6 +256,7 @@ class BuildMode(Mode):
         self.en_build_modes = []
         self.build_opts = []
         self.build_timeout_mins = None
+        self.resources = None
         self.pre_run_cmds = []
         self.post_run_cmds = []
         self.run_opts = []
@@ -280,6 +295,7 @@ class RunMode(Mode):
         self.build_mode = ""
         self.run_timeout_mins = None
         self.run_timeout_multiplier = None
+        self.resources = None
         self.sw_images = []
         self.sw_build_device = ""
         self.sw_build_opts = []
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+"""Benchmark the dvsim Scheduler with many short local jobs.
+
+Each job is a dummy Deploy item whose launcher runs a short command (by
+default "sleep 0") as a child process. The benchmark runs the same set of
+jobs through the Scheduler twice: once with the launcher polled every
+poll_freq seconds, and once with completion signalled by SIGCHLD (as
+LocalLauncher does).
+
+For each mode, it reports the total time, the throughput and the "reap
+latency" of jobs: the time between a job's launch and the scheduler seeing
+that it has finished, minus the requested job duration. This is roughly how
+long a slot sits idle after its job exits.
+"""
+
+import argparse
+import logging as log
+import shlex
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+from Launcher import Launcher
+from Scheduler import Scheduler
+
+
+class BenchLauncher(Launcher):
+    """A launcher that runs a command locally and records timings.
+
+    This avoids the workspace and output directory handling of
+    LocalLauncher, so that the benchmark measures just the scheduler.
+    """
+
+    variant = "bench"
+
+    # The command that each job runs (set by main).
+    cmd = ["true"]
+
+    def __init__(self, deploy) -> None:
+        self.deploy = deploy
+        self.status = None
+        self.exit_code = None
+        self._process = None
+        self.launch_time = None
+        self.reap_time = None
+
+    def launch(self) -> None:
+        self.launch_time = time.monotonic()
+        self._process = subprocess.Popen(
+            self.cmd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def poll(self):
+        if self._process.poll() is None:
+            return "D"
+        self.reap_time = time.monotonic()
+        self.exit_code = self._process.returncode
+        self.status = "P" if self.exit_code == 0 else "F"
+        return self.status
+
+    def kill(self) -> None:
+        if self._process is not None:
+            self._process.kill()
+            self._process.wait()
+        self.status = "K"
+
+
+class PollingBenchLauncher(BenchLauncher):
+    """BenchLauncher that only relies on polling."""
+
+    completion_signal = None
+
+
+class SignalBenchLauncher(BenchLauncher):
+    """BenchLauncher that wakes the scheduler on SIGCHLD."""
+
+    completion_signal = getattr(signal, "SIGCHLD", None)
+
+
+class BenchSimCfg:
+    """The minimal cfg that the Scheduler needs for each item."""
+
+
+class BenchDeploy:
+    """A dummy Deploy item with no dependencies."""
+
+    target = "run"
+    dependencies = []
+    needs_all_dependencies_passing = True
+    weight = 1
+    resources = {}
+
+    def __init__(self, idx, sim_cfg, launcher_cls) -> None:
+        self.full_name = f"bench.job{idx}"
+        self.sim_cfg = sim_cfg
+        self.launcher_cls = launcher_cls
+        self.launcher = None
+
+    def create_launcher(self) -> None:
+        self.launcher = self.launcher_cls(self)
+
+
+def run_mode(name, launcher_cls, num_jobs, job_time):
+    """Run num_jobs through a Scheduler and print the results."""
+    sim_cfg = BenchSimCfg()
+    items = [BenchDeploy(idx, sim_cfg, launcher_cls) for idx in range(num_jobs)]
+
+    start = time.monotonic()
+    results = Scheduler(items, launcher_cls, interactive=True).run()
+    elapsed = time.monotonic() - start
+
+    failed = sum(1 for status in results.values() if status != "P")
+    latencies = sorted(
+        (item.launcher.reap_time - item.launcher.launch_time - job_time) * 1000
+        for item in items
+        if item.launcher.reap_time is not None
+    )
+    p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+
+    print(
+        f"{name:>8}: {num_jobs} jobs in {elapsed:.2f}s "
+        f"({num_jobs / elapsed:.1f} jobs/s), {failed} not passed; "
+        f"reap latency mean {statistics.mean(latencies):.1f}ms, "
+        f"median {statistics.median(latencies):.1f}ms, p99 {p99:.1f}ms",
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=10000,
+        help="Number of dummy jobs to run (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--max-parallel",
+        type=int,
+        default=32,
+        help="Maximum number of jobs running at once (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--job-time",
+        type=float,
+        default=0.0,
+        help="How long each job sleeps, in seconds (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--poll-freq",
+        type=float,
+        default=1.0,
+        help="Launcher poll interval in seconds (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=["poll", "signal", "both"],
+        default="both",
+        help="Which completion mechanism to measure (default: %(default)s)",
+    )
+    args = parser.parse_args()
+
+    log.basicConfig(level=log.WARNING, format="%(message)s")
+
+    if SignalBenchLauncher.completion_signal is None and args.mode != "poll":
+        print("This platform has no SIGCHLD; only polling is available.")
+        return 1
+
+    BenchLauncher.cmd = shlex.split(f"sleep {args.job_time}")
+    BenchLauncher.max_parallel = args.max_parallel
+    BenchLauncher.poll_freq = args.poll_freq
+
+    if args.mode in ["poll", "both"]:
+        run_mode("poll", PollingBenchLauncher, args.jobs, args.job_time)
+    if args.mode in ["signal", "both"]:
+        run_mode("signal", SignalBenchLauncher, args.jobs, args.job_time)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
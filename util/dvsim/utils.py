@@ -5,8 +5,10 @@ r"""
 Utility functions common across dvsim.
 """
 
+import hashlib
 import logging as log
 import os
+import pickle
 import re
 import shlex
 import shutil
@@ -78,15 +80,106 @@ def run_cmd_with_timeout(cmd, timeout=-1, exit_on_failure=1):
     return (result, status)
 
 
+# Parsed hjson files, pickled, keyed by a hash of their contents. Files such
+# as the common and tool cfgs are imported by every child cfg of a primary
+# cfg, so this means each is only parsed once. The pickles are unpickled on
+# each use, because callers modify the parsed data as they merge it.
+_parsed_hjson = {}
+
+# If not None, a directory in which parsed hjson files are also kept (in the
+# same way) between invocations of dvsim.
+hjson_cache_dir = None
+
+# Bump this to ignore the files in hjson_cache_dir if what is stored changes.
+_HJSON_CACHE_VERSION = 1
+
+# The number of files that prune_hjson_cache() keeps in hjson_cache_dir. This
+# is enough for every cfg and testplan in the tree, with room to spare for a
+# few revisions of each.
+_HJSON_CACHE_MAX_ENTRIES = 4096
+
+
+def get_parsed_hjson(key):
+    """Find the pickled data for the hjson file with the given key."""
+    pickled = _parsed_hjson.get(key)
+    if pickled is None and hjson_cache_dir is not None:
+        path = Path(hjson_cache_dir) / key
+        try:
+            pickled = path.read_bytes()
+        except OSError:
+            return None
+        # Mark the file as recently used, so that prune_hjson_cache keeps it.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        _parsed_hjson[key] = pickled
+    return pickled
+
+
+def put_parsed_hjson(key, pickled):
+    """Remember the pickled data for the hjson file with the given key."""
+    _parsed_hjson[key] = pickled
+    if hjson_cache_dir is None:
+        return
+    try:
+        os.makedirs(hjson_cache_dir, exist_ok=True)
+        tmp_path = Path(hjson_cache_dir) / f".{key}.{os.getpid()}"
+        tmp_path.write_bytes(pickled)
+        os.replace(tmp_path, Path(hjson_cache_dir) / key)
+    except OSError as e:
+        log.debug("Cannot write to hjson cache %s: %s", hjson_cache_dir, e)
+
+
+def prune_hjson_cache(max_entries=_HJSON_CACHE_MAX_ENTRIES):
+    """Delete all but the max_entries most recently used files in the cache.
+
+    Every edit to an hjson file adds a new file to hjson_cache_dir, so this
+    stops it from growing without bound.
+    """
+    if hjson_cache_dir is None:
+        return
+    entries = []
+    try:
+        with os.scandir(hjson_cache_dir) as it:
+            for entry in it:
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    pass
+    except OSError:
+        return
+
+    entries.sort(reverse=True)
+    for _, path in entries[max_entries:]:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
 # Parse hjson and return a dict
 def parse_hjson(hjson_file):
     hjson_cfg_dict = None
     try:
         log.debug("Parsing %s", hjson_file)
-        f = open(hjson_file, 'r')
-        text = f.read()
-        hjson_cfg_dict = hjson.loads(text, use_decimal=True)
-        f.close()
+        with open(hjson_file, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data)
+        digest.update(f"\0{_HJSON_CACHE_VERSION}\0{hjson.__version__}".encode())
+        key = digest.hexdigest()
+
+        pickled = get_parsed_hjson(key)
+        if pickled is not None:
+            try:
+                return pickle.loads(pickled)
+            except Exception as e:
+                log.debug("Ignoring bad hjson cache entry for %s: %s",
+                          hjson_file, e)
+
+        hjson_cfg_dict = hjson.loads(data.decode(), use_decimal=True)
+        put_parsed_hjson(key, pickle.dumps(hjson_cfg_dict,
+                                           pickle.HIGHEST_PROTOCOL))
     except Exception as e:
         log.fatal(
             "Failed to parse \"%s\" possibly due to bad path or syntax error.\n%s",
@@ -116,18 +209,34 @@ def _stringify_wildcard_value(value):
                          'type.'.format(value))
 
 
-def _subst_wildcards(var, mdict, ignored, ignore_error, seen):
+# A wildcard in a string to be substituted (see subst_wildcards)
+_WILDCARD_RE = re.compile(r"{([A-Za-z0-9\_]+)}")
+
+
+def _lookup_wildcard(name, mdict):
+    '''Look up the raw value of a wildcard in mdict or the environment'''
+    value = mdict.get(name)
+    if value is None:
+        value = os.environ.get(name)
+    return value
+
+
+def _subst_wildcards(var, mdict, ignored, ignore_error, seen,
+                     table=None, deps=None):
     '''Worker function for subst_wildcards
 
     seen is a list of wildcards that have been expanded on the way to this call
     (used for spotting circular recursion).
 
+    If table is not None, it is a WildcardTable for mdict, ignored and
+    ignore_error, which is used to look up (and remember) the expansion of each
+    wildcard. In that case, deps is a dictionary that gets the names of the
+    wildcards that we looked at (see WildcardTable).
+
     Returns (expanded, seen_err) where expanded is the new value of the string
     and seen_err is true if we stopped early because of an ignored error.
 
     '''
-    wildcard_re = re.compile(r"{([A-Za-z0-9\_]+)}")
-
     # Work from left to right, expanding each wildcard we find. idx is where we
     # should start searching (so that we don't keep finding a wildcard that
     # we've decided to ignore).
@@ -136,8 +245,7 @@ def _subst_wildcards(var, mdict, ignored, ignore_error, seen):
     any_err = False
 
     while True:
-        right_str = var[idx:]
-        match = wildcard_re.search(right_str)
+        match = _WILDCARD_RE.search(var, idx)
 
         # If no match, we're done.
         if match is None:
@@ -147,7 +255,7 @@ def _subst_wildcards(var, mdict, ignored, ignore_error, seen):
 
         # If the name should be ignored, skip over it.
         if name in ignored:
-            idx += match.end()
+            idx = match.end()
             continue
 
         # If the name has been seen already, we've spotted circular recursion.
@@ -158,14 +266,15 @@ def _subst_wildcards(var, mdict, ignored, ignore_error, seen):
 
         # Treat eval_cmd specially
         if name == 'eval_cmd':
-            cmd = _subst_wildcards(right_str[match.end():], mdict, ignored,
-                                   ignore_error, seen)[0]
+            cmd = _subst_wildcards(var[match.end():], mdict, ignored,
+                                   ignore_error, seen, table, deps)[0]
 
             # Are there any wildcards left in cmd? If not, we can run the
             # command and we're done.
-            cmd_matches = list(wildcard_re.finditer(cmd))
+            cmd_matches = list(_WILDCARD_RE.finditer(cmd))
             if not cmd_matches:
-                var = var[:match.start()] + run_cmd(cmd)
+                output = run_cmd(cmd) if table is None else table.eval_cmd(cmd)
+                var = var[:match.start()] + output
                 continue
 
             # Otherwise, check that each of them is ignored, or that
@@ -185,38 +294,35 @@ def _subst_wildcards(var, mdict, ignored, ignore_error, seen):
             # don't want to report an error either because ignore_error is true
             # or because each wildcard that's left is ignored. Return the
             # partially evaluated version.
-            return (var[:idx] + right_str[:match.end()] + cmd, True)
-
-        # Otherwise, look up name in mdict.
-        value = mdict.get(name)
-
-        # If the value isn't set, check the environment
-        if value is None:
-            value = os.environ.get(name)
+            return (var[:match.end()] + cmd, True)
+
+        # Otherwise, look up name in mdict (or the environment) and do any
+        # recursive expansion of its value, adding name to seen (to avoid
+        # circular recursion). With a table, this is only done once per name.
+        if table is not None:
+            value, saw_err = table.expand(name, seen, deps)
+        else:
+            value = _lookup_wildcard(name, mdict)
+            if value is not None:
+                value, saw_err = _subst_wildcards(
+                    _stringify_wildcard_value(value), mdict, ignored,
+                    ignore_error, seen + [name])
 
         if value is None:
             # Ignore missing values if ignore_error is True.
             if ignore_error:
-                idx += match.end()
+                idx = match.end()
                 continue
 
             raise ValueError('String to be expanded contains '
                              'unknown wildcard, {!r}.'.format(match.group(0)))
 
-        value = _stringify_wildcard_value(value)
-
-        # Do any recursive expansion of value, adding name to seen (to avoid
-        # circular recursion).
-        value, saw_err = _subst_wildcards(value, mdict, ignored, ignore_error,
-                                          seen + [name])
-
         # Replace the original match with the result and go around again. If
         # saw_err, increment idx past what we just inserted.
-        var = (var[:idx] + right_str[:match.start()] + value +
-               right_str[match.end():])
+        var = var[:match.start()] + value + var[match.end():]
         if saw_err:
             any_err = True
-            idx += match.start() + len(value)
+            idx = match.start() + len(value)
 
 
 def subst_wildcards(var, mdict, ignored_wildcards=[], ignore_error=False):
@@ -293,19 +399,124 @@ def subst_wildcards(var, mdict, ignored_wildcards=[], ignore_error=False):
         sys.exit(1)
 
 
+class WildcardTable:
+    '''Memoised wildcard substitution against a single dictionary
+
+    This gives the same results as subst_wildcards(var, mdict,
+    ignored_wildcards, ignore_error) for each string passed to subst(), but
+    each wildcard's value is only expanded once, the first time it is needed
+    (after expanding the wildcards it depends on). The output of each command
+    run with eval_cmd is also remembered, so each command is only run once.
+
+    Each expansion records the values of all the wildcards that it depended on.
+    Before a remembered expansion is used, these are checked against mdict (and
+    the environment), so it is fine for mdict to change while the table is in
+    use: any expansion that depended on something that changed is just done
+    again.
+
+    If eval_outputs is not None, it is a dictionary mapping commands to their
+    outputs, which can be shared between tables.
+
+    '''
+    def __init__(self, mdict, ignored_wildcards=[], ignore_error=False,
+                 eval_outputs=None):
+        self.mdict = mdict
+        self.ignored_wildcards = list(ignored_wildcards)
+        self.ignore_error = ignore_error
+
+        # A dict mapping a wildcard name to a tuple (value, saw_err, deps).
+        # value and saw_err are as returned by _subst_wildcards for the
+        # wildcard's value. deps is a dict from the name of each wildcard that
+        # the expansion looked at (including name itself) to the stringified
+        # value it had at the time (or None if it wasn't defined).
+        self._expansions = {}
+
+        # A dict mapping a command run with eval_cmd to its output.
+        self._eval_outputs = {} if eval_outputs is None else eval_outputs
+
+    def _is_current(self, deps):
+        '''Check that each wildcard in deps still has the same value'''
+        for name, old_value in deps.items():
+            value = _lookup_wildcard(name, self.mdict)
+            if value is not None:
+                try:
+                    value = _stringify_wildcard_value(value)
+                except ValueError:
+                    return False
+            if value != old_value:
+                return False
+        return True
+
+    def expand(self, name, seen, deps):
+        '''Expand the value of the wildcard called name
+
+        Returns (value, saw_err) as for _subst_wildcards or (None, False) if
+        the wildcard isn't defined. Adds the wildcards that the expansion
+        depends on to deps (if it is not None).
+
+        '''
+        entry = self._expansions.get(name)
+        if entry is None or not self._is_current(entry[2]):
+            raw_value = _lookup_wildcard(name, self.mdict)
+            if raw_value is None:
+                if deps is not None:
+                    deps[name] = None
+                return (None, False)
+
+            str_value = _stringify_wildcard_value(raw_value)
+            entry_deps = {name: str_value}
+            value, saw_err = _subst_wildcards(str_value, self.mdict,
+                                              self.ignored_wildcards,
+                                              self.ignore_error,
+                                              seen + [name], self, entry_deps)
+            entry = (value, saw_err, entry_deps)
+            self._expansions[name] = entry
+
+        if deps is not None:
+            deps.update(entry[2])
+        return (entry[0], entry[1])
+
+    def eval_cmd(self, cmd):
+        '''Run cmd (with run_cmd), or return its output from last time'''
+        output = self._eval_outputs.get(cmd)
+        if output is None:
+            output = run_cmd(cmd)
+            self._eval_outputs[cmd] = output
+        return output
+
+    def subst(self, var):
+        '''Substitute wildcards in var, as with subst_wildcards'''
+        try:
+            return _subst_wildcards(var, self.mdict, self.ignored_wildcards,
+                                    self.ignore_error, [], self, None)[0]
+        except ValueError as err:
+            log.error(str(err))
+            sys.exit(1)
+
+
 def find_and_substitute_wildcards(sub_dict,
                                   full_dict,
                                   ignored_wildcards=[],
-                                  ignore_error=False):
+                                  ignore_error=False,
+                                  table=None):
     '''
     Recursively find key values containing wildcards in sub_dict in full_dict
     and return resolved sub_dict.
+
+    The substitution is done with table, a WildcardTable for full_dict,
+    ignored_wildcards and ignore_error. If table is None, a new one is used
+    for this call.
     '''
+    if table is None:
+        table = WildcardTable(full_dict, ignored_wildcards, ignore_error)
+    assert table.mdict is full_dict
+
     for key in sub_dict.keys():
         if type(sub_dict[key]) in [dict, OrderedDict]:
             # Recursively call this function in sub-dicts
             sub_dict[key] = find_and_substitute_wildcards(
-                sub_dict[key], full_dict, ignored_wildcards, ignore_error)
+                sub_dict[key], full_dict, ignored_wildcards, ignore_error,
+                table)
 
         elif type(sub_dict[key]) is list:
             sub_dict_key_values = list(sub_dict[key])
@@ -316,19 +527,17 @@ def find_and_substitute_wildcards(sub_dict,
                     # Recursively call this function in sub-dicts
                     sub_dict_key_values[i] = \
                         find_and_substitute_wildcards(sub_dict_key_values[i],
-                                                      full_dict, ignored_wildcards, ignore_error)
+                                                      full_dict, ignored_wildcards, ignore_error,
+                                                      table)
 
                 elif type(sub_dict_key_values[i]) is str:
-                    sub_dict_key_values[i] = subst_wildcards(
-                        sub_dict_key_values[i], full_dict, ignored_wildcards,
-                        ignore_error)
+                    sub_dict_key_values[i] = table.subst(sub_dict_key_values[i])
 
             # Set the substituted key values back
             sub_dict[key] = sub_dict_key_values
 
         elif type(sub_dict[key]) is str:
-            sub_dict[key] = subst_wildcards(sub_dict[key], full_dict,
-                                            ignored_wildcards, ignore_error)
+            sub_dict[key] = table.subst(sub_dict[key])
     return sub_dict
 
 
@@ -355,6 +564,15 @@ def md_results_to_html(title, css_file, md_text):
     return html_text
 
 
+# A html table cell holding a numerical value (or a 'not applicable' string)
+# followed by an identifier, for htmc_color_pc_cells. The groups are the whole
+# cell, the value and the identifier. The value patterns are for floating
+# point numbers ('0', '0.0' & '.0') and the 'not applicable' strings.
+_PC_CELL_RE = re.compile(
+    r"(<td.*>\s*([\+\-]?\d+\.?\d*|--|NA|N.A.|N.A|N/A|na|n.a.|n.a|n/a)"
+    r"\s+(%|%u|G|B|E|W|I|EN|WN)\s*</td>)")
+
+
 def htmc_color_pc_cells(text):
     '''This function finds cells in a html table that contain numerical values
     (and a few known strings) followed by a single space and an identifier.
@@ -409,98 +627,63 @@ def htmc_color_pc_cells(text):
 
     # List of 'not applicable' identifiers.
     na_list = ['--', 'NA', 'N.A.', 'N.A', 'N/A', 'na', 'n.a.', 'n.a', 'n/a']
-    na_list_patterns = '|'.join(na_list)
-
-    # List of floating point patterns: '0', '0.0' & '.0'
-    fp_patterns = r"[\+\-]?\d+\.?\d*"
-
-    patterns = fp_patterns + '|' + na_list_patterns
-    indicators = "%|%u|G|B|E|W|I|EN|WN"
-    match = re.findall(
-        r"(<td.*>\s*(" + patterns + r")\s+(" + indicators + r")\s*</td>)",
-        text)
-    if len(match) > 0:
-        subst_list = {}
-        fp_nums = []
-        for item in match:
-            # item is a tuple - first is the full string indicating the table
-            # cell which we want to replace, second is the floating point value.
-            cell = item[0]
-            fp_num = item[1]
-            indicator = item[2]
-            # Skip if fp_num is already processed.
-            if (fp_num, indicator) in fp_nums:
-                continue
-            fp_nums.append((fp_num, indicator))
-            if fp_num in na_list:
-                subst = color_cell(cell, "cna", indicator)
-            else:
-                # Item is a fp num.
-                try:
-                    fp = float(fp_num)
-                except ValueError:
-                    log.error(
-                        "Percentage item \"%s\" in cell \"%s\" is not an "
-                        "integer or a floating point number", fp_num, cell)
-                    continue
-                # Percentage, colored.
-                if indicator == "%":
-                    if fp >= 0.0 and fp < 10.0:
-                        subst = color_cell(cell, "c0")
-                    elif fp >= 10.0 and fp < 20.0:
-                        subst = color_cell(cell, "c1")
-                    elif fp >= 20.0 and fp < 30.0:
-                        subst = color_cell(cell, "c2")
-                    elif fp >= 30.0 and fp < 40.0:
-                        subst = color_cell(cell, "c3")
-                    elif fp >= 40.0 and fp < 50.0:
-                        subst = color_cell(cell, "c4")
-                    elif fp >= 50.0 and fp < 60.0:
-                        subst = color_cell(cell, "c5")
-                    elif fp >= 60.0 and fp < 70.0:
-                        subst = color_cell(cell, "c6")
-                    elif fp >= 70.0 and fp < 80.0:
-                        subst = color_cell(cell, "c7")
-                    elif fp >= 80.0 and fp < 90.0:
-                        subst = color_cell(cell, "c8")
-                    elif fp >= 90.0 and fp < 100.0:
-                        subst = color_cell(cell, "c9")
-                    elif fp >= 100.0:
-                        subst = color_cell(cell, "c10")
-                # Percentage, uncolored.
-                elif indicator == "%u":
-                    subst = cell.replace("%u", "%")
-                # Good: green
-                elif indicator == "G":
-                    subst = color_cell(cell, "c10", indicator)
-                # Bad: red
-                elif indicator == "B":
-                    subst = color_cell(cell, "c0", indicator)
-                # Info, uncolored.
-                elif indicator == "I":
-                    subst = cell.replace("I", "")
-                # Bad if positive: red for errors, yellow for warnings,
-                # otherwise green.
-                elif indicator in ["E", "W"]:
-                    if fp <= 0:
-                        subst = color_cell(cell, "c10", indicator)
-                    elif indicator == "W":
-                        subst = color_cell(cell, "c6", indicator)
-                    elif indicator == "E":
-                        subst = color_cell(cell, "c0", indicator)
-                # Bad if negative: red for errors, yellow for warnings,
-                # otherwise green.
-                elif indicator in ["EN", "WN"]:
-                    if fp >= 0:
-                        subst = color_cell(cell, "c10", indicator)
-                    elif indicator == "WN":
-                        subst = color_cell(cell, "c6", indicator)
-                    elif indicator == "EN":
-                        subst = color_cell(cell, "c0", indicator)
-            subst_list[cell] = subst
-        for item in subst_list:
-            text = text.replace(item, subst_list[item])
-    return text
+
+    def subst_cell(cell, fp_num, indicator):
+        """Return the marked-up cell (or None if it can't be marked up)."""
+        if fp_num in na_list:
+            return color_cell(cell, "cna", indicator)
+
+        # Item is a fp num.
+        try:
+            fp = float(fp_num)
+        except ValueError:
+            log.error(
+                "Percentage item \"%s\" in cell \"%s\" is not an "
+                "integer or a floating point number", fp_num, cell)
+            return None
+        # Percentage, colored: c0 for 0.00-9.99 up to c10 for 100 or more.
+        if indicator == "%":
+            if fp < 0.0:
+                return None
+            return color_cell(cell, "c{}".format(min(int(fp // 10), 10)))
+        # Percentage, uncolored.
+        if indicator == "%u":
+            return cell.replace("%u", "%")
+        # Good: green
+        if indicator == "G":
+            return color_cell(cell, "c10", indicator)
+        # Bad: red
+        if indicator == "B":
+            return color_cell(cell, "c0", indicator)
+        # Info, uncolored.
+        if indicator == "I":
+            return cell.replace("I", "")
+        # Bad if positive: red for errors, yellow for warnings,
+        # otherwise green.
+        if indicator in ["E", "W"]:
+            if fp <= 0:
+                return color_cell(cell, "c10", indicator)
+            return color_cell(cell, "c6" if indicator == "W" else "c0",
+                              indicator)
+        # Bad if negative: red for errors, yellow for warnings,
+        # otherwise green.
+        if fp >= 0:
+            return color_cell(cell, "c10", indicator)
+        return color_cell(cell, "c6" if indicator == "WN" else "c0",
+                          indicator)
+
+    # Tables may repeat the same cell many times, so each distinct cell is
+    # only marked up once. The text is rewritten in a single pass, rather
+    # than once per distinct cell.
+    substs = {}
+
+    def replace(match):
+        cell = match.group(1)
+        if cell not in substs:
+            substs[cell] = subst_cell(cell, match.group(2), match.group(3))
+        return substs[cell] or cell
+
+    return _PC_CELL_RE.sub(replace, text)
 
 
 def print_msg_list(msg_list_title, msg_list, max_msg_count=-1):
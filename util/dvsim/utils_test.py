@@ -6,7 +6,9 @@
 
 import os
 import pytest
-from .utils import _subst_wildcards, subst_wildcards
+from . import utils
+from .utils import (WildcardTable, _subst_wildcards, parse_hjson,
+                    prune_hjson_cache, subst_wildcards)
 
 
 def test_subst_wildcards():
@@ -78,3 +80,92 @@ def test_subst_wildcards():
                                 'bar': 'q',
                                 'p_xyz_q': 'baz'
                             }) == 'baz')
+
+
+def test_wildcard_table(tmp_path):
+    '''Pytest-compatible test for the WildcardTable class.'''
+    mdict = {'a': '{b}-{c}', 'b': 'bee', 'c': ['{b}', 1], 'd': '{biggles}'}
+
+    # The table gives the same results as subst_wildcards, including when
+    # errors are ignored.
+    table = WildcardTable(mdict)
+    assert table.subst('{a} {b}') == subst_wildcards('{a} {b}', mdict)
+    assert table.subst('{a} {a}') == 'bee-bee 1 bee-bee 1'
+    assert (WildcardTable(mdict, ignore_error=True).subst('{d} {a}') ==
+            subst_wildcards('{d} {a}', mdict, ignore_error=True))
+    assert (WildcardTable(mdict, ignored_wildcards=['b']).subst('{a}') ==
+            '{b}-{b} 1')
+
+    # Changing mdict invalidates any expansions that depended on what changed.
+    mdict['b'] = 'bumble'
+    assert table.subst('{a}') == 'bumble-bumble 1'
+    mdict['c'].append('{b}')
+    assert table.subst('{a}') == 'bumble-bumble 1 bumble'
+
+    # Circular recursion is still spotted.
+    with pytest.raises(ValueError) as excinfo:
+        table = WildcardTable({'a': '{b}', 'b': '{a}'})
+        _subst_wildcards('{a}', table.mdict, [], False, [], table)
+    assert "circular expansion of wildcard '{a}'" in str(excinfo.value)
+
+    # Each command is only run once.
+    counter = tmp_path / 'counter'
+    table = WildcardTable({'cmd': 'echo x >> {0}; cat {0}'.format(counter)})
+    assert table.subst('{eval_cmd}{cmd}') == 'x'
+    assert table.subst('{eval_cmd}{cmd}') == 'x'
+
+
+def test_parse_hjson_cache(tmp_path, monkeypatch):
+    '''Check that parsed hjson files are cached by their contents.'''
+    monkeypatch.setattr(utils, '_parsed_hjson', {})
+    monkeypatch.setattr(utils, 'hjson_cache_dir', str(tmp_path / 'cache'))
+
+    cfg = tmp_path / 'cfg.hjson'
+    cfg.write_text('{\n  name: foo\n  opts: ["a", "b"]\n}\n')
+    data = parse_hjson(str(cfg))
+    assert data == {'name': 'foo', 'opts': ['a', 'b']}
+
+    # Callers get their own copy, which they can modify.
+    data['opts'] += ['c']
+    assert parse_hjson(str(cfg))['opts'] == ['a', 'b']
+    assert len(os.listdir(tmp_path / 'cache')) == 1
+
+    # A later run finds the parsed file on disk, without parsing it again.
+    monkeypatch.setattr(utils, '_parsed_hjson', {})
+    with monkeypatch.context() as m:
+        m.setattr(utils.hjson, 'loads', None)
+        assert parse_hjson(str(cfg))['name'] == 'foo'
+
+    # Changing the file means it is parsed again.
+    cfg.write_text('{\n  name: bar\n}\n')
+    assert parse_hjson(str(cfg)) == {'name': 'bar'}
+    assert len(os.listdir(tmp_path / 'cache')) == 2
+
+
+def test_prune_hjson_cache(tmp_path, monkeypatch):
+    '''Check that pruning keeps the most recently used cache files.'''
+    monkeypatch.setattr(utils, '_parsed_hjson', {})
+    cache_dir = tmp_path / 'cache'
+    monkeypatch.setattr(utils, 'hjson_cache_dir', str(cache_dir))
+
+    cfgs = []
+    for idx in range(4):
+        cfg = tmp_path / f'cfg{idx}.hjson'
+        cfg.write_text(f'{{\n  name: cfg{idx}\n}}\n')
+        parse_hjson(str(cfg))
+        cfgs.append(cfg)
+
+    # Make the files look as if they were written in order, a second apart.
+    files = sorted(cache_dir.iterdir(), key=lambda path: path.stat().st_mtime)
+    for idx, path in enumerate(files):
+        os.utime(path, (1000 + idx, 1000 + idx))
+    oldest = files[0]
+
+    # Reading a file from the cache counts as using it.
+    monkeypatch.setattr(utils, '_parsed_hjson', {})
+    key = oldest.name
+    assert utils.get_parsed_hjson(key) is not None
+    assert oldest.stat().st_mtime > 1003
+
+    prune_hjson_cache(max_entries=2)
+    assert sorted(cache_dir.iterdir()) == sorted([oldest, files[-1]])
@@ -10,6 +10,7 @@ from pathlib import Path
 from typing import Dict, Optional, Union
 
 import reggen.gen_rtl
+from basegen.templates import template_lookup
 from mako import exceptions as mako_exceptions  # type: ignore
 from mako.lookup import TemplateLookup as MakoTemplateLookup  # type: ignore
 from reggen.countermeasure import CounterMeasure
@@ -94,9 +95,8 @@ class IpTemplateRendererBase:
             # this directory using relative paths.
             # Use strict_undefined to throw a NameError if undefined variables
             # are used within a template.
-            self._lookup = MakoTemplateLookup(
-                directories=[str(self.ip_template.template_path)],
-                strict_undefined=True)
+            self._lookup = template_lookup([self.ip_template.template_path],
+                                           strict_undefined=True)
         return self._lookup
 
     def get_uniquified_name(self, name: str) -> str:
@@ -292,7 +292,44 @@ class IpBlockRenderer(IpTemplateRendererBase):
                        'Please remove it manually.')
                 raise TemplateRenderError(msg).with_traceback(e.__traceback__)
 
-    def render(self, output_dir: Path, overwrite_output_dir: bool) -> None:
+    def _sync_directory(self, staging_dir: Path, output_dir: Path) -> None:
+        """Update output_dir to match staging_dir, file by file.
+
+        Unlike _refresh_directory, files whose contents (and permissions)
+        haven't changed are left alone, keeping their modification times.
+        Files in output_dir that aren't in staging_dir are removed.
+        """
+        staged = set()
+        for src in staging_dir.rglob('*'):
+            if src.is_dir():
+                continue
+            rel_path = src.relative_to(staging_dir)
+            staged.add(rel_path)
+            dst = output_dir / rel_path
+            try:
+                if (dst.is_file() and
+                        dst.stat().st_mode == src.stat().st_mode and
+                        dst.read_bytes() == src.read_bytes()):
+                    continue
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(src, dst)
+            except OSError as e:
+                raise TemplateRenderError(
+                    f'Cannot update {dst}: {e}').with_traceback(
+                        e.__traceback__)
+
+        # Remove stale files, and then any directories left empty.
+        for dst in sorted(output_dir.rglob('*'), reverse=True):
+            rel_path = dst.relative_to(output_dir)
+            if dst.is_dir() and not dst.is_symlink():
+                if (not any(dst.iterdir()) and
+                        not (staging_dir / rel_path).is_dir()):
+                    dst.rmdir()
+            elif rel_path not in staged:
+                dst.unlink()
+
+    def render(self, output_dir: Path, overwrite_output_dir: bool,
+               keep_unchanged: bool = False) -> None:
         """ Render the IP template into output_dir.
 
         Generates the IP directory in a staging area and atomically moves it
@@ -301,6 +338,10 @@ class IpBlockRenderer(IpTemplateRendererBase):
         - Copy all non-template files.
         - Render all *.tpl files to their corresponding location.
         - Generate register file description with reggen.
+
+        If keep_unchanged is true and output_dir exists (and may be
+        overwritten), only the files that changed are replaced, rather than
+        the whole directory.
         """
         # Ensure to operate on an absolute path for output_dir.
         output_dir = output_dir.resolve()
@@ -379,7 +420,11 @@ class IpBlockRenderer(IpTemplateRendererBase):
             f'{self.ip_config.instance_name}.ipconfig.hjson',
             header=_HJSON_LICENSE_HEADER)
 
-        self._refresh_directory(staging_dir, output_dir, overwrite_output_dir)
+        if keep_unchanged and overwrite_output_dir and output_dir.is_dir():
+            self._sync_directory(staging_dir, output_dir)
+        else:
+            self._refresh_directory(staging_dir, output_dir,
+                                    overwrite_output_dir)
 
         # Ensure that the staging directory is removed at the end. Ignore
         # errors as the directory should not exist at this point actually.
@@ -0,0 +1,111 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+'''A persistent cache of validated IP blocks
+
+Parsing and validating an IP block's Hjson takes a while, and tools like
+topgen, dttool and raclgen load the same IP blocks every time they run.
+If the cache is turned on, IpBlock.from_text() keeps each block that it
+validates in a cache directory (as a pickle) and loads it from there the
+next time it is asked for the same block.
+
+A cached block is keyed by a digest of everything that validation depends
+on: the Hjson text, the parameter defaults, node and location that were
+passed to from_text(), the sources of reggen itself and the versions of
+Python and of the libraries whose objects end up in an IpBlock. Changing any
+of these means that the block is validated again. Hjson files that fail
+validation are never cached, so their errors are reported every time.
+
+The cache is off by default. It is turned on by setting OT_REGGEN_CACHE_DIR
+to a directory (see basegen.cache), which should only be written by the
+user running the tools, since loading a cached block unpickles it. The cache
+directory can be deleted at any time.
+'''
+
+import hashlib
+import logging as log
+import pickle
+import sys
+from pathlib import Path
+from typing import Optional, Sequence, Tuple, Type, TypeVar
+
+import hjson  # type: ignore
+import semantic_version
+
+from basegen.cache import cache_dir, write_atomically
+
+CACHE_DIR_ENV = 'OT_REGGEN_CACHE_DIR'
+
+T = TypeVar('T')
+
+_reggen_digest: Optional[str] = None
+
+
+def _reggen_sources_digest() -> str:
+    '''Return a digest of reggen's sources (computed once per process)'''
+    global _reggen_digest
+    if _reggen_digest is None:
+        hasher = hashlib.sha256()
+        for path in sorted(Path(__file__).parent.glob('*.py')):
+            hasher.update(path.name.encode('utf-8'))
+            hasher.update(b'\0')
+            hasher.update(path.read_bytes())
+            hasher.update(b'\0')
+        _reggen_digest = hasher.hexdigest()
+    return _reggen_digest
+
+
+def _cache_path(directory: Path, txt: str,
+                param_defaults: Sequence[Tuple[str, str]], where: str,
+                node: str) -> Path:
+    hasher = hashlib.sha256()
+    for part in (_reggen_sources_digest(), sys.version,
+                 hjson.__version__, semantic_version.__version__,
+                 repr(list(param_defaults)), where, node, txt):
+        hasher.update(part.encode('utf-8'))
+        hasher.update(b'\0')
+    return directory / (hasher.hexdigest() + '.pickle')
+
+
+def load_block(txt: str, param_defaults: Sequence[Tuple[str, str]],
+               where: str, node: str, cls: Type[T]) -> Optional[T]:
+    '''Return the cached block validated from txt, or None
+
+    txt, param_defaults, where and node are the arguments of
+    IpBlock.from_text(), and cls is IpBlock. Returns None if the cache is off,
+    the block is not in it, or the entry can't be loaded as an object of
+    class cls. Every call returns a new object, so callers can modify the
+    block that they get.
+    '''
+    directory = cache_dir(CACHE_DIR_ENV)
+    if directory is None:
+        return None
+
+    path = _cache_path(directory, txt, param_defaults, where, node)
+    try:
+        with open(path, 'rb') as handle:
+            block = pickle.load(handle)
+    except FileNotFoundError:
+        return None
+    except Exception as err:
+        # A damaged entry (from a process that was killed, say) is just a
+        # cache miss.
+        log.debug(f'Ignoring cached IP block {path}: {err}')
+        return None
+
+    if not isinstance(block, cls):
+        log.debug(f'Ignoring cached IP block {path}, which contains a '
+                  f'{type(block).__name__}')
+        return None
+    return block
+
+
+def store_block(txt: str, param_defaults: Sequence[Tuple[str, str]],
+                where: str, node: str, block: object) -> None:
+    '''Add a block validated from txt to the cache (if it is on)'''
+    directory = cache_dir(CACHE_DIR_ENV)
+    if directory is None:
+        return
+    path = _cache_path(directory, txt, param_defaults, where, node)
+    write_atomically(path,
+                     pickle.dumps(block, protocol=pickle.HIGHEST_PROTOCOL))
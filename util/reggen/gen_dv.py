@@ -12,9 +12,9 @@ from typing import Dict, List, Union, Optional
 import yaml
 
 from mako import exceptions  # type: ignore
-from mako.lookup import TemplateLookup  # type: ignore
 import importlib.resources
 
+from basegen.templates import template_lookup
 from reggen.ip_block import IpBlock
 from reggen.multi_register import MultiRegister
 from reggen.register import Register
@@ -152,8 +152,7 @@ def get_block_base_name(dv_base_names_map: Dict[str, DvBaseNames],
 def gen_dv(block: IpBlock, dv_base_names: List[str], outdir: str) -> int:
     '''Generate DV files for an IpBlock'''
 
-    lookup = TemplateLookup(
-        directories=[str(importlib.resources.files('reggen'))])
+    lookup = template_lookup([str(importlib.resources.files('reggen'))])
     uvm_reg_tpl = lookup.get_template('uvm_reg.sv.tpl')
 
     # Generate the RAL package(s). For a device interface with no name we
@@ -11,16 +11,16 @@ import os.path
 
 import yaml
 from mako import exceptions  # type: ignore
-from mako.template import Template  # type: ignore
 import importlib.resources
 
+from basegen.templates import template_from_file
 from reggen.ip_block import IpBlock
 
 
 def gen_fpv(block: IpBlock, outdir: str) -> int:
     # Read Register templates
-    fpv_csr_tpl = Template(
-        filename=str(importlib.resources.files('reggen') / "fpv_csr.sv.tpl"))
+    fpv_csr_tpl = template_from_file(
+        str(importlib.resources.files('reggen') / "fpv_csr.sv.tpl"))
 
     device_hier_paths = block.bus_interfaces.device_hier_paths
 
@@ -329,6 +329,11 @@ def gen_const_interrupts(fieldout: TextIO, block: IpBlock, component: str,
 def gen_tock(block: IpBlock, outfile: TextIO, src_file: Optional[str],
              src_lic: Optional[str], src_copy: str,
              version: VersionInformation) -> int:
+    # Reserved fields are numbered from 1 in each file, even if this is not
+    # the first block that the process generates.
+    global filler_no
+    filler_no = 0
+
     rnames = block.get_rnames()
 
     paramout = io.StringIO()
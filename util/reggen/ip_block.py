@@ -9,6 +9,7 @@ from dataclasses import dataclass
 
 import hjson  # type: ignore
 from reggen.alert import Alert
+from reggen.block_cache import load_block, store_block
 from reggen.bus_interfaces import BusInterfaces
 from reggen.clocking import Clocking, ClockingItem
 from reggen.countermeasure import CounterMeasure
@@ -387,10 +388,18 @@ class IpBlock:
                   param_defaults: list[tuple[str, str]],
                   where: str,
                   node: str = '') -> 'IpBlock':
-        '''Load an IpBlock from an hjson description in txt'''
-        return IpBlock.from_raw(param_defaults,
-                                hjson.loads(txt, use_decimal=True), where,
-                                node)
+        '''Load an IpBlock from an hjson description in txt
+
+        If OT_REGGEN_CACHE_DIR is set, validated blocks are cached between
+        runs (see reggen.block_cache).
+        '''
+        block = load_block(txt, param_defaults, where, node, IpBlock)
+        if block is None:
+            block = IpBlock.from_raw(param_defaults,
+                                     hjson.loads(txt, use_decimal=True), where,
+                                     node)
+            store_block(txt, param_defaults, where, node, block)
+        return block
 
     @staticmethod
     def from_path(path: str,
@@ -7,9 +7,16 @@ r"""Command-line tool to validate and convert register hjson
 """
 import argparse
 import logging as log
+import multiprocessing
+import os
 import re
 import sys
+import time
 from pathlib import Path
+from typing import Dict, List, Optional, TextIO, Tuple
+
+import hjson
+from tabulate import tabulate
 
 from reggen import (
     gen_cfg_md, gen_cheader, gen_dv, gen_fpv, gen_md, gen_html, gen_json, gen_rtl,
@@ -24,10 +31,317 @@ DESC = """regtool, generate register info from Hjson source"""
 USAGE = '''
   regtool [options]
   regtool [options] <input>
+  regtool --batch <manifest> [--jobs N] [options]
   regtool (-h | --help)
   regtool (-V | --version)
 '''
 
+BATCH_DESC = """
+batch mode:
+  With --batch, regtool reads a manifest that lists IP Hjson files and the
+  outputs to generate from each of them. Each file is parsed and validated
+  once, all of its outputs are generated from the result, and the IPs are
+  processed by up to --jobs processes. A manifest looks like:
+
+    {
+      ips: [
+        {
+          hjson: "hw/ip/uart/data/uart.hjson"
+          // Optional, like --param, --node, --alias and --scrub.
+          param: "",
+          node: "",
+          outputs: [
+            // Formats that write a directory take "outdir", which defaults
+            // to the same directory as on the command line.
+            {format: "rtl"},
+            {format: "dv", outdir: "build/uart_dv",
+             dv_base_names: ["uart:block:uart_base_reg_block"]},
+            // Other formats need an "outfile".
+            {format: "cdh", outfile: "build/uart_regs.h"},
+          ]
+        }
+      ]
+    }
+
+  Paths are relative to the current directory. The formats are json (-j),
+  compact (-c), registers (-d), rtl (-r), dv (-s), fpv (-f), cdh
+  (--cdefines), sec_cm_testplan, rs (--rust), trs (--tock), interfaces,
+  systemrdl, doc_html_old and hjson (the default). Once all IPs are done,
+  the time spent on each of them is printed.
+"""
+
+# Entries are triples of the form (arg, (fmt, dirspec)).
+#
+# arg is the name of the argument that selects the format. fmt is the
+# name of the format. dirspec is None if the output is a single file; if
+# the output needs a directory, it is a default path relative to the source
+# file (used when --outdir is not given).
+ARG_TO_FORMAT = [('j', ('json', None)), ('c', ('compact', None)),
+                 ('d', ('registers', None)), ('doc', ('doc', None)),
+                 ('r', ('rtl', 'rtl')), ('s', ('dv', 'dv')),
+                 ('f', ('fpv', 'fpv/vip')), ('cdefines', ('cdh', None)),
+                 ('sec_cm_testplan', ('sec_cm_testplan', 'data')),
+                 ('rust', ('rs', None)), ('tock', ('trs', None)),
+                 ('interfaces', ('interfaces', None)),
+                 ('systemrdl', ('systemrdl', None)),
+                 ('doc_html_old', ('doc_html_old', None))]
+
+# The output formats that can be generated from an IP block, with their
+# dirspecs (see ARG_TO_FORMAT).
+FORMAT_DIRSPECS = {
+    fmt: dirspec
+    for _, (fmt, dirspec) in ARG_TO_FORMAT if fmt != 'doc'
+}
+FORMAT_DIRSPECS['hjson'] = None
+
+
+def parse_params(param: str) -> List[Tuple[str, str]]:
+    '''Split the value of --param into (name, value) pairs'''
+    raw_params = param.split(';') if param else []
+    params = []
+    for idx, raw_param in enumerate(raw_params):
+        tokens = raw_param.split('=')
+        if len(tokens) != 2:
+            raise ValueError('Entry {} in list of parameter defaults to '
+                             'apply is {!r}, which is not of the form '
+                             'param=value.'.format(idx, raw_param))
+        params.append((tokens[0], tokens[1]))
+    return params
+
+
+def default_outdir(src_name: str, dirspec: str) -> str:
+    '''The output directory of a format if none is given'''
+    return str(Path(src_name).parents[1].joinpath(dirspec))
+
+
+def src_license(srcfull: str) -> Tuple[Optional[str], str]:
+    '''Find the license and copyright lines of an Hjson source
+
+    These are copied to generated C and Rust files. Returns a pair (src_lic,
+    src_copy).
+    '''
+    src_lic = None
+    src_copy = ''
+    found_spdx = None
+    found_lunder = None
+    copy = re.compile(r'.*(copyright.*)|(.*\(c\).*)', re.IGNORECASE)
+    spdx = re.compile(r'.*(SPDX-License-Identifier:.+)')
+    lunder = re.compile(r'.*(Licensed under.+)', re.IGNORECASE)
+    for line in srcfull.splitlines():
+        mat = copy.match(line)
+        if mat is not None:
+            src_copy += mat.group(1)
+        mat = spdx.match(line)
+        if mat is not None:
+            found_spdx = mat.group(1)
+        mat = lunder.match(line)
+        if mat is not None:
+            found_lunder = mat.group(1)
+    if found_lunder:
+        src_lic = found_lunder
+    if found_spdx:
+        src_lic += '\n' + found_spdx
+    return src_lic, src_copy
+
+
+def gen_output(obj: IpBlock, fmt: str, srcfull: str, src_name: str,
+               outfile: Optional[TextIO], outdir: Optional[str],
+               dv_base_names: Optional[List[str]],
+               version_stamp: version_file.VersionInformation) -> Optional[int]:
+    '''Generate one output format from a validated IP block
+
+    Formats that write a directory use outdir; the others write to outfile,
+    which is closed when done. srcfull and src_name are the contents and name
+    of the Hjson file that obj was read from. Returns a non-zero value on
+    failure.
+    '''
+    if fmt == 'rtl':
+        return gen_rtl.gen_rtl(obj, outdir)
+    if fmt == 'sec_cm_testplan':
+        return gen_sec_cm_testplan.gen_sec_cm_testplan(obj, outdir)
+    if fmt == 'dv':
+        return gen_dv.gen_dv(obj, dv_base_names, outdir)
+    if fmt == 'fpv':
+        return gen_fpv.gen_fpv(obj, outdir)
+    src_lic, src_copy = src_license(srcfull)
+
+    with outfile:
+        if fmt == 'registers':
+            return gen_md.gen_md(obj, outfile)
+        elif fmt == 'interfaces':
+            # Assumes the registers will be in a file called `registers.md`
+            # and within the same location as the output's destination.
+            # Exposing this as an option would nice to do.
+            return gen_cfg_md.gen_cfg_md(obj, outfile, "registers.md")
+        elif fmt == 'doc_html_old':
+            return gen_html.gen_html(obj, outfile)
+        elif fmt == 'cdh':
+            return gen_cheader.gen_cdefines(obj, outfile, src_lic,
+                                            src_copy)
+        elif fmt == 'rs':
+            return gen_rust.gen_rust(obj, outfile, src_lic, src_copy)
+        elif fmt == 'trs':
+            return gen_tock.gen_tock(obj, outfile, src_name, src_lic,
+                                     src_copy, version_stamp)
+        elif fmt == 'systemrdl':
+            return systemrdl_exporter.SystemrdlExporter(obj).export(outfile)
+        else:
+            return gen_json.gen_json(obj, outfile, fmt)
+
+        outfile.write('\n')
+
+
+def load_manifest(path: str) -> List[Dict[str, object]]:
+    '''Read and check a batch manifest, returning its list of IPs'''
+    with open(path, 'r') as handle:
+        manifest = hjson.load(handle, use_decimal=True)
+
+    if not isinstance(manifest, dict) or \
+            not isinstance(manifest.get('ips'), list):
+        raise ValueError(f'{path}: expected a dict with a list of IPs '
+                         'called "ips".')
+    ip_keys = {'hjson', 'param', 'node', 'alias', 'scrub', 'outputs'}
+    output_keys = {'format', 'outfile', 'outdir', 'dv_base_names'}
+    for idx, ip in enumerate(manifest['ips']):
+        where = f'{path}: IP {idx}'
+        if not isinstance(ip, dict) or 'hjson' not in ip:
+            raise ValueError(f'{where} is not a dict with an "hjson" key.')
+        where = f'{path}: IP {ip["hjson"]}'
+        unknown = set(ip) - ip_keys
+        if unknown:
+            raise ValueError(f'{where} has unknown keys: '
+                             f'{", ".join(sorted(unknown))}.')
+        for output in ip.get('outputs', []):
+            fmt = output.get('format')
+            if fmt not in FORMAT_DIRSPECS:
+                raise ValueError(f'{where} has an output with unknown format '
+                                 f'{fmt!r}.')
+            unknown = set(output) - output_keys
+            if unknown:
+                raise ValueError(f'{where} has a {fmt} output with unknown '
+                                 f'keys: {", ".join(sorted(unknown))}.')
+            if FORMAT_DIRSPECS[fmt] is None:
+                if 'outfile' not in output:
+                    raise ValueError(f'{where} has a {fmt} output with no '
+                                     'outfile.')
+            elif 'outfile' in output:
+                raise ValueError(f'The {fmt} format expects an output '
+                                 f'directory, not an output file ({where}).')
+    return manifest['ips']
+
+
+def _init_batch_worker(log_level: int) -> None:
+    log.getLogger().setLevel(log_level)
+
+
+def run_batch_ip(
+    ip: Dict[str, object], version_stamp: version_file.VersionInformation
+) -> Tuple[float, List[Tuple[str, float]], Optional[str]]:
+    '''Generate the outputs of an IP in a batch manifest
+
+    Returns the time spent parsing the IP's Hjson, the time spent on each
+    output and an error message if something failed.
+    '''
+    src_name = ip['hjson']
+    outputs = []
+    start = time.perf_counter()
+    try:
+        with open(src_name, 'r') as handle:
+            srcfull = handle.read()
+        obj = IpBlock.from_text(srcfull, parse_params(ip.get('param', '')),
+                                src_name, ip.get('node', ''))
+        if 'alias' in ip:
+            obj.alias_from_path(ip.get('scrub', False), Path(ip['alias']))
+    except (OSError, ValueError) as err:
+        return time.perf_counter() - start, outputs, str(err)
+    parse_time = time.perf_counter() - start
+
+    for output in ip.get('outputs', []):
+        fmt = output['format']
+        start = time.perf_counter()
+        try:
+            dirspec = FORMAT_DIRSPECS[fmt]
+            outfile = None
+            outdir = None
+            if dirspec is None:
+                outfile = open(output['outfile'], 'w')
+            else:
+                outdir = output.get('outdir',
+                                    default_outdir(src_name, dirspec))
+            ret = gen_output(obj, fmt, srcfull, src_name, outfile, outdir,
+                             output.get('dv_base_names'), version_stamp)
+        except (OSError, ValueError) as err:
+            return parse_time, outputs, f'{fmt} output: {err}'
+        except SystemExit:
+            # Some generators log an error and exit, which must not take a
+            # worker process (or the rest of the batch) down with them.
+            ret = 1
+        outputs.append((fmt, time.perf_counter() - start))
+        if ret:
+            return parse_time, outputs, f'{fmt} output failed.'
+
+    return parse_time, outputs, None
+
+
+def _run_batch_job(
+    job: Tuple[Dict[str, object], version_file.VersionInformation]
+) -> Tuple[float, List[Tuple[str, float]], Optional[str]]:
+    return run_batch_ip(*job)
+
+
+def run_batch(manifest: str, jobs: int,
+              version_stamp: version_file.VersionInformation) -> int:
+    '''Generate everything in a batch manifest, see BATCH_DESC
+
+    Returns the exit code for regtool.
+    '''
+    try:
+        ips = load_manifest(manifest)
+    except (OSError, ValueError) as err:
+        log.error(str(err))
+        return 1
+
+    start = time.perf_counter()
+    batch_jobs = [(ip, version_stamp) for ip in ips]
+    jobs = max(1, min(jobs, len(ips)))
+    if jobs == 1:
+        results = map(_run_batch_job, batch_jobs)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(jobs,
+                                    initializer=_init_batch_worker,
+                                    initargs=(log.getLogger().level, ))
+        results = pool.imap(_run_batch_job, batch_jobs)
+
+    rows = []
+    failed = 0
+    try:
+        for ip, (parse_time, outputs, error) in zip(ips, results):
+            if error is not None:
+                log.error(f'{ip["hjson"]}: {error}')
+                failed += 1
+            output_time = sum(t for _, t in outputs)
+            rows.append([
+                ip['hjson'], f'{parse_time:.2f}',
+                ', '.join(f'{fmt} {t:.2f}' for fmt, t in outputs),
+                f'{parse_time + output_time:.2f}',
+                'failed' if error is not None else 'ok'
+            ])
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    print(tabulate(rows,
+                   headers=['IP', 'Parse (s)', 'Outputs (s)', 'Total (s)',
+                            'Status']))
+    print(f'Processed {len(ips)} IPs with {jobs} jobs in '
+          f'{time.perf_counter() - start:.2f}s.')
+    if failed:
+        log.error(f'{failed} of {len(ips)} IPs failed.')
+        return 1
+    return 0
+
 
 def main():
     verbose = 0
@@ -36,7 +350,8 @@ def main():
         prog="regtool",
         formatter_class=argparse.RawDescriptionHelpFormatter,
         usage=USAGE,
-        description=DESC)
+        description=DESC,
+        epilog=BATCH_DESC)
     parser.add_argument('input',
                         nargs='?',
                         metavar='file',
@@ -141,6 +456,15 @@ def main():
                         help='''Regblock node to generate.
                                 By default, generate for all nodes.
                                 ''')
+    parser.add_argument('--batch',
+                        metavar='MANIFEST',
+                        help='Generate the outputs listed in a manifest '
+                        '(see "batch mode" below).')
+    parser.add_argument('--jobs',
+                        type=int,
+                        default=os.cpu_count() or 1,
+                        help='Number of IPs processed in parallel in batch '
+                        'mode (default: %(default)s).')
     parser.add_argument(
         '--version-stamp',
         type=str,
@@ -162,24 +486,9 @@ def main():
     else:
         log.basicConfig(format=log_format)
 
-    # Entries are triples of the form (arg, (fmt, dirspec)).
-    #
-    # arg is the name of the argument that selects the format. fmt is the
-    # name of the format. dirspec is None if the output is a single file; if
-    # the output needs a directory, it is a default path relative to the source
-    # file (used when --outdir is not given).
-    arg_to_format = [('j', ('json', None)), ('c', ('compact', None)),
-                     ('d', ('registers', None)), ('doc', ('doc', None)),
-                     ('r', ('rtl', 'rtl')), ('s', ('dv', 'dv')),
-                     ('f', ('fpv', 'fpv/vip')), ('cdefines', ('cdh', None)),
-                     ('sec_cm_testplan', ('sec_cm_testplan', 'data')),
-                     ('rust', ('rs', None)), ('tock', ('trs', None)),
-                     ('interfaces', ('interfaces', None)),
-                     ('systemrdl', ('systemrdl', None)),
-                     ('doc_html_old', ('doc_html_old', None))]
     fmt = None
     dirspec = None
-    for arg_name, spec in arg_to_format:
+    for arg_name, spec in ARG_TO_FORMAT:
         if getattr(args, arg_name):
             if fmt is not None:
                 log.error('Multiple output formats specified on '
@@ -191,16 +500,22 @@ def main():
 
     infile = args.input
 
+    # Extract version stamp from file
+    version_stamp = version_file.VersionInformation(args.version_stamp)
+
+    if args.batch is not None:
+        # Everything else is given by the manifest.
+        if (fmt != 'hjson' or infile is not sys.stdin or args.param or
+                args.node or args.alias is not None or args.scrub or
+                args.outdir is not None or args.outfile is not sys.stdout or
+                args.novalidate or args.dv_base_names):
+            log.error('--batch only takes the --jobs, --version-stamp, '
+                      '--verbose and --quiet options.')
+            sys.exit(1)
+        return run_batch(args.batch, args.jobs, version_stamp)
+
     # Split parameters into key=value pairs.
-    raw_params = args.param.split(';') if args.param else []
-    params = []
-    for idx, raw_param in enumerate(raw_params):
-        tokens = raw_param.split('=')
-        if len(tokens) != 2:
-            raise ValueError('Entry {} in list of parameter defaults to '
-                             'apply is {!r}, which is not of the form '
-                             'param=value.'.format(idx, raw_param))
-        params.append((tokens[0], tokens[1]))
+    params = parse_params(args.param)
 
     # Define either outfile or outdir (but not both), depending on the output
     # format.
@@ -222,7 +537,7 @@ def main():
         if args.outdir is not None:
             outdir = args.outdir
         elif infile is not sys.stdin:
-            outdir = str(Path(infile.name).parents[1].joinpath(dirspec))
+            outdir = default_outdir(infile.name, dirspec)
         else:
             # We're using sys.stdin, so can't infer an output directory name
             log.error(
@@ -232,9 +547,6 @@ def main():
                     fmt))
             sys.exit(1)
 
-    # Extract version stamp from file
-    version_stamp = version_file.VersionInformation(args.version_stamp)
-
     if fmt == 'doc':
         with outfile:
             gen_selfdoc.document(outfile)
@@ -267,60 +579,8 @@ def main():
             gen_json.gen_json(obj, outfile, fmt)
             outfile.write('\n')
     else:
-        if fmt == 'rtl':
-            return gen_rtl.gen_rtl(obj, outdir)
-        if fmt == 'sec_cm_testplan':
-            return gen_sec_cm_testplan.gen_sec_cm_testplan(obj, outdir)
-        if fmt == 'dv':
-            return gen_dv.gen_dv(obj, args.dv_base_names, outdir)
-        if fmt == 'fpv':
-            return gen_fpv.gen_fpv(obj, outdir)
-        src_lic = None
-        src_copy = ''
-        found_spdx = None
-        found_lunder = None
-        copy = re.compile(r'.*(copyright.*)|(.*\(c\).*)', re.IGNORECASE)
-        spdx = re.compile(r'.*(SPDX-License-Identifier:.+)')
-        lunder = re.compile(r'.*(Licensed under.+)', re.IGNORECASE)
-        for line in srcfull.splitlines():
-            mat = copy.match(line)
-            if mat is not None:
-                src_copy += mat.group(1)
-            mat = spdx.match(line)
-            if mat is not None:
-                found_spdx = mat.group(1)
-            mat = lunder.match(line)
-            if mat is not None:
-                found_lunder = mat.group(1)
-        if found_lunder:
-            src_lic = found_lunder
-        if found_spdx:
-            src_lic += '\n' + found_spdx
-
-        with outfile:
-            if fmt == 'registers':
-                return gen_md.gen_md(obj, outfile)
-            elif fmt == 'interfaces':
-                # Assumes the registers will be in a file called `registers.md`
-                # and within the same location as the output's destination.
-                # Exposing this as an option would nice to do.
-                return gen_cfg_md.gen_cfg_md(obj, outfile, "registers.md")
-            elif fmt == 'doc_html_old':
-                return gen_html.gen_html(obj, outfile)
-            elif fmt == 'cdh':
-                return gen_cheader.gen_cdefines(obj, outfile, src_lic,
-                                                src_copy)
-            elif fmt == 'rs':
-                return gen_rust.gen_rust(obj, outfile, src_lic, src_copy)
-            elif fmt == 'trs':
-                return gen_tock.gen_tock(obj, outfile, infile.name, src_lic,
-                                         src_copy, version_stamp)
-            elif fmt == 'systemrdl':
-                return systemrdl_exporter.SystemrdlExporter(obj).export(outfile)
-            else:
-                return gen_json.gen_json(obj, outfile, fmt)
-
-            outfile.write('\n')
+        return gen_output(obj, fmt, srcfull, infile.name, outfile, outdir,
+                          args.dv_base_names, version_stamp)
 
 
 if __name__ == '__main__':
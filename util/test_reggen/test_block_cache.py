@@ -0,0 +1,86 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import io
+import pickle
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from reggen import block_cache
+from reggen.gen_json import gen_json
+from reggen.ip_block import IpBlock
+
+UART = (Path(__file__).resolve().parents[2] / 'hw' / 'ip' / 'uart' / 'data' /
+        'uart.hjson')
+
+
+def _dump(block):
+    out = io.StringIO()
+    gen_json(block, out, 'json')
+    return out.getvalue()
+
+
+class TestBlockCache(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache_dir = Path(tmp.name)
+        patcher = mock.patch.object(block_cache, 'cache_dir',
+                                    return_value=self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.txt = UART.read_text()
+        self.from_raw = mock.Mock(wraps=IpBlock.from_raw)
+        patcher = mock.patch.object(IpBlock, 'from_raw', self.from_raw)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _load(self, param_defaults=[]):
+        return IpBlock.from_text(self.txt, param_defaults, 'uart')
+
+    def test_hit(self):
+        first = self._load()
+        second = self._load()
+        self.assertEqual(self.from_raw.call_count, 1)
+        self.assertIsNot(first, second)
+        self.assertEqual(_dump(first), _dump(second))
+
+    def test_key(self):
+        self._load()
+        self.txt = self.txt.replace('"uart"', '"uart2"', 1)
+        self.assertEqual(self._load().name, 'uart2')
+        self._load([('RxFifoDepth', '64')])
+        self.assertEqual(self.from_raw.call_count, 3)
+        self.assertEqual(len(list(self.cache_dir.iterdir())), 3)
+
+    def test_damaged_entry(self):
+        self._load()
+        for path in self.cache_dir.iterdir():
+            path.write_bytes(b'not a pickle')
+        self.assertEqual(self._load().name, 'uart')
+        self.assertEqual(self.from_raw.call_count, 2)
+
+    def test_wrong_type(self):
+        self._load()
+        for path in self.cache_dir.iterdir():
+            path.write_bytes(pickle.dumps({'name': 'uart'}))
+        self.assertIsInstance(self._load(), IpBlock)
+        self.assertEqual(self.from_raw.call_count, 2)
+
+    def test_off(self):
+        with mock.patch.object(block_cache, 'cache_dir', return_value=None):
+            self._load()
+            self._load()
+        self.assertEqual(self.from_raw.call_count, 2)
+        self.assertEqual(list(self.cache_dir.iterdir()), [])
+
+    def test_invalid(self):
+        self.txt = '{name: "uart"}'
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                self._load()
+        self.assertEqual(list(self.cache_dir.iterdir()), [])
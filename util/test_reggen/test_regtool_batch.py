@@ -0,0 +1,76 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+import hjson
+
+import regtool
+import version_file
+from reggen.gen_cheader import gen_cdefines
+from reggen.ip_block import IpBlock
+
+SPI_DEVICE = (Path(__file__).resolve().parents[2] / 'hw' / 'ip' /
+              'spi_device' / 'data' / 'spi_device.hjson')
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.tmp = Path(self._tmp.name)
+
+    def _write_manifest(self, ips):
+        path = self.tmp / 'manifest.hjson'
+        path.write_text(hjson.dumps({'ips': ips}))
+        return str(path)
+
+    def test_outputs(self):
+        manifest = self._write_manifest([{
+            'hjson': str(SPI_DEVICE),
+            'outputs': [
+                {'format': 'cdh', 'outfile': str(self.tmp / 'regs.h')},
+                {'format': 'trs', 'outfile': str(self.tmp / 'a.rs')},
+                {'format': 'trs', 'outfile': str(self.tmp / 'b.rs')},
+            ]
+        }])
+        version = version_file.VersionInformation(None)
+        self.assertEqual(regtool.run_batch(manifest, 1, version), 0)
+
+        # The C header is the same as if the block was generated on its own.
+        srcfull = SPI_DEVICE.read_text()
+        block = IpBlock.from_text(srcfull, [], str(SPI_DEVICE))
+        expected = io.StringIO()
+        gen_cdefines(block, expected, *regtool.src_license(srcfull))
+        self.assertEqual((self.tmp / 'regs.h').read_text(),
+                         expected.getvalue())
+
+        # Generating an output doesn't change what the next one generates.
+        self.assertEqual((self.tmp / 'a.rs').read_text(),
+                         (self.tmp / 'b.rs').read_text())
+
+    def test_failures(self):
+        manifest = self._write_manifest([
+            {'hjson': str(self.tmp / 'missing.hjson'), 'outputs': []},
+        ])
+        version = version_file.VersionInformation(None)
+        self.assertEqual(regtool.run_batch(manifest, 1, version), 1)
+
+    def test_bad_manifest(self):
+        manifest = self._write_manifest([{
+            'hjson': str(SPI_DEVICE),
+            'outputs': [{'format': 'cdh'}],
+        }])
+        with self.assertRaisesRegex(ValueError, 'no outfile'):
+            regtool.load_manifest(manifest)
+
+        manifest = self._write_manifest([{
+            'hjson': str(SPI_DEVICE),
+            'outputs': [{'format': 'rtl', 'outfile': 'x.sv'}],
+        }])
+        with self.assertRaisesRegex(ValueError, 'expects an output directory'):
+            regtool.load_manifest(manifest)
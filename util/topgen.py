@@ -12,13 +12,14 @@ import shutil
 import sys
 import tempfile
 from collections import OrderedDict, defaultdict
-from copy import deepcopy
+from copy import copy, deepcopy
 from pathlib import Path
 from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
 
 import hjson
 import tlgen
 import version_file
+from basegen.templates import template_from_file, template_lookup
 from basegen.typing import ConfigT, ParamsT
 from design.lib.OtpMemMap import OtpMemMap
 from design.lib.LcStEnc import LcStEnc
@@ -26,8 +27,6 @@ from ipgen import (IpBlockRenderer, IpConfig, IpDescriptionOnlyRenderer,
                    IpTemplate, TemplateRenderError)
 from ipgen.clkmgr_gen import get_clkmgr_params
 from mako import exceptions
-from mako.lookup import TemplateLookup
-from mako.template import Template
 from raclgen.lib import DEFAULT_RACL_CONFIG
 from reggen import access, gen_rtl, gen_sec_cm_testplan, window
 from reggen.countermeasure import CounterMeasure
@@ -41,7 +40,10 @@ from topgen.c_test import TopGenCTest
 from topgen.clocks import Clocks
 from topgen.gen_dv import gen_dv
 from topgen.gen_top_docs import gen_top_docs
-from topgen.lib import find_module, find_modules, load_cfg, write_file_secure
+from topgen.incremental import Dependencies, digest_bytes
+from topgen.jobs import JobPool
+from topgen.lib import (find_module, find_modules, load_cfg,
+                        write_file_if_changed, write_file_secure)
 from topgen.merge import (
     amend_alert, amend_interrupt, amend_pinmux_io, amend_racl,
     amend_reset_request, amend_resets, amend_wkup, commit_alert_modules,
@@ -75,6 +77,13 @@ TOPGEN_TEMPLATE_PATH = SRCTREE_TOP / "util" / "topgen" / "templates"
 IP_RAW_PATH = SRCTREE_TOP / "hw" / "ip"
 IP_TEMPLATES_PATH = SRCTREE_TOP / "hw" / "ip_templates"
 
+# The sources of topgen and the generators it uses. These are an input of
+# everything that topgen generates.
+TOPGEN_SOURCE_PATHS = tuple(
+    SRCTREE_TOP / "util" / path
+    for path in ["topgen.py", "topgen", "reggen", "tlgen", "ipgen", "basegen",
+                 "design", "raclgen", "version_file.py"])
+
 
 @dataclass
 class Seed:
@@ -158,7 +167,7 @@ def ipgen_render(template_name: str, topname: str, params: ParamsT,
     """ Render an IP template for a specific toplevel using ipgen.
 
     The generated IP block is placed in the "ip_autogen" directory of the
-    toplevel.
+    toplevel. Files that are already up to date are left alone.
 
     Aborts the program execution in case of an error.
     """
@@ -168,7 +177,8 @@ def ipgen_render(template_name: str, topname: str, params: ParamsT,
     try:
         renderer = IpBlockRenderer(ip_template, ip_config)
         renderer.render(out_path / "ip_autogen" / module_name,
-                        overwrite_output_dir=True)
+                        overwrite_output_dir=True,
+                        keep_unchanged=True)
     except TemplateRenderError as e:
         log.error(e.verbose_str())
         sys.exit(1)
@@ -176,8 +186,9 @@ def ipgen_render(template_name: str, topname: str, params: ParamsT,
 
 def generate_top(top: ConfigT, name_to_block: IpBlocksT, tpl_filename: str,
                  **kwargs: Dict[str, object]) -> None:
-    top_tpl = Template(filename=tpl_filename,
-                       lookup=TemplateLookup([TOPGEN_TEMPLATE_PATH, "/"]))
+    top_tpl = template_from_file(tpl_filename,
+                                 lookup=template_lookup(
+                                     [TOPGEN_TEMPLATE_PATH, "/"]))
 
     try:
         return top_tpl.render(top=top, name_to_block=name_to_block, **kwargs)
@@ -186,6 +197,55 @@ def generate_top(top: ConfigT, name_to_block: IpBlocksT, tpl_filename: str,
         return ""
 
 
+def render_top_template(deps: Dependencies, pool: JobPool,
+                        top_inputs: Dict[str, str],
+                        top: ConfigT, name_to_block: IpBlocksT,
+                        template_path: Path, rendered_path: Path,
+                        secure: bool = False,
+                        extra_inputs: Optional[Dict[str, str]] = None,
+                        **other_info: object) -> None:
+    """Render a top-level template to rendered_path, if it is out of date.
+
+    top_inputs are the inputs shared by all top-level templates (see
+    Dependencies.needs_update). The template's own directory and
+    other_info are also inputs, as are extra_inputs. If secure is true, the
+    file is written with restricted permissions. The template is rendered by
+    a job of pool.
+    """
+    unit = f"template {deps.output_name(rendered_path)}"
+    # Some templates are also passed the top config as an argument, which is
+    # already covered by top_inputs.
+    arguments = {
+        name: "top" if value is top else value
+        for name, value in other_info.items()
+    }
+    inputs = {
+        **top_inputs,
+        **(extra_inputs or {}),
+        "templates": deps.files_digest(TOPGEN_TEMPLATE_PATH,
+                                       template_path.parent),
+        "arguments": deps.value_digest(arguments, shallow=True),
+    }
+    if not deps.needs_update(unit, inputs):
+        return
+
+    def render() -> None:
+        template_contents = generate_top(top, name_to_block,
+                                         str(template_path), **other_info)
+        if secure:
+            # Use the write_file_secure for writting file with restricted file permissions
+            write_file_secure(rendered_path, template_contents)
+        else:
+            write_file_if_changed(rendered_path, template_contents)
+
+        # An empty result means that rendering failed (and the error has
+        # been logged), so make sure that the next run tries again.
+        if template_contents:
+            deps.record(unit, [rendered_path])
+
+    pool.submit(unit, render)
+
+
 def configure_xbars(top: ConfigT) -> None:
     """Complete all xbar configs in the top config.
 
@@ -224,13 +284,17 @@ def configure_xbars(top: ConfigT) -> None:
         obj["inter_signal_list"] = inter_signal_list
 
 
-def generate_xbars(top: ConfigT, out_path: Path) -> None:
-    """Re-run validate and elaborate to generate the Xbar objects."""
+def generate_xbars(top: ConfigT, out_path: Path, deps: Dependencies,
+                   pool: JobPool) -> None:
+    """Re-run validate and elaborate to generate the Xbar objects.
+
+    Each crossbar is generated by a job of pool.
+    """
     top_name = "top_" + top["name"]
     gencmd = (f"// util/topgen.py -t hw/{top_name}/data/{top_name}.hjson "
               f"-o hw/{top_name}/\n\n")
 
-    for obj in top["xbar"]:
+    def generate(obj: ConfigT, unit: str) -> None:
         objname = obj["name"]
         log.info(f"generating xbar {objname}")
         xbar_path = out_path / "ip" / f"xbar_{objname}" / "data" / "autogen"
@@ -240,8 +304,9 @@ def generate_xbars(top: ConfigT, out_path: Path) -> None:
 
         # Generate output of crossbar with complete fields
         xbar_hjson_path = xbar_path / f"xbar_{xbar.name}.gen.hjson"
-        xbar_hjson_path.write_text(genhdr + gencmd +
-                                   hjson.dumps(obj, for_json=True) + '\n')
+        write_file_if_changed(xbar_hjson_path,
+                              genhdr + gencmd +
+                              hjson.dumps(obj, for_json=True) + '\n')
 
         if not tlgen.elaborate(xbar):
             log.error("Elaboration failed." + repr(xbar))
@@ -253,21 +318,33 @@ def generate_xbars(top: ConfigT, out_path: Path) -> None:
 
         ip_path = out_path / "ip" / f"xbar_{objname}"
 
+        outputs = [xbar_hjson_path]
         for filename, filecontent in results:
             filepath = ip_path / filename
-            filepath.parent.mkdir(parents=True, exist_ok=True)
-            with filepath.open(mode="w", encoding="UTF-8") as fout:
-                fout.write(filecontent)
+            write_file_if_changed(filepath, filecontent)
+            outputs.append(filepath)
 
         dv_path = out_path / "ip" / f"xbar_{objname}" / "dv" / "autogen"
         dv_path.mkdir(parents=True, exist_ok=True)
 
         # generate testbench for xbar
         tlgen.generate_tb(xbar, dv_path, top_name)
+        outputs += sorted(p for p in dv_path.iterdir() if p.is_file())
+
+        deps.record(unit, outputs)
+
+    for obj in top["xbar"]:
+        unit = f"xbar {obj['name']}"
+        inputs = {
+            "topgen": deps.files_digest(*TOPGEN_SOURCE_PATHS),
+            "xbar": deps.value_digest(obj),
+        }
+        if deps.needs_update(unit, inputs):
+            pool.submit(unit, generate, obj, unit)
 
 
 def generate_ipgen(top: ConfigT, module: ConfigT, params: ParamsT,
-                   out_path: Path) -> None:
+                   out_path: Path, deps: Dependencies, pool: JobPool) -> None:
     topname = top["name"]
     template_name = module["template_type"]
     module_name = module["type"]
@@ -281,7 +358,23 @@ def generate_ipgen(top: ConfigT, module: ConfigT, params: ParamsT,
         raise ValueError(
             f"Unexpected uniquified name: expected {module_instance_name}, "
             f"got {uniq_name}")
-    ipgen_render(module["template_type"], topname, params, out_path)
+
+    unit = f"ipgen {module_name}"
+    inputs = {
+        "topgen": deps.files_digest(*TOPGEN_SOURCE_PATHS),
+        "template": deps.files_digest(IP_TEMPLATES_PATH / template_name),
+        "params": deps.value_digest(
+            [topname, params, uniquified_modules.modules]),
+    }
+    if not deps.needs_update(unit, inputs):
+        return
+
+    def render() -> None:
+        ipgen_render(module["template_type"], topname, params, out_path)
+        module_path = out_path / "ip_autogen" / module_name
+        deps.record(unit, (p for p in module_path.rglob("*") if p.is_file()))
+
+    pool.submit(unit, render)
 
 
 def get_ipgen_params(module: ConfigT) -> ParamsT:
@@ -824,18 +917,40 @@ def _get_basic_ipgen_params(topcfg: Dict[str, object], template_type: str) -> Di
 
 
 def generate_top_only(top_only_dict: List[str], out_path: Path, top_name: str,
-                      alt_hjson_path: str) -> None:
-    """Generate the regfile for top_only IPs."""
+                      alt_hjson_path: str, deps: Dependencies,
+                      pool: JobPool) -> None:
+    """Generate the regfile for top_only IPs, each in a job of pool."""
     log.info("Generating top only modules")
 
+    def is_regfile(path: Path) -> bool:
+        return path.name.endswith(("_reg_pkg.sv", "_reg_top.sv"))
+
+    def generate(ip: str, hjson_path: Path, genrtl_dir: Path,
+                 unit: str) -> None:
+        log.info(f"Generating registers for top module {ip}, hjson: "
+                 f"{hjson_path}, output: {genrtl_dir}")
+        generate_regfile_from_path(hjson_path, genrtl_dir)
+        deps.record(unit, (p for p in sorted(genrtl_dir.glob("*.sv"))
+                           if is_regfile(p)))
+
     for ip in top_only_dict:
         ip_out_path = out_path / "ip" / ip
         hjson_path = ip_out_path / "data" / f"{ip}.hjson"
         genrtl_dir = ip_out_path / "rtl"
         genrtl_dir.mkdir(parents=True, exist_ok=True)
-        log.info(f"Generating registers for top module {ip}, hjson: "
-                 f"{hjson_path}, output: {genrtl_dir}")
-        generate_regfile_from_path(hjson_path, genrtl_dir)
+
+        # The hand-written RTL is an input too, since it is checked for
+        # countermeasure annotations.
+        unit = f"top-only {ip}"
+        rtl_paths = sorted(genrtl_dir.glob("*.sv"))
+        inputs = {
+            "topgen": deps.files_digest(*TOPGEN_SOURCE_PATHS),
+            "hjson": deps.files_digest(hjson_path),
+            "rtl": deps.files_digest(
+                *(p for p in rtl_paths if not is_regfile(p))),
+        }
+        if deps.needs_update(unit, inputs):
+            pool.submit(unit, generate, ip, hjson_path, genrtl_dir, unit)
 
 
 def generate_top_ral(topname: str, top: ConfigT, name_to_block: IpBlocksT,
@@ -938,15 +1053,12 @@ def create_mem(item, addrsep, regwidth) -> window.Window:
 
 
 def generate_rust(topname, completecfg, name_to_block, out_path, version_stamp,
-                  src_tree_top, topgen_template_path) -> None:
+                  src_tree_top, topgen_template_path, deps, top_inputs,
+                  pool) -> None:
     # Template render helper
     def render_template(template_path: str, rendered_path: Path, **other_info):
-        template_contents = generate_top(completecfg, name_to_block,
-                                         str(template_path), **other_info)
-
-        rendered_path.parent.mkdir(exist_ok=True, parents=True)
-        with rendered_path.open(mode="w", encoding="UTF-8") as fout:
-            fout.write(template_contents)
+        render_top_template(deps, pool, top_inputs, completecfg, name_to_block,
+                            template_path, rendered_path, **other_info)
 
     # Create Rust output directory
     rsformat_dir = out_path / "sw/autogen/chip/"
@@ -1260,7 +1372,8 @@ def complete_topcfg(topcfg: ConfigT, name_to_block: IpBlocksT) -> None:
 def generate_full_ipgens(args: argparse.Namespace, topcfg: ConfigT,
                          name_to_block: Dict[str, ConfigT],
                          alias_cfgs: Dict[str, ConfigT], cfg_path: Path,
-                         out_path: Path) -> None:
+                         out_path: Path, deps: Dependencies,
+                         pool: JobPool) -> None:
 
     # TODO, there are no interdependencies between ips so do them in any
     # order, which means could just iterate over all in the topcfg.
@@ -1278,7 +1391,7 @@ def generate_full_ipgens(args: argparse.Namespace, topcfg: ConfigT,
                 params = get_params(*args)
             else:
                 params = _get_basic_ipgen_params(topcfg, template_type)
-            generate_ipgen(topcfg, module, params, out_path)
+            generate_ipgen(topcfg, module, params, out_path, deps, pool)
 
     ipgens_by_template_type = defaultdict(list)
     for m in topcfg["module"]:
@@ -1292,6 +1405,8 @@ def generate_full_ipgens(args: argparse.Namespace, topcfg: ConfigT,
        not args.xbar_only:
         generate_modules("rv_plic", single_instance=False, get_params=_get_rv_plic_params)
     if args.plic_only:
+        pool.wait()
+        _finish_incremental(deps)
         sys.exit()
 
     # Generate Alert Handler if there is an instance
@@ -1300,6 +1415,8 @@ def generate_full_ipgens(args: argparse.Namespace, topcfg: ConfigT,
                          single_instance=False,
                          get_params=_get_alert_handler_params)
     if args.alert_handler_only:
+        pool.wait()
+        _finish_incremental(deps)
         sys.exit()
 
     # Generate outgoing alerts
@@ -1396,15 +1513,31 @@ def dump_completecfg(cfg: ConfigT, out_path: Path) -> None:
                 module_with_secret_params["otp_mmap"] = module.pop("otp_mmap")
             secret_cfg["module"].append(module_with_secret_params)
 
-    genhjson_path.write_text(genhdr + GENCMD.format(top_name=top_name) + "\n" +
-                             hjson.dumps(dump_cfg, for_json=True, default=vars) +
-                             '\n')
+    write_file_if_changed(genhjson_path,
+                          genhdr + GENCMD.format(top_name=top_name) + "\n" +
+                          hjson.dumps(dump_cfg, for_json=True, default=vars) +
+                          '\n')
     # Write secrets file with secure permissions
     secrets_content = (genhdr + GENCMD.format(top_name=top_name) + "\n" +
                        hjson.dumps(secret_cfg, for_json=True, default=vars) + '\n')
     write_file_secure(secretgenhjson_path, secrets_content)
 
 
+def _ip_hjson_paths(name_to_hjson: Dict[str, Path],
+                    out_path: Path) -> List[Path]:
+    """The IP Hjson files in name_to_hjson that topgen doesn't generate."""
+    ipgen_path = (out_path / "ip_autogen").resolve()
+    return sorted(path for path in name_to_hjson.values()
+                  if ipgen_path not in path.resolve().parents)
+
+
+def _finish_incremental(deps: Dependencies) -> None:
+    """Save the state of an incremental run and report what it generated."""
+    if deps.enabled:
+        deps.save()
+        print(deps.report())
+
+
 def main():
     parser = argparse.ArgumentParser(prog="topgen")
     parser.add_argument("--topcfg",
@@ -1511,6 +1644,29 @@ def main():
                         default=False,
                         action="store_true",
                         help="Only return the list of blocks and exit.")
+    parser.add_argument("--incremental",
+                        action="store_true",
+                        help="""
+          Only regenerate the outputs (ipgen modules, crossbars, top-level
+          templates ...) whose inputs or files have changed since the last
+          incremental run, and report what was regenerated and why.
+        """)
+    parser.add_argument("--incremental-state",
+                        type=Path,
+                        help="""
+          The file in which --incremental records the inputs and outputs of
+          each run. Implies --incremental. Defaults to
+          build/topgen/top_{name}.json in the repository.
+        """)
+    parser.add_argument("--jobs",
+                        "-j",
+                        type=int,
+                        default=1,
+                        help="""
+          The number of processes used to generate the ipgen modules,
+          crossbars and files rendered from top-level templates in parallel.
+          The output doesn't depend on this. Defaults to 1.
+        """)
 
     args = parser.parse_args()
 
@@ -1530,6 +1686,10 @@ def main():
             "'no' series options cannot be used with 'only' series options")
         raise SystemExit(sys.exc_info()[1])
 
+    if args.jobs < 1:
+        log.error("'--jobs' should be at least 1")
+        raise SystemExit(sys.exc_info()[1])
+
     # Don't print warnings when querying the list of blocks.
     log_level = (log.ERROR if args.get_blocks or args.check_cm else
                  log.DEBUG if args.verbose else None)
@@ -1554,6 +1714,13 @@ def main():
 
     topcfg = load_cfg(args.topcfg)
 
+    state_path = args.incremental_state
+    if args.incremental and state_path is None:
+        state_path = (SRCTREE_TOP / "build" / "topgen" /
+                      f"top_{topcfg['name']}.json")
+    dep_tracker = Dependencies(state_path, out_path)
+    pool = JobPool(args.jobs, dep_tracker)
+
     # Load the seed config from the separate configuration file
     seed_cfg = load_cfg(args.seedcfg)
     seed_error = validate_seed_cfg(topcfg, seed_cfg)
@@ -1630,9 +1797,22 @@ def main():
                 raise ValueError(f"Multiple alias targets for {alias_target}")
             alias_cfgs[alias_target] = alias_cfg
 
+    # In an incremental run, the passes can also stop as soon as they reach
+    # the complete top configuration that the last run converged to, if
+    # that had the same inputs (the complete top configuration is a fixed
+    # point of the passes).
     topname = topcfg["name"]
     cfg_copy = deepcopy(topcfg)
-    cfg_last_dump = None
+    cfg_inputs = [
+        dep_tracker.value_digest(cfg_copy),
+        dep_tracker.files_digest(
+            *TOPGEN_SOURCE_PATHS, IP_TEMPLATES_PATH,
+            *sorted(Path(args.topcfg).parent.glob("*.hjson")),
+            *(args.alias_files or []))
+    ]
+    cfg_inputs_digest = None
+    fixed_point = None
+    cfg_last_digest = None
     for pass_idx in range(maximum_passes):
         log.info("Generation pass {}".format(pass_idx + 1))
         # Use the same seed for each pass to have stable random constants.
@@ -1645,16 +1825,29 @@ def main():
         # Delete config path before dumping, not needed
         del completecfg["cfg_path"]
         cfg_dump = hjson.dumps(completecfg, for_json=True, default=vars)
-        if pass_idx > 0 and cfg_dump == cfg_last_dump:
+        cfg_digest = digest_bytes(cfg_dump.encode("UTF-8"))
+        if pass_idx == 0 and dep_tracker.enabled:
+            # The IP Hjson files are only known after the first pass.
+            cfg_inputs.append(dep_tracker.files_digest(
+                *_ip_hjson_paths(name_to_hjson, out_path_gen)))
+            cfg_inputs_digest = dep_tracker.value_digest(cfg_inputs)
+            fixed_point = dep_tracker.fixed_point(cfg_inputs_digest)
+        if pass_idx > 0 and cfg_digest == cfg_last_digest:
             log.info("process_top converged after {} passes".format(pass_idx +
                                                                     1))
             break
+        elif cfg_digest == fixed_point:
+            log.info("process_top reached the configuration of the last run "
+                     "after {} passes".format(pass_idx + 1))
+            break
         else:
-            cfg_last_dump = cfg_dump
+            cfg_last_digest = cfg_digest
         cfg_copy = completecfg
     else:
         log.error("Too many process_top passes without convergence")
         raise SystemExit(sys.exc_info()[1])
+    if dep_tracker.enabled:
+        dep_tracker.record_fixed_point(cfg_inputs_digest, cfg_digest)
 
     complete_topcfg(completecfg, name_to_block)
     create_alert_lpgs(completecfg, name_to_block)
@@ -1671,6 +1864,20 @@ def main():
     # Dump the complete top config
     dump_completecfg(completecfg, out_path)
 
+    # The inputs of everything generated from the complete top config: the
+    # config itself and the IP blocks in name_to_block. The blocks of ipgen
+    # IPs are made from their templates in memory, so the blocks themselves
+    # are digested rather than the files they come from.
+    top_inputs = {
+        "topgen": dep_tracker.files_digest(*TOPGEN_SOURCE_PATHS),
+        "top": dep_tracker.value_digest(completecfg),
+        "ips": dep_tracker.value_digest([
+            name_to_block,
+            dep_tracker.files_digest(
+                *_ip_hjson_paths(name_to_hjson, out_path))
+        ]),
+    }
+
     topname = topcfg["name"]
     top_name = f"top_{topname}"
 
@@ -1682,6 +1889,7 @@ def main():
 
         exit_code = generate_top_ral(topname, completecfg, name_to_block,
                                      args.dv_base_names, out_path)
+        _finish_incremental(dep_tracker)
         sys.exit(exit_code)
 
     # Generate top only modules
@@ -1690,26 +1898,36 @@ def main():
         m["type"]
         for m in completecfg["module"] if lib.is_top_reggen(m)
     }
-    generate_top_only(top_only_ips, out_path, top_name, args.hjson_path)
+    generate_top_only(top_only_ips, out_path, top_name, args.hjson_path,
+                      dep_tracker, pool)
     # Re-set the seed because generate_full_ipgens uses the same RNG again from the beginning
     SecurePrngFactory.create("topgen", topcfg["seed"]["topgen_seed"].value)
 
     generate_full_ipgens(args, completecfg, name_to_block, alias_cfgs,
-                         cfg_path, out_path)
+                         cfg_path, out_path, dep_tracker, pool)
 
     if args.get_blocks:
+        pool.wait()
+        dep_tracker.save()
         print("\n".join(name_to_block.keys()))
         sys.exit(0)
 
     # Generate xbars
     if not args.no_xbar or args.xbar_only:
-        generate_xbars(completecfg, out_path)
+        generate_xbars(completecfg, out_path, dep_tracker, pool)
 
     # Generate Rust toplevel definitions
     if not args.no_rust:
+        rust_inputs = dict(top_inputs)
+        if args.version_stamp is not None:
+            rust_inputs["version_stamp"] = dep_tracker.files_digest(
+                args.version_stamp)
         generate_rust(topname, completecfg, name_to_block, out_path.resolve(),
-                      version_stamp, SRCTREE_TOP, TOPGEN_TEMPLATE_PATH)
+                      version_stamp, SRCTREE_TOP, TOPGEN_TEMPLATE_PATH,
+                      dep_tracker, rust_inputs, pool)
         if args.rust_only:
+            pool.wait()
+            _finish_incremental(dep_tracker)
             sys.exit(0)
 
     # Check countermeasures for all blocks.
@@ -1722,8 +1940,11 @@ def main():
                         level=log_level,
                         force=True)
 
+        # The countermeasures are checked in the generated RTL.
+        pool.wait()
         okay = _check_countermeasures(completecfg, name_to_block,
                                       name_to_hjson)
+        _finish_incremental(dep_tracker)
         sys.exit(0 if okay else 1)
 
     if not args.no_top or args.top_only:
@@ -1731,15 +1952,13 @@ def main():
         def render_template(template_path: str, rendered_path: Path,
                             secure: bool = False, **other_info):
             """Render template to file, optionally with secure permissions for sensitive files"""
-            template_contents = generate_top(completecfg, name_to_block,
-                                             str(template_path), **other_info)
-
-            if secure:
-                # Use the write_file_secure for writting file with restricted file permissions
-                write_file_secure(rendered_path, template_contents)
-            else:
-                rendered_path.parent.mkdir(exist_ok=True, parents=True)
-                rendered_path.write_text(template_contents, encoding="UTF-8")
+            # c_helper is updated between renders, so give the job the
+            # helper as it is now (see JobPool).
+            if "helper" in other_info:
+                other_info["helper"] = copy(other_info["helper"])
+            render_top_template(dep_tracker, pool, top_inputs, completecfg,
+                                name_to_block, template_path, rendered_path,
+                                secure, **other_info)
 
         # Header for SV files
         gencmd_sv = warnhdr + "//\n" + GENCMD.format(top_name=top_name) + "\n"
@@ -1819,8 +2038,9 @@ def main():
 
         # Create verible waiver file for the random constant package for long lines.
         rnd_cnst_vbl_file_path = out_path / rnd_cnst_path / f"{rnd_cnst_file}.vbl"
-        with rnd_cnst_vbl_file_path.open(mode="w", encoding="UTF-8") as fout:
-            fout.write((lichdr + gencmd_rnd_cnst_sv).replace("//", "#") + f"""
+        write_file_if_changed(
+            rnd_cnst_vbl_file_path,
+            (lichdr + gencmd_rnd_cnst_sv).replace("//", "#") + f"""
 # These lines are too long due to templating
 waive --rule=line-length --location="{rnd_cnst_sv_file}"
 """)
@@ -1854,7 +2074,12 @@ waive --rule=line-length --location="{rnd_cnst_sv_file}"
             lc_st_enc_file = "lc_ctrl_state_pkg.sv"
             render_template(IP_RAW_PATH / "lc_ctrl" / "rtl" / "lc_ctrl_state_pkg.sv.tpl",
                             out_path / lc_st_enc_path / lc_st_enc_file,
-                            secure=True, lc_st_enc=lc_st_enc)
+                            secure=True, lc_st_enc=lc_st_enc,
+                            extra_inputs={
+                                "lc_ctrl_state": dep_tracker.files_digest(
+                                    IP_RAW_PATH / "lc_ctrl" / "data" /
+                                    "lc_ctrl_state.hjson")
+                            })
             render_template(TOPGEN_TEMPLATE_PATH / "core_file.core.tpl",
                             out_path / lc_st_enc_path /
                             f"top_{topname}_{lc_seed.seed_mode}_lc_ctrl_state_pkg.core",
@@ -1880,6 +2105,10 @@ waive --rule=line-length --location="{rnd_cnst_sv_file}"
         out_paths = [
             out_path.resolve(), (SRCTREE_TOP / "hw" / top_name).resolve()
         ]
+        # If out_path is hw/top_{topname}, the second set of files would
+        # overwrite the first, so only create the second.
+        if out_paths[0] == out_paths[1]:
+            del root_paths[0], out_paths[0]
 
         # C Header + C File + Clang-format file
         gencmd_c = warnhdr + GENCMD.format(top_name=top_name)
@@ -1903,7 +2132,7 @@ waive --rule=line-length --location="{rnd_cnst_sv_file}"
                 cformat_dir = path / "sw" / "autogen"
                 cformat_dir.mkdir(parents=True, exist_ok=True)
                 cformat_path = cformat_dir / ".clang-format"
-                cformat_path.write_text(cformat_tplpath.read_text())
+                write_file_if_changed(cformat_path, cformat_tplpath.read_text())
 
                 # Save the header macro prefix into `c_helper`
                 rel_header_dir = cformat_dir.relative_to(root_paths[idx])
@@ -2008,34 +2237,25 @@ waive --rule=line-length --location="{rnd_cnst_sv_file}"
         for fname in tb_files:
             tpl_fname = "%s.tpl" % (fname)
             xbar_chip_data_path = TOPGEN_TEMPLATE_PATH / tpl_fname
-            template_contents = generate_top(completecfg,
-                                             name_to_block,
-                                             str(xbar_chip_data_path),
-                                             gencmd=gencmd_sv)
-
-            rendered_dir = out_path / "dv/autogen"
-            rendered_dir.mkdir(parents=True, exist_ok=True)
-            rendered_path = rendered_dir / fname
-
-            with rendered_path.open(mode="w", encoding="UTF-8") as fout:
-                fout.write(template_contents)
+            render_template(xbar_chip_data_path,
+                            out_path / "dv/autogen" / fname,
+                            gencmd=gencmd_sv)
 
         # generate parameters for chip-level environment package
         tpl_fname = "chip_env_pkg__params.sv.tpl"
         alert_handler_chip_data_path = TOPGEN_TEMPLATE_PATH / tpl_fname
-        template_contents = generate_top(completecfg, name_to_block,
-                                         str(alert_handler_chip_data_path))
-
-        rendered_dir = out_path / "dv/env/autogen"
-        rendered_dir.mkdir(parents=True, exist_ok=True)
-        rendered_path = rendered_dir / "chip_env_pkg__params.sv"
+        render_template(alert_handler_chip_data_path,
+                        out_path / "dv/env/autogen" /
+                        "chip_env_pkg__params.sv")
 
-        with rendered_path.open(mode="w", encoding="UTF-8") as fout:
-            fout.write(template_contents)
-
-        # generate documentation for toplevel
+        # generate documentation for toplevel, which adds files to the
+        # pinmux ipgen module (so that must have been generated first)
+        pool.wait()
         gen_top_docs(completecfg, c_helper, out_path)
 
+    pool.wait()
+    _finish_incremental(dep_tracker)
+
 
 if __name__ == "__main__":
     main()
@@ -6,9 +6,9 @@ import logging as log
 from typing import List, Optional, Tuple
 
 from mako import exceptions  # type: ignore
-from mako.lookup import TemplateLookup  # type: ignore
 import importlib.resources
 
+from basegen.templates import template_lookup
 from reggen.gen_dv import gen_core_file
 
 from .top import Top
@@ -23,7 +23,7 @@ def sv_base_addr(top: Top, if_name: Tuple[str, Optional[str]],
 def gen_dv(top: Top, dv_base_names: List[str], outdir: str) -> int:
     '''Generate DV RAL model for a Top'''
     # Read template
-    lookup = TemplateLookup(directories=[
+    lookup = template_lookup([
         str(importlib.resources.files('topgen')),
         str(importlib.resources.files('reggen'))
     ])
@@ -6,7 +6,7 @@ r"""Top Module Documentation Generator
 """
 from tabulate import tabulate
 
-from .lib import find_module
+from .lib import find_module, write_file_if_changed
 
 TABLE_HEADER = '''<!--
 DO NOT EDIT THIS FILE DIRECTLY.
@@ -182,7 +182,7 @@ def gen_pinmux_docs(top, c_helper, out_path):
         pinout_table += create_pinmux_table(top, c_helper)
         pinout_table += "\n"
         pinout_table_path = pinmux_top_doc_path / pinout_name
-        pinout_table_path.write_text(pinout_table)
+        write_file_if_changed(pinout_table_path, pinout_table)
 
         # create summary table row
         row = [
@@ -206,7 +206,7 @@ def gen_pinmux_docs(top, c_helper, out_path):
                               colalign=colalign)
     summary_table += "\n"
     summary_table_path = pinmux_top_doc_path / "targets.md"
-    summary_table_path.write_text(summary_table)
+    write_file_if_changed(summary_table_path, summary_table)
 
 
 def gen_top_docs(top, c_helper, out_path):
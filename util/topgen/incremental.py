@@ -0,0 +1,296 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+"""Dependency tracking for incremental topgen runs.
+
+topgen's output is split into units: an ipgen module, a crossbar, the
+register files of a top-only IP or a single file rendered from a top-level
+template. For each unit we record digests of the inputs it was generated
+from (named, so that we can say which of them changed) and of the files it
+wrote. A later run can skip a unit if its inputs are unchanged and its
+output files are still as they were left.
+"""
+
+import hashlib
+import json
+import logging as log
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Bump this if the format of the state file changes.
+STATE_VERSION = 1
+
+
+def _jsonable(obj: Any) -> Any:
+    """Convert obj to something that json can dump, for digest_value.
+
+    Objects are converted as hjson does when topgen dumps the complete top
+    configuration, so two configurations have the same digest if they have
+    the same dump (which is how topgen decides that its passes converged).
+    """
+    if hasattr(obj, "for_json"):
+        return obj.for_json()
+    if hasattr(obj, "_asdict"):
+        return obj._asdict()
+    if isinstance(obj, (type, Enum)):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj, key=repr)
+    if isinstance(obj, Path):
+        return str(obj)
+    if hasattr(obj, "__dict__"):
+        return vars(obj)
+    return repr(obj)
+
+
+def _shallow_jsonable(obj: Any) -> Any:
+    """Like _jsonable, but only keeps the scalar attributes of objects.
+
+    This is used for template arguments, which can be helper objects that
+    refer to the whole top configuration (digested separately).
+    """
+    if (hasattr(obj, "__dict__") and
+            not isinstance(obj, (type, Enum)) and
+            not hasattr(obj, "for_json")):
+        return {
+            k: v
+            for k, v in vars(obj).items()
+            if isinstance(v, (str, int, float, bool)) or v is None
+        }
+    return _jsonable(obj)
+
+
+def digest_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def digest_value(value: Any, shallow: bool = False) -> str:
+    """Return a digest of a value made of dicts, lists and scalars.
+
+    Objects are digested by their attributes (see _jsonable). If shallow is
+    true, only their scalar attributes are used.
+    """
+    dump = json.dumps(value,
+                      default=_shallow_jsonable if shallow else _jsonable)
+    return digest_bytes(dump.encode("UTF-8"))
+
+
+def digest_file(path: Path) -> Optional[str]:
+    """Return a digest of the contents of path, or None if it doesn't exist.
+    """
+    try:
+        return digest_bytes(path.read_bytes())
+    except FileNotFoundError:
+        return None
+
+
+def digest_tree(path: Path) -> str:
+    """Return a digest of the names and contents of all files below path."""
+    hasher = hashlib.sha256()
+    for file_path in sorted(p for p in path.rglob("*") if p.is_file()):
+        if "__pycache__" in file_path.parts:
+            continue
+        hasher.update(str(file_path.relative_to(path)).encode("UTF-8"))
+        hasher.update(b"\0")
+        hasher.update(file_path.read_bytes())
+        hasher.update(b"\0")
+    return hasher.hexdigest()
+
+
+def digest_files(paths: Iterable[Path]) -> str:
+    """Return a digest of the names and contents of some files or trees."""
+    hasher = hashlib.sha256()
+    for path in paths:
+        digest = digest_tree(path) if path.is_dir() else digest_file(path)
+        hasher.update(f"{path}\0{digest}\0".encode("UTF-8"))
+    return hasher.hexdigest()
+
+
+class Dependencies:
+    """The inputs and outputs of each unit of topgen's output.
+
+    If state_path is None, nothing is tracked: every unit is generated and
+    nothing is written. Otherwise, the state of the previous run is loaded
+    from state_path and save() writes the state of this one.
+
+    A unit is generated with:
+
+        if deps.needs_update(unit, inputs):
+            ... generate the unit ...
+            deps.record(unit, output_paths)
+    """
+
+    def __init__(self, state_path: Optional[Path], out_path: Path) -> None:
+        self.state_path = state_path
+        self.out_path = out_path.resolve()
+
+        # The units of the previous run, which are kept unless they are
+        # generated again (so that a run that only generates some units
+        # doesn't forget about the others).
+        self._units: Dict[str, Dict[str, Any]] = {}
+        self._fixed_points: Dict[str, str] = {}
+        if state_path is not None:
+            self._load()
+
+        # The inputs of units that are being generated, until they are
+        # recorded.
+        self._pending: Dict[str, Dict[str, str]] = {}
+
+        self._digests: Dict[Tuple[Path, ...], str] = {}
+
+        # The units recorded since the last call to take_records().
+        self._recorded: List[str] = []
+
+        self.regenerated: List[Tuple[str, str]] = []
+        self.skipped: List[str] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.state_path is not None
+
+    def files_digest(self, *paths: Path) -> str:
+        """Return a digest of some input files or directory trees.
+
+        Inputs don't change during a run, so digests are only computed once.
+        If nothing is tracked, this returns an empty string without reading
+        anything.
+        """
+        if not self.enabled:
+            return ""
+        digest = self._digests.get(paths)
+        if digest is None:
+            digest = digest_files(paths)
+            self._digests[paths] = digest
+        return digest
+
+    def value_digest(self, value: Any, shallow: bool = False) -> str:
+        """Return digest_value(value, shallow), or "" if not tracking."""
+        return digest_value(value, shallow) if self.enabled else ""
+
+    def _load(self) -> None:
+        try:
+            state = json.loads(self.state_path.read_text(encoding="UTF-8"))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as err:
+            log.warning(f"Ignoring unreadable topgen state "
+                        f"{self.state_path}: {err}")
+            return
+
+        if (state.get("version") != STATE_VERSION or
+                state.get("out_path") != str(self.out_path)):
+            log.info(f"Ignoring topgen state {self.state_path}, which is "
+                     "for a different version or output directory.")
+            return
+        self._units = state.get("units", {})
+        self._fixed_points = state.get("fixed_points", {})
+
+    def save(self) -> None:
+        """Write the state of this run to state_path (if tracking)."""
+        if not self.enabled:
+            return
+        state = {
+            "version": STATE_VERSION,
+            "out_path": str(self.out_path),
+            "fixed_points": self._fixed_points,
+            "units": self._units,
+        }
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        self.state_path.write_text(json.dumps(state, indent=1, sort_keys=True),
+                                   encoding="UTF-8")
+
+    def output_name(self, path: Path) -> str:
+        """The name of an output file in the state and in messages."""
+        path = path.resolve()
+        try:
+            return str(path.relative_to(self.out_path))
+        except ValueError:
+            return str(path)
+
+    def _abs(self, name: str) -> Path:
+        return self.out_path / name
+
+    def _why_stale(self, unit: str, inputs: Dict[str, str]) -> Optional[str]:
+        """Why unit needs generating, or None if it is up to date."""
+        old = self._units.get(unit)
+        if old is None:
+            return "new"
+
+        old_inputs = old["inputs"]
+        changed = sorted(name
+                         for name in inputs.keys() | old_inputs.keys()
+                         if inputs.get(name) != old_inputs.get(name))
+        if changed:
+            return ", ".join(changed) + " changed"
+
+        for name, digest in old["outputs"].items():
+            actual = digest_file(self._abs(name))
+            if actual is None:
+                return f"{name} is missing"
+            if actual != digest:
+                return f"{name} was modified"
+        return None
+
+    def needs_update(self, unit: str, inputs: Dict[str, str]) -> bool:
+        """Return whether unit needs to be generated.
+
+        inputs maps the name of each input of the unit to a digest of it. If
+        this returns true, the caller should generate the unit and then call
+        record().
+        """
+        if not self.enabled:
+            return True
+
+        reason = self._why_stale(unit, inputs)
+        if reason is None:
+            self.skipped.append(unit)
+            return False
+
+        log.info(f"Generating {unit}: {reason}")
+        self.regenerated.append((unit, reason))
+        self._pending[unit] = inputs
+        return True
+
+    def record(self, unit: str, outputs: Iterable[Path]) -> None:
+        """Record the files written by unit, which has been generated."""
+        if not self.enabled:
+            return
+        self._units[unit] = {
+            "inputs": self._pending.pop(unit),
+            "outputs": {
+                self.output_name(path): digest_file(path)
+                for path in outputs
+            },
+        }
+        self._recorded.append(unit)
+
+    def take_records(self) -> Dict[str, Dict[str, Any]]:
+        """Return (and forget) the units recorded since the last call.
+
+        This is how units recorded by a worker process get back to the main
+        one, which passes them to add_records().
+        """
+        records = {unit: self._units[unit] for unit in self._recorded}
+        self._recorded = []
+        return records
+
+    def add_records(self, records: Dict[str, Dict[str, Any]]) -> None:
+        """Add units returned by take_records() in another process."""
+        self._units.update(records)
+
+    def fixed_point(self, inputs_digest: str) -> Optional[str]:
+        """The complete config that a run with inputs_digest converged to."""
+        return self._fixed_points.get(inputs_digest)
+
+    def record_fixed_point(self, inputs_digest: str, cfg_digest: str) -> None:
+        # Only the most recent fixed point is worth keeping.
+        self._fixed_points = {inputs_digest: cfg_digest}
+
+    def report(self) -> str:
+        """A summary of which units were generated, and why."""
+        lines = [f"topgen: generated {len(self.regenerated)} of "
+                 f"{len(self.regenerated) + len(self.skipped)} outputs"]
+        for unit, reason in self.regenerated:
+            lines.append(f"  {unit}: {reason}")
+        return "\n".join(lines)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from incremental import Dependencies
+
+
+class TestDependencies(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.out_path = Path(self._tmp.name) / "out"
+        self.state_path = Path(self._tmp.name) / "state.json"
+        self.output = self.out_path / "rtl" / "foo.sv"
+
+    def _run(self, inputs, contents="module foo;\n"):
+        """Do a run that generates one unit, and return its Dependencies."""
+        deps = Dependencies(self.state_path, self.out_path)
+        if deps.needs_update("foo", inputs):
+            self.output.parent.mkdir(parents=True, exist_ok=True)
+            self.output.write_text(contents)
+            deps.record("foo", [self.output])
+        deps.save()
+        return deps
+
+    def test_up_to_date(self):
+        self.assertEqual(self._run({"top": "1"}).regenerated,
+                         [("foo", "new")])
+        deps = self._run({"top": "1"})
+        self.assertEqual(deps.regenerated, [])
+        self.assertEqual(deps.skipped, ["foo"])
+
+    def test_stale(self):
+        self._run({"top": "1", "ips": "1"})
+        self.assertEqual(self._run({"top": "2", "ips": "2"}).regenerated,
+                         [("foo", "ips, top changed")])
+
+        self.output.write_text("edited\n")
+        self.assertEqual(self._run({"top": "2", "ips": "2"}).regenerated,
+                         [("foo", "rtl/foo.sv was modified")])
+
+        self.output.unlink()
+        self.assertEqual(self._run({"top": "2", "ips": "2"}).regenerated,
+                         [("foo", "rtl/foo.sv is missing")])
+
+    def test_other_out_path(self):
+        self._run({"top": "1"})
+        self.out_path = Path(self._tmp.name) / "other"
+        self.assertEqual(self._run({"top": "1"}).regenerated,
+                         [("foo", "new")])
+
+    def test_fixed_point(self):
+        deps = Dependencies(self.state_path, self.out_path)
+        deps.record_fixed_point("in1", "cfg1")
+        deps.record_fixed_point("in2", "cfg2")
+        deps.save()
+
+        deps = Dependencies(self.state_path, self.out_path)
+        self.assertIsNone(deps.fixed_point("in1"))
+        self.assertEqual(deps.fixed_point("in2"), "cfg2")
+
+    def test_disabled(self):
+        deps = Dependencies(None, self.out_path)
+        self.assertTrue(deps.needs_update("foo", {}))
+        self.assertEqual(deps.files_digest(self.out_path), "")
+        deps.record("foo", [self.output])
+        deps.save()
+        self.assertFalse(self.state_path.exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
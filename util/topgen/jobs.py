@@ -0,0 +1,146 @@
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+"""Run independent parts of topgen's output in parallel.
+
+Most of what topgen generates once the complete top configuration is known
+(ipgen modules, crossbars, files rendered from top-level templates) is made
+of independent Mako renders. A JobPool runs these in worker processes.
+
+The workers are forked when the jobs are run, so they can use anything the
+jobs refer to (the complete top config, IP blocks, helper objects and the
+jobs themselves, which are often closures) without pickling it. This means
+that jobs see objects as they are when the pool is run, not when the job was
+submitted, so anything that is changed between submissions must be copied
+by the caller.
+
+Whatever a job logs is captured and logged again by the main process in the
+order in which the jobs were submitted, so that the output doesn't depend on
+which job finishes first. The same goes for the units that a job records
+with the Dependencies object.
+"""
+
+import logging as log
+import multiprocessing
+import traceback
+from typing import Callable, List, Optional, Tuple
+
+from .incremental import Dependencies
+
+# The jobs of the JobPool that is running, which forked workers inherit.
+_running_jobs: List[Tuple[str, Callable[[], None]]] = []
+_running_deps: Optional[Dependencies] = None
+
+
+class _CaptureHandler(log.Handler):
+    """A log handler that keeps the records, ready to be pickled."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.records: List[log.LogRecord] = []
+
+    def emit(self, record: log.LogRecord) -> None:
+        # The arguments and exception of a record might not be picklable, so
+        # format them now.
+        if record.exc_info:
+            record.exc_text = "".join(
+                traceback.format_exception(*record.exc_info))
+            record.exc_info = None
+        record.msg = record.getMessage()
+        record.args = None
+        self.records.append(record)
+
+
+def _run_job(index: int) -> Tuple[List[log.LogRecord], dict, Optional[str]]:
+    """Run a job in a worker process.
+
+    Returns the log records of the job, the units that it recorded and an
+    error message if it failed.
+    """
+    name, func = _running_jobs[index]
+
+    handler = _CaptureHandler()
+    root = log.getLogger()
+    root.handlers = [handler]
+
+    if _running_deps is not None:
+        # Forget about the units recorded by the main process before the
+        # fork, which it knows about already.
+        _running_deps.take_records()
+
+    error = None
+    try:
+        func()
+    except SystemExit as err:
+        # topgen logs an error before exiting, so the exit code is normally
+        # all that is left to say.
+        error = (f"exited with {err.code}"
+                 if err.code is None or isinstance(err.code, int) else
+                 str(err.code))
+    except Exception:
+        error = traceback.format_exc()
+
+    records = (_running_deps.take_records()
+               if _running_deps is not None else {})
+    return handler.records, records, error
+
+
+class JobPool:
+    """A set of independent jobs, which are run by up to `jobs` processes.
+
+    If jobs is 1, each job is run as soon as it is submitted, so topgen
+    behaves as if there was no pool at all. Otherwise jobs are queued by
+    submit() and run by wait().
+    """
+
+    def __init__(self, jobs: int, deps: Dependencies) -> None:
+        if jobs > 1 and "fork" not in multiprocessing.get_all_start_methods():
+            log.warning("Parallel generation needs processes to be forked, "
+                        "which is not supported here. Running one job at a "
+                        "time.")
+            jobs = 1
+        self.jobs = jobs
+        self.deps = deps
+        self._queue: List[Tuple[str, Callable[[], None]]] = []
+
+    def submit(self, name: str, func: Callable[..., None], *args: object,
+               **kwargs: object) -> None:
+        """Run func(*args, **kwargs) as a job called name."""
+        if self.jobs == 1:
+            func(*args, **kwargs)
+        else:
+            self._queue.append((name, lambda: func(*args, **kwargs)))
+
+    def wait(self) -> None:
+        """Run all the queued jobs.
+
+        Once all jobs have finished, raise SystemExit if any of them failed.
+        """
+        global _running_jobs, _running_deps
+
+        if not self._queue:
+            return
+        queue, self._queue = self._queue, []
+
+        _running_jobs = queue
+        _running_deps = self.deps
+        ctx = multiprocessing.get_context("fork")
+        failed = []
+        try:
+            with ctx.Pool(min(self.jobs, len(queue))) as pool:
+                results = pool.imap(_run_job, range(len(queue)), chunksize=1)
+                for (name, _), (records, units, error) in zip(queue, results):
+                    for record in records:
+                        log.getLogger(record.name).handle(record)
+                    self.deps.add_records(units)
+                    if error is not None:
+                        failed.append((name, error))
+        finally:
+            _running_jobs = []
+            _running_deps = None
+
+        for name, error in failed:
+            log.error(f"Generating {name} failed: {error}")
+        if failed:
+            raise SystemExit(f"{len(failed)} of {len(queue)} topgen jobs "
+                             "failed")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# Copyright lowRISC contributors (OpenTitan project).
+# Licensed under the Apache License, Version 2.0, see LICENSE for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import logging as log
+import multiprocessing
+import tempfile
+import unittest
+from pathlib import Path
+
+from topgen.incremental import Dependencies
+from topgen.jobs import JobPool
+
+
+def _generate(deps, out_path, idx):
+    """A job that writes a file, logs something and records its unit."""
+    output = out_path / f"dir{idx % 3}" / f"out{idx}.sv"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(f"module out{idx};\n" * (idx + 1))
+    log.getLogger("jobs_test").info(f"Generated out{idx}")
+    deps.record(f"out{idx}", [output])
+
+
+class TestJobPool(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.tmp = Path(self._tmp.name)
+
+    def _run(self, jobs):
+        """Run some jobs with a pool, returning what they left behind.
+
+        Returns the generated files (mapping their paths relative to the
+        output directory to their contents), the recorded units and the
+        messages that the jobs logged.
+        """
+        out_path = self.tmp / f"out-j{jobs}"
+        state_path = self.tmp / f"state-j{jobs}.json"
+        deps = Dependencies(state_path, out_path)
+        pool = JobPool(jobs, deps)
+        with self.assertLogs(level="INFO") as logs:
+            for idx in range(8):
+                if deps.needs_update(f"out{idx}", {"idx": str(idx)}):
+                    pool.submit(f"out{idx}", _generate, deps, out_path, idx)
+            pool.wait()
+        deps.save()
+
+        files = {
+            str(path.relative_to(out_path)): path.read_text()
+            for path in out_path.rglob("*") if path.is_file()
+        }
+        units = json.loads(state_path.read_text())["units"]
+        messages = [msg for msg in logs.output if "jobs_test" in msg]
+        return files, units, messages
+
+    @unittest.skipUnless("fork" in multiprocessing.get_all_start_methods(),
+                         "needs processes to be forked")
+    def test_parallel_matches_serial(self):
+        files, units, messages = self._run(1)
+        self.assertEqual(len(files), 8)
+        self.assertEqual(sorted(units), [f"out{idx}" for idx in range(8)])
+        self.assertEqual(messages, [f"INFO:jobs_test:Generated out{idx}"
+                                    for idx in range(8)])
+
+        self.assertEqual(self._run(4), (files, units, messages))
+
+    def test_failure(self):
+        def fail():
+            raise ValueError("oops")
+
+        pool = JobPool(2, Dependencies(None, self.tmp))
+        pool.submit("good", lambda: None)
+        pool.submit("bad", fail)
+        with self.assertLogs(level="ERROR") as logs:
+            with self.assertRaises(SystemExit):
+                pool.wait()
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("Generating bad failed", logs.output[0])
+        self.assertIn("ValueError: oops", logs.output[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
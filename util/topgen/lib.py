@@ -1559,8 +1559,42 @@ class TopGen:
         self.subranges[addr_space_name] = subspace_regions
 
 
+def _file_has_content(file_path: Path, content: str,
+                      mode: Optional[int] = None) -> bool:
+    """Return whether file_path holds exactly content (and has mode, if set).
+    """
+    try:
+        if mode is not None and (file_path.stat().st_mode & 0o777) != mode:
+            return False
+        return file_path.read_bytes() == content.encode("UTF-8")
+    except FileNotFoundError:
+        return False
+
+
+def write_file_if_changed(file_path: Path, content: str) -> bool:
+    """
+    Write content to a file, unless the file already holds exactly that.
+
+    Leaving an unchanged file alone keeps its modification time, so that
+    tools downstream of topgen (such as Bazel or FuseSoC) don't see it as
+    changed.
+
+    Args:
+        file_path: Path where the file should be written
+        content: Content to write to the file
+
+    Returns:
+        Whether the file was written.
+    """
+    if _file_has_content(file_path, content):
+        return False
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_path.write_text(content, encoding="UTF-8")
+    return True
+
+
 def write_file_secure(file_path: Path, content: str,
-                      mode: int = 0o600) -> None:
+                      mode: int = 0o600) -> bool:
     """
     Write content to a file with secure permissions.
 
@@ -1568,11 +1602,19 @@ def write_file_secure(file_path: Path, content: str,
     the file with the correct permissions from the start. This prevents race
     conditions in shared NFS environments without needing temporary files.
 
+    As with write_file_if_changed, a file that already has the right content
+    and permissions is left alone.
+
     Args:
         file_path: Path where the file should be written
         content: Content to write to the file
         mode: File permissions to set (default: 0o600 for owner read/write only)
+
+    Returns:
+        Whether the file was written.
     """
+    if _file_has_content(file_path, content, mode):
+        return False
     file_path.parent.mkdir(parents=True, exist_ok=True)
 
     # First delete file if it exists so that we can securely create it
@@ -1584,3 +1626,4 @@ def write_file_secure(file_path: Path, content: str,
     file_descriptor = os.open(file_path, flags, mode)
     with os.fdopen(file_descriptor, "w", encoding="UTF-8") as fout:
         fout.write(content)
+    return True